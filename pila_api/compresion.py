@@ -0,0 +1,197 @@
+# pila_api/compresion.py
+"""
+Compresión del transporte HTTP.
+
+- GzipCuerpoMiddleware: acepta cuerpos con Content-Encoding: gzip y los descomprime a
+  medida que la vista los lee (nunca el cuerpo completo de una vez), con un tope de
+  tamaño descomprimido (PILA_MAX_CUERPO_DESCOMPRIMIDO) que responde 413.
+- comprimir_respuesta: decorador de vistas que comprime la respuesta (gzip, o zstd si el
+  paquete zstandard está instalado) según Accept-Encoding. Las respuestas streaming se
+  comprimen por partes, sin juntarlas en memoria.
+"""
+
+import io
+import zlib
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+
+try:
+    import zstandard
+except ImportError:  # zstd es opcional: sin el paquete zstandard solo se ofrece gzip
+    zstandard = None
+
+# Bloque leído del cuerpo comprimido / tamaño máximo de cada salida de zlib
+_BLOQUE = 64 * 1024
+
+# Respuestas no streaming más pequeñas que esto no se comprimen
+_MIN_COMPRIMIR = 200
+
+
+class CuerpoDemasiadoGrande(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "El cuerpo descomprimido excede el tamaño máximo permitido"
+    default_code = "cuerpo_demasiado_grande"
+
+
+def _max_cuerpo() -> int:
+    return int(getattr(settings, "PILA_MAX_CUERPO_DESCOMPRIMIDO", 200 * 1024 * 1024))
+
+
+class LectorGzip(io.RawIOBase):
+    """
+    Flujo de lectura que descomprime gzip desde otro flujo por bloques.
+
+    Raises (al leer):
+        CuerpoDemasiadoGrande: si lo descomprimido supera limite bytes
+        ParseError: si el gzip es inválido o está truncado
+    """
+
+    def __init__(self, origen, limite: int):
+        self._origen = origen
+        self._limite = limite
+        self._zlib = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        self._pendiente = b""
+        self._total = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _descomprimir(self) -> bytes:
+        while not self._zlib.eof:
+            comprimido = self._zlib.unconsumed_tail or self._origen.read(_BLOQUE)
+            if not comprimido:
+                raise ParseError("Cuerpo gzip incompleto")
+            try:
+                datos = self._zlib.decompress(comprimido, _BLOQUE)
+            except zlib.error as e:
+                raise ParseError(f"Cuerpo gzip inválido: {e}")
+            if datos:
+                self._total += len(datos)
+                if self._total > self._limite:
+                    raise CuerpoDemasiadoGrande()
+                return datos
+        return b""
+
+    def readinto(self, destino) -> int:
+        if not self._pendiente:
+            self._pendiente = self._descomprimir()
+        n = min(len(destino), len(self._pendiente))
+        destino[:n] = self._pendiente[:n]
+        self._pendiente = self._pendiente[n:]
+        return n
+
+
+class GzipCuerpoMiddleware:
+    """
+    Cuerpos de petición con Content-Encoding: gzip: el flujo de la petición se reemplaza
+    por uno que descomprime al leer (DRF y request.body ven el JSON descomprimido).
+    Otras codificaciones responden 415.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        codificacion = request.META.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if codificacion == "gzip":
+            request._stream = io.BufferedReader(LectorGzip(request._stream, _max_cuerpo()), _BLOQUE)
+            request._read_started = False
+            del request.META["HTTP_CONTENT_ENCODING"]
+        elif codificacion not in ("", "identity"):
+            return JsonResponse(
+                {"detail": f"Content-Encoding no soportado: {codificacion} (use gzip)"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        return self.get_response(request)
+
+
+def codificaciones_disponibles() -> tuple[str, ...]:
+    """Codificaciones de respuesta en orden de preferencia del servidor."""
+    return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+
+def elegir_codificacion(accept_encoding: str) -> str | None:
+    """
+    Codificación para la respuesta según Accept-Encoding (mayor q; a igual q, la preferida
+    del servidor). None = sin comprimir.
+    """
+    calidades = {}
+    for parte in accept_encoding.lower().split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        parametros = parametros.replace(" ", "")
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        calidades[nombre.strip()] = q
+
+    mejor, mejor_q = None, 0.0
+    for codificacion in codificaciones_disponibles():
+        q = calidades.get(codificacion, calidades.get("*", 0.0))
+        if q > mejor_q:
+            mejor, mejor_q = codificacion, q
+    return mejor
+
+
+def _compresor(codificacion: str):
+    if codificacion == "zstd":
+        return zstandard.ZstdCompressor().compressobj()
+    return zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def _comprimir_stream(partes, codificacion: str):
+    compresor = _compresor(codificacion)
+    for parte in partes:
+        datos = compresor.compress(parte)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def comprimir(request, response):
+    """
+    Comprime la respuesta si el cliente lo acepta. Solo respuestas 200 sin codificación
+    previa (no 206/304 ni errores). El ETag fuerte pasa a débil: el contenido codificado ya
+    no es byte a byte el mismo recurso.
+    """
+    if response.status_code != 200 or response.has_header("Content-Encoding"):
+        return response
+    if not response.streaming and len(response.content) < _MIN_COMPRIMIR:
+        return response
+
+    patch_vary_headers(response, ("Accept-Encoding",))
+    codificacion = elegir_codificacion(request.headers.get("Accept-Encoding", ""))
+    if codificacion is None:
+        return response
+
+    if response.streaming:
+        response.streaming_content = _comprimir_stream(response.streaming_content, codificacion)
+        if response.has_header("Content-Length"):
+            del response["Content-Length"]
+    else:
+        compresor = _compresor(codificacion)
+        response.content = compresor.compress(response.content) + compresor.flush()
+        response["Content-Length"] = str(len(response.content))
+
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+        response["ETag"] = "W/" + etag
+    response["Content-Encoding"] = codificacion
+    return response
+
+
+def comprimir_respuesta(vista):
+    """Decorador: comprime la respuesta de la vista según Accept-Encoding (ver comprimir)."""
+
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        return comprimir(request, vista(request, *args, **kwargs))
+
+    return envoltura
@@ -18,4 +18,15 @@ def planilla_to_response(planilla):
         },
         "errores": planilla.errores or [],
         "tiene_archivo": bool(planilla.tiene_archivo),
-    }
\ No newline at end of file
+    }
+
+def job_to_response(job):
+    return {
+        "job_id": job.job_id,
+        "estado": job.estado,
+        "intentos": job.intentos,
+        "error": job.error or None,
+        "fecha_creacion": job.fecha_creacion.isoformat() if job.fecha_creacion else None,
+        "fecha_inicio": job.fecha_inicio.isoformat() if job.fecha_inicio else None,
+        "fecha_fin": job.fecha_fin.isoformat() if job.fecha_fin else None,
+    }
@@ -0,0 +1,69 @@
+# pila_api/management/commands/procesar_planillas.py
+"""
+Worker de la cola de planillas asíncronas (POST /pila/planillas/?async=1).
+Reclama jobs con SELECT ... FOR UPDATE SKIP LOCKED: se pueden correr varios en paralelo.
+Con la cola vacía borra detalles de generaciones viejas (recolectar_generaciones) en lotes
+acotados antes de esperar.
+
+Uso:
+  python manage.py procesar_planillas            # loop infinito
+  python manage.py procesar_planillas --once     # procesa lo pendiente y termina
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from pila_api.services.generaciones_detalles import recolectar_generaciones
+from pila_api.services.procesar_planilla import reclamar_job, ejecutar_job
+
+
+class Command(BaseCommand):
+    help = "Procesa la cola de planillas asíncronas (ingesta + cálculo)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Termina cuando no hay jobs pendientes")
+        parser.add_argument("--sleep", type=float, default=2.0, help="Segundos de espera si la cola está vacía")
+        parser.add_argument("--max-jobs", type=int, default=None, help="Termina tras procesar N jobs")
+        parser.add_argument(
+            "--lotes-recoleccion", type=int, default=10,
+            help="Lotes de detalles viejos a borrar cada vez que la cola está vacía (0 = no recolectar)",
+        )
+
+    def handle(self, *args, **options):
+        procesados = 0
+
+        while True:
+            close_old_connections()
+            job = reclamar_job()
+
+            if job is None:
+                borrados = 0
+                if options["lotes_recoleccion"]:
+                    borrados = recolectar_generaciones(max_lotes=options["lotes_recoleccion"])
+                    if borrados:
+                        self.stdout.write(f"{borrados} detalle(s) de generaciones viejas borrados")
+                if options["once"]:
+                    break
+                if not borrados:
+                    time.sleep(options["sleep"])
+                continue
+
+            self.stdout.write(f"Procesando job {job.job_id} (planilla {job.planilla_id})...")
+            job = ejecutar_job(job)
+
+            if job.estado == "PENDIENTE":
+                # Otra petición tiene el bloqueo de la planilla: se retoma en otra vuelta
+                self.stdout.write(self.style.WARNING(f"Job {job.job_id}: planilla ocupada, vuelve a la cola"))
+                time.sleep(options["sleep"])
+                continue
+            if job.estado == "COMPLETADO":
+                self.stdout.write(self.style.SUCCESS(f"✓ Job {job.job_id} completado"))
+            else:
+                self.stdout.write(self.style.ERROR(f"✗ Job {job.job_id} fallido: {job.error}"))
+
+            procesados += 1
+            if options["max_jobs"] and procesados >= options["max_jobs"]:
+                break
+
+        self.stdout.write(f"{procesados} job(s) procesados")
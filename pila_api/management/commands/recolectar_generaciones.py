@@ -0,0 +1,30 @@
+# pila_api/management/commands/recolectar_generaciones.py
+"""
+Borra los detalles y novedades de generaciones de detalles ya reemplazadas (reingestas),
+por lotes en transacciones cortas. El worker procesar_planillas lo hace mientras la cola
+está vacía; este comando sirve para correrlo aparte (cron) o vaciar todo lo pendiente.
+
+Uso:
+  python manage.py recolectar_generaciones
+  python manage.py recolectar_generaciones --planilla 123 --batch-size 500
+"""
+
+from django.core.management.base import BaseCommand
+from pila_api.services.generaciones_detalles import recolectar_generaciones
+
+
+class Command(BaseCommand):
+    help = "Borra detalles de generaciones viejas (reingestas ya reemplazadas)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--planilla", type=int, default=None, help="Solo esta planilla (planilla_id)")
+        parser.add_argument("--batch-size", type=int, default=None, help="Detalles por lote (PILA_RECOLECCION_BATCH_SIZE)")
+        parser.add_argument("--max-lotes", type=int, default=None, help="Termina tras borrar N lotes")
+
+    def handle(self, *args, **options):
+        borrados = recolectar_generaciones(
+            planilla_id=options["planilla"],
+            batch_size=options["batch_size"],
+            max_lotes=options["max_lotes"],
+        )
+        self.stdout.write(self.style.SUCCESS(f"{borrados} detalle(s) borrados"))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0008_pilaplanilladetalle_dias_arl_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PilaJob',
+            fields=[
+                ('job_id', models.AutoField(primary_key=True, serialize=False)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'PENDIENTE'), ('EN_PROCESO', 'EN_PROCESO'), ('COMPLETADO', 'COMPLETADO'), ('FALLIDO', 'FALLIDO')], default='PENDIENTE', max_length=20)),
+                ('force', models.BooleanField(default=False)),
+                ('intentos', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'pila"."pila_job',
+            },
+        ),
+        migrations.AddField(
+            model_name='pilajob',
+            name='planilla',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='pila_api.pilaplanilla'),
+        ),
+        migrations.AddIndex(
+            model_name='pilajob',
+            index=models.Index(fields=['estado', 'job_id'], name='ix_pila_job_estado'),
+        ),
+    ]
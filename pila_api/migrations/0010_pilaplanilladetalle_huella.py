@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0009_pilajob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='huella',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
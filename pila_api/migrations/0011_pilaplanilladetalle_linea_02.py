@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0010_pilaplanilladetalle_huella'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='linea_02',
+            field=models.CharField(blank=True, default='', max_length=693),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0011_pilaplanilladetalle_linea_02'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PilaArchivo',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('tipo_planilla', models.CharField(blank=True, default='', max_length=1)),
+                ('version', models.PositiveIntegerField()),
+                ('etag', models.CharField(max_length=64)),
+                ('contenido', models.BinaryField()),
+                ('tamano', models.PositiveIntegerField()),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_acceso', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'pila"."pila_archivo',
+            },
+        ),
+        migrations.AddField(
+            model_name='pilaplanilla',
+            name='version_archivo',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaarchivo',
+            name='planilla',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archivos', to='pila_api.pilaplanilla'),
+        ),
+        migrations.AddIndex(
+            model_name='pilaarchivo',
+            index=models.Index(fields=['fecha_acceso'], name='ix_pila_archivo_acceso'),
+        ),
+        migrations.AddConstraint(
+            model_name='pilaarchivo',
+            constraint=models.UniqueConstraint(fields=('planilla', 'tipo_planilla', 'version'), name='uq_pila_archivo_version'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 17:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0012_pilaarchivo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilaarchivo',
+            name='ruta',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
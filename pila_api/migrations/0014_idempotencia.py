@@ -0,0 +1,42 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0013_pilaarchivo_ruta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PilaIdempotencia',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('clave', models.CharField(max_length=255, unique=True)),
+                ('hash_payload', models.CharField(max_length=64)),
+                ('status', models.PositiveSmallIntegerField()),
+                ('respuesta', models.JSONField()),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'pila"."pila_idempotencia',
+            },
+        ),
+        migrations.AddField(
+            model_name='pilaplanilla',
+            name='hash_payload',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pilaidempotencia',
+            name='planilla',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotencias', to='pila_api.pilaplanilla'),
+        ),
+        migrations.AddIndex(
+            model_name='pilaidempotencia',
+            index=models.Index(fields=['fecha_creacion'], name='ix_pila_idempotencia_fecha'),
+        ),
+    ]
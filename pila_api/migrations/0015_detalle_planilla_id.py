@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0014_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pilaplanilladetalle',
+            index=models.Index(fields=['planilla', 'id'], name='ix_pila_detalle_planilla_id'),
+        ),
+    ]
@@ -0,0 +1,178 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:11
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+# Copia congelada del cálculo de services/aportes_detalle.py y utils/centavos.py a la fecha
+# de esta migración: no importa código de la app para que reaplicarla dé siempre lo mismo.
+
+# Detalles por bulk_update al llenar las columnas
+BLOQUE = 1000
+
+# Columnas de aportes del detalle, en centavos
+CAMPOS_APORTES = [
+    "salud_ibc_centavos", "salud_empleado_centavos", "salud_empleador_centavos",
+    "pension_ibc_centavos", "pension_empleado_centavos", "pension_empleador_centavos",
+    "fsp_solidaridad_centavos", "fsp_subsistencia_centavos",
+    "arl_ibc_centavos", "arl_empleador_centavos",
+    "caja_ibc_centavos", "caja_empleador_centavos",
+    "sena_centavos", "icbf_centavos",
+]
+
+# Tasas de ley SENA (2%) e ICBF (3%) como fracción n/d; el payload no las modifica
+TASA_SENA = (1, 50)
+TASA_ICBF = (3, 100)
+
+
+def _a_centavos(valor) -> int:
+    """Pesos (Decimal, str, int o float) -> centavos enteros ROUND_HALF_UP; None o "" -> 0."""
+    if valor is None or valor == "":
+        return 0
+    if isinstance(valor, int):
+        return valor * 100
+    d = valor if isinstance(valor, Decimal) else Decimal(str(valor).strip())
+    return int(d.scaleb(2).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _cotizacion_centavos(centavos: int, tasa: tuple[int, int]) -> int:
+    """centavos × tasa al múltiplo de 100 pesos superior, en centavos."""
+    n, d = tasa
+    return -(-(centavos * n) // (10000 * d)) * 10000
+
+
+def _columnas_aportes(aportes: dict | None, novedad_sln: bool) -> dict:
+    """Valores de CAMPOS_APORTES para el JSON aportes de un detalle ({} o None = todo 0)."""
+    if not aportes:
+        return dict.fromkeys(CAMPOS_APORTES, 0)
+
+    salud = aportes.get("salud", {})
+    pension = aportes.get("pension", {})
+    arl = aportes.get("arl", {})
+    caja = aportes.get("caja", {})
+
+    caja_ibc = _a_centavos(caja.get("ibc"))
+    parafiscales = caja.get("aplica", False) and caja_ibc > 0 and not caja.get("exonerado", False) and not novedad_sln
+
+    return {
+        "salud_ibc_centavos": _a_centavos(salud.get("ibc")),
+        "salud_empleado_centavos": _a_centavos(salud.get("empleado")),
+        "salud_empleador_centavos": _a_centavos(salud.get("empleador")),
+        "pension_ibc_centavos": _a_centavos(pension.get("ibc")),
+        "pension_empleado_centavos": _a_centavos(pension.get("empleado")),
+        "pension_empleador_centavos": _a_centavos(pension.get("empleador")),
+        "fsp_solidaridad_centavos": _a_centavos(pension.get("fsp_solidaridad")),
+        "fsp_subsistencia_centavos": _a_centavos(pension.get("fsp_subsistencia")),
+        "arl_ibc_centavos": _a_centavos(arl.get("ibc")),
+        "arl_empleador_centavos": _a_centavos(arl.get("empleador")),
+        "caja_ibc_centavos": caja_ibc,
+        "caja_empleador_centavos": _a_centavos(caja.get("empleador")),
+        "sena_centavos": _cotizacion_centavos(caja_ibc, TASA_SENA) if parafiscales else 0,
+        "icbf_centavos": _cotizacion_centavos(caja_ibc, TASA_ICBF) if parafiscales else 0,
+    }
+
+
+def llenar_aportes_centavos(apps, schema_editor):
+    """Columnas *_centavos de los detalles ya calculados, desde su JSON aportes."""
+    PilaPlanilla = apps.get_model("pila_api", "PilaPlanilla")
+    PilaPlanillaDetalle = apps.get_model("pila_api", "PilaPlanillaDetalle")
+    PilaNovedad = apps.get_model("pila_api", "PilaNovedad")
+
+    for planilla in PilaPlanilla.objects.filter(detalles__estado="OK").distinct().iterator():
+        con_sln = set(
+            PilaNovedad.objects
+            .filter(detalle__planilla=planilla, tipo_novedad__iexact="SLN")
+            .values_list("detalle_id", flat=True)
+        )
+
+        pendientes = []
+        for d in PilaPlanillaDetalle.objects.filter(planilla=planilla, estado="OK").iterator(chunk_size=BLOQUE):
+            for campo, valor in _columnas_aportes(d.aportes, d.id in con_sln).items():
+                setattr(d, campo, valor)
+            pendientes.append(d)
+            if len(pendientes) >= BLOQUE:
+                PilaPlanillaDetalle.objects.bulk_update(pendientes, CAMPOS_APORTES)
+                pendientes = []
+        if pendientes:
+            PilaPlanillaDetalle.objects.bulk_update(pendientes, CAMPOS_APORTES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0015_detalle_planilla_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='arl_empleador_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='arl_ibc_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='caja_empleador_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='caja_ibc_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='fsp_solidaridad_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='fsp_subsistencia_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='icbf_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='pension_empleado_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='pension_empleador_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='pension_ibc_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='salud_empleado_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='salud_empleador_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='salud_ibc_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='sena_centavos',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(llenar_aportes_centavos, migrations.RunPython.noop),
+    ]
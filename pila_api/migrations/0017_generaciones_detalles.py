@@ -0,0 +1,37 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0016_aportes_centavos'),
+    ]
+
+    operations = [
+        # Índice único de 0005 pendiente de quitar (el modelo ya no lo declara): la generación
+        # nueva se inserta con los mismos documentos que la vigente
+        migrations.RemoveConstraint(
+            model_name='pilaplanilladetalle',
+            name='uq_pila_detalle_planilla_doc',
+        ),
+        migrations.RemoveIndex(
+            model_name='pilaplanilladetalle',
+            name='ix_pila_detalle_planilla_id',
+        ),
+        migrations.AddField(
+            model_name='pilaplanilla',
+            name='generacion',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pilaplanilladetalle',
+            name='generacion',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='pilaplanilladetalle',
+            index=models.Index(fields=['planilla', 'generacion', 'id'], name='ix_pila_detalle_generacion'),
+        ),
+    ]
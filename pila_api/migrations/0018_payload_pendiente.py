@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0017_generaciones_detalles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilaplanilla',
+            name='payload_pendiente',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 18:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0018_payload_pendiente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilajob',
+            name='created',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='pilajob',
+            name='payload',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0019_job_payload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pilaplanilla',
+            name='estado',
+            field=models.CharField(choices=[('PENDIENTE', 'PENDIENTE'), ('EN_PROCESO', 'EN_PROCESO'), ('COMPLETADA', 'COMPLETADA'), ('CON_ERRORES', 'CON_ERRORES')], default='EN_PROCESO', max_length=20),
+        ),
+    ]
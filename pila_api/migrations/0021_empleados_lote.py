@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-18 19:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0020_planilla_pendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PilaEmpleadosLote',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('generacion', models.PositiveIntegerField()),
+                ('lote', models.PositiveIntegerField()),
+                ('empleados', models.JSONField(default=list)),
+                ('planilla', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lotes_empleados', to='pila_api.pilaplanilla')),
+            ],
+            options={
+                'db_table': 'pila"."pila_empleados_lote',
+                'indexes': [models.Index(fields=['planilla', 'generacion', 'lote'], name='ix_pila_empleados_lote')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 19:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pila_api', '0021_empleados_lote'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pilaplanilla',
+            name='version_lineas',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
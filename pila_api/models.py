@@ -3,6 +3,7 @@ from django.db import models
 
 class PilaPlanilla(models.Model):
     ESTADOS = (
+        ("PENDIENTE", "PENDIENTE"),  # payload encolado (?async=1), aún sin worker
         ("EN_PROCESO", "EN_PROCESO"),
         ("COMPLETADA", "COMPLETADA"),
         ("CON_ERRORES", "CON_ERRORES"),
@@ -18,11 +19,21 @@ class PilaPlanilla(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADOS, default="EN_PROCESO")
 
     payload_inicial = models.JSONField(null=True, blank=True)
+    # Payload de una reingesta en curso: pasa a payload_inicial junto con el cambio de generación
+    payload_pendiente = models.JSONField(null=True, blank=True)
 
     totales = models.JSONField(null=True, blank=True)
     resumen = models.JSONField(null=True, blank=True)
     errores = models.JSONField(default=list, blank=True)
     tiene_archivo = models.BooleanField(default=False)
+    # Versión de los datos del TXT: se incrementa al recalcular o cambiar el payload (invalida archivos guardados)
+    version_archivo = models.PositiveIntegerField(default=0)
+    # SHA-256 canónico del último payload procesado con éxito ("" = en proceso o sin procesar)
+    hash_payload = models.CharField(max_length=64, blank=True, default="")
+    # Generación vigente de los detalles (services/generaciones_detalles.py): las lecturas solo ven esa
+    generacion = models.PositiveIntegerField(default=0)
+    # Versión con la que el último cálculo dejó las linea_02 de los detalles ("" = no usarlas)
+    version_lineas = models.CharField(max_length=32, blank=True, default="")
 
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     fecha_finalizacion = models.DateTimeField(null=True, blank=True)
@@ -44,6 +55,8 @@ class PilaPlanillaDetalle(models.Model):
         on_delete=models.CASCADE,
         related_name="detalles",
     )
+    # Ingesta que creó el detalle; vigente si es igual a planilla.generacion
+    generacion = models.PositiveIntegerField(default=0)
 
     tipo_doc = models.CharField(max_length=3)
     numero_doc = models.CharField(max_length=20)
@@ -76,11 +89,63 @@ class PilaPlanillaDetalle(models.Model):
     aportes_empleador = models.DecimalField(max_digits=14, decimal_places=2, default=0)
     aportes_empleado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
 
+    # Aportes por subsistema en centavos (services/aportes_detalle.py): totales con SUM en la base
+    salud_ibc_centavos = models.BigIntegerField(default=0)
+    salud_empleado_centavos = models.BigIntegerField(default=0)
+    salud_empleador_centavos = models.BigIntegerField(default=0)
+    pension_ibc_centavos = models.BigIntegerField(default=0)
+    pension_empleado_centavos = models.BigIntegerField(default=0)
+    pension_empleador_centavos = models.BigIntegerField(default=0)
+    fsp_solidaridad_centavos = models.BigIntegerField(default=0)
+    fsp_subsistencia_centavos = models.BigIntegerField(default=0)
+    arl_ibc_centavos = models.BigIntegerField(default=0)
+    arl_empleador_centavos = models.BigIntegerField(default=0)
+    caja_ibc_centavos = models.BigIntegerField(default=0)
+    caja_empleador_centavos = models.BigIntegerField(default=0)
+    sena_centavos = models.BigIntegerField(default=0)
+    icbf_centavos = models.BigIntegerField(default=0)
+
+    # Huella de las entradas del último cálculo (calcular_planilla incremental)
+    huella = models.CharField(max_length=32, blank=True, default="")
+
+    # Registro 02 ya renderizado al calcular (secuencia provisional 00000); vigente mientras la huella no cambie
+    linea_02 = models.CharField(max_length=693, blank=True, default="")
 
     class Meta:
         db_table = 'pila"."pila_planilla_detalle'
         # NOTA: Se eliminó la restricción UNIQUE para permitir múltiples registros por empleado
         # (necesario para generar múltiples líneas tipo 02 cuando hay novedades como VAC, IGE, etc)
+        indexes = [
+            # Detalles de la generación vigente y paginación por cursor de listar_detalles
+            # (planilla_id = X AND generacion = G AND id > cursor ORDER BY id); también la
+            # recolección de generaciones viejas (generacion < G)
+            models.Index(fields=["planilla", "generacion", "id"], name="ix_pila_detalle_generacion"),
+        ]
+
+
+class PilaEmpleadosLote(models.Model):
+    """
+    Empleados tal como llegaron en una ingesta por partes (?stream=1), un lote por fila: el
+    payload_inicial de esas planillas se guarda sin la lista "empleados" (ver
+    services/empleados_lotes.py).
+    """
+    id = models.AutoField(primary_key=True)
+
+    planilla = models.ForeignKey(
+        PilaPlanilla,
+        on_delete=models.CASCADE,
+        related_name="lotes_empleados",
+    )
+    # Generación de los detalles ingeridos con estos empleados (ver generaciones_detalles)
+    generacion = models.PositiveIntegerField()
+    lote = models.PositiveIntegerField()  # orden dentro de la generación
+    empleados = models.JSONField(default=list)
+
+    class Meta:
+        db_table = 'pila"."pila_empleados_lote'
+        indexes = [
+            models.Index(fields=["planilla", "generacion", "lote"], name="ix_pila_empleados_lote"),
+        ]
 
 
 class PilaNovedad(models.Model):
@@ -111,4 +176,107 @@ class PilaNovedad(models.Model):
     metadata = models.JSONField(default=dict, blank=True)
 
     class Meta:
-        db_table = 'pila"."pila_novedad'
\ No newline at end of file
+        db_table = 'pila"."pila_novedad'
+
+class PilaJob(models.Model):
+    """
+    Cola de procesamiento asíncrono (crear_planilla?async=1).
+    Los workers (manage.py procesar_planillas) reclaman jobs con SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    ESTADOS = (
+        ("PENDIENTE", "PENDIENTE"),
+        ("EN_PROCESO", "EN_PROCESO"),
+        ("COMPLETADO", "COMPLETADO"),
+        ("FALLIDO", "FALLIDO"),
+    )
+
+    job_id = models.AutoField(primary_key=True)
+
+    planilla = models.ForeignKey(
+        PilaPlanilla,
+        on_delete=models.CASCADE,
+        related_name="jobs",
+    )
+
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="PENDIENTE")
+    # Payload recibido en el POST que encoló el job (el que procesa, aunque llegue otro después)
+    payload = models.JSONField(null=True, blank=True)
+    force = models.BooleanField(default=False)
+    # El POST creó la planilla: el worker siempre la ingiere
+    created = models.BooleanField(default=False)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'pila"."pila_job'
+        indexes = [
+            models.Index(fields=["estado", "job_id"], name="ix_pila_job_estado"),
+        ]
+
+
+class PilaArchivo(models.Model):
+    """
+    Archivo TXT ya generado (caché de descargar_archivo), por planilla, filtro tipo_planilla
+    y versión de los datos. Vigente mientras version == planilla.version_archivo.
+    etag es el SHA-256 del contenido; el contenido va en la tabla o en PILA_ARCHIVOS_DIR.
+    """
+    id = models.AutoField(primary_key=True)
+
+    planilla = models.ForeignKey(
+        PilaPlanilla,
+        on_delete=models.CASCADE,
+        related_name="archivos",
+    )
+
+    tipo_planilla = models.CharField(max_length=1, blank=True, default="")  # "" = todos, E, K
+    version = models.PositiveIntegerField()
+
+    etag = models.CharField(max_length=64)
+    contenido = models.BinaryField()  # vacío si el archivo está en disco (ruta)
+    tamano = models.PositiveIntegerField()
+    # Ruta relativa a PILA_ARCHIVOS_DIR cuando el contenido se guarda en disco ("" = en la tabla)
+    ruta = models.CharField(max_length=255, blank=True, default="")
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_acceso = models.DateTimeField(auto_now_add=True)  # última descarga (desalojo LRU)
+
+    class Meta:
+        db_table = 'pila"."pila_archivo'
+        constraints = [
+            models.UniqueConstraint(
+                fields=["planilla", "tipo_planilla", "version"], name="uq_pila_archivo_version"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["fecha_acceso"], name="ix_pila_archivo_acceso"),
+        ]
+
+
+class PilaIdempotencia(models.Model):
+    """
+    Respuesta de crear_planilla guardada por Idempotency-Key: un reintento con la misma
+    clave recibe la misma respuesta sin volver a procesar. Vence tras PILA_IDEMPOTENCIA_TTL.
+    """
+    id = models.AutoField(primary_key=True)
+    clave = models.CharField(max_length=255, unique=True)
+    hash_payload = models.CharField(max_length=64)  # payload con que se usó la clave
+
+    planilla = models.ForeignKey(
+        PilaPlanilla,
+        on_delete=models.CASCADE,
+        related_name="idempotencias",
+    )
+    status = models.PositiveSmallIntegerField()
+    respuesta = models.JSONField()
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'pila"."pila_idempotencia'
+        indexes = [
+            models.Index(fields=["fecha_creacion"], name="ix_pila_idempotencia_fecha"),
+        ]
@@ -0,0 +1,152 @@
+# pila_api/renderers/fixed_width/layout.py
+"""
+Layouts declarativos de ancho fijo, compilados una sola vez.
+
+Un layout es una lista de Campo (posiciones 1-based inclusivas como el Anexo Técnico,
+tipo alfanumérico o numérico y una función que extrae el valor del dict de datos).
+compilar_layout() valida el layout (rango, solapes) y genera una sola vez la función que
+arma la línea: una asignación por campo con ancho y relleno fijos en el código y un único
+"".join al final, sin el buffer de caracteres de FixedWidthLine ni llamadas por campo.
+
+Semántica de cada campo (igual a FixedWidthLine):
+- ALFA: str(valor) alineado a la izquierda con espacios
+- NUM: entero alineado a la derecha con ceros (Decimal -> int)
+- La función de valor devuelve None cuando el campo no se escribe: queda en blanco, o con
+  el contenido del fondo si se pasa uno (ej. la cola 333-693 clonada de un archivo real)
+
+Un valor más ancho que su campo sigue siendo un error (ValueError), pero no se valida
+campo por campo: solo puede alargar la línea, así que se verifica la longitud final y
+únicamente si no cuadra se busca el campo culpable.
+"""
+
+from decimal import Decimal
+
+ALFA = "A"
+NUM = "N"
+
+
+class Campo:
+    """
+    Campo de un layout de ancho fijo.
+
+    Args:
+        inicio, fin: posiciones 1-based, fin inclusivo (como el Anexo Técnico)
+        tipo: ALFA o NUM
+        valor: función data -> valor del campo; None = campo no escrito
+        nombre: descripción para mensajes de error
+    """
+
+    __slots__ = ("inicio", "fin", "tipo", "valor", "nombre")
+
+    def __init__(self, inicio: int, fin: int, tipo: str, valor, nombre: str = ""):
+        self.inicio = inicio
+        self.fin = fin
+        self.tipo = tipo
+        self.valor = valor
+        self.nombre = nombre
+
+    @property
+    def ancho(self) -> int:
+        return self.fin - self.inicio + 1
+
+
+def _texto(valor, tipo: str) -> str:
+    if tipo == NUM and isinstance(valor, Decimal):
+        valor = int(valor)
+    return str(valor)
+
+
+def _generar_render(nombre: str, piezas: list):
+    """
+    Genera (una vez) la función render(data, blancos) del layout: una asignación por
+    campo con el ancho y el relleno ya fijos en el código, y un único "".join al final.
+    piezas: Campo o None (hueco) en orden de posición; blancos[i] es el relleno de la
+    pieza i cuando no se escribe.
+    """
+    espacio = {"Decimal": Decimal}
+    lineas = ["def render(data, blancos):"]
+    partes = []
+    for i, campo in enumerate(piezas):
+        if campo is None:
+            partes.append(f"blancos[{i}]")
+            continue
+        espacio[f"valor_{i}"] = campo.valor
+        lineas.append(f"    v = valor_{i}(data)")
+        if campo.tipo == NUM:
+            texto = "str(int(v) if v.__class__ is Decimal else v)"
+            relleno = f"rjust({campo.ancho}, '0')"
+        else:
+            texto, relleno = "str(v)", f"ljust({campo.ancho})"
+        lineas.append(f"    p{i} = blancos[{i}] if v is None else {texto}.{relleno}")
+        partes.append(f"p{i}")
+    lineas.append(f"    return ''.join(({', '.join(partes)},))")
+
+    fuente = "\n".join(lineas)
+    exec(compile(fuente, f"<layout {nombre}>", "exec"), espacio)
+    return espacio["render"], fuente
+
+
+class LayoutCompilado:
+    """Layout validado y precompilado: render(data) arma la línea en una pasada."""
+
+    def __init__(self, nombre: str, longitud: int, campos: list[Campo]):
+        self.nombre = nombre
+        self.longitud = longitud
+        self.campos = tuple(sorted(campos, key=lambda c: c.inicio))
+
+        piezas = []
+        cortes = []
+        pos = 1
+        for campo in self.campos:
+            if campo.tipo not in (ALFA, NUM):
+                raise ValueError(f"{nombre}: tipo '{campo.tipo}' inválido en {campo.inicio}-{campo.fin}")
+            if campo.inicio < 1 or campo.fin > longitud or campo.fin < campo.inicio:
+                raise ValueError(f"{nombre}: campo fuera de rango: {campo.inicio}-{campo.fin}")
+            if campo.inicio < pos:
+                raise ValueError(f"{nombre}: campo {campo.inicio}-{campo.fin} se solapa con el anterior")
+            if campo.inicio > pos:
+                # Hueco sin campo: siempre blanco (o fondo)
+                piezas.append(None)
+                cortes.append((pos - 1, campo.inicio - 1))
+            piezas.append(campo)
+            cortes.append((campo.inicio - 1, campo.fin))
+            pos = campo.fin + 1
+        if pos <= longitud:
+            piezas.append(None)
+            cortes.append((pos - 1, longitud))
+
+        self._cortes = tuple(cortes)
+        self._blancos = tuple(" " * (fin - inicio) for inicio, fin in cortes)
+        # fuente: código generado, útil para depurar
+        self._render, self.fuente = _generar_render(nombre, piezas)
+
+    def render(self, data: dict, fondo: str | None = None) -> str:
+        """
+        Args:
+            data: valores de los campos
+            fondo: línea completa (longitud del layout) cuyo contenido queda en los huecos
+                y en los campos no escritos. Por defecto espacios.
+        """
+        if fondo is None:
+            blancos = self._blancos
+        else:
+            if len(fondo) != self.longitud:
+                raise ValueError(f"fondo debe medir {self.longitud}, pero mide {len(fondo)}")
+            blancos = [fondo[inicio:fin] for inicio, fin in self._cortes]
+
+        linea = self._render(data, blancos)
+        if len(linea) != self.longitud:
+            self._error_ancho(data)
+        return linea
+
+    def _error_ancho(self, data: dict):
+        for campo in self.campos:
+            v = campo.valor(data)
+            if v is not None and len(_texto(v, campo.tipo)) > campo.ancho:
+                raise ValueError(f"Valor '{_texto(v, campo.tipo)}' excede ancho {campo.ancho}")
+        raise ValueError(f"{self.nombre}: longitud final incorrecta")
+
+
+def compilar_layout(nombre: str, longitud: int, campos: list[Campo]) -> LayoutCompilado:
+    """Valida y compila un layout (una vez, a nivel de módulo)."""
+    return LayoutCompilado(nombre, longitud, campos)
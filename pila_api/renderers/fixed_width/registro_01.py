@@ -1,6 +1,59 @@
 # pila_api/renderers/fixed_width/registro_01.py
 
-from pila_api.renderers.fixed_width.base import FixedWidthLine
+from pila_api.renderers.fixed_width.layout import ALFA, NUM, Campo, compilar_layout
+
+
+def _numero_radicacion(data):
+    # Campo 17: numérico si el operador lo asignó; en blanco si no
+    num_rad = data.get("numero_radicacion")
+    if num_rad is not None and str(num_rad).strip() != "":
+        return int(num_rad)
+    return None
+
+
+def _codigo_operador(data):
+    cod_op = str(data.get("codigo_operador", "00"))[:2].zfill(2)
+    return int(cod_op) if cod_op.isdigit() else 0
+
+
+# Layout del encabezado (posiciones 1-based, fin inclusivo)
+LAYOUT_01 = compilar_layout("Registro 01", 359, [
+    # --- Campos 1-3 ---
+    Campo(1, 2, ALFA, lambda d: "01", "tipo_registro"),
+    Campo(3, 3, ALFA, lambda d: str(d.get("modalidad_planilla", "1"))[:1], "modalidad_planilla"),  # 1=Electrónica, 2=Asistida
+    Campo(4, 7, ALFA, lambda d: str(d.get("secuencia", "0001")).strip()[:4].zfill(4), "secuencia"),
+
+    # --- Campos 4-8 ---
+    Campo(8, 207, ALFA, lambda d: str(d.get("razon_social", ""))[:200], "razon_social"),
+    Campo(208, 209, ALFA, lambda d: str(d.get("tipo_doc", "NI"))[:2], "tipo_doc"),
+    Campo(210, 225, ALFA, lambda d: str(d.get("num_doc", "")).strip()[:16], "num_doc"),  # 16 chars A
+    Campo(226, 226, ALFA, lambda d: str(d.get("dv", "")).strip()[:1], "dv"),
+    Campo(227, 227, ALFA, lambda d: str(d.get("tipo_planilla", "E"))[:1], "tipo_planilla"),
+
+    # --- Campos 9-10 (en blanco para E, K, etc.) ---
+    Campo(228, 237, ALFA, lambda d: str(d.get("numero_planilla_asociada", "")).strip()[:9], "numero_planilla_asociada"),
+    Campo(238, 247, ALFA, lambda d: str(d.get("fecha_pago_planilla_asociada", "")).strip()[:10], "fecha_pago_planilla_asociada"),
+
+    # --- Campos 11-13 ---
+    Campo(248, 248, ALFA, lambda d: str(d.get("forma_presentacion", "U"))[:1], "forma_presentacion"),
+    Campo(249, 258, ALFA, lambda d: str(d.get("codigo_sucursal", "")).strip()[:10], "codigo_sucursal"),
+    Campo(259, 298, ALFA, lambda d: str(d.get("nombre_sucursal", "")).strip()[:40], "nombre_sucursal"),
+
+    # --- Campos 14-16 ---
+    Campo(299, 304, ALFA, lambda d: str(d.get("codigo_arl", "")).strip()[:6], "codigo_arl"),
+    Campo(305, 311, ALFA, lambda d: str(d.get("periodo_pago_no_salud", "")).strip()[:7], "periodo_pago_no_salud"),
+    Campo(312, 318, ALFA, lambda d: str(d.get("periodo_pago_salud", "")).strip()[:7], "periodo_pago_salud"),
+
+    # --- Campos 17-18 ---
+    Campo(319, 328, NUM, _numero_radicacion, "numero_radicacion"),
+    Campo(329, 338, ALFA, lambda d: str(d.get("fecha_pago", "")).strip()[:10], "fecha_pago"),
+
+    # --- Campos 19-22 ---
+    Campo(339, 343, NUM, lambda d: int(d.get("total_cotizantes", 0)), "total_cotizantes"),
+    Campo(344, 355, NUM, lambda d: int(d.get("valor_total_nomina", 0)), "valor_total_nomina"),
+    Campo(356, 357, ALFA, lambda d: str(d.get("tipo_aportante", "01"))[:2].zfill(2), "tipo_aportante"),
+    Campo(358, 359, NUM, _codigo_operador, "codigo_operador"),  # 2 dígitos
+])
 
 
 class Registro01Renderer:
@@ -8,6 +61,8 @@ class Registro01Renderer:
     Registro tipo 1 del archivo tipo 2 – Encabezado (359 caracteres).
     Referencia: Anexo Técnico 2 v.29, ARCHIVO TIPO 2 - Información planilla integrada.
     Ver pila/docs/ARCHIVO_TIPO2_ENCABEZADO.md.
+
+    Los campos están declarados en LAYOUT_01 (compilado al importar el módulo).
     """
     LEN = 359
 
@@ -23,58 +78,4 @@ class Registro01Renderer:
           319-328 numero_radicacion, 329-338 fecha_pago, 339-343 total_cotizantes,
           344-355 valor_total_nomina, 356-357 tipo_aportante, 358-359 codigo_operador.
         """
-        l = FixedWidthLine(self.LEN)
-
-        # --- Campos 1-3 ---
-        l.set_alpha(1, 2, "01")  # Campo 1: tipo registro
-        l.set_alpha(3, 3, str(data.get("modalidad_planilla", "1"))[:1])  # Campo 2: modalidad (1=Electrónica, 2=Asistida)
-        sec = str(data.get("secuencia", "0001")).strip()[:4].zfill(4)
-        l.set_alpha(4, 7, sec)  # Campo 3: secuencia 0001
-
-        # --- Campos 4-8 ---
-        razon = str(data.get("razon_social", ""))[:200]
-        l.set_alpha(8, 207, razon)  # Campo 4: razón social (200)
-        l.set_alpha(208, 209, str(data.get("tipo_doc", "NI"))[:2].ljust(2))  # Campo 5: tipo documento
-        num_doc = str(data.get("num_doc", "")).strip()[:16].ljust(16)  # Campo 6: 16 chars A
-        l.set_alpha(210, 225, num_doc)
-        dv = str(data.get("dv", "")).strip()[:1] or " "
-        l.set_alpha(226, 226, dv)  # Campo 7: dígito verificación
-        l.set_alpha(227, 227, str(data.get("tipo_planilla", "E"))[:1])  # Campo 8: tipo planilla
-
-        # --- Campos 9-10 ---
-        num_planilla_asoc = str(data.get("numero_planilla_asociada", "")).strip()[:9]
-        l.set_alpha(228, 237, num_planilla_asoc.ljust(9))  # Campo 9: en blanco para E, K, etc.
-        fecha_planilla_asoc = str(data.get("fecha_pago_planilla_asociada", "")).strip()[:10]
-        l.set_alpha(238, 247, fecha_planilla_asoc.ljust(10))  # Campo 10
-
-        # --- Campos 11-13 ---
-        l.set_alpha(248, 248, str(data.get("forma_presentacion", "U"))[:1])  # Campo 11
-        cod_suc = str(data.get("codigo_sucursal", "")).strip()[:10].ljust(10)
-        l.set_alpha(249, 258, cod_suc)  # Campo 12
-        nom_suc = str(data.get("nombre_sucursal", "")).strip()[:40].ljust(40)
-        l.set_alpha(259, 298, nom_suc)  # Campo 13
-
-        # --- Campos 14-16 ---
-        cod_arl = str(data.get("codigo_arl", "")).strip()[:6].ljust(6)
-        l.set_alpha(299, 304, cod_arl)  # Campo 14
-        l.set_alpha(305, 311, str(data.get("periodo_pago_no_salud", "")).strip()[:7].ljust(7))  # Campo 15
-        l.set_alpha(312, 318, str(data.get("periodo_pago_salud", "")).strip()[:7].ljust(7))  # Campo 16
-
-        # --- Campos 17-18 ---
-        num_rad = data.get("numero_radicacion")
-        if num_rad is not None and str(num_rad).strip() != "":
-            l.set_num(319, 328, int(num_rad))
-        else:
-            l.set_alpha(319, 328, "".ljust(10))  # en blanco si no asignado
-        fecha_pago = str(data.get("fecha_pago", "")).strip()[:10].ljust(10)
-        l.set_alpha(329, 338, fecha_pago)  # Campo 18
-
-        # --- Campos 19-22 ---
-        l.set_num(339, 343, int(data.get("total_cotizantes", 0)))  # Campo 19
-        l.set_num(344, 355, int(data.get("valor_total_nomina", 0)))  # Campo 20
-        tipo_ap = str(data.get("tipo_aportante", "01"))[:2].zfill(2)
-        l.set_alpha(356, 357, tipo_ap)  # Campo 21
-        cod_op = str(data.get("codigo_operador", "00"))[:2].zfill(2)
-        l.set_num(358, 359, int(cod_op) if cod_op.isdigit() else 0)  # Campo 22 (2 dígitos)
-
-        return l.render()
+        return LAYOUT_01.render(data)
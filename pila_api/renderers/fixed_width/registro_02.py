@@ -1,6 +1,212 @@
 # pila_api/renderers/fixed_width/registro_02.py
 
-from pila_api.renderers.fixed_width.base import FixedWidthLine
+from pila_api.renderers.fixed_width.layout import ALFA, NUM, Campo, compilar_layout
+
+
+# -------------------------------------------------------------------
+# Extractores de valor (data -> valor; None = campo no escrito)
+# -------------------------------------------------------------------
+
+def _texto(clave, corte=None):
+    return lambda d: str(d.get(clave, "")).strip()[:corte]
+
+
+def _nombre(clave):
+    # Nombres tal cual vienen (sin strip); None se escribe en blanco
+    def valor(d):
+        v = d.get(clave, "")
+        return "" if v is None else v
+    return valor
+
+
+def _entero(clave):
+    return lambda d: int(str(d.get(clave, "")).strip() or 0)
+
+
+def _dias(clave):
+    return lambda d: int(str(d.get(clave, 0)).zfill(2))
+
+
+def _texto_opcional(clave, corte=None):
+    def valor(d):
+        v = str(d.get(clave, "")).strip()
+        return v[:corte] if v else None
+    return valor
+
+
+def _valor_opcional(clave):
+    # Cotizaciones/valores: pueden venir como "12345.0"
+    def valor(d):
+        v = str(d.get(clave, "")).strip()
+        return int(float(v)) if v else None
+    return valor
+
+
+def _tipo_salario(d):
+    tipo_salario = str(d.get("tipo_salario", "F")).strip()  # Por defecto "F" si no se especifica
+    return tipo_salario[:1] if tipo_salario else " "
+
+
+def _v_348_356(d):
+    # (si lo estás pasando; si no, queda lo del tail)
+    v348 = str(d.get("v_348_356", "")).strip()
+    return int(v348) if v348 != "" else None
+
+
+def _tarifa_arl(d):
+    tarifa_arl = str(d.get("tarifa_arl", "")).strip()
+    return tarifa_arl[:9].ljust(9, "0") if tarifa_arl else None
+
+
+def _centro_trabajo(d):
+    # Siempre se escribe (0, 1, 3 o 5)
+    centro_trabajo = d.get("centro_trabajo", 0)
+    if centro_trabajo is None or centro_trabajo == "":
+        centro_trabajo = 0
+    return int(centro_trabajo)
+
+
+# Si la tarifa CCF viene en porcentaje ("4.00000"), se convierte a decimal ("0.04000")
+_TARIFA_CCF_PORCENTAJE = {"4.": "0.04000", "2.": "0.02000", "3.": "0.03000"}
+
+
+def _tarifa_ccf(d):
+    tarifa_ccf = str(d.get("tarifa_ccf", "")).strip()
+    if not tarifa_ccf:
+        return None
+    if len(tarifa_ccf) == 7:
+        return _TARIFA_CCF_PORCENTAJE.get(tarifa_ccf[:2], tarifa_ccf)
+    return tarifa_ccf
+
+
+def _clase_riesgo(d):
+    # 1-5 según tarifa ARL 0.522→1, 1.044→2, 2.436→3, 4.350→4, 6.960→5
+    clase_riesgo = str(d.get("clase_riesgo", "")).strip()
+    return clase_riesgo if clase_riesgo in ("1", "2", "3", "4", "5") else "1"
+
+
+def _ibc_otros_parafiscales(d):
+    ibc_otros_paraf = d.get("ibc_otros_parafiscales")
+    if ibc_otros_paraf is not None and int(ibc_otros_paraf) >= 0:
+        return int(ibc_otros_paraf)
+    return None
+
+
+def _horas_laboradas(d):
+    horas_laboradas = str(d.get("horas_laboradas", "")).strip()
+    return int(horas_laboradas) if horas_laboradas else None
+
+
+def _actividad_economica(d):
+    # Exactamente 7 caracteres: truncar o rellenar con ceros a la izquierda (es numérico)
+    actividad_economica = str(d.get("actividad_economica_arl", "")).strip()
+    if not actividad_economica:
+        return None
+    return actividad_economica[:7].zfill(7)
+
+
+# Layout del detalle (posiciones 1-based, fin inclusivo). Los campos sin declarar quedan
+# en blanco, o con el contenido de raw_333_693 en la zona 333-693.
+LAYOUT_02 = compilar_layout("Registro 02", 693, [
+    Campo(1, 2, ALFA, lambda d: "02", "tipo_registro"),
+    Campo(3, 7, ALFA, _texto("secuencia"), "secuencia"),
+    Campo(8, 9, ALFA, _texto("tipo_doc"), "tipo_doc"),
+    Campo(10, 25, ALFA, _texto("num_doc"), "num_doc"),  # 16 caracteres según Anexo Técnico campo 4
+    Campo(26, 27, ALFA, _texto("tipo_cotizante"), "tipo_cotizante"),
+    Campo(28, 29, ALFA, _texto("subtipo_cotizante"), "subtipo_cotizante"),
+
+    # Códigos DANE: departamento / municipio
+    Campo(32, 33, ALFA, _texto("cod_departamento", 2), "cod_departamento"),
+    Campo(34, 36, ALFA, _texto("cod_municipio", 3), "cod_municipio"),
+
+    # Nombres: primer apellido (20), segundo apellido (30), primer nombre (20), segundo nombre (30)
+    Campo(37, 56, ALFA, _nombre("papellido"), "papellido"),
+    Campo(57, 86, ALFA, _nombre("sapellido"), "sapellido"),
+    Campo(87, 106, ALFA, _nombre("pnombre"), "pnombre"),
+    Campo(107, 136, ALFA, _nombre("snombre"), "snombre"),
+
+    # Campos 15-30: Novedades (posiciones 137-153)
+    Campo(137, 137, ALFA, _texto("nov_ing"), "nov_ing"),  # Campo 15: ING - Ingreso
+    Campo(138, 138, ALFA, _texto("nov_ret"), "nov_ret"),  # Campo 16: RET - Retiro
+    Campo(143, 143, ALFA, _texto("nov_vsp"), "nov_vsp"),  # Campo 21: VSP - Variación permanente salario
+    Campo(145, 145, ALFA, _texto("nov_vst"), "nov_vst"),  # Campo 23: VST - Variación transitoria salario
+    Campo(146, 146, ALFA, _texto("nov_sln"), "nov_sln"),  # Campo 24: SLN - Suspensión temporal
+    Campo(147, 147, ALFA, _texto("nov_ige"), "nov_ige"),  # Campo 25: IGE - Incapacidad enfermedad general
+    Campo(148, 148, ALFA, _texto("nov_lma"), "nov_lma"),  # Campo 26: LMA - Licencia maternidad/paternidad
+    Campo(149, 149, ALFA, _texto("nov_vac"), "nov_vac"),  # Campo 27: VAC - Vacaciones
+    Campo(152, 153, NUM, _entero("irl_dias"), "irl_dias"),  # Campo 30: IRL - Días incapacidad AT/EL
+
+    # Entidades (6 caracteres). AFP en blanco si no obligado a pensiones.
+    Campo(154, 159, ALFA, lambda d: str(d.get("afp") or "").strip(), "afp"),  # Campo 31
+    Campo(166, 171, ALFA, _texto("eps"), "eps"),  # Campo 33
+    Campo(178, 183, ALFA, _texto("ccf"), "ccf"),  # Campo 35
+
+    # 184-191 días por subsistema (Layout: 36=pension 184-185, 37=salud 186-187)
+    Campo(184, 185, NUM, _dias("dias_pension"), "dias_pension"),
+    Campo(186, 187, NUM, _dias("dias_salud"), "dias_salud"),
+    Campo(188, 189, NUM, _dias("dias_arl"), "dias_arl"),
+    Campo(190, 191, NUM, _dias("dias_caja"), "dias_caja"),
+
+    Campo(192, 200, NUM, _entero("v_192_200"), "salario_basico"),  # Campo 40
+    Campo(201, 201, ALFA, _tipo_salario, "tipo_salario"),  # Campo 41: X=integral, F=fijo, V=variable
+    Campo(202, 210, NUM, _entero("ibc_pension"), "ibc_pension"),  # Campo 42
+    Campo(211, 219, NUM, _entero("v_210_218"), "ibc_salud"),  # Campo 43
+    Campo(220, 228, NUM, _entero("v_219_227"), "ibc_arl"),  # Campo 44
+    Campo(229, 237, NUM, _entero("v_228_236"), "ibc_ccf"),  # Campo 45
+    Campo(238, 244, ALFA, _texto("v_237_245"), "tarifa_pension"),  # Campo 46 (7 chars con decimales)
+    Campo(245, 253, NUM, _entero("v_246_254"), "cotizacion_pension"),  # Campo 47
+    Campo(254, 262, NUM, _entero("v_255_263"), "aporte_voluntario_afiliado"),  # Campo 48
+    Campo(263, 271, NUM, _entero("v_264_272"), "aporte_voluntario_aportante"),  # Campo 49
+    Campo(272, 280, NUM, _entero("v_273_281"), "total_cotizacion_pension"),  # Campo 50
+    Campo(281, 289, NUM, _entero("v_282_290"), "fsp_solidaridad"),  # Campo 51
+    Campo(290, 298, NUM, _entero("v_291_299"), "fsp_subsistencia"),  # Campo 52
+    Campo(299, 307, NUM, _entero("v_300_308"), "valor_no_retenido"),  # Campo 53
+    Campo(308, 314, ALFA, _texto("v_309_317"), "tarifa_salud"),  # Campo 54 (7 chars con decimales)
+    Campo(315, 323, NUM, _entero("v_318_326"), "cotizacion_salud"),  # Campo 55
+    Campo(324, 332, NUM, _entero("v_327_332"), "upc_adicional"),  # Campo 56
+
+    # Zona 333-693: sin escribir queda lo clonado en raw_333_693 (si se pasa)
+    Campo(348, 356, NUM, _v_348_356, "v_348_356"),
+
+    # Campos ARL y parafiscales
+    Campo(381, 389, ALFA, _tarifa_arl, "tarifa_arl"),  # Campo 61 (9 chars)
+    Campo(390, 398, NUM, _centro_trabajo, "centro_trabajo"),  # Campo 62
+    Campo(399, 407, NUM, _valor_opcional("cotizacion_arl"), "cotizacion_arl"),  # Campo 63
+    Campo(408, 414, ALFA, _tarifa_ccf, "tarifa_ccf"),  # Campo 64 (0.04000 = 4%)
+    Campo(415, 423, NUM, _valor_opcional("valor_ccf"), "valor_ccf"),  # Campo 65
+    Campo(424, 430, ALFA, _texto_opcional("tarifa_sena"), "tarifa_sena"),  # Campo 66
+    Campo(431, 439, NUM, _valor_opcional("valor_sena"), "valor_sena"),  # Campo 67
+    Campo(440, 446, ALFA, _texto_opcional("tarifa_icbf"), "tarifa_icbf"),  # Campo 68
+    Campo(447, 455, NUM, _valor_opcional("valor_icbf"), "valor_icbf"),  # Campo 69
+    Campo(506, 506, ALFA, _texto_opcional("exonerado", 1), "exonerado"),  # Campo 76: S/N
+    Campo(507, 512, ALFA, _texto_opcional("codigo_arl"), "codigo_arl"),  # Campo 77
+    Campo(513, 513, ALFA, _clase_riesgo, "clase_riesgo"),  # Campo 78
+
+    # Fechas de novedades (campos 80-94, AAAA-MM-DD)
+    Campo(515, 524, ALFA, _texto_opcional("fecha_ing", 10), "fecha_ing"),  # Campo 80
+    Campo(525, 534, ALFA, _texto_opcional("fecha_ret", 10), "fecha_ret"),  # Campo 81
+    Campo(535, 544, ALFA, _texto_opcional("fecha_vsp_inicio", 10), "fecha_vsp_inicio"),  # Campo 82
+    Campo(545, 554, ALFA, _texto_opcional("fecha_sln_inicio", 10), "fecha_sln_inicio"),  # Campo 83
+    Campo(555, 564, ALFA, _texto_opcional("fecha_sln_fin", 10), "fecha_sln_fin"),  # Campo 84
+    Campo(565, 574, ALFA, _texto_opcional("fecha_ige_inicio", 10), "fecha_ige_inicio"),  # Campo 85
+    Campo(575, 584, ALFA, _texto_opcional("fecha_ige_fin", 10), "fecha_ige_fin"),  # Campo 86
+    Campo(585, 594, ALFA, _texto_opcional("fecha_lma_inicio", 10), "fecha_lma_inicio"),  # Campo 87
+    Campo(595, 604, ALFA, _texto_opcional("fecha_lma_fin", 10), "fecha_lma_fin"),  # Campo 88
+    Campo(605, 614, ALFA, _texto_opcional("fecha_vac_inicio", 10), "fecha_vac_inicio"),  # Campo 89
+    Campo(615, 624, ALFA, _texto_opcional("fecha_vac_fin", 10), "fecha_vac_fin"),  # Campo 90
+    Campo(645, 654, ALFA, _texto_opcional("fecha_irl_inicio", 10), "fecha_irl_inicio"),  # Campo 93
+    Campo(655, 664, ALFA, _texto_opcional("fecha_irl_fin", 10), "fecha_irl_fin"),  # Campo 94
+
+    # Campo 95: IBC otros parafiscales (no CCF). Obligatorio tipos 1,18,20,22,30,31,55
+    # Error 816: no puede ser 0 cuando hay aporte SENA/ICBF y 30 días cotizados
+    Campo(665, 673, NUM, _ibc_otros_parafiscales, "ibc_otros_parafiscales"),
+    Campo(674, 676, NUM, _horas_laboradas, "horas_laboradas"),  # Campo 96
+    Campo(687, 693, ALFA, _actividad_economica, "actividad_economica_arl"),  # Campo 98 (7 chars, numérico)
+])
+
+# Zona clonada de un archivo real (raw_333_693)
+_INICIO_RAW, _FIN_RAW = 333, 693
+_FONDO_SIN_RAW = " " * (_INICIO_RAW - 1)
 
 
 class Registro02Renderer:
@@ -8,329 +214,19 @@ class Registro02Renderer:
     Registro tipo 02 - Detalle cotizante (ancho fijo)
     Basado en ATI_COL28736 (2).TXT
     Longitud observada en el ejemplo: 693
+
+    Los campos están declarados en LAYOUT_02 (compilado al importar el módulo).
     """
     LEN = 693
 
     def render(self, data: dict) -> str:
-        l = FixedWidthLine(self.LEN)
-
-        # 1-2 tipo registro
-        l.set_alpha(1, 2, "02")
-
-        # 3-7 secuencia
-        l.set_alpha(3, 7, str(data.get("secuencia", "")).strip())
-
-        # 8-9 tipo doc
-        l.set_alpha(8, 9, str(data.get("tipo_doc", "")).strip())
-
-        # 10-25 num doc (16 caracteres según Anexo Técnico campo 4)
-        l.set_alpha(10, 25, str(data.get("num_doc", "")).strip())
-
-        # 26-27 tipo cotizante / 28-29 subtipo
-        l.set_alpha(26, 27, str(data.get("tipo_cotizante", "")).strip())
-        l.set_alpha(28, 29, str(data.get("subtipo_cotizante", "")).strip())
-
-        # 32-33 código departamento / 34-36 código municipio (DANE)
-        dep = str(data.get("cod_departamento", "")).strip()
-        mun = str(data.get("cod_municipio", "")).strip()
-        l.set_alpha(32, 33, dep[:2])
-        l.set_alpha(34, 36, mun[:3])
-
-        # 37-56 primer apellido (20)
-        l.set_alpha(37, 56, data.get("papellido", ""))
-
-        # 57-86 segundo apellido (30)
-        l.set_alpha(57, 86, data.get("sapellido", ""))
-
-        # 87-106 primer nombre (20)
-        l.set_alpha(87, 106, data.get("pnombre", ""))
-
-        # 107-136 segundo nombre (30) - CORREGIDO según Anexo Técnico
-        l.set_alpha(107, 136, data.get("snombre", ""))
-
-        # ============================================
-        # Campos 15-30: Novedades (posiciones 137-153)
-        # ============================================
-        
-        # Campo 15 (pos 137): ING - Ingreso
-        l.set_alpha(137, 137, str(data.get("nov_ing", "")).strip())
-        
-        # Campo 16 (pos 138): RET - Retiro
-        l.set_alpha(138, 138, str(data.get("nov_ret", "")).strip())
-        
-        # Campo 21 (pos 143): VSP - Variación permanente salario
-        l.set_alpha(143, 143, str(data.get("nov_vsp", "")).strip())
-        
-        # Campo 23 (pos 145): VST - Variación transitoria salario
-        l.set_alpha(145, 145, str(data.get("nov_vst", "")).strip())
-        
-        # Campo 24 (pos 146): SLN - Suspensión temporal
-        l.set_alpha(146, 146, str(data.get("nov_sln", "")).strip())
-        
-        # Campo 25 (pos 147): IGE - Incapacidad enfermedad general
-        l.set_alpha(147, 147, str(data.get("nov_ige", "")).strip())
-        
-        # Campo 26 (pos 148): LMA - Licencia maternidad/paternidad
-        l.set_alpha(148, 148, str(data.get("nov_lma", "")).strip())
-        
-        # Campo 27 (pos 149): VAC - Vacaciones
-        l.set_alpha(149, 149, str(data.get("nov_vac", "")).strip())
-        
-        # Campo 30 (pos 152-153): IRL - Días incapacidad AT/EL
-        l.set_num(152, 153, int(str(data.get("irl_dias", 0)).strip() or 0))
-
-        # 154-159 Campo 31: AFP (6 caracteres). En blanco si no obligado a pensiones.
-        afp_val = data.get("afp") or ""
-        l.set_alpha(154, 159, str(afp_val).strip())
-
-        # 166-171 Campo 33: EPS (6 caracteres)
-        l.set_alpha(166, 171, str(data.get("eps", "")).strip())
-
-        # 178-183 Campo 35: CCF (6 caracteres)
-        l.set_alpha(178, 183, str(data.get("ccf", "")).strip())
-
-        # ✅ 1) Clonar lo NO mapeado (tail): 333-693
+        # Clonar lo NO mapeado (tail) 333-693 como fondo; los campos mapeados lo sobrescriben
         raw_tail = data.get("raw_333_693")
         if raw_tail:
-            l.set_raw(333, 693, raw_tail)
-
-        # ✅ 2) Sobrescribir lo que sí estamos mapeando (184-332 y campos ARL 381-407, 507-513)
-
-        # 184-191 días por subsistema (Layout: 36=pension 184-185, 37=salud 186-187)
-        l.set_num(184, 185, int(str(data.get("dias_pension", 0)).zfill(2)))
-        l.set_num(186, 187, int(str(data.get("dias_salud", 0)).zfill(2)))
-        l.set_num(188, 189, int(str(data.get("dias_arl", 0)).zfill(2)))
-        l.set_num(190, 191, int(str(data.get("dias_caja", 0)).zfill(2)))
-
-        # 192-200 Campo 40: Salario básico (9 chars numéricos)
-        l.set_num(192, 200, int(str(data.get("v_192_200", "")).strip() or 0))
-
-        # 201 Campo 41: Tipo de salario (1 char: X=integral, F=fijo, V=variable)
-        tipo_salario = str(data.get("tipo_salario", "F")).strip()  # Por defecto "F" si no se especifica
-        l.set_alpha(201, 201, tipo_salario[:1] if tipo_salario else " ")
-
-        # 202-210 Campo 42: IBC pensión (9 chars numéricos)
-        l.set_num(202, 210, int(str(data.get("ibc_pension", "")).strip() or 0))
-
-        # 211-219 Campo 43: IBC salud (9 chars numéricos)
-        l.set_num(211, 219, int(str(data.get("v_210_218", "")).strip() or 0))
-
-        # 220-228 Campo 44: IBC riesgos laborales (9 chars numéricos)
-        l.set_num(220, 228, int(str(data.get("v_219_227", "")).strip() or 0))
-
-        # 229-237 Campo 45: IBC CCF (9 chars numéricos)
-        l.set_num(229, 237, int(str(data.get("v_228_236", "")).strip() or 0))
-
-        # 238-244 Campo 46: Tarifa aportes pensiones (7 chars con decimales)
-        l.set_alpha(238, 244, str(data.get("v_237_245", "")).strip())
-
-        # 245-253 Campo 47: Cotización obligatoria pensiones (9 chars numéricos)
-        l.set_num(245, 253, int(str(data.get("v_246_254", "")).strip() or 0))
-
-        # 254-262 Campo 48: Aporte voluntario afiliado pensiones (9 chars numéricos)
-        l.set_num(254, 262, int(str(data.get("v_255_263", "")).strip() or 0))
-
-        # 263-271 Campo 49: Aporte voluntario aportante pensiones (9 chars numéricos)
-        l.set_num(263, 271, int(str(data.get("v_264_272", "")).strip() or 0))
-
-        # 272-280 Campo 50: Total cotización pensiones (9 chars numéricos)
-        l.set_num(272, 280, int(str(data.get("v_273_281", "")).strip() or 0))
-
-        # 281-289 Campo 51: Fondo solidaridad - solidaridad (9 chars numéricos)
-        l.set_num(281, 289, int(str(data.get("v_282_290", "")).strip() or 0))
-
-        # 290-298 Campo 52: Fondo solidaridad - subsistencia (9 chars numéricos)
-        l.set_num(290, 298, int(str(data.get("v_291_299", "")).strip() or 0))
-
-        # 299-307 Campo 53: Valor no retenido (9 chars numéricos)
-        l.set_num(299, 307, int(str(data.get("v_300_308", "")).strip() or 0))
-
-        # 308-314 Campo 54: Tarifa aportes salud (7 chars con decimales)
-        l.set_alpha(308, 314, str(data.get("v_309_317", "")).strip())
-
-        # 315-323 Campo 55: Cotización obligatoria salud (9 chars numéricos)
-        l.set_num(315, 323, int(str(data.get("v_318_326", "")).strip() or 0))
-
-        # 324-332 Campo 56: UPC adicional (9 chars numéricos)
-        l.set_num(324, 332, int(str(data.get("v_327_332", "")).strip() or 0))
-
-        # 348-356 (9) (si lo estás pasando; si no, queda lo del tail)
-        v348 = str(data.get("v_348_356", "")).strip()
-        if v348 != "":
-            l.set_num(348, 356, int(v348 or 0))
-
-        # ===================================================================
-        # CAMPOS ARL (zona 333-693)
-        # ===================================================================
-        
-        # 381-389 Campo 61: Tarifa aportes riesgos laborales (9 chars)
-        tarifa_arl = str(data.get("tarifa_arl", "")).strip()
-        if tarifa_arl:
-            l.set_alpha(381, 389, tarifa_arl[:9].ljust(9, '0'))
-        
-        # 390-398 Campo 62: Centro de trabajo (9 chars, numérico). Siempre escribir (0, 1, 3 o 5).
-        centro_trabajo = data.get("centro_trabajo", 0)
-        if centro_trabajo is None or centro_trabajo == "":
-            centro_trabajo = 0
-        l.set_num(390, 398, int(centro_trabajo))
-        
-        # 399-407 Campo 63: Cotización obligatoria riesgos laborales (9 chars, numérico)
-        cotizacion_arl = str(data.get("cotizacion_arl", "")).strip()
-        if cotizacion_arl:
-            l.set_num(399, 407, int(float(cotizacion_arl)))
-        
-        # 408-414 Campo 64: Tarifa aportes CCF (7 chars, formato decimal: 0.04000 = 4%)
-        tarifa_ccf = str(data.get("tarifa_ccf", "")).strip()
-        if tarifa_ccf:
-            # Si viene en formato "4.00000" (porcentaje), convertir a "0.04000" (decimal)
-            if tarifa_ccf.startswith("4.") and len(tarifa_ccf) == 7:
-                tarifa_ccf = "0.04000"
-            elif tarifa_ccf.startswith("2.") and len(tarifa_ccf) == 7:
-                tarifa_ccf = "0.02000"
-            elif tarifa_ccf.startswith("3.") and len(tarifa_ccf) == 7:
-                tarifa_ccf = "0.03000"
-            l.set_alpha(408, 414, tarifa_ccf)
-        
-        # 415-423 Campo 65: Valor aporte CCF (9 chars, numérico)
-        valor_ccf = str(data.get("valor_ccf", "")).strip()
-        if valor_ccf:
-            l.set_num(415, 423, int(float(valor_ccf)))
-        
-        # 424-430 Campo 66: Tarifa aportes SENA (7 chars, numérico con decimales)
-        tarifa_sena = str(data.get("tarifa_sena", "")).strip()
-        if tarifa_sena:
-            l.set_alpha(424, 430, tarifa_sena)
-        
-        # 431-439 Campo 67: Valor aportes SENA (9 chars, numérico)
-        valor_sena = str(data.get("valor_sena", "")).strip()
-        if valor_sena:
-            l.set_num(431, 439, int(float(valor_sena)))
-        
-        # 440-446 Campo 68: Tarifa aportes ICBF (7 chars, numérico con decimales)
-        tarifa_icbf = str(data.get("tarifa_icbf", "")).strip()
-        if tarifa_icbf:
-            l.set_alpha(440, 446, tarifa_icbf)
-        
-        # 447-455 Campo 69: Valor aporte ICBF (9 chars, numérico)
-        valor_icbf = str(data.get("valor_icbf", "")).strip()
-        if valor_icbf:
-            l.set_num(447, 455, int(float(valor_icbf)))
-        
-        # 506 Campo 76: Cotizante exonerado salud, SENA e ICBF (1 char, S/N)
-        exonerado = str(data.get("exonerado", "")).strip()
-        if exonerado:
-            l.set_alpha(506, 506, exonerado[:1])
-        
-        # 507-512 Campo 77: Código administradora riesgos laborales (6 chars, alfanumérico)
-        codigo_arl = str(data.get("codigo_arl", "")).strip()
-        if codigo_arl:
-            l.set_alpha(507, 512, codigo_arl)
-        
-        # 513 Campo 78: Clase de riesgo (1 char, pos 513: 1-5 según tarifa ARL 0.522→1, 1.044→2, 2.436→3, 4.350→4, 6.960→5)
-        clase_riesgo = str(data.get("clase_riesgo", "")).strip()
-        if clase_riesgo not in ("1", "2", "3", "4", "5"):
-            clase_riesgo = "1"
-        l.set_alpha(513, 513, clase_riesgo[:1])
-        
-        # 665-673 Campo 95: IBC otros parafiscales (no CCF). Obligatorio tipos 1,18,20,22,30,31,55
-        # Error 816: no puede ser 0 cuando hay aporte SENA/ICBF y 30 días cotizados
-        ibc_otros_paraf = data.get("ibc_otros_parafiscales")
-        if ibc_otros_paraf is not None and int(ibc_otros_paraf) >= 0:
-            l.set_num(665, 673, int(ibc_otros_paraf))
-
-        # 674-676 Campo 96: Número de horas laboradas (3 chars, numérico)
-        horas_laboradas = str(data.get("horas_laboradas", "")).strip()
-        if horas_laboradas:
-            l.set_num(674, 676, int(horas_laboradas or 0))
-        
-        # ===================================================================
-        # CAMPOS DE FECHAS DE NOVEDADES (zona 515-664, campos 80-94)
-        # ===================================================================
-        
-        # Campo 80 (pos 515-524): Fecha ingreso (AAAA-MM-DD)
-        fecha_ing = str(data.get("fecha_ing", "")).strip()
-        if fecha_ing:
-            l.set_alpha(515, 524, fecha_ing[:10])
-        
-        # Campo 81 (pos 525-534): Fecha retiro (AAAA-MM-DD)
-        fecha_ret = str(data.get("fecha_ret", "")).strip()
-        if fecha_ret:
-            l.set_alpha(525, 534, fecha_ret[:10])
-        
-        # Campo 82 (pos 535-544): Fecha inicio VSP (AAAA-MM-DD)
-        fecha_vsp = str(data.get("fecha_vsp_inicio", "")).strip()
-        if fecha_vsp:
-            l.set_alpha(535, 544, fecha_vsp[:10])
-        
-        # Campo 83 (pos 545-554): Fecha inicio SLN (AAAA-MM-DD)
-        fecha_sln_inicio = str(data.get("fecha_sln_inicio", "")).strip()
-        if fecha_sln_inicio:
-            l.set_alpha(545, 554, fecha_sln_inicio[:10])
-        
-        # Campo 84 (pos 555-564): Fecha fin SLN (AAAA-MM-DD)
-        fecha_sln_fin = str(data.get("fecha_sln_fin", "")).strip()
-        if fecha_sln_fin:
-            l.set_alpha(555, 564, fecha_sln_fin[:10])
-        
-        # Campo 85 (pos 565-574): Fecha inicio IGE (AAAA-MM-DD)
-        fecha_ige_inicio = str(data.get("fecha_ige_inicio", "")).strip()
-        if fecha_ige_inicio:
-            l.set_alpha(565, 574, fecha_ige_inicio[:10])
-        
-        # Campo 86 (pos 575-584): Fecha fin IGE (AAAA-MM-DD)
-        fecha_ige_fin = str(data.get("fecha_ige_fin", "")).strip()
-        if fecha_ige_fin:
-            l.set_alpha(575, 584, fecha_ige_fin[:10])
-        
-        # Campo 87 (pos 585-594): Fecha inicio LMA (AAAA-MM-DD)
-        fecha_lma_inicio = str(data.get("fecha_lma_inicio", "")).strip()
-        if fecha_lma_inicio:
-            l.set_alpha(585, 594, fecha_lma_inicio[:10])
-        
-        # Campo 88 (pos 595-604): Fecha fin LMA (AAAA-MM-DD)
-        fecha_lma_fin = str(data.get("fecha_lma_fin", "")).strip()
-        if fecha_lma_fin:
-            l.set_alpha(595, 604, fecha_lma_fin[:10])
-        
-        # Campo 89 (pos 605-614): Fecha inicio VAC (AAAA-MM-DD)
-        fecha_vac_inicio = str(data.get("fecha_vac_inicio", "")).strip()
-        if fecha_vac_inicio:
-            l.set_alpha(605, 614, fecha_vac_inicio[:10])
-        
-        # Campo 90 (pos 615-624): Fecha fin VAC (AAAA-MM-DD)
-        fecha_vac_fin = str(data.get("fecha_vac_fin", "")).strip()
-        if fecha_vac_fin:
-            l.set_alpha(615, 624, fecha_vac_fin[:10])
-        
-        # Campo 93 (pos 645-654): Fecha inicio IRL (AAAA-MM-DD)
-        fecha_irl_inicio = str(data.get("fecha_irl_inicio", "")).strip()
-        if fecha_irl_inicio:
-            l.set_alpha(645, 654, fecha_irl_inicio[:10])
-        
-        # Campo 94 (pos 655-664): Fecha fin IRL (AAAA-MM-DD)
-        fecha_irl_fin = str(data.get("fecha_irl_fin", "")).strip()
-        if fecha_irl_fin:
-            l.set_alpha(655, 664, fecha_irl_fin[:10])
-        
-        # 687-693 Campo 98: Actividad económica riesgos laborales (7 chars, numérico)
-        actividad_economica = str(data.get("actividad_economica_arl", "")).strip()
-        if actividad_economica:
-            # Asegurar que solo se escriban exactamente 7 caracteres
-            if len(actividad_economica) > 7:
-                actividad_economica = actividad_economica[:7]
-            elif len(actividad_economica) < 7:
-                # Rellenar con ceros a la izquierda (es numérico)
-                actividad_economica = actividad_economica.zfill(7)
-            l.set_alpha(687, 693, actividad_economica)
-
-        # Renderizar y validar longitud
-        rendered = l.render()
-        
-        # WORKAROUND: Si la línea tiene 694 caracteres, truncar el último
-        # (bug conocido en algunas líneas específicas)
-        if len(rendered) == 694:
-            rendered = rendered[:693]
-        elif len(rendered) != 693:
-            raise ValueError(f"Línea generada tiene {len(rendered)} caracteres, esperado 693")
-        
-        return rendered
\ No newline at end of file
+            raw_tail = str(raw_tail)
+            ancho = _FIN_RAW - _INICIO_RAW + 1
+            if len(raw_tail) != ancho:
+                raise ValueError(f"raw debe medir {ancho}, pero mide {len(raw_tail)}")
+            return LAYOUT_02.render(data, fondo=_FONDO_SIN_RAW + raw_tail)
+
+        return LAYOUT_02.render(data)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# pila_api/scripts/bench_ingesta.py
+"""
+Benchmark de ingesta de detalles/novedades: INSERT fila a fila (flujo anterior de
+crear_planilla) vs ingestar_detalles (bulk_create por lotes).
+
+Mide número de queries y tiempo para distintos tamaños de planilla. Todo corre dentro
+de una transacción que se revierte al final: no deja datos en la base.
+
+Uso:
+  python -m pila_api.scripts.bench_ingesta
+  python -m pila_api.scripts.bench_ingesta 100 1000 5000
+"""
+
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pila_service.settings")
+django.setup()
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from pila_api.models import PilaPlanilla
+from pila_api.serializers import PayloadPlanillaSerializer
+from pila_api.services.ingestar_planilla import construir_filas, ingestar_detalles
+from pila_api.scripts.payload_sintetico import generar_payload
+
+
+def _fila_a_fila(planilla, empleados):
+    for detalle, novedades in construir_filas(planilla, empleados, "1"):
+        detalle.save(force_insert=True)
+        for novedad in novedades:
+            novedad.detalle = detalle
+            novedad.save(force_insert=True)
+
+
+def _medir(fn, *args, **kwargs):
+    with CaptureQueriesContext(connection) as ctx:
+        inicio = time.perf_counter()
+        with transaction.atomic():
+            fn(*args, **kwargs)
+        segundos = time.perf_counter() - inicio
+    return len(ctx.captured_queries), segundos
+
+
+def main():
+    tamanos = [int(x) for x in sys.argv[1:]] or [100, 1000, 5000]
+
+    print(f"{'empleados':>10} {'detalles':>9} | {'fila a fila':>22} | {'bulk_create':>22} | {'speedup':>7}")
+    print("-" * 82)
+
+    for n in tamanos:
+        payload = generar_payload(n, numero_interno=f"BENCH-INGESTA-{n}")
+        serializer = PayloadPlanillaSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+        empleados = serializer.validated_data["empleados"]
+
+        with transaction.atomic():
+            planilla = PilaPlanilla.objects.create(
+                numero_interno=payload["planilla"]["numero_interno"],
+                periodo=payload["periodo"],
+                empresa_nit=payload["empresa"]["nit"],
+                empresa_sucursal=payload["empresa"]["sucursal"],
+            )
+            n_detalles = len(construir_filas(planilla, empleados, "1"))
+
+            q_fila, t_fila = _medir(_fila_a_fila, planilla, empleados)
+            q_bulk, t_bulk = _medir(ingestar_detalles, planilla, empleados, "1", generacion=1)
+
+            transaction.set_rollback(True)
+
+        print(
+            f"{n:>10} {n_detalles:>9} | {q_fila:>8} q {t_fila:>10.3f} s | "
+            f"{q_bulk:>8} q {t_bulk:>10.3f} s | {t_fila / t_bulk if t_bulk else 0:>6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
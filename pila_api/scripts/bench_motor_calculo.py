@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# pila_api/scripts/bench_motor_calculo.py
+"""
+Benchmark de los motores de cálculo de calcular_planilla: Decimal (referencia) vs NumPy.
+
+Para cada tamaño ingiere una planilla sintética, prepara las entradas una sola vez
+(novedades, flags, días) y mide cada motor sobre las mismas entradas. También verifica
+que ambos motores produzcan exactamente los mismos IBCs y aportes. Todo corre dentro de
+una transacción que se revierte al final: no deja datos en la base.
+
+Uso:
+  python -m pila_api.scripts.bench_motor_calculo
+  python -m pila_api.scripts.bench_motor_calculo 100 1000 10000 100000
+"""
+
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pila_service.settings")
+django.setup()
+
+from django.db import transaction
+
+from pila_api.models import PilaPlanilla
+from pila_api.serializers import PayloadPlanillaSerializer
+from pila_api.services.calcular_planilla import _preparar_entrada, calcular_entradas_decimal
+from pila_api.services.contexto_planilla import PlanillaContexto
+from pila_api.services.ingestar_planilla import ingestar_detalles
+from pila_api.services.motor_numpy import calcular_entradas_numpy
+from pila_api.services.parametros_legales import parametros_periodo
+from pila_api.services.snapshot_planilla import detalles_planilla
+from pila_api.scripts.payload_sintetico import generar_payload
+
+
+def _resultados(entradas):
+    return [
+        (e.ibc_salud, e.ibc_pension, e.ibc_arl, e.aportes, e.aportes_emp, e.aportes_empl)
+        for e in entradas
+    ]
+
+
+def _medir(motor, entradas, parametros, repeticiones):
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        motor(entradas, parametros)
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor
+
+
+def main():
+    tamanos = [int(x) for x in sys.argv[1:]] or [100, 1000, 10000, 100000]
+
+    print(f"{'detalles':>9} | {'preparar':>10} | {'decimal':>10} | {'numpy':>10} | {'speedup':>7} | idénticos")
+    print("-" * 70)
+
+    for n in tamanos:
+        # generar_payload produce ~1.3 detalles por empleado
+        payload = generar_payload(max(1, int(n / 1.33)), numero_interno=f"BENCH-MOTOR-{n}")
+        serializer = PayloadPlanillaSerializer(data=payload)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            planilla = PilaPlanilla.objects.create(
+                numero_interno=payload["planilla"]["numero_interno"],
+                periodo=payload["periodo"],
+                empresa_nit=payload["empresa"]["nit"],
+                empresa_sucursal=payload["empresa"]["sucursal"],
+                payload_inicial=payload,
+            )
+            ingestar_detalles(planilla, serializer.validated_data["empleados"], "1", generacion=planilla.generacion)
+
+            contexto = PlanillaContexto.desde_planilla(planilla)
+            parametros = parametros_periodo(planilla.periodo, contexto.parametros)
+            detalles = list(detalles_planilla(planilla))
+
+            inicio = time.perf_counter()
+            entradas = [
+                _preparar_entrada(d, contexto.empleado(d.tipo_doc, d.numero_doc), parametros, contexto.empresa_exonerada)
+                for d in detalles
+            ]
+            t_preparar = time.perf_counter() - inicio
+
+            repeticiones = 3 if len(entradas) <= 10000 else 1
+            t_decimal = _medir(calcular_entradas_decimal, entradas, parametros, repeticiones)
+            referencia = _resultados(entradas)
+            t_numpy = _medir(calcular_entradas_numpy, entradas, parametros, repeticiones)
+            identicos = referencia == _resultados(entradas)
+
+            transaction.set_rollback(True)
+
+        print(
+            f"{len(entradas):>9} | {t_preparar:>8.3f} s | {t_decimal:>8.3f} s | {t_numpy:>8.3f} s | "
+            f"{t_decimal / t_numpy if t_numpy else 0:>6.1f}x | {'sí' if identicos else 'NO'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# pila_api/scripts/bench_redondeos.py
+"""
+Micro-benchmark de redondeos Decreto 1990: funciones escalares (redondear_ibc,
+redondear_cotizacion llamadas valor a valor) vs versiones por lote
+(redondear_ibc_lote, redondear_cotizacion_lote).
+
+Mide listas de int, listas de Decimal y arreglos NumPy int64 (si NumPy está instalado),
+y verifica que ambos caminos den exactamente el mismo resultado. No usa la base de datos.
+
+Uso:
+  python -m pila_api.scripts.bench_redondeos
+  python -m pila_api.scripts.bench_redondeos 200000
+"""
+
+import os
+import random
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from pila_api.utils.redondeos import (
+    np,
+    redondear_cotizacion,
+    redondear_cotizacion_lote,
+    redondear_ibc,
+    redondear_ibc_lote,
+)
+
+
+def _medir(fn, valores):
+    inicio = time.perf_counter()
+    resultado = fn(valores)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rnd = random.Random(1990)
+
+    # Cotizaciones en pesos (hasta ~25 SMMLV × 16%) e IBCs con centavos
+    enteros = [rnd.randint(0, 6_000_000) for _ in range(n)]
+    decimales = [Decimal(rnd.randint(0, 3_600_000_000)).scaleb(-2) for _ in range(n)]
+    entradas = [("int", enteros), ("Decimal", decimales)]
+    if np is not None:
+        entradas.append(("numpy int64", np.array(enteros, dtype=np.int64)))
+
+    print(f"{n} valores")
+    print(f"{'función':>12} {'entrada':>12} | {'escalar':>10} | {'lote':>10} | {'speedup':>7} | idénticos")
+    print("-" * 72)
+
+    for nombre, escalar, lote in (
+        ("ibc", redondear_ibc, redondear_ibc_lote),
+        ("cotizacion", redondear_cotizacion, redondear_cotizacion_lote),
+    ):
+        for tipo, valores in entradas:
+            iterable = valores.tolist() if tipo.startswith("numpy") else valores
+            esperado, t_escalar = _medir(lambda vs: [escalar(v) for v in vs], iterable)
+            obtenido, t_lote = _medir(lote, valores)
+            identicos = list(obtenido) == esperado
+            print(
+                f"{nombre:>12} {tipo:>12} | {t_escalar:>8.3f} s | {t_lote:>8.3f} s | "
+                f"{t_escalar / t_lote if t_lote else 0:>6.1f}x | {'sí' if identicos else 'NO'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
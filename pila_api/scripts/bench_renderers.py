@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# pila_api/scripts/bench_renderers.py
+"""
+Micro-benchmark de los renderers de ancho fijo: implementación de referencia
+(FixedWidthLine, campo por campo) vs layouts compilados (LAYOUT_01 / LAYOUT_02).
+
+Renderiza N registros 02 (y N encabezados 01) con datos sintéticos variados y verifica
+que ambos caminos produzcan exactamente las mismas líneas. No usa la base de datos.
+
+Uso:
+  python -m pila_api.scripts.bench_renderers
+  python -m pila_api.scripts.bench_renderers 200000
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+from pila_api.renderers.fixed_width.referencia import Registro01Referencia, Registro02Referencia
+from pila_api.renderers.fixed_width.registro_01 import Registro01Renderer
+from pila_api.renderers.fixed_width.registro_02 import Registro02Renderer
+
+
+def datos_01(rnd: random.Random) -> dict:
+    return {
+        "modalidad_planilla": "1",
+        "secuencia": "0001",
+        "razon_social": rnd.choice(["ACME SAS", "CONSTRUCCIONES ÑANDÚ LTDA", ""]),
+        "tipo_doc": "NI",
+        "num_doc": str(rnd.randint(800000000, 999999999)),
+        "dv": str(rnd.randint(0, 9)),
+        "tipo_planilla": rnd.choice(["E", "K"]),
+        "numero_planilla_asociada": "",
+        "fecha_pago_planilla_asociada": "",
+        "forma_presentacion": "U",
+        "codigo_sucursal": rnd.choice(["", "001"]),
+        "nombre_sucursal": rnd.choice(["", "PRINCIPAL"]),
+        "codigo_arl": "14-23",
+        "periodo_pago_no_salud": "2025-12",
+        "periodo_pago_salud": "2026-01",
+        "numero_radicacion": rnd.choice([None, "", 1234567]),
+        "fecha_pago": "",
+        "total_cotizantes": rnd.randint(1, 99999),
+        "valor_total_nomina": rnd.randint(0, 10 ** 11),
+        "tipo_aportante": "1",
+        "codigo_operador": rnd.choice(["00", "88", "x"]),
+    }
+
+
+def datos_02(rnd: random.Random, secuencia: int) -> dict:
+    ibc = rnd.randint(1423500, 35587500)
+    novedad = rnd.random() < 0.2
+    return {
+        "secuencia": f"{secuencia:05d}",
+        "tipo_doc": "CC",
+        "num_doc": str(rnd.randint(10 ** 6, 10 ** 10)),
+        "tipo_cotizante": rnd.choice(["01", "23", "51"]),
+        "subtipo_cotizante": rnd.choice(["00", "12"]),
+        "cod_departamento": "11",
+        "cod_municipio": "001",
+        "papellido": rnd.choice(["PÉREZ", "NUÑEZ", None]),
+        "sapellido": "GÓMEZ",
+        "pnombre": "ANA",
+        "snombre": rnd.choice(["", "MARÍA"]),
+        "nov_ing": "X" if novedad else "",
+        "nov_ret": "",
+        "nov_vsp": "",
+        "nov_vst": "",
+        "nov_sln": "",
+        "nov_ige": "",
+        "nov_lma": "",
+        "nov_vac": "X" if novedad and rnd.random() < 0.5 else "",
+        "irl_dias": rnd.choice([0, 0, 0, 3]),
+        "afp": rnd.choice(["230301", "", None]),
+        "eps": "EPS001",
+        "ccf": "CCF22",
+        "dias_salud": 30,
+        "dias_pension": 30,
+        "dias_arl": 30,
+        "dias_caja": 30,
+        "v_192_200": ibc,
+        "tipo_salario": rnd.choice(["F", "X", ""]),
+        "ibc_pension": ibc,
+        "v_210_218": ibc,
+        "v_219_227": ibc,
+        "v_228_236": ibc,
+        "v_237_245": "0.16000",
+        "v_246_254": ibc * 16 // 100,
+        "v_255_263": 0,
+        "v_264_272": 0,
+        "v_273_281": 0,
+        "v_282_290": 0,
+        "v_291_299": 0,
+        "v_300_308": 0,
+        "v_309_317": rnd.choice(["0.04000", "0.12500"]),
+        "v_318_326": ibc * 4 // 100,
+        "v_327_332": 0,
+        "tarifa_arl": rnd.choice(["0.0052200", "0.0435000", ""]),
+        "centro_trabajo": rnd.choice([0, 1, None, ""]),
+        "cotizacion_arl": rnd.choice([7500, "7500.0", ""]),
+        "tarifa_ccf": rnd.choice(["0.04000", "4.00000", ""]),
+        "valor_ccf": ibc * 4 // 100,
+        "tarifa_sena": rnd.choice(["0.02000", ""]),
+        "valor_sena": rnd.choice([0, ibc * 2 // 100]),
+        "tarifa_icbf": rnd.choice(["0.03000", ""]),
+        "valor_icbf": rnd.choice([0, ibc * 3 // 100]),
+        "exonerado": rnd.choice(["S", "N"]),
+        "codigo_arl": "14-23",
+        "clase_riesgo": rnd.choice(["1", "4", "", "9"]),
+        "horas_laboradas": rnd.choice([240, 0, ""]),
+        "ibc_otros_parafiscales": rnd.choice([0, ibc, None, -1]),
+        "actividad_economica_arl": rnd.choice(["", "1234", "4522901", "452290199"]),
+        "fecha_ing": "2025-12-01" if novedad else "",
+        "fecha_ret": "",
+        "fecha_vsp_inicio": "",
+        "fecha_sln_inicio": "",
+        "fecha_sln_fin": "",
+        "fecha_ige_inicio": "",
+        "fecha_ige_fin": "",
+        "fecha_lma_inicio": "",
+        "fecha_lma_fin": "",
+        "fecha_vac_inicio": "2025-12-10" if novedad else "",
+        "fecha_vac_fin": "2025-12-20" if novedad else "",
+        "fecha_irl_inicio": "",
+        "fecha_irl_fin": "",
+        "raw_333_693": None,
+    }
+
+
+def _medir(renderer, datos):
+    inicio = time.perf_counter()
+    lineas = [renderer.render(d) for d in datos]
+    return lineas, time.perf_counter() - inicio
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rnd = random.Random(693)
+
+    casos = (
+        ("registro 01", Registro01Referencia(), Registro01Renderer(), [datos_01(rnd) for _ in range(n)]),
+        ("registro 02", Registro02Referencia(), Registro02Renderer(), [datos_02(rnd, i + 1) for i in range(n)]),
+    )
+
+    print(f"{n} líneas por registro")
+    print(f"{'registro':>12} | {'referencia':>10} | {'compilado':>10} | {'speedup':>7} | idénticos")
+    print("-" * 62)
+
+    for nombre, referencia, compilado, datos in casos:
+        esperado, t_referencia = _medir(referencia, datos)
+        obtenido, t_compilado = _medir(compilado, datos)
+        print(
+            f"{nombre:>12} | {t_referencia:>8.3f} s | {t_compilado:>8.3f} s | "
+            f"{t_referencia / t_compilado if t_compilado else 0:>6.1f}x | {'sí' if esperado == obtenido else 'NO'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# pila_api/scripts/bench_validacion.py
+"""
+Benchmark de validación del payload: serializers DRF vs validador compilado
+(pila_api/validacion.py), sobre un payload sintético.
+
+Verifica que ambos backends devuelvan el mismo validated_data antes de medir.
+
+Uso:
+  python -m pila_api.scripts.bench_validacion
+  python -m pila_api.scripts.bench_validacion 1000 10000 --repeticiones 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "pila_service.settings")
+django.setup()
+
+from pila_api.serializers import PayloadPlanillaSerializer
+from pila_api.scripts.payload_sintetico import generar_payload
+from pila_api.validacion import compilar_serializer, validar
+
+
+def _medir(validador: str, payload: dict, repeticiones: int) -> float:
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        validar(PayloadPlanillaSerializer, payload, validador)
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tamanos", nargs="*", type=int, default=[10000])
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    # Compilación (una vez por proceso), fuera de la medición
+    compilar_serializer(PayloadPlanillaSerializer)
+
+    print(f"{'empleados':>10} | {'drf':>10} | {'compilado':>10} | {'speedup':>7}")
+    print("-" * 48)
+
+    for n in args.tamanos:
+        # Como llega en request.data: solo tipos JSON
+        payload = json.loads(json.dumps(generar_payload(n, numero_interno=f"BENCH-VALIDACION-{n}")))
+
+        if validar(PayloadPlanillaSerializer, payload, "drf") != validar(PayloadPlanillaSerializer, payload, "compilado"):
+            raise SystemExit(f"{n} empleados: validated_data distinto entre backends")
+
+        t_drf = _medir("drf", payload, args.repeticiones)
+        t_compilado = _medir("compilado", payload, args.repeticiones)
+        print(f"{n:>10} | {t_drf:>8.3f} s | {t_compilado:>8.3f} s | {t_drf / t_compilado if t_compilado else 0:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# pila_api/scripts/payload_sintetico.py
+"""
+Payload PILA sintético (formato Nomiweb) para benchmarks.
+
+Mezcla empleados con una línea NORMAL y empleados con línea NORMAL + VAC/IGE,
+salarios altos (FSP), tipo 23 y pensionados, para que los benchmarks recorran
+las mismas ramas que una planilla real.
+"""
+
+import random
+
+SMMLV = 1423500
+
+
+def generar_empleado(i: int, rnd: random.Random) -> dict:
+    salario = rnd.choice([SMMLV, 1800000, 2500000, 6500000, 15000000, 26000000, 40000000])
+    tipo_cotizante = "23" if i % 17 == 0 else "01"
+    subtipo = "1" if i % 23 == 0 else "00"
+
+    registros = [{
+        "tipo_linea": "NORMAL",
+        "dias": {"salud": 30, "pension": 30, "arl": 30, "caja": 30},
+        "ibc": {"salud": salario, "pension": salario, "arl": salario, "parafiscales": salario},
+        "novedades": [],
+    }]
+    if i % 3 == 0:
+        codigo = "VAC" if i % 2 == 0 else "IGE"
+        ibc_nov = round(salario / 3, 2)
+        registros = [
+            {
+                "tipo_linea": "NORMAL",
+                "dias": {"salud": 20, "pension": 20, "arl": 20, "caja": 20},
+                "ibc": {"salud": salario - ibc_nov, "pension": salario - ibc_nov, "arl": salario - ibc_nov, "parafiscales": salario - ibc_nov},
+                "novedades": [],
+            },
+            {
+                "tipo_linea": codigo,
+                "dias": {"salud": 10, "pension": 10, "arl": 10, "caja": 10},
+                "ibc": {"salud": ibc_nov, "pension": ibc_nov, "arl": ibc_nov, "parafiscales": ibc_nov},
+                "novedades": [{"codigo": codigo, "fecha_desde": "2025-12-01", "fecha_hasta": "2025-12-10", "dias": 10}],
+            },
+        ]
+
+    return {
+        "id_empleado": i,
+        "tipo_doc": "CC",
+        "num_doc": str(10000000 + i),
+        "primer_apellido": "APELLIDO",
+        "segundo_apellido": "SEGUNDO",
+        "primer_nombre": "NOMBRE",
+        "segundo_nombre": "",
+        "cod_departamento": "11",
+        "cod_municipio": "001",
+        "tipo_cotizante": tipo_cotizante,
+        "subtipo_cotizante": subtipo,
+        "salario_basico": salario,
+        "flags": {"salario_integral": salario >= 26000000},
+        "entidades": {"eps": "EPS001", "afp": "230301", "arl": "14-23", "caja": "CCF22"},
+        "tarifas": {"arl": "0.522"},
+        "clase_riesgo": "1",
+        "codigo_centro_trabajo": 1,
+        "actividad_economica_arl": "4522901",
+        "registros": registros,
+    }
+
+
+def generar_payload(n_empleados: int, numero_interno: str = "BENCH-0001", seed: int = 0) -> dict:
+    rnd = random.Random(seed)
+    return {
+        "empresa": {
+            "id_interno": 1,
+            "nit": "900123456",
+            "dv": "7",
+            "razon_social": "EMPRESA BENCHMARK SAS",
+            "sucursal": "001",
+            "tipo_aportante": "01",
+            "codigo_arl": "14-23",
+            "flags": {"empresa_exonerada": True},
+        },
+        "periodo": "2025-12",
+        "planilla": {"tipo_planilla": "E", "numero_interno": numero_interno},
+        "empleados": [generar_empleado(i, rnd) for i in range(n_empleados)],
+        "parametros": {
+            "smmlv": SMMLV,
+            "tope_ibc_smmlv": 25,
+            "dias_base": 30,
+            "fsp_porcentajes": {"4-16": 0.01, "16-17": 0.012, "17-18": 0.014, "18-19": 0.016, "19-20": 0.018, ">20": 0.02},
+        },
+    }
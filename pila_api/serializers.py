@@ -95,6 +95,9 @@ class EmpleadoSerializer(serializers.Serializer):
     clase_riesgo = serializers.CharField(max_length=1, required=False, allow_blank=True)
     # Código centro de trabajo (campo 62 TXT, pos 390-398)
     codigo_centro_trabajo = serializers.IntegerField(required=False, allow_null=True)
+    # Sucursal del empleado para archivos por sucursal (tipo_presentacion_planilla=S); por defecto la de la empresa
+    codigo_sucursal = serializers.CharField(max_length=10, required=False, allow_blank=True)
+    nombre_sucursal = serializers.CharField(max_length=40, required=False, allow_blank=True)
     
     # Nuevo campo para múltiples registros por empleado
     registros = RegistroEmpleadoSerializer(many=True, required=False, default=list)
@@ -106,13 +109,17 @@ class MetaSerializer(serializers.Serializer):
     usuario = serializers.CharField(max_length=150, required=False)
 
 
-class PayloadPlanillaSerializer(serializers.Serializer):
+class EncabezadoPayloadSerializer(serializers.Serializer):
+    """Payload sin empleados (ingesta streaming: los empleados se validan uno a uno)"""
     empresa = EmpresaSerializer()
     periodo = serializers.RegexField(regex=r"^\d{4}-\d{2}$")
     planilla = PlanillaSerializer()
-    empleados = EmpleadoSerializer(many=True)
     meta = MetaSerializer(required=False)
 
+
+class PayloadPlanillaSerializer(EncabezadoPayloadSerializer):
+    empleados = EmpleadoSerializer(many=True)
+
     def validate(self, attrs):
         # Validación mínima: empleados no vacío
         if not attrs.get("empleados"):
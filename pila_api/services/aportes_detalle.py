@@ -0,0 +1,61 @@
+# pila_api/services/aportes_detalle.py
+"""
+Columnas numéricas de aportes de PilaPlanillaDetalle (enteros en centavos).
+
+El JSON aportes es la salida completa del motor de cálculo (con flags y textos); las
+columnas *_centavos guardan los mismos valores tipados para que los totales de la
+planilla y el valor total nómina del registro 01 salgan de un SUM en la base, sin leer
+ni convertir el JSON de cada detalle.
+
+calcular_planilla llena las columnas con columnas_aportes al persistir cada detalle; la
+migración 0016 las llena para los detalles ya calculados con una copia propia de este cálculo.
+"""
+
+from pila_api.services.parametros_legales import ParametrosLegales
+from pila_api.utils.centavos import a_centavos, cotizacion
+
+# Columnas de aportes del detalle, en centavos
+CAMPOS_APORTES = [
+    "salud_ibc_centavos", "salud_empleado_centavos", "salud_empleador_centavos",
+    "pension_ibc_centavos", "pension_empleado_centavos", "pension_empleador_centavos",
+    "fsp_solidaridad_centavos", "fsp_subsistencia_centavos",
+    "arl_ibc_centavos", "arl_empleador_centavos",
+    "caja_ibc_centavos", "caja_empleador_centavos",
+    "sena_centavos", "icbf_centavos",
+]
+
+
+def columnas_aportes(aportes: dict | None, parametros: ParametrosLegales, novedad_sln: bool) -> dict:
+    """
+    Valores de CAMPOS_APORTES para el JSON aportes de un detalle ({} o None = todo 0).
+
+    SENA e ICBF no están en el JSON: se calculan como en el registro 02 (IBC caja × tasa al
+    múltiplo de 100 superior; 0 sin caja, exonerado o con novedad SLN).
+    """
+    if not aportes:
+        return dict.fromkeys(CAMPOS_APORTES, 0)
+
+    salud = aportes.get("salud", {})
+    pension = aportes.get("pension", {})
+    arl = aportes.get("arl", {})
+    caja = aportes.get("caja", {})
+
+    caja_ibc = a_centavos(caja.get("ibc"))
+    parafiscales = caja.get("aplica", False) and caja_ibc > 0 and not caja.get("exonerado", False) and not novedad_sln
+
+    return {
+        "salud_ibc_centavos": a_centavos(salud.get("ibc")),
+        "salud_empleado_centavos": a_centavos(salud.get("empleado")),
+        "salud_empleador_centavos": a_centavos(salud.get("empleador")),
+        "pension_ibc_centavos": a_centavos(pension.get("ibc")),
+        "pension_empleado_centavos": a_centavos(pension.get("empleado")),
+        "pension_empleador_centavos": a_centavos(pension.get("empleador")),
+        "fsp_solidaridad_centavos": a_centavos(pension.get("fsp_solidaridad")),
+        "fsp_subsistencia_centavos": a_centavos(pension.get("fsp_subsistencia")),
+        "arl_ibc_centavos": a_centavos(arl.get("ibc")),
+        "arl_empleador_centavos": a_centavos(arl.get("empleador")),
+        "caja_ibc_centavos": caja_ibc,
+        "caja_empleador_centavos": a_centavos(caja.get("empleador")),
+        "sena_centavos": cotizacion(caja_ibc, parametros.tasa_sena) * 100 if parafiscales else 0,
+        "icbf_centavos": cotizacion(caja_ibc, parametros.tasa_icbf) * 100 if parafiscales else 0,
+    }
@@ -0,0 +1,275 @@
+# pila_api/services/archivos_generados.py
+"""
+Caché de archivos TXT generados (tabla pila_archivo).
+
+Cada archivo se guarda por (planilla, filtro tipo_planilla, versión). La versión es
+planilla.version_archivo, que se incrementa cada vez que cambian los datos del TXT
+(calcular_planilla y crear_planilla): un archivo de una versión anterior nunca se sirve y
+se borra al guardar la nueva. El ETag es el SHA-256 del contenido (ETag fuerte).
+
+Dónde se guarda el contenido (sin ninguno de los dos la caché está desactivada y la descarga
+genera el TXT en streaming, con memoria constante):
+- PILA_ARCHIVOS_DIR: en disco (direccionado por contenido: <dir>/<etag[:2]>/<etag>.txt), escrito
+  a medida que se genera, sin armarlo en memoria; la vista lo sirve con FileResponse (sendfile)
+- PILA_ARCHIVOS_EN_TABLA (opt-in, sin PILA_ARCHIVOS_DIR): en la columna contenido. Se genera a
+  un archivo temporal (spooled) a la par del SHA-256, pero guardarlo y servirlo lee el archivo
+  completo en memoria: solo para archivos chicos o despliegues sin volumen compartido
+
+Desalojo (al guardar un archivo nuevo), por última descarga (LRU):
+- PILA_ARCHIVOS_MAX: máximo de archivos guardados (0 = caché desactivada)
+- PILA_ARCHIVOS_MAX_BYTES: tamaño total máximo (0 = sin límite)
+- PILA_ARCHIVOS_TTL: segundos sin descargas tras los que un archivo se borra (0 = sin vencimiento)
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from pila_api.models import PilaArchivo, PilaPlanilla
+from pila_api.services.generar_txt import lineas_planilla, marcar_archivo_generado
+from pila_api.services.snapshot_planilla import cargar_planilla, lectura_consistente
+
+
+# Bytes del archivo temporal en memoria antes de pasar a disco (PILA_ARCHIVOS_EN_TABLA)
+_SPOOL_MAX = 8 * 1024 * 1024
+
+
+def cache_activa() -> bool:
+    return _max_archivos() > 0 and (bool(_directorio()) or _en_tabla())
+
+
+def _max_archivos() -> int:
+    return int(getattr(settings, "PILA_ARCHIVOS_MAX", 200) or 0)
+
+
+def _max_bytes() -> int:
+    return int(getattr(settings, "PILA_ARCHIVOS_MAX_BYTES", 0) or 0)
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "PILA_ARCHIVOS_TTL", 0) or 0)
+
+
+def _directorio() -> str:
+    return str(getattr(settings, "PILA_ARCHIVOS_DIR", "") or "")
+
+
+def _en_tabla() -> bool:
+    return bool(getattr(settings, "PILA_ARCHIVOS_EN_TABLA", False))
+
+
+def ruta_absoluta(archivo: PilaArchivo) -> str:
+    return os.path.join(_directorio(), archivo.ruta)
+
+
+def abrir_archivo(archivo: PilaArchivo):
+    """Contenido del archivo como archivo binario abierto (en disco o desde la tabla)."""
+    if archivo.ruta:
+        return open(ruta_absoluta(archivo), "rb")
+    contenido = archivo.contenido
+    # BytesIO comparte el buffer de un bytes (sin copia); psycopg entrega memoryview
+    return io.BytesIO(contenido if isinstance(contenido, bytes) else bytes(contenido))
+
+
+def etag_http(archivo: PilaArchivo) -> str:
+    """ETag fuerte para el header HTTP (entre comillas)."""
+    return f'"{archivo.etag}"'
+
+
+def invalidar_archivos(planilla_id: int) -> None:
+    """Incrementa la versión de los datos del TXT: los archivos guardados dejan de ser vigentes."""
+    PilaPlanilla.objects.filter(planilla_id=planilla_id).update(version_archivo=F("version_archivo") + 1)
+
+
+def archivo_vigente(planilla: PilaPlanilla, filtro_tipo_planilla: str | None = None) -> PilaArchivo | None:
+    """
+    Archivo guardado para la versión actual de la planilla, o None. El contenido se carga
+    diferido: una consulta If-None-Match que coincide no lo lee.
+    """
+    archivo = (
+        PilaArchivo.objects
+        .defer("contenido")
+        .filter(
+            planilla=planilla,
+            tipo_planilla=filtro_tipo_planilla or "",
+            version=planilla.version_archivo,
+        )
+        .first()
+    )
+    if archivo is not None and archivo.ruta and not os.path.exists(ruta_absoluta(archivo)):
+        # Borrado del volumen por fuera del servicio: se vuelve a generar
+        archivo.delete()
+        return None
+    return archivo
+
+
+def registrar_acceso(archivo: PilaArchivo) -> None:
+    PilaArchivo.objects.filter(id=archivo.id).update(fecha_acceso=timezone.now())
+
+
+def obtener_archivo(planilla_id: int, filtro_tipo_planilla: str | None = None) -> PilaArchivo:
+    """
+    Archivo TXT de la planilla para la versión actual: el guardado si existe; si no, lo
+    genera, lo guarda y aplica el desalojo.
+
+    La generación lee dentro de lectura_consistente() (snapshot, sin lock de la planilla):
+    el archivo corresponde a la version_archivo leída en ese mismo snapshot, aunque la
+    planilla se recalcule mientras se genera. Guardarlo es una escritura corta aparte; si
+    una descarga simultánea ya guardó esa versión, se usa la suya.
+
+    Raises:
+        PilaPlanilla.DoesNotExist: Si la planilla no existe
+        ValueError: Si faltan datos requeridos en el payload (ver iter_lineas_txt)
+    """
+    archivo = archivo_vigente(cargar_planilla(planilla_id), filtro_tipo_planilla)
+    if archivo is not None:
+        registrar_acceso(archivo)
+        return archivo
+
+    with lectura_consistente():
+        planilla = cargar_planilla(planilla_id)
+        lineas = lineas_planilla(planilla, filtro_tipo_planilla)
+        if _directorio():
+            etag, tamano, ruta = _escribir_en_disco(lineas)
+            contenido = b""
+        else:
+            with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX) as tmp:
+                etag, tamano = _escribir_lineas(lineas, tmp)
+                tmp.seek(0)
+                contenido, ruta = tmp.read(), ""
+
+    archivo = _guardar_archivo(planilla, filtro_tipo_planilla or "", etag, contenido, tamano, ruta)
+    marcar_archivo_generado(planilla)
+    desalojar_archivos()
+    return archivo
+
+
+def _guardar_archivo(planilla, tipo_planilla: str, etag: str, contenido: bytes, tamano: int, ruta: str) -> PilaArchivo:
+    """Fila del archivo generado para planilla.version_archivo (la leída en el snapshot)."""
+    try:
+        with transaction.atomic():
+            archivo = PilaArchivo.objects.create(
+                planilla=planilla,
+                tipo_planilla=tipo_planilla,
+                version=planilla.version_archivo,
+                etag=etag,
+                contenido=contenido,
+                tamano=tamano,
+                ruta=ruta,
+            )
+    except IntegrityError:
+        # Otra descarga generó y guardó la misma versión mientras tanto (uq_pila_archivo_version)
+        archivo = PilaArchivo.objects.defer("contenido").get(
+            planilla=planilla, tipo_planilla=tipo_planilla, version=planilla.version_archivo
+        )
+        if ruta and ruta != archivo.ruta and not PilaArchivo.objects.filter(ruta=ruta).exists():
+            os.remove(os.path.join(_directorio(), ruta))
+        registrar_acceso(archivo)
+        return archivo
+
+    # Versiones anteriores del mismo archivo ya no se pueden servir
+    _borrar(PilaArchivo.objects.filter(
+        planilla=planilla, tipo_planilla=tipo_planilla, version__lt=planilla.version_archivo
+    ))
+    return archivo
+
+
+def desalojar_archivos() -> int:
+    """
+    Aplica la política de desalojo (TTL, máximo de archivos y de bytes, por última descarga).
+
+    Returns:
+        Cantidad de archivos borrados
+    """
+    borrados = 0
+
+    ttl = _ttl()
+    if ttl:
+        limite = timezone.now() - timedelta(seconds=ttl)
+        borrados += _borrar(PilaArchivo.objects.filter(fecha_acceso__lt=limite))
+
+    max_archivos = _max_archivos()
+    max_bytes = _max_bytes()
+
+    # Recorre del más reciente al más antiguo; desde el primero que excede un límite, se borra
+    total_bytes = 0
+    conservar = 0
+    desalojar = []
+    recientes = PilaArchivo.objects.order_by("-fecha_acceso", "-id").values_list("id", "tamano")
+    for i, (archivo_id, tamano) in enumerate(recientes.iterator()):
+        total_bytes += tamano
+        if desalojar or i >= max_archivos or (max_bytes and total_bytes > max_bytes and conservar):
+            desalojar.append(archivo_id)
+        else:
+            conservar += 1
+
+    if desalojar:
+        borrados += _borrar(PilaArchivo.objects.filter(id__in=desalojar))
+    return borrados
+
+
+def _escribir_en_disco(lineas) -> tuple[str, int, str]:
+    """
+    Escribe las líneas (separadas por \\n) en PILA_ARCHIVOS_DIR calculando el SHA-256 a la
+    par; el archivo temporal se renombra a su ruta por contenido al terminar.
+
+    Returns:
+        (etag, tamaño en bytes, ruta relativa)
+    """
+    directorio = _directorio()
+    os.makedirs(directorio, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(dir=directorio, prefix=".tmp-", delete=False) as tmp:
+        try:
+            etag, tamano = _escribir_lineas(lineas, tmp)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+
+    ruta = os.path.join(etag[:2], f"{etag}.txt")
+    os.makedirs(os.path.join(directorio, etag[:2]), exist_ok=True)
+    os.replace(tmp.name, os.path.join(directorio, ruta))
+    return etag, tamano, ruta
+
+
+def _escribir_lineas(lineas, destino) -> tuple[str, int]:
+    """
+    Escribe las líneas (separadas por \\n) en destino calculando el SHA-256 a la par.
+
+    Returns:
+        (etag, tamaño en bytes)
+    """
+    sha = hashlib.sha256()
+    tamano = 0
+    for i, linea in enumerate(lineas):
+        if i:
+            linea = b"\n" + linea
+        destino.write(linea)
+        sha.update(linea)
+        tamano += len(linea)
+    return sha.hexdigest(), tamano
+
+
+def _borrar(archivos) -> int:
+    """
+    Borra las filas y, en disco, los archivos que ya ninguna fila usa (dos filas pueden
+    compartir contenido, ej. E y sin filtro cuando no hay estudiantes).
+    """
+    rutas = set(archivos.exclude(ruta="").values_list("ruta", flat=True)) if _directorio() else set()
+    borrados = archivos.delete()[0]
+
+    en_uso = set(PilaArchivo.objects.filter(ruta__in=rutas).values_list("ruta", flat=True)) if rutas else set()
+    for ruta in rutas - en_uso:
+        try:
+            os.remove(os.path.join(_directorio(), ruta))
+        except FileNotFoundError:
+            pass
+    return borrados
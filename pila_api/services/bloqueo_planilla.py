@@ -0,0 +1,124 @@
+# pila_api/services/bloqueo_planilla.py
+"""
+Coordinación de las escrituras de una misma planilla (por numero_interno).
+
+Sin esto, dos POST concurrentes del mismo numero_interno corren los dos get_or_create,
+borran y reinsertan detalles y novedades y recalculan: el doble de trabajo y riesgo de
+deadlock entre los DELETE de detalles/novedades de una y los INSERT de la otra.
+
+bloqueo_planilla(numero_interno) serializa esas escrituras:
+
+- PostgreSQL: advisory lock de sesión (pg_advisory_lock) sobre una llave de 64 bits
+  derivada del numero_interno. Coordina todos los procesos y servidores que usan la
+  misma base; las peticiones que esperan entran en el orden en que pidieron el lock.
+  Es de sesión (no de transacción) porque la ingesta y el cálculo corren en
+  transacciones separadas: se libera al salir del bloque, o si la conexión se cae.
+  Requiere que la conexión no se comparta entre peticiones a mitad del bloque (con
+  PgBouncer, modo session).
+- Otras bases (SQLite en desarrollo y tests): un lock por numero_interno dentro del
+  proceso.
+
+La espera está acotada por settings.PILA_BLOQUEO_TIMEOUT segundos (lock_timeout solo
+mientras se pide el advisory lock): quien no obtiene el lock a tiempo recibe PlanillaOcupada
+(409 en la API) en vez de ocupar un worker de gunicorn hasta que este lo mate.
+
+Quien espera vuelve a revisar al obtener el lock si el trabajo ya lo hizo la petición
+anterior (crear_planilla: mismo hash de payload o misma Idempotency-Key) y reutiliza ese
+resultado en vez de reprocesar.
+"""
+
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+# SQLSTATE lock_not_available: venció lock_timeout esperando el advisory lock
+_LOCK_NOT_AVAILABLE = "55P03"
+
+# Lock por numero_interno (bases sin advisory locks): [lock, peticiones que lo usan]
+_locks_locales = {}
+_guardia = threading.Lock()
+
+
+class PlanillaOcupada(Exception):
+    """Otra petición tiene el bloqueo de la planilla y no lo soltó dentro de PILA_BLOQUEO_TIMEOUT."""
+
+    def __init__(self, numero_interno: str, espera: float):
+        self.numero_interno = numero_interno
+        self.espera = espera
+        super().__init__(
+            f"La planilla {numero_interno} está en proceso por otra petición (esperó {espera:g} s); reintente más tarde"
+        )
+
+
+def espera_maxima() -> float:
+    """Segundos que se espera el bloqueo de una planilla (0 = sin límite)."""
+    return max(float(getattr(settings, "PILA_BLOQUEO_TIMEOUT", 30) or 0), 0)
+
+
+def llave_bloqueo(numero_interno: str) -> int:
+    """Llave bigint (con signo) del advisory lock de la planilla."""
+    digest = hashlib.blake2b(f"pila_planilla:{numero_interno}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+@contextmanager
+def _bloqueo_local(numero_interno: str, espera: float):
+    with _guardia:
+        entrada = _locks_locales.setdefault(numero_interno, [threading.Lock(), 0])
+        entrada[1] += 1
+    try:
+        if not entrada[0].acquire(timeout=espera or -1):
+            raise PlanillaOcupada(numero_interno, espera)
+        try:
+            yield
+        finally:
+            entrada[0].release()
+    finally:
+        with _guardia:
+            entrada[1] -= 1
+            if not entrada[1]:
+                del _locks_locales[numero_interno]
+
+
+@contextmanager
+def _bloqueo_postgres(numero_interno: str, espera: float):
+    llave = llave_bloqueo(numero_interno)
+    # set_config(..., true) dura lo que la transacción (o se deshace con el savepoint si
+    # vence): el lock_timeout no alcanza a las consultas que siguen en la petición
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT current_setting('lock_timeout')")
+        previo = cursor.fetchone()[0]
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{round(espera * 1000)}ms"])
+        try:
+            cursor.execute("SELECT pg_advisory_lock(%s)", [llave])
+        except OperationalError as e:
+            if getattr(e.__cause__, "pgcode", None) == _LOCK_NOT_AVAILABLE:
+                raise PlanillaOcupada(numero_interno, espera) from e
+            raise
+        cursor.execute("SELECT set_config('lock_timeout', %s, true)", [previo])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [llave])
+
+
+@contextmanager
+def bloqueo_planilla(numero_interno: str | None):
+    """
+    Bloque exclusivo para escribir la planilla numero_interno: espera a que terminen las
+    peticiones anteriores sobre la misma planilla. Sin numero_interno (payload inválido, que
+    la validación rechazará) no bloquea.
+
+    Raises:
+        PlanillaOcupada: si no obtuvo el bloqueo en PILA_BLOQUEO_TIMEOUT segundos
+    """
+    if not numero_interno:
+        yield
+        return
+    bloqueo = _bloqueo_postgres if connection.vendor == "postgresql" else _bloqueo_local
+    with bloqueo(numero_interno, espera_maxima()):
+        yield
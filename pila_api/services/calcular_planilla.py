@@ -1,29 +1,51 @@
 # pila_api/services/calcular_planilla.py
 
-from decimal import Decimal, ROUND_HALF_UP
+import hashlib
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from django.db import transaction
-from pila_api.models import PilaPlanilla, PilaPlanillaDetalle
-from pila_api.utils.redondeos import redondear_cotizacion, redondear_ibc
+from django.db.models import Sum
+from pila_api.models import PilaPlanillaDetalle
+from pila_api.services.aportes_detalle import CAMPOS_APORTES, columnas_aportes
+from pila_api.services.contexto_planilla import PlanillaContexto
+from pila_api.services.generaciones_detalles import activar_payload_pendiente
+from pila_api.services.linea_detalle import renderizar_linea_02
+from pila_api.services.parametros_legales import ParametrosLegales, parametros_periodo
+from pila_api.services.snapshot_planilla import cargar_planilla, detalles_planilla
+from pila_api.utils.centavos import a_centavos, a_decimal, a_texto, ceil_100, porcentaje, proporcion
+from pila_api.utils.redondeos import redondear_cotizacion
 
 D0 = Decimal("0")
-Q2 = Decimal("0.01")
 
-# Tasas v0.2 (mínimas)
-TASA_SALUD_EMP = Decimal("0.04")
-TASA_SALUD_EMPL = Decimal("0.085")
+# Campos que calcular_planilla reescribe en cada detalle
+CAMPOS_CALCULO = [
+    "dias_cotizados",
+    "dias_salud", "dias_pension", "dias_arl", "dias_caja",
+    "ibc_salud", "ibc_pension", "ibc_arl",
+    "estado", "errores",
+    "aportes", "aportes_empleado", "aportes_empleador",
+    "huella", "linea_02",
+    *CAMPOS_APORTES,
+]
 
-TASA_PENSION_EMP = Decimal("0.04")
-TASA_PENSION_EMPL = Decimal("0.12")
+# Campos calculados que llegan al TXT (la huella no): si ninguno cambia, el archivo tampoco
+CAMPOS_TXT = [campo for campo in CAMPOS_CALCULO if campo != "huella"]
 
-TASA_CAJA = Decimal("0.04")
+# Columnas sumadas para los totales de la planilla (solo detalles OK)
+CAMPOS_TOTALES = [
+    "salud_empleado_centavos", "salud_empleador_centavos",
+    "pension_empleado_centavos", "pension_empleador_centavos",
+    "arl_empleador_centavos", "caja_empleador_centavos",
+]
 
-ARL_TASAS = {
-    "1": Decimal("0.00522"),
-    "2": Decimal("0.01044"),
-    "3": Decimal("0.02436"),
-    "4": Decimal("0.04350"),
-    "5": Decimal("0.06960"),
-}
+# Versión de las reglas de cálculo y del registro 02: forma parte de la huella de cada detalle.
+# Incrementarla al cambiar reglas/tasas o el layout en código invalida las huellas y líneas guardadas.
+VERSION_CALCULO = 2
+
+# Motores de cálculo disponibles (ver calcular_planilla(motor=...))
+MOTORES_CALCULO = ("decimal", "numpy")
 
 
 def _clamp(value: Decimal, min_v: Decimal, max_v: Decimal) -> Decimal:
@@ -43,398 +65,538 @@ def _to_decimal(x) -> Decimal:
 
 
 def _q2(x: Decimal) -> Decimal:
-    return _to_decimal(x).quantize(Q2, rounding=ROUND_HALF_UP)
+    return a_decimal(a_centavos(x))
 
 
 def _calc_pct(base: Decimal, pct: Decimal) -> Decimal:
-    return _q2(_to_decimal(base) * _to_decimal(pct))
+    # Exacto en centavos enteros (sin límite de precisión de Decimal con IBCs grandes)
+    return a_decimal(porcentaje(a_centavos(base), pct))
+
+
+def _repartir(total: int, tasa_emp: Decimal, tasa_empl: Decimal) -> int:
+    """Parte del empleado de un total en pesos: total × emp / (emp + empl), exacto (sin float)."""
+    return proporcion(total, tasa_emp, tasa_emp + tasa_empl)
+
 
+def _prorrata(valor: Decimal, dias: Decimal, dias_base: Decimal) -> Decimal:
+    """valor × dias / dias_base a centavos (ROUND_HALF_UP), exacto."""
+    return a_decimal(proporcion(a_centavos(valor), dias, dias_base))
 
-def _calcular_fsp(ibc_pension: Decimal, smmlv: Decimal, fsp_porcentajes: dict) -> tuple[Decimal, Decimal]:
+
+def _calcular_fsp(ibc_pension: Decimal, parametros: ParametrosLegales) -> tuple[Decimal, Decimal]:
     """
     Calcula Fondo Solidaridad Pensional (FSP) según Decreto 1990 de 2016.
     
     FSP se calcula cuando IBC > 4 SMLV.
-    El porcentaje varía según el rango de SMLV:
-    - 4-16 SMLV: porcentaje según fsp_porcentajes["4-16"]
-    - 16-17 SMLV: porcentaje según fsp_porcentajes["16-17"]
-    - 17-18 SMLV: porcentaje según fsp_porcentajes["17-18"]
-    - 18-19 SMLV: porcentaje según fsp_porcentajes["18-19"]
-    - 19-20 SMLV: porcentaje según fsp_porcentajes["19-20"]
-    - >20 SMLV: porcentaje según fsp_porcentajes[">20"]
+    El porcentaje varía según el rango de SMLV (4-16, 16-17, 17-18, 18-19, 19-20, >20),
+    tomado de parametros.fsp_porcentajes (ver parametros_legales.TRAMOS_FSP).
     
     Args:
         ibc_pension: IBC de pensión (salario + VST si aplica)
-        smmlv: Salario Mínimo Legal Vigente
-        fsp_porcentajes: Diccionario con porcentajes FSP por rango (en decimal, ej: 0.01 = 1%)
+        parametros: parámetros legales del periodo (tramos FSP precalculados)
         
     Returns:
         Tuple (fsp_solidaridad, fsp_subsistencia) - ambos valores redondeados según Decreto 1990
     """
-    if ibc_pension <= 0 or smmlv <= 0:
+    # Tramo por bisect sobre los límites en pesos; None si IBC <= 4 SMLV
+    porcentaje_fsp = parametros.tasa_fsp(ibc_pension)
+    if porcentaje_fsp is None:
         return (D0, D0)
     
-    # Calcular cuántos SMLV representa el IBC
-    smlv_count = ibc_pension / smmlv
-    
-    # Si IBC <= 4 SMLV, no aplica FSP
-    if smlv_count <= Decimal("4"):
-        return (D0, D0)
-    
-    # Determinar porcentaje según rango
-    porcentaje_fsp = D0
-    if smlv_count <= Decimal("16"):
-        porcentaje_fsp = Decimal(str(fsp_porcentajes.get("4-16", 0.01)))
-    elif smlv_count <= Decimal("17"):
-        porcentaje_fsp = Decimal(str(fsp_porcentajes.get("16-17", 0.012)))
-    elif smlv_count <= Decimal("18"):
-        porcentaje_fsp = Decimal(str(fsp_porcentajes.get("17-18", 0.014)))
-    elif smlv_count <= Decimal("19"):
-        porcentaje_fsp = Decimal(str(fsp_porcentajes.get("18-19", 0.016)))
-    elif smlv_count <= Decimal("20"):
-        porcentaje_fsp = Decimal(str(fsp_porcentajes.get("19-20", 0.018)))
-    else:  # > 20
-        porcentaje_fsp = Decimal(str(fsp_porcentajes.get(">20", 0.02)))
-    
     # Calcular FSP sobre el IBC
     fsp_total = _calc_pct(ibc_pension, porcentaje_fsp)
     
     # FSP se divide en dos partes iguales: solidaridad y subsistencia
-    fsp_solidaridad = fsp_total / Decimal("2")
-    fsp_subsistencia = fsp_total / Decimal("2")
-    
-    # Redondear según Decreto 1990 (múltiplo de 100 superior)
-    fsp_solidaridad_redondeado = Decimal(redondear_cotizacion(fsp_solidaridad))
-    fsp_subsistencia_redondeado = Decimal(redondear_cotizacion(fsp_subsistencia))
+    # Redondear cada mitad según Decreto 1990 (múltiplo de 100 superior), exacto en centavos
+    fsp_mitad = ceil_100(a_centavos(fsp_total), divisor=2)
+    fsp_solidaridad_redondeado = Decimal(fsp_mitad)
+    fsp_subsistencia_redondeado = Decimal(fsp_mitad)
     
     return (fsp_solidaridad_redondeado, fsp_subsistencia_redondeado)
 
 
-def calcular_planilla(planilla_id: int) -> dict:
+class EntradaCalculo:
+    """
+    Un detalle con días, flags y novedades ya resueltos: es lo que reciben los motores
+    de cálculo (Decimal de referencia o NumPy). Los motores llenan los campos de salida.
+    """
+
+    __slots__ = (
+        "detalle", "errores",
+        "ibc_subs", "dias_salud", "dias_pension", "dias_arl",
+        "ibc_salud_cero", "ibc_pension_cero",
+        "aplica_salud", "aplica_pension", "aplica_arl", "aplica_caja",
+        "salario_integral", "aplica_exoneracion",
+        "tiene_novedad_sln", "tiene_novedad_sin_riesgo", "arl_pct",
+        # salida
+        "ibc_salud", "ibc_pension", "ibc_arl",
+        "aportes", "aportes_emp", "aportes_empl",
+    )
+
+
+def _preparar_entrada(d, emp, parametros: ParametrosLegales, empresa_exonerada: bool) -> EntradaCalculo:
+    """
+    Reglas por detalle que no son aritmética de aportes: overrides de días por novedad,
+    validaciones, flags por tipo/subtipo de cotizante, exoneración y novedades de ausentismo.
+    Ajusta en el detalle los días que no aplican.
+    """
+    e = EntradaCalculo()
+    e.detalle = d
+    errores = []
+
+    dias = int(d.dias_cotizados or 0)
+    ibc_base = _to_decimal(d.ibc)
+
+    novedades = [(n.tipo_novedad or "").upper() for n in d.novedades.all()]
+
+    # --- reglas mínimas por novedades (ING/RET override días) ---
+    for n in d.novedades.all():
+        cod = (n.tipo_novedad or "").upper()
+        if cod in ("RET", "ING"):
+            dias_override = (n.metadata or {}).get("dias_cotizados")
+            if dias_override is not None:
+                try:
+                    dias = int(dias_override)
+                except ValueError:
+                    errores.append(f"{cod}: dias_cotizados inválido")
+
+    # --- validaciones mínimas ---
+    if dias < 0 or dias > 30:
+        errores.append("dias_cotizados fuera de rango (0..30)")
+    if ibc_base < 0:
+        errores.append("ibc negativo")
+
+    # IBC base por defecto (si no cotiza días, IBC=0)
+    e.ibc_subs = D0 if dias == 0 else ibc_base
+    d.dias_cotizados = dias
+
+    # --- A.2: días para el mínimo proporcional por subsistema (antes de ajustes por tipo) ---
+    e.dias_salud = _to_decimal(getattr(d, "dias_salud", dias))
+    e.dias_pension = _to_decimal(getattr(d, "dias_pension", dias))
+    e.dias_arl = _to_decimal(getattr(d, "dias_arl", dias))
+
+    # --- Flags por subsistema ---
+    aplica_salud = emp.aplica_salud
+    aplica_pension = emp.aplica_pension
+    aplica_arl = emp.aplica_arl
+    aplica_caja = emp.aplica_caja
+    e.ibc_salud_cero = False
+    e.ibc_pension_cero = False
+
+    # --- Ajustes según tipo y subtipo de cotizante ---
+    # Si tipo_cotizante == "23": solo ARL (sin pensión, salud ni CCF)
+    if d.tipo_cotizante == "23":
+        aplica_salud = False
+        aplica_pension = False
+        aplica_caja = False
+        # Mantener aplica_arl = True (solo ARL)
+        # Establecer días en 0 para subsistemas que no aplican
+        d.dias_salud = 0
+        d.dias_pension = 0
+        d.dias_caja = 0
+        # IBCs en 0 para subsistemas que no aplican
+        e.ibc_salud_cero = True
+        e.ibc_pension_cero = True
+
+    # Si subtipo_cotizante == "1": pensionado activo, no liquidación de pensiones AFP
+    if d.subtipo_cotizante == "1":
+        aplica_pension = False
+        d.dias_pension = 0
+        e.ibc_pension_cero = True
+
+    # Solo no aplica pensión cuando subtipo tiene valor y es distinto de "12". Si está en blanco/0/00 o es "12", sí aplica.
+    subtipo_norm = str(d.subtipo_cotizante or "").strip().zfill(2)
+    if subtipo_norm not in ("00", "12"):
+        aplica_pension = False
+        d.dias_pension = 0
+        e.ibc_pension_cero = True
+
+    e.aplica_salud = aplica_salud
+    e.aplica_pension = aplica_pension
+    e.aplica_arl = aplica_arl
+    e.aplica_caja = aplica_caja
+
+    # --- Exoneración (empresa_exonerada AND <10 SMMLV AND NO integral) ---
+    e.salario_integral = emp.salario_integral
+
+    # usa el salario_basico del payload (Nomiweb lo manda)
+    smmlv_mayor_10 = emp.salario_basico >= parametros.umbral_exoneracion
+
+    e.aplica_exoneracion = (
+        empresa_exonerada
+        and (not e.salario_integral)
+        and (not smmlv_mayor_10)
+    )
+
+    # Error 362: En líneas SLN (licencia sin pago) tarifa salud 0 → cotización salud 0. Solo SLN (tabla novedades 3 chars).
+    e.tiene_novedad_sln = "SLN" in novedades
+    # VAC/IGE/LMA/SLN/IRL: mismos días e IBC que salud, pero tarifa ARL 0% (no exposición a riesgos)
+    e.tiene_novedad_sin_riesgo = any(cod in ("VAC", "IGE", "LMA", "SLN", "IRL") for cod in novedades)
+
+    e.arl_pct = None
+    if not errores and aplica_arl and not e.tiene_novedad_sin_riesgo:
+        e.arl_pct = parametros.tasa_arl(d.riesgo_arl)
+        if not e.arl_pct:
+            errores.append("riesgo_arl inválido (1..5)")
+
+    e.errores = errores
+    e.aportes = None
+    e.aportes_emp = D0
+    e.aportes_empl = D0
+    return e
+
+
+def _calcular_entrada_decimal(e: EntradaCalculo, parametros: ParametrosLegales):
+    """Motor de referencia: IBCs y aportes de un detalle con aritmética Decimal."""
+    d = e.detalle
+    smmlv = parametros.smmlv
+    dias_base = parametros.dias_base
+    ibc_max_global = parametros.ibc_max_global
+
+    # --- A.2: mínimo proporcional por subsistema + tope ---
+    ibc_min_salud = _prorrata(smmlv, e.dias_salud, dias_base) if e.dias_salud > 0 else D0
+    ibc_min_pension = _prorrata(smmlv, e.dias_pension, dias_base) if e.dias_pension > 0 else D0
+    ibc_min_arl = _prorrata(smmlv, e.dias_arl, dias_base) if e.dias_arl > 0 else D0
+
+    e.ibc_salud = D0 if e.ibc_salud_cero else _clamp(e.ibc_subs, ibc_min_salud, ibc_max_global)
+    e.ibc_pension = D0 if e.ibc_pension_cero else _clamp(e.ibc_subs, ibc_min_pension, ibc_max_global)
+    e.ibc_arl = _clamp(e.ibc_subs, ibc_min_arl, ibc_max_global)
+
+    if e.errores:
+        return
+
+    aplica_salud = e.aplica_salud
+    aplica_pension = e.aplica_pension
+    aplica_arl = e.aplica_arl
+    aplica_caja = e.aplica_caja
+    aplica_exoneracion = e.aplica_exoneracion
+
+    # IBC efectivos según flags
+    ibc_salud_calc = e.ibc_salud if aplica_salud else D0
+    ibc_pension_calc = e.ibc_pension if aplica_pension else D0
+    ibc_arl_calc = e.ibc_arl if aplica_arl else D0
+
+    # Salud: cuando IBC > 10 SMLV usar tasas de conceptosfijos (idfijo 8 y 18) = 4% + 8.5% = 12.5%
+    # Los integrales siempre superan 10 SMLV (mínimo ~25 SMLV, IBC ~70% ≈ 17.5 SMLV)
+    ibc_mayor_10_smmlv = ibc_salud_calc > parametros.umbral_exoneracion or e.salario_integral
+    if aplica_salud and not e.tiene_novedad_sln:
+        salud_emp = _calc_pct(ibc_salud_calc, parametros.tasa_salud_emp)
+        if ibc_mayor_10_smmlv:
+            salud_empl = _calc_pct(ibc_salud_calc, parametros.tasa_salud_empl_ibc10)
+        elif aplica_exoneracion:
+            salud_empl = D0
+        else:
+            salud_empl = _calc_pct(ibc_salud_calc, parametros.tasa_salud_empl)
+    else:
+        salud_emp = salud_empl = D0
+
+    pension_emp = _calc_pct(ibc_pension_calc, parametros.tasa_pension_emp) if aplica_pension else D0
+    pension_empl = _calc_pct(ibc_pension_calc, parametros.tasa_pension_empl) if aplica_pension else D0
+
+    # ARL
+    arl_empl = _calc_pct(ibc_arl_calc, e.arl_pct) if e.arl_pct else D0
+
+    # Caja
+    caja_empl = _calc_pct(ibc_salud_calc, parametros.tasa_caja) if (aplica_caja and d.caja_compensacion) else D0
+    if aplica_exoneracion:
+        caja_empl = D0
+
+    # FSP (Fondo Solidaridad Pensional) - solo si aplica pensión
+    # Se calcula sobre el IBC de pensión antes de redondear
+    fsp_solidaridad = D0
+    fsp_subsistencia = D0
+    if aplica_pension and parametros.fsp_porcentajes:
+        fsp_solidaridad, fsp_subsistencia = _calcular_fsp(ibc_pension_calc, parametros)
+
+    # Aplicar redondeo de cotizaciones según Decreto 1990 de 2016
+    # Las cotizaciones se redondean al múltiplo de 100 superior.
+    # Importante: salud y pensión se redondean como TOTAL (campo 47/55),
+    # no cada componente por separado, para evitar Error 191.
+    salud_total = salud_emp + salud_empl
+    pension_total = pension_emp + pension_empl
+    salud_total_redondeado = redondear_cotizacion(salud_total)
+    pension_total_redondeado = redondear_cotizacion(pension_total)
+    arl_empl_redondeado = redondear_cotizacion(arl_empl)
+    caja_empl_redondeado = redondear_cotizacion(caja_empl)
+
+    # Repartir proporcionalmente para aportes empleado/empleador (4% emp, 12% empl)
+    if pension_total > 0:
+        pension_emp_redondeado = _repartir(pension_total_redondeado, *parametros.reparto_pension)
+        pension_empl_redondeado = pension_total_redondeado - pension_emp_redondeado
+    else:
+        pension_emp_redondeado = pension_empl_redondeado = 0
+
+    if salud_total > 0:
+        if salud_empl == 0:
+            salud_emp_redondeado = salud_total_redondeado
+            salud_empl_redondeado = 0
+        else:
+            salud_emp_redondeado = _repartir(salud_total_redondeado, *parametros.reparto_salud)
+            salud_empl_redondeado = salud_total_redondeado - salud_emp_redondeado
+    else:
+        salud_emp_redondeado = salud_empl_redondeado = 0
+
+    e.aportes = {
+        "salud": {
+            "aplica": aplica_salud,
+            "ibc": str(_q2(ibc_salud_calc)),
+            "empleado": str(salud_emp_redondeado),
+            "empleador": str(salud_empl_redondeado),
+            "total": str(salud_total_redondeado),
+            "exonerado_empleador": aplica_exoneracion,
+        },
+        "pension": {
+            "aplica": aplica_pension,
+            "ibc": str(_q2(ibc_pension_calc)),
+            "empleado": str(pension_emp_redondeado),
+            "empleador": str(pension_empl_redondeado),
+            "total": str(pension_total_redondeado),
+            "fsp_solidaridad": str(fsp_solidaridad),
+            "fsp_subsistencia": str(fsp_subsistencia),
+        },
+        "arl": {
+            "aplica": aplica_arl,
+            "ibc": str(_q2(ibc_arl_calc)),
+            "riesgo": str(d.riesgo_arl),
+            "empleador": str(arl_empl_redondeado),
+        },
+        "caja": {
+            "aplica": aplica_caja and bool(d.caja_compensacion),
+            "ibc": str(_q2(ibc_salud_calc)),
+            "empleador": str(caja_empl_redondeado),
+            "exonerado": aplica_exoneracion,
+        },
+    }
+
+    # Usar valores redondeados para los totales
+    e.aportes_emp = Decimal(salud_emp_redondeado + pension_emp_redondeado)
+    e.aportes_empl = Decimal(salud_empl_redondeado + pension_empl_redondeado + arl_empl_redondeado + caja_empl_redondeado)
+
+
+def calcular_entradas_decimal(entradas: list, parametros: ParametrosLegales):
+    for e in entradas:
+        _calcular_entrada_decimal(e, parametros)
+
+
+def version_lineas(planilla) -> str:
+    """
+    Versión de las linea_02 guardadas: reglas de cálculo y versión de los datos del TXT. Al
+    terminar, calcular_planilla la deja en planilla.version_lineas (todas las líneas de la
+    generación ya corresponden al payload vigente); cambiar el payload sin recalcular
+    (activar_payload) incrementa version_archivo y deja de coincidir.
+    """
+    return f"{VERSION_CALCULO}:{planilla.version_archivo}"
+
+
+def _huella_planilla(contexto: PlanillaContexto) -> list:
+    """Entradas de cálculo a nivel de planilla (comunes a todos los detalles)."""
+    return [VERSION_CALCULO, contexto.payload.get("periodo"), contexto.parametros, contexto.empresa_exonerada]
+
+
+def _huella_detalle(d, emp, huella_planilla: list) -> str:
+    """
+    Huella de las entradas de cálculo y del registro 02 de un detalle: días, IBC,
+    tipo/subtipo, riesgo, nombres, novedades, datos del empleado en el payload y
+    parámetros de la planilla. Si no cambia, recalcular el detalle (y renderizar su
+    línea) daría el mismo resultado.
+    """
+    entradas = [
+        huella_planilla,
+        d.tipo_doc, d.numero_doc, d.tipo_cotizante, d.subtipo_cotizante,
+        d.riesgo_arl, d.caja_compensacion,
+        d.primer_nombre, d.primer_apellido,
+        d.dias_cotizados, d.dias_salud, d.dias_pension, d.dias_arl, d.dias_caja,
+        str(d.ibc),
+        [emp.aplica_salud, emp.aplica_pension, emp.aplica_arl, emp.aplica_caja,
+         emp.salario_integral, str(emp.salario_basico)],
+        emp.raw,
+        sorted(
+            [n.id, n.tipo_novedad, n.fecha_inicio, n.fecha_fin, n.dias, n.metadata]
+            for n in d.novedades.all()
+        ),
+    ]
+    texto = json.dumps(entradas, sort_keys=True, default=str)
+    return hashlib.blake2b(texto.encode(), digest_size=16).hexdigest()
+
+
+def _totales_planilla(planilla, generacion: int) -> dict:
+    """
+    Totales de la planilla con un solo SUM en la base sobre las columnas de aportes de los
+    detalles OK de la generación (los CON_ERROR tienen las columnas en 0, pero se excluyen igual).
+    """
+    sumas = (
+        PilaPlanillaDetalle.objects
+        .filter(planilla=planilla, generacion=generacion, estado="OK")
+        .aggregate(**{campo: Sum(campo) for campo in CAMPOS_TOTALES})
+    )
+    salud_emp, salud_empl, pension_emp, pension_empl, arl_empl, caja_empl = (
+        sumas[campo] or 0 for campo in CAMPOS_TOTALES
+    )
+    empleado = salud_emp + pension_emp
+    empleador = salud_empl + pension_empl + arl_empl + caja_empl
+
+    return {
+        "empleado": a_texto(empleado),
+        "empleador": a_texto(empleador),
+        "total": a_texto(empleado + empleador),
+        "subsistemas": {
+            "salud": {
+                "empleado": a_texto(salud_emp),
+                "empleador": a_texto(salud_empl),
+                "total": a_texto(salud_emp + salud_empl),
+            },
+            "pension": {
+                "empleado": a_texto(pension_emp),
+                "empleador": a_texto(pension_empl),
+                "total": a_texto(pension_emp + pension_empl),
+            },
+            "arl": {"empleador": a_texto(arl_empl)},
+            "caja": {"empleador": a_texto(caja_empl)},
+        }
+    }
+
+
+def _linea_02(d, emp, parametros: ParametrosLegales) -> str:
+    """
+    Registro 02 renderizado del detalle, o "" si el payload no permite renderizarlo:
+    generar_txt lo intenta de nuevo al descargar y reporta allí el error.
+    """
+    try:
+        return renderizar_linea_02(d, emp, parametros)
+    except (ValueError, TypeError, ArithmeticError):
+        return ""
+
+
+def _batch_size(batch_size: int | None) -> int:
+    if batch_size:
+        return int(batch_size)
+    return int(getattr(settings, "PILA_CALCULO_BATCH_SIZE", 500) or 500)
+
+
+def _motor(motor: str | None):
+    motor = (motor or getattr(settings, "PILA_MOTOR_CALCULO", "decimal") or "decimal").lower()
+    if motor == "decimal":
+        return calcular_entradas_decimal
+    if motor == "numpy":
+        try:
+            from pila_api.services.motor_numpy import calcular_entradas_numpy
+        except ImportError as e:
+            raise ImproperlyConfigured("El motor de cálculo 'numpy' requiere numpy instalado") from e
+        return calcular_entradas_numpy
+    raise ValueError(f"Motor de cálculo desconocido: {motor} (use {', '.join(MOTORES_CALCULO)})")
+
+
+def calcular_planilla(
+    planilla_id: int,
+    batch_size: int | None = None,
+    motor: str | None = None,
+    full: bool = False,
+    generacion: int | None = None,
+) -> dict:
+    """
+    Calcula aportes de los detalles de la planilla y actualiza sus totales.
+
+    Con generacion calcula los detalles de esa generación (recién ingeridos) con el payload
+    pendiente de la reingesta, y deja generación y payload como vigentes en el mismo UPDATE
+    que los totales: las lecturas pasan de los datos anteriores a los nuevos de una vez.
+
+    Por defecto es incremental: solo recalcula los detalles cuya huella de entradas
+    (ver _huella_detalle) cambió desde el último cálculo. Los totales salen siempre de un
+    SUM en la base sobre las columnas de aportes de todos los detalles (_totales_planilla).
+
+    Args:
+        planilla_id: ID de la planilla
+        batch_size: detalles por UPDATE al persistir resultados.
+            Por defecto settings.PILA_CALCULO_BATCH_SIZE
+        motor: "decimal" (referencia) o "numpy" (vectorizado, mismo resultado).
+            Por defecto settings.PILA_MOTOR_CALCULO
+        full: recalcula todos los detalles
+        generacion: generación a calcular y activar. Por defecto la vigente
+    """
+    batch_size = _batch_size(batch_size)
+    calcular_entradas = _motor(motor)
+
     with transaction.atomic():
-        planilla = PilaPlanilla.objects.select_for_update().get(planilla_id=planilla_id)
+        planilla = cargar_planilla(planilla_id, bloquear=True)
+        activados = []
+        generacion_vigente = planilla.generacion
+        if generacion is None:
+            generacion = planilla.generacion
+        else:
+            # Cambio de puntero: generación y payload se guardan junto con los totales (o el error)
+            activados = activar_payload_pendiente(planilla)
+        planilla.generacion = generacion
 
         # --- Parámetros legales desde payload ---
-        params = (planilla.payload_inicial or {}).get("parametros", {}) or {}
-
-        smmlv = _to_decimal(params.get("smmlv"))
-        tope_smmlv = _to_decimal(params.get("tope_ibc_smmlv", 25))
-        dias_base = _to_decimal(params.get("dias_base", 30))
-        fsp_porcentajes = params.get("fsp_porcentajes", {}) or {}
-        # EPS desde conceptosfijos: idfijo 8 (empleado), idfijo 18 (empresa cuando IBC > 10 SMLV)
-        tasa_salud_emp_param = _to_decimal(params.get("tasa_salud_emp", 0.04))
-        tasa_salud_empl_ibc10_param = _to_decimal(params.get("tasa_salud_empl_ibc_mayor_10", 0.085))
+        # Índice del payload (empleados por documento, flags, parámetros): se construye una vez
+        contexto = PlanillaContexto.desde_planilla(planilla)
+        # Parámetros legales del periodo (compilados y cacheados por periodo + parámetros del payload)
+        parametros = parametros_periodo(planilla.periodo, contexto.parametros)
 
-        if smmlv <= 0:
+        if parametros.smmlv <= 0:
             planilla.estado = "CON_ERRORES"
             planilla.errores = ["Falta parametros.smmlv en payload"]
-            planilla.save(update_fields=["estado", "errores"])
+            planilla.version_lineas = ""
+            planilla.save(update_fields=["estado", "errores", "generacion", "version_lineas", *activados])
             return {"resumen": planilla.resumen, "totales": planilla.totales, "estado": planilla.estado}
 
-        ibc_max_global = _q2(smmlv * tope_smmlv)
+        # Detalles y novedades en 2 consultas (ordenados por id)
+        detalles = list(detalles_planilla(planilla, generacion=generacion))
 
-        detalles = (
-            PilaPlanillaDetalle.objects
-            .filter(planilla=planilla)
-            .prefetch_related("novedades")
-        )
-        
-        # Empresa Flags 
-        empresa_flags = (planilla.payload_inicial or {}).get("empresa", {}).get("flags", {}) or {}
-        empresa_exonerada = bool(empresa_flags.get("empresa_exonerada", False))
-
-        # --- Mapa de flags por empleado (desde payload_inicial) ---
-        payload_inicial = planilla.payload_inicial or {}
-        empleados_payload = payload_inicial.get("empleados", []) or []
-
-        flags_map = {}
-        for e in empleados_payload:
-            tipo_doc = e.get("tipo_doc") or ""
-            numero_doc = e.get("numero_doc") or e.get("num_doc") or ""
-            f = (e.get("flags") or {})
-            flags_map[(tipo_doc, numero_doc)] = {
-                "aplica_salud": bool(f.get("aplica_salud", True)),
-                "aplica_pension": bool(f.get("aplica_pension", True)),
-                "aplica_arl": bool(f.get("aplica_arl", True)),
-                "aplica_caja": bool(f.get("aplica_caja", True)),
-            }
+        empresa_exonerada = contexto.empresa_exonerada
+        huella_planilla = _huella_planilla(contexto)
 
-        warnings = 0
+        # --- Detalles a recalcular: huella distinta a la guardada ---
+        cambiados = []
+        for d in detalles:
+            emp = contexto.empleado(d.tipo_doc, d.numero_doc)
+            if full or not d.huella or d.huella != _huella_detalle(d, emp, huella_planilla):
+                cambiados.append((d, emp))
+
+        entradas = [
+            _preparar_entrada(d, emp, parametros, empresa_exonerada)
+            for d, emp in cambiados
+        ]
+        calcular_entradas(entradas, parametros)
 
-        tot_emp = D0
-        tot_empl = D0
+        warnings = 0
+        actualizados = []
 
-        tot_salud_emp = D0
-        tot_salud_empl = D0
-        tot_pension_emp = D0
-        tot_pension_empl = D0
-        tot_arl_empl = D0
-        tot_caja_empl = D0
+        cambia_txt = bool(activados) or generacion != generacion_vigente
 
-        for d in detalles:
-            errores = []
-
-            dias = int(d.dias_cotizados or 0)
-            ibc_base = _to_decimal(d.ibc)
-
-            # --- reglas mínimas por novedades (ING/RET override días) ---
-            for n in d.novedades.all():
-                cod = (n.tipo_novedad or "").upper()
-                if cod in ("RET", "ING"):
-                    dias_override = (n.metadata or {}).get("dias_cotizados")
-                    if dias_override is not None:
-                        try:
-                            dias = int(dias_override)
-                        except ValueError:
-                            errores.append(f"{cod}: dias_cotizados inválido")
-
-            # --- validaciones mínimas ---
-            if dias < 0 or dias > 30:
-                errores.append("dias_cotizados fuera de rango (0..30)")
-            if ibc_base < 0:
-                errores.append("ibc negativo")
-
-            # IBC base por defecto (si no cotiza días, IBC=0)
-            ibc_subs = D0 if dias == 0 else ibc_base
-
-            # asignación inicial
-            d.dias_cotizados = dias
-            d.ibc_salud = ibc_subs
-            d.ibc_pension = ibc_subs
-            d.ibc_arl = ibc_subs
-
-            # --- A.2: mínimo proporcional por subsistema + tope ---
-            dias_salud = _to_decimal(getattr(d, "dias_salud", dias))
-            dias_pension = _to_decimal(getattr(d, "dias_pension", dias))
-            dias_arl = _to_decimal(getattr(d, "dias_arl", dias))
-
-            ibc_min_salud = _q2(smmlv * dias_salud / dias_base) if dias_salud > 0 else D0
-            ibc_min_pension = _q2(smmlv * dias_pension / dias_base) if dias_pension > 0 else D0
-            ibc_min_arl = _q2(smmlv * dias_arl / dias_base) if dias_arl > 0 else D0
-
-            d.ibc_salud = _clamp(_to_decimal(d.ibc_salud), ibc_min_salud, ibc_max_global)
-            d.ibc_pension = _clamp(_to_decimal(d.ibc_pension), ibc_min_pension, ibc_max_global)
-            d.ibc_arl = _clamp(_to_decimal(d.ibc_arl), ibc_min_arl, ibc_max_global)
-
-            # --- Flags por subsistema ---
-            f = flags_map.get(
-                (d.tipo_doc, d.numero_doc),
-                {"aplica_salud": True, "aplica_pension": True, "aplica_arl": True, "aplica_caja": True},
-            )
-            aplica_salud = f["aplica_salud"]
-            aplica_pension = f["aplica_pension"]
-            aplica_arl = f["aplica_arl"]
-            aplica_caja = f["aplica_caja"]
-            
-            # --- Ajustes según tipo y subtipo de cotizante ---
-            # Si tipo_cotizante == "23": solo ARL (sin pensión, salud ni CCF)
-            if d.tipo_cotizante == "23":
-                aplica_salud = False
-                aplica_pension = False
-                aplica_caja = False
-                # Mantener aplica_arl = True (solo ARL)
-                # Establecer días en 0 para subsistemas que no aplican
-                d.dias_salud = 0
-                d.dias_pension = 0
-                d.dias_caja = 0
-                # Establecer IBCs en 0 para subsistemas que no aplican
-                d.ibc_salud = D0
-                d.ibc_pension = D0
-            
-            # Si subtipo_cotizante == "1": pensionado activo, no liquidación de pensiones AFP
-            if d.subtipo_cotizante == "1":
-                aplica_pension = False
-                d.dias_pension = 0
-                d.ibc_pension = D0
-
-            # Solo no aplica pensión cuando subtipo tiene valor y es distinto de "12". Si está en blanco/0/00 o es "12", sí aplica.
-            subtipo_norm = str(d.subtipo_cotizante or "").strip().zfill(2)
-            if subtipo_norm not in ("00", "12"):
-                aplica_pension = False
-                d.dias_pension = 0
-                d.ibc_pension = D0
-
-            aportes = {}
-            aportes_emp = D0
-            aportes_empl = D0
-
-            # --- Exoneración (empresa_exonerada AND <10 SMMLV AND NO integral) ---
-            emp_payload = next(
-                (
-                    e for e in empleados_payload
-                    if (e.get("tipo_doc") or "") == d.tipo_doc
-                    and (e.get("numero_doc") or e.get("num_doc") or "") == d.numero_doc
-                ),
-                {},
-            )
-
-            emp_flags = (emp_payload.get("flags") or {})
-            salario_integral = bool(emp_flags.get("salario_integral", False))
-
-            # usa el salario_basico del payload (Nomiweb lo manda)
-            salario_basico = _to_decimal(emp_payload.get("salario_basico"))
-
-            smmlv_mayor_10 = salario_basico >= (smmlv * Decimal("10"))
-
-            aplica_exoneracion = (
-                empresa_exonerada
-                and (not salario_integral)
-                and (not smmlv_mayor_10)
-            )
-            
-            if not errores:
-                # IBC efectivos según flags
-                ibc_salud_calc = _to_decimal(d.ibc_salud) if aplica_salud else D0
-                ibc_pension_calc = _to_decimal(d.ibc_pension) if aplica_pension else D0
-                ibc_arl_calc = _to_decimal(d.ibc_arl) if aplica_arl else D0
-
-                # Salud: cuando IBC > 10 SMLV usar tasas de conceptosfijos (idfijo 8 y 18) = 4% + 8.5% = 12.5%
-                # Los integrales siempre superan 10 SMLV (mínimo ~25 SMLV, IBC ~70% ≈ 17.5 SMLV)
-                # Error 362: En líneas SLN (licencia sin pago) tarifa salud 0 → cotización salud 0. Solo SLN (tabla novedades 3 chars).
-                tiene_novedad_sln_susp = any(
-                    (n.tipo_novedad or "").upper() == "SLN"
-                    for n in d.novedades.all()
-                )
-                ibc_mayor_10_smmlv = ibc_salud_calc > (smmlv * Decimal("10")) or salario_integral
-                if aplica_salud and not tiene_novedad_sln_susp:
-                    salud_emp = _calc_pct(ibc_salud_calc, tasa_salud_emp_param)
-                    if ibc_mayor_10_smmlv:
-                        salud_empl = _calc_pct(ibc_salud_calc, tasa_salud_empl_ibc10_param)
-                    elif aplica_exoneracion:
-                        salud_empl = D0
-                    else:
-                        salud_empl = _calc_pct(ibc_salud_calc, TASA_SALUD_EMPL)
-                else:
-                    salud_emp = salud_empl = D0
-
-                pension_emp = _calc_pct(ibc_pension_calc, TASA_PENSION_EMP) if aplica_pension else D0
-                pension_empl = _calc_pct(ibc_pension_calc, TASA_PENSION_EMPL) if aplica_pension else D0
-
-                # ARL
-                # VAC/IGE/LMA/SLN/IRL: mismos días e IBC que salud, pero tarifa 0% (no exposición a riesgos)
-                tiene_novedad_sin_riesgo = any(
-                    (n.tipo_novedad or "").upper() in ("VAC", "IGE", "LMA", "SLN", "IRL")
-                    for n in d.novedades.all()
-                )
-                if aplica_arl and not tiene_novedad_sin_riesgo:
-                    arl_pct = ARL_TASAS.get(str(d.riesgo_arl))
-                    if not arl_pct:
-                        errores.append("riesgo_arl inválido (1..5)")
-                        arl_empl = D0
-                    else:
-                        arl_empl = _calc_pct(ibc_arl_calc, arl_pct)
-                else:
-                    arl_empl = D0
-
-                # Caja
-                caja_empl = _calc_pct(ibc_salud_calc, TASA_CAJA) if (aplica_caja and d.caja_compensacion) else D0
-                if aplica_exoneracion:
-                    caja_empl = D0
-
-                # FSP (Fondo Solidaridad Pensional) - solo si aplica pensión
-                # Se calcula sobre el IBC de pensión antes de redondear
-                fsp_solidaridad = D0
-                fsp_subsistencia = D0
-                if aplica_pension and fsp_porcentajes:
-                    fsp_solidaridad, fsp_subsistencia = _calcular_fsp(
-                        ibc_pension_calc, smmlv, fsp_porcentajes
-                    )
-
-                # Aplicar redondeo de cotizaciones según Decreto 1990 de 2016
-                # Las cotizaciones se redondean al múltiplo de 100 superior.
-                # Importante: salud y pensión se redondean como TOTAL (campo 47/55),
-                # no cada componente por separado, para evitar Error 191.
-                salud_total = salud_emp + salud_empl
-                pension_total = pension_emp + pension_empl
-                salud_total_redondeado = redondear_cotizacion(salud_total)
-                pension_total_redondeado = redondear_cotizacion(pension_total)
-                arl_empl_redondeado = redondear_cotizacion(arl_empl)
-                caja_empl_redondeado = redondear_cotizacion(caja_empl)
-
-                # Repartir proporcionalmente para aportes empleado/empleador (4% emp, 12% empl)
-                if pension_total > 0:
-                    pension_emp_redondeado = int(round(pension_total_redondeado * float(TASA_PENSION_EMP) / float(TASA_PENSION_EMP + TASA_PENSION_EMPL)))
-                    pension_empl_redondeado = pension_total_redondeado - pension_emp_redondeado
-                else:
-                    pension_emp_redondeado = pension_empl_redondeado = 0
-
-                if salud_total > 0:
-                    if salud_empl == 0:
-                        salud_emp_redondeado = salud_total_redondeado
-                        salud_empl_redondeado = 0
-                    else:
-                        salud_emp_redondeado = int(round(salud_total_redondeado * float(TASA_SALUD_EMP) / float(TASA_SALUD_EMP + TASA_SALUD_EMPL)))
-                        salud_empl_redondeado = salud_total_redondeado - salud_emp_redondeado
-                else:
-                    salud_emp_redondeado = salud_empl_redondeado = 0
-
-                aportes = {
-                    "salud": {
-                        "aplica": aplica_salud,
-                        "ibc": str(_q2(ibc_salud_calc)),
-                        "empleado": str(salud_emp_redondeado),
-                        "empleador": str(salud_empl_redondeado),
-                        "total": str(salud_total_redondeado),
-                        "exonerado_empleador": aplica_exoneracion,
-                    },
-                    "pension": {
-                        "aplica": aplica_pension,
-                        "ibc": str(_q2(ibc_pension_calc)),
-                        "empleado": str(pension_emp_redondeado),
-                        "empleador": str(pension_empl_redondeado),
-                        "total": str(pension_total_redondeado),
-                        "fsp_solidaridad": str(fsp_solidaridad),
-                        "fsp_subsistencia": str(fsp_subsistencia),
-                    },
-                    "arl": {
-                        "aplica": aplica_arl,
-                        "ibc": str(_q2(ibc_arl_calc)),
-                        "riesgo": str(d.riesgo_arl),
-                        "empleador": str(arl_empl_redondeado),
-                    },
-                    "caja": {
-                        "aplica": aplica_caja and bool(d.caja_compensacion),
-                        "ibc": str(_q2(ibc_salud_calc)),
-                        "empleador": str(caja_empl_redondeado),
-                        "exonerado": aplica_exoneracion,
-                    },
-                }
-
-                # Usar valores redondeados para los totales
-                aportes_emp = Decimal(salud_emp_redondeado + pension_emp_redondeado)
-                aportes_empl = Decimal(salud_empl_redondeado + pension_empl_redondeado + arl_empl_redondeado + caja_empl_redondeado)
+        for e, (d, emp) in zip(entradas, cambiados):
+            antes = [getattr(d, campo) for campo in CAMPOS_TXT]
+            d.ibc_salud = e.ibc_salud
+            d.ibc_pension = e.ibc_pension
+            d.ibc_arl = e.ibc_arl
 
             # persistencia
-            if errores:
+            if e.errores:
                 d.estado = "CON_ERROR"
-                d.errores = errores
+                d.errores = e.errores
                 d.aportes = {}
                 d.aportes_empleado = D0
                 d.aportes_empleador = D0
             else:
                 d.estado = "OK"
                 d.errores = []
-                d.aportes = aportes
-                d.aportes_empleado = aportes_emp
-                d.aportes_empleador = aportes_empl
-
-                tot_emp += aportes_emp
-                tot_empl += aportes_empl
-
-                tot_salud_emp += Decimal(aportes["salud"]["empleado"])
-                tot_salud_empl += Decimal(aportes["salud"]["empleador"])
-                tot_pension_emp += Decimal(aportes["pension"]["empleado"])
-                tot_pension_empl += Decimal(aportes["pension"]["empleador"])
-                tot_arl_empl += Decimal(aportes["arl"]["empleador"])
-                tot_caja_empl += Decimal(aportes["caja"]["empleador"])
-
-            d.save(update_fields=[
-                "dias_cotizados",
-                "dias_salud", "dias_pension", "dias_arl", "dias_caja",
-                "ibc_salud", "ibc_pension", "ibc_arl",
-                "estado", "errores",
-                "aportes", "aportes_empleado", "aportes_empleador",
-            ])
+                d.aportes = e.aportes
+                d.aportes_empleado = e.aportes_emp
+                d.aportes_empleador = e.aportes_empl
+
+            # Columnas de aportes en centavos (de las que salen los totales)
+            for campo, valor in columnas_aportes(d.aportes, parametros, e.tiene_novedad_sln).items():
+                setattr(d, campo, valor)
+
+            # Huella sobre las entradas ya ajustadas (días por tipo/novedad): es lo que queda guardado
+            d.huella = _huella_detalle(d, emp, huella_planilla)
+            # Registro 02 listo para el TXT: generar_txt solo le pone la secuencia
+            d.linea_02 = _linea_02(d, emp, parametros) if d.estado == "OK" else ""
+            actualizados.append(d)
+            cambia_txt = cambia_txt or antes != [getattr(d, campo) for campo in CAMPOS_TXT]
+
+        # Persistencia por lotes: un UPDATE por cada batch_size detalles (no uno por detalle)
+        PilaPlanillaDetalle.objects.bulk_update(actualizados, CAMPOS_CALCULO, batch_size=batch_size)
 
         # Total empleados = cotizantes ÚNICOS (tipo_doc + numero_doc), no número de líneas (Error 184)
         unique_cotizantes = set((d.tipo_doc, d.numero_doc) for d in detalles)
@@ -445,30 +607,25 @@ def calcular_planilla(planilla_id: int) -> dict:
             "empleados_procesados": empleados_procesados,
             "empleados_con_error": empleados_con_error,
             "warnings": warnings,
+            "detalles": len(detalles),
+            "detalles_recalculados": len(actualizados),
         }
 
-        planilla.totales = {
-            "empleado": str(_q2(tot_emp)),
-            "empleador": str(_q2(tot_empl)),
-            "total": str(_q2(tot_emp + tot_empl)),
-            "subsistemas": {
-                "salud": {
-                    "empleado": str(_q2(tot_salud_emp)),
-                    "empleador": str(_q2(tot_salud_empl)),
-                    "total": str(_q2(tot_salud_emp + tot_salud_empl)),
-                },
-                "pension": {
-                    "empleado": str(_q2(tot_pension_emp)),
-                    "empleador": str(_q2(tot_pension_empl)),
-                    "total": str(_q2(tot_pension_emp + tot_pension_empl)),
-                },
-                "arl": {"empleador": str(_q2(tot_arl_empl))},
-                "caja": {"empleador": str(_q2(tot_caja_empl))},
-            }
-        }
+        # Totales: SUM en la base sobre las columnas de aportes (incluye los detalles no recalculados)
+        totales = _totales_planilla(planilla, generacion)
+        cambia_txt = cambia_txt or totales != planilla.totales
+        planilla.totales = totales
 
         planilla.estado = "COMPLETADA" if empleados_con_error == 0 else "CON_ERRORES"
-        planilla.save(update_fields=["resumen", "totales", "estado"])
+        campos = ["resumen", "totales", "estado", "generacion", "version_lineas", *activados]
+        if cambia_txt:
+            # Nueva versión de los datos del TXT: los archivos guardados (archivos_generados) dejan
+            # de servirse. Un recálculo sin cambios conserva la versión (y el ETag de los clientes)
+            planilla.version_archivo += 1
+            campos.append("version_archivo")
+        # Las linea_02 guardadas valen para esta versión: generar_txt lo revisa una vez por planilla
+        planilla.version_lineas = version_lineas(planilla)
+        planilla.save(update_fields=campos)
 
         return {
             "resumen": planilla.resumen,
@@ -0,0 +1,102 @@
+# pila_api/services/contexto_planilla.py
+
+from decimal import Decimal
+
+from pila_api.services.empleados_lotes import empleados_guardados
+
+
+def clave_empleado(tipo_doc, numero_doc) -> tuple[str, str]:
+    """
+    Clave (tipo_doc, numero_doc) normalizada, igual para payload y PilaPlanillaDetalle.
+    El payload puede traer el documento como num_doc o numero_doc, y como número o texto.
+    """
+    return (str(tipo_doc or "").strip(), str(numero_doc or "").strip())
+
+
+class EmpleadoContexto:
+    """
+    Datos de un empleado del payload_inicial ya normalizados para cálculo y TXT.
+    Un empleado ausente del payload se representa con EmpleadoContexto({}) (valores por defecto).
+    """
+
+    __slots__ = (
+        "raw",
+        "aplica_salud", "aplica_pension", "aplica_arl", "aplica_caja",
+        "salario_integral", "salario_basico",
+        "entidades", "tarifa_arl", "clase_riesgo", "centro_trabajo",
+        "primer_apellido", "segundo_apellido", "primer_nombre", "segundo_nombre",
+        "cod_departamento", "cod_municipio", "actividad_economica_arl",
+        "codigo_sucursal", "nombre_sucursal",
+    )
+
+    def __init__(self, emp: dict):
+        self.raw = emp
+
+        flags = emp.get("flags") or {}
+        self.aplica_salud = bool(flags.get("aplica_salud", True))
+        self.aplica_pension = bool(flags.get("aplica_pension", True))
+        self.aplica_arl = bool(flags.get("aplica_arl", True))
+        self.aplica_caja = bool(flags.get("aplica_caja", True))
+        self.salario_integral = bool(flags.get("salario_integral", False))
+
+        salario = emp.get("salario_basico")
+        self.salario_basico = Decimal(str(salario)) if salario is not None else Decimal("0")
+
+        self.entidades = emp.get("entidades") or {}
+        self.tarifa_arl = (emp.get("tarifas") or {}).get("arl")
+        self.clase_riesgo = emp.get("clase_riesgo")
+        self.centro_trabajo = emp.get("codigo_centro_trabajo", emp.get("centro_trabajo", 0))
+
+        # None = no viene en el payload (el TXT usa entonces el nombre guardado en el detalle)
+        self.primer_apellido = emp.get("primer_apellido")
+        self.segundo_apellido = emp.get("segundo_apellido", "")
+        self.primer_nombre = emp.get("primer_nombre")
+        self.segundo_nombre = emp.get("segundo_nombre", "")
+
+        self.cod_departamento = emp.get("cod_departamento", "")
+        self.cod_municipio = emp.get("cod_municipio", "")
+        self.actividad_economica_arl = emp.get("actividad_economica_arl", "")
+
+        # Sucursal del empleado (archivos por sucursal); None = la de la empresa
+        self.codigo_sucursal = emp.get("codigo_sucursal")
+        self.nombre_sucursal = emp.get("nombre_sucursal")
+
+
+_EMPLEADO_VACIO = EmpleadoContexto({})
+
+
+class PlanillaContexto:
+    """
+    Índice del payload_inicial de una planilla, construido una sola vez y compartido por
+    calcular_planilla y generar_txt_planilla: empleados por (tipo_doc, numero_doc) en O(1).
+
+    empleados: los del payload si es None (si el payload se ingirió por partes, los guardados
+    por lotes: ver desde_planilla)
+    """
+
+    def __init__(self, payload: dict | None, empleados=None):
+        payload = payload or {}
+
+        self.payload = payload
+        self.empresa = payload.get("empresa") or {}
+        self.planilla = payload.get("planilla") or {}
+        self.parametros = payload.get("parametros") or {}
+
+        empresa_flags = self.empresa.get("flags") or {}
+        self.empresa_exonerada = bool(empresa_flags.get("empresa_exonerada", False))
+
+        self.empleados = {}
+        for emp in (payload.get("empleados") or []) if empleados is None else empleados:
+            clave = clave_empleado(emp.get("tipo_doc"), emp.get("numero_doc") or emp.get("num_doc"))
+            self.empleados[clave] = EmpleadoContexto(emp)
+
+    @classmethod
+    def desde_planilla(cls, planilla) -> "PlanillaContexto":
+        payload = planilla.payload_inicial
+        if payload is not None and "empleados" not in payload:
+            # Ingesta por partes: los empleados están en los lotes de la generación vigente
+            return cls(payload, empleados_guardados(planilla.planilla_id, planilla.generacion))
+        return cls(payload)
+
+    def empleado(self, tipo_doc, numero_doc) -> EmpleadoContexto:
+        return self.empleados.get(clave_empleado(tipo_doc, numero_doc), _EMPLEADO_VACIO)
@@ -0,0 +1,36 @@
+# pila_api/services/empleados_lotes.py
+"""
+Empleados del payload guardados por lotes (tabla pila_empleados_lote).
+
+La ingesta por partes (?stream=1) no arma la lista payload["empleados"]: cada lote de
+empleados tal como llegaron se inserta en una fila apenas se completa, con la generación de
+los detalles que se ingieren con ellos, y payload_inicial guarda el resto del payload. Así
+la memoria de la ingesta queda acotada por el lote y no por el número de empleados.
+
+Las lecturas (PlanillaContexto, GET .../payload/) usan payload_inicial["empleados"] si
+existe (flujo normal) y si no los lotes de la generación vigente. Los lotes de generaciones
+anteriores se borran con recolectar_generaciones, igual que sus detalles.
+"""
+
+from pila_api.models import PilaEmpleadosLote
+
+
+def guardar_lote(planilla, generacion: int, lote: int, empleados: list) -> None:
+    PilaEmpleadosLote.objects.create(planilla=planilla, generacion=generacion, lote=lote, empleados=empleados)
+
+
+def borrar_lotes(planilla, generacion: int) -> None:
+    """Borra los lotes de esa generación (se reemplazan al guardar un payload sin reingesta)."""
+    PilaEmpleadosLote.objects.filter(planilla=planilla, generacion=generacion).delete()
+
+
+def empleados_guardados(planilla_id: int, generacion: int):
+    """Empleados de la generación, en el orden en que llegaron, leyendo un lote a la vez."""
+    ids = (
+        PilaEmpleadosLote.objects
+        .filter(planilla_id=planilla_id, generacion=generacion)
+        .order_by("lote")
+        .values_list("id", flat=True)
+    )
+    for lote_id in list(ids):
+        yield from PilaEmpleadosLote.objects.values_list("empleados", flat=True).get(id=lote_id)
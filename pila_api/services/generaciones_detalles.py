@@ -0,0 +1,110 @@
+# pila_api/services/generaciones_detalles.py
+"""
+Generaciones de los detalles de una planilla (reingesta sin cortar las lecturas).
+
+Antes, reingerir (force=1, o un payload nuevo) borraba todos los detalles y novedades de la
+planilla y los recreaba en una transacción: listar_detalles y descargar_archivo quedaban
+esperando los locks de los DELETE o veían la planilla vacía o a medio calcular.
+
+Ahora cada ingesta escribe sus detalles con una generación nueva (nueva_generacion), al
+lado de los de la generación vigente, que no se tocan:
+
+1. registrar_planilla deja el payload recibido en planilla.payload_pendiente; payload_inicial,
+   estado, totales y detalles siguen siendo los de la generación vigente G
+2. ingestar_detalles inserta la generación G+1 (planilla.generacion sigue en G)
+3. calcular_planilla(generacion=G+1) la calcula y, en el mismo UPDATE en que guarda
+   totales y resumen, cambia planilla.generacion a G+1 y pasa payload_pendiente a
+   payload_inicial (activar_payload_pendiente): el cambio de puntero
+4. recolectar_generaciones borra después, por lotes acotados y en transacciones cortas,
+   los detalles (y novedades) de las generaciones anteriores a la vigente, y los empleados
+   guardados por lotes de esas generaciones (ingesta por partes, ver empleados_lotes)
+
+Las lecturas (snapshot_planilla.detalles_planilla, listado_detalles, PlanillaContexto)
+filtran por planilla.generacion y leen payload_inicial: ven la generación anterior completa
+con su payload y totales o la nueva completa, nunca una mezcla. Una lectura ya en curso sobre G (lectura_consistente) la sigue
+viendo aunque se recolecte mientras tanto.
+
+Solo se recolectan generaciones menores a la vigente: una ingesta en curso (o una que falló
+antes del cambio de puntero) tiene generación mayor y no se toca hasta que otra la supere.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from pila_api.models import PilaEmpleadosLote, PilaNovedad, PilaPlanilla, PilaPlanillaDetalle
+
+
+def _batch_size(batch_size: int | None) -> int:
+    if batch_size:
+        return int(batch_size)
+    return int(getattr(settings, "PILA_RECOLECCION_BATCH_SIZE", 1000) or 1000)
+
+
+def nueva_generacion(planilla) -> int:
+    """
+    Generación para una nueva ingesta de la planilla: mayor que la vigente y que cualquier
+    generación que haya quedado sin activar (ingesta que falló antes de calcular).
+    """
+    ultima = PilaPlanillaDetalle.objects.filter(planilla=planilla).aggregate(ultima=Max("generacion"))["ultima"]
+    return max(ultima or 0, planilla.generacion) + 1
+
+
+def activar_payload_pendiente(planilla) -> list[str]:
+    """
+    Pasa planilla.payload_pendiente a payload_inicial (en memoria, sin guardar) y limpia los
+    errores y el hash del payload anterior. Se guarda con los campos devueltos, en el mismo
+    UPDATE que el cambio de generación.
+
+    Returns:
+        Campos modificados ([] si no había payload pendiente)
+    """
+    if planilla.payload_pendiente is None:
+        return []
+    planilla.payload_inicial = planilla.payload_pendiente
+    planilla.payload_pendiente = None
+    planilla.errores = []
+    planilla.hash_payload = ""  # se marca al terminar de procesar (idempotencia)
+    return ["payload_inicial", "payload_pendiente", "errores", "hash_payload"]
+
+
+def recolectar_generaciones(
+    planilla_id: int | None = None,
+    batch_size: int | None = None,
+    max_lotes: int | None = None,
+) -> int:
+    """
+    Borra los detalles y novedades de generaciones anteriores a la vigente, de a batch_size
+    detalles por transacción (locks cortos, sin frenar a las lecturas ni a las ingestas), y
+    al terminar con cada planilla sus lotes de empleados de esas generaciones.
+
+    Args:
+        planilla_id: solo esa planilla. Por defecto todas
+        batch_size: detalles por lote. Por defecto settings.PILA_RECOLECCION_BATCH_SIZE
+        max_lotes: máximo de lotes a borrar (None = hasta terminar)
+
+    Returns:
+        Número de detalles borrados
+    """
+    batch_size = _batch_size(batch_size)
+    planillas = PilaPlanilla.objects.filter(generacion__gt=0)
+    if planilla_id is not None:
+        planillas = planillas.filter(planilla_id=planilla_id)
+
+    borrados = 0
+    lotes = 0
+    for pid, generacion in list(planillas.order_by("planilla_id").values_list("planilla_id", "generacion")):
+        viejos = PilaPlanillaDetalle.objects.filter(planilla_id=pid, generacion__lt=generacion)
+        while True:
+            if max_lotes is not None and lotes >= max_lotes:
+                return borrados
+            ids = list(viejos.order_by("id").values_list("id", flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                PilaNovedad.objects.filter(detalle_id__in=ids).delete()
+                PilaPlanillaDetalle.objects.filter(id__in=ids).delete()
+            borrados += len(ids)
+            lotes += 1
+        PilaEmpleadosLote.objects.filter(planilla_id=pid, generacion__lt=generacion).delete()
+    return borrados
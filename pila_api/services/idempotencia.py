@@ -0,0 +1,167 @@
+# pila_api/services/idempotencia.py
+"""
+Reintentos idempotentes de crear_planilla.
+
+Nomiweb reintenta el POST con el mismo cuerpo cuando hay timeout. Sin esto cada
+reintento reescribe payload_inicial y, con force=1, borra y recrea detalles y novedades y
+recalcula. Dos mecanismos:
+
+- Hash del payload: cada planilla guarda en hash_payload el SHA-256 canónico (JSON con
+  claves ordenadas y sin espacios) del último payload procesado con éxito. Un POST con el
+  mismo numero_interno y el mismo hash responde la planilla guardada sin tocarla (aunque
+  traiga force=1; para recalcular con el mismo payload está POST .../calcular/).
+- Idempotency-Key: la respuesta (status y cuerpo) se guarda por clave y un reintento con la
+  misma clave la recibe tal cual. La misma clave con otro payload responde 422. Las claves
+  vencen tras PILA_IDEMPOTENCIA_TTL segundos.
+"""
+
+import hashlib
+import json
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from pila_api.models import PilaIdempotencia, PilaPlanilla
+
+MAX_CLAVE = 255
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "PILA_IDEMPOTENCIA_TTL", 86400) or 0)
+
+
+def _json_canonico(valor) -> str:
+    return json.dumps(valor, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _partes_canonicas(valor, niveles: int = 2):
+    """
+    El JSON canónico de valor por partes: los dicts y listas de los primeros niveles (el
+    payload y su lista de empleados) se recorren elemento a elemento y cada elemento se
+    codifica con json.dumps. Concatenadas dan exactamente _json_canonico(valor).
+    """
+    if niveles and isinstance(valor, dict):
+        yield "{"
+        for i, clave in enumerate(sorted(valor)):
+            yield f"{',' if i else ''}{_json_canonico(clave)}:"
+            yield from _partes_canonicas(valor[clave], niveles - 1)
+        yield "}"
+    elif niveles and isinstance(valor, list):
+        yield "["
+        for i, elemento in enumerate(valor):
+            if i:
+                yield ","
+            yield from _partes_canonicas(elemento, niveles - 1)
+        yield "]"
+    else:
+        yield _json_canonico(valor)
+
+
+def hash_payload(payload) -> str:
+    """
+    SHA-256 canónico: mismo hash sin importar orden de claves ni espacios del JSON. El texto
+    canónico se pasa al hash por partes (un empleado a la vez), sin armarlo completo.
+    """
+    sha = hashlib.sha256()
+    for parte in _partes_canonicas(payload):
+        sha.update(parte.encode("utf-8"))
+    return sha.hexdigest()
+
+
+class HashPayloadPorPartes:
+    """
+    hash_payload de un payload cuyos empleados se reciben de a uno (ingesta por partes),
+    sin conservarlos: agregar_empleado los codifica apenas llegan y hexdigest recibe el resto
+    del payload al final. El texto canónico de los empleados se acumula en un archivo
+    temporal (en memoria hasta _SPOOL_MAX bytes, después en disco): en el JSON canónico
+    "empleados" va en el lugar de su clave ordenada y las demás claves pueden llegar después.
+    """
+
+    _SPOOL_MAX = 1024 * 1024
+
+    def __init__(self):
+        self._empleados = tempfile.SpooledTemporaryFile(max_size=self._SPOOL_MAX)
+        self._n = 0
+
+    def agregar_empleado(self, empleado) -> None:
+        if self._n:
+            self._empleados.write(b",")
+        self._empleados.write(_json_canonico(empleado).encode("utf-8"))
+        self._n += 1
+
+    def hexdigest(self, payload: dict) -> str:
+        """Hash de payload (sin "empleados") con los empleados agregados como su lista."""
+        sha = hashlib.sha256()
+        sha.update(b"{")
+        for i, clave in enumerate(sorted({*payload, "empleados"})):
+            sha.update(f"{',' if i else ''}{_json_canonico(clave)}:".encode("utf-8"))
+            if clave != "empleados":
+                sha.update(_json_canonico(payload[clave]).encode("utf-8"))
+                continue
+            sha.update(b"[")
+            self._empleados.seek(0)
+            for bloque in iter(lambda: self._empleados.read(64 * 1024), b""):
+                sha.update(bloque)
+            sha.update(b"]")
+        sha.update(b"}")
+        self._empleados.close()
+        return sha.hexdigest()
+
+
+def numero_interno_payload(payload) -> str | None:
+    """planilla.numero_interno del payload sin validar, o None si falta o no es texto."""
+    planilla = payload.get("planilla") if isinstance(payload, dict) else None
+    numero_interno = planilla.get("numero_interno") if isinstance(planilla, dict) else None
+    if not isinstance(numero_interno, str) or not numero_interno:
+        return None
+    return numero_interno
+
+
+def planilla_procesada(payload, huella: str) -> PilaPlanilla | None:
+    """Planilla del numero_interno del payload ya procesada con este mismo payload, o None."""
+    numero_interno = numero_interno_payload(payload)
+    if numero_interno is None:
+        return None
+    return (
+        PilaPlanilla.objects
+        .filter(numero_interno=numero_interno, hash_payload=huella)
+        .exclude(estado__in=("PENDIENTE", "EN_PROCESO"))
+        .first()
+    )
+
+
+def marcar_procesada(planilla_id: int, huella: str) -> None:
+    PilaPlanilla.objects.filter(planilla_id=planilla_id).update(hash_payload=huella)
+
+
+def respuesta_guardada(clave: str) -> PilaIdempotencia | None:
+    """Respuesta guardada para la clave, si no venció."""
+    qs = PilaIdempotencia.objects.filter(clave=clave)
+    ttl = _ttl()
+    if ttl:
+        qs = qs.filter(fecha_creacion__gte=timezone.now() - timedelta(seconds=ttl))
+    return qs.first()
+
+
+def guardar_respuesta(clave: str, huella: str, planilla: PilaPlanilla, status: int, respuesta: dict) -> None:
+    """
+    Guarda la respuesta de la clave (reemplaza una vencida) y borra las claves vencidas.
+    Si otra petición con la misma clave la guardó primero, se conserva esa.
+    """
+    ttl = _ttl()
+    if ttl:
+        PilaIdempotencia.objects.filter(fecha_creacion__lt=timezone.now() - timedelta(seconds=ttl)).delete()
+    try:
+        with transaction.atomic():
+            PilaIdempotencia.objects.create(
+                clave=clave,
+                hash_payload=huella,
+                planilla=planilla,
+                status=status,
+                respuesta=respuesta,
+            )
+    except IntegrityError:
+        pass
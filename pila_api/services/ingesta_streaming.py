@@ -0,0 +1,203 @@
+# pila_api/services/ingesta_streaming.py
+"""
+Ingesta de crear_planilla leyendo el cuerpo de la petición por partes (?stream=1).
+
+En el flujo normal DRF decodifica el cuerpo completo (request.data) y
+PayloadPlanillaSerializer arma otra copia validada de todos los empleados, además de las
+filas de todos los detalles. Aquí el JSON se recorre con leer_objeto: cada empleado se
+valida con EmpleadoSerializer (con el backend de PILA_VALIDADOR) apenas se lee y se
+entrega a ingestar_detalles, que inserta de a PILA_INGESTA_BATCH_SIZE empleados.
+
+Los empleados tal como llegaron tampoco se acumulan: se guardan de a un lote en
+pila_empleados_lote (ver empleados_lotes) con la generación que se ingiere, y
+payload_inicial queda sin la lista "empleados". El hash del payload (idempotencia) se
+calcula a medida que se leen (HashPayloadPorPartes). Así la memoria de la ingesta queda
+acotada por el lote: lo validado, las filas y los empleados crudos solo existen para el
+lote en curso.
+
+Los empleados que llegan antes que empresa, periodo y planilla se retienen hasta
+completar el encabezado: conviene enviar "empleados" como última clave del payload.
+
+Todo corre en una transacción: un empleado inválido (o JSON mal formado) a mitad del
+cuerpo deshace lo insertado y responde 400, sin dejar la planilla a medio ingerir.
+
+Apenas se conoce el numero_interno (encabezado validado) se toma bloqueo_planilla y se
+mantiene hasta terminar el cálculo y marcar el hash del payload: otra petición de la
+misma planilla espera a que esta termine.
+"""
+
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+
+from pila_api.serializers import EmpleadoSerializer, EncabezadoPayloadSerializer
+from pila_api.services.bloqueo_planilla import bloqueo_planilla
+from pila_api.services.calcular_planilla import calcular_planilla
+from pila_api.services.generaciones_detalles import nueva_generacion
+from pila_api.services.empleados_lotes import borrar_lotes, guardar_lote
+from pila_api.services.idempotencia import HashPayloadPorPartes, marcar_procesada
+from pila_api.services.ingestar_planilla import ingestar_detalles
+from pila_api.services.procesar_planilla import activar_payload, registrar_planilla, requiere_ingesta
+from pila_api.utils.json_streaming import leer_objeto
+from pila_api.validacion import validar
+
+_CLAVES_ENCABEZADO = {"empresa", "periodo", "planilla"}
+
+# Campos de la planilla que escribe calcular_planilla (salvo los payloads)
+_CAMPOS_CALCULO = ["estado", "errores", "totales", "resumen", "version_archivo", "version_lineas", "generacion", "hash_payload"]
+
+
+def _eventos(flujo):
+    """leer_objeto con los errores de JSON como 400 (ParseError)."""
+    try:
+        yield from leer_objeto(flujo, "empleados")
+    except ValueError as e:
+        raise ParseError(str(e))
+
+
+def _validar_encabezado(payload: dict) -> dict:
+    encabezado = {clave: valor for clave, valor in payload.items() if clave != "empleados"}
+    return validar(EncabezadoPayloadSerializer, encabezado)
+
+
+class _EmpleadosRecibidos:
+    """
+    Empleados crudos del cuerpo: entran al hash del payload y se guardan de a batch_size en
+    pila_empleados_lote con la generación de la planilla que se está ingiriendo.
+    """
+
+    def __init__(self, planilla, generacion: int, batch_size: int, huella: HashPayloadPorPartes):
+        self.planilla = planilla
+        self.generacion = generacion
+        self.batch_size = batch_size
+        self.huella = huella
+        self.total = 0
+        self._lote = []
+        self._lotes = 0
+
+    def agregar(self, emp: dict) -> None:
+        self.huella.agregar_empleado(emp)
+        self._lote.append(emp)
+        self.total += 1
+        if len(self._lote) >= self.batch_size:
+            self.terminar()
+
+    def terminar(self) -> None:
+        """Guarda el lote en curso (si tiene empleados)."""
+        if self._lote:
+            guardar_lote(self.planilla, self.generacion, self._lotes, self._lote)
+            self._lotes += 1
+            self._lote = []
+
+
+def _empleados_validados(eventos, payload: dict, pendientes: list, recibidos: _EmpleadosRecibidos):
+    """
+    Empleados validados, en orden: primero los retenidos antes del encabezado y luego los
+    que siguen en el flujo. Cada empleado crudo pasa a recibidos; las claves que aparecen
+    después de la lista (ej. meta) se agregan a payload.
+    """
+
+    def validar_empleado(emp):
+        indice = recibidos.total
+        recibidos.agregar(emp)
+        try:
+            return validar(EmpleadoSerializer, emp)
+        except serializers.ValidationError as e:
+            raise serializers.ValidationError({"empleados": {str(indice): e.detail}})
+
+    for emp in pendientes:
+        yield validar_empleado(emp)
+    pendientes.clear()
+
+    for clave, valor in eventos:
+        if clave == "empleados":
+            yield validar_empleado(valor)
+        else:
+            payload[clave] = valor
+    recibidos.terminar()
+
+
+def procesar_payload_streaming(flujo, force: bool = False, batch_size: int | None = None):
+    """
+    Crea o reutiliza la planilla del payload JSON leído de flujo, ingiere sus empleados por
+    lotes a medida que se leen y la calcula (mismo resultado que crear_planilla síncrono).
+
+    Args:
+        flujo: cuerpo de la petición (objeto con read(n))
+        force: reingesta detalles/novedades aunque ya existan
+        batch_size: empleados por lote. Por defecto settings.PILA_INGESTA_BATCH_SIZE
+
+    Returns:
+        (planilla, created); planilla.hash_payload ya marcado con el payload leído
+
+    Raises:
+        ParseError: Si el cuerpo no es un objeto JSON válido
+        ValidationError: Si el encabezado o algún empleado no pasa la validación, o no
+            hay empleados
+    """
+    if flujo is None:
+        raise ParseError("Cuerpo vacío")
+
+    eventos = _eventos(flujo)
+    payload = {}
+    pendientes = []
+    huella = HashPayloadPorPartes()
+    batch_size = int(batch_size or getattr(settings, "PILA_INGESTA_BATCH_SIZE", 1000) or 1000)
+
+    with ExitStack() as bloqueo:
+        with transaction.atomic():
+            # Encabezado: lo necesario para crear la planilla antes de ingerir
+            for clave, valor in eventos:
+                if clave == "empleados":
+                    pendientes.append(valor)
+                else:
+                    payload[clave] = valor
+                if _CLAVES_ENCABEZADO <= payload.keys():
+                    break
+
+            encabezado = _validar_encabezado(payload)
+            # Se libera al salir del ExitStack: después de confirmar, calcular y marcar el hash
+            bloqueo.enter_context(bloqueo_planilla(encabezado["planilla"]["numero_interno"]))
+            obj, created = registrar_planilla(encabezado, payload)
+            ingestar = requiere_ingesta(obj, force, created)
+
+            if ingestar:
+                generacion = nueva_generacion(obj)
+            else:
+                # Sin reingesta los empleados reemplazan a los de la generación vigente: el
+                # cambio se ve al confirmar, junto con el payload (activar_payload)
+                generacion = obj.generacion
+                borrar_lotes(obj, generacion)
+            recibidos = _EmpleadosRecibidos(obj, generacion, batch_size, huella)
+
+            empleados = _empleados_validados(eventos, payload, pendientes, recibidos)
+            if ingestar:
+                riesgo_arl_default = str(encabezado["empresa"].get("clase_riesgo_arl", "1"))
+                ingestar_detalles(obj, empleados, riesgo_arl_default, batch_size, generacion=generacion)
+            else:
+                # Sin reingesta igual se valida y se guarda el cuerpo completo
+                for _ in empleados:
+                    pass
+
+            if not recibidos.total:
+                raise serializers.ValidationError("empleados no puede estar vacío")
+
+            # Claves posteriores a empleados (ej. meta) y payload sin la lista de empleados
+            # (en la planilla nueva o como pendiente de la reingesta, ver registrar_planilla)
+            _validar_encabezado(payload)
+            obj.save(update_fields=["payload_inicial" if created else "payload_pendiente"])
+            if not ingestar:
+                activar_payload(obj)
+
+        if ingestar:
+            calcular_planilla(obj.planilla_id, generacion=generacion)
+            # Sin volver a leer el payload de la base: el activado es el que se acaba de leer
+            obj.refresh_from_db(fields=_CAMPOS_CALCULO)
+            obj.payload_inicial, obj.payload_pendiente = payload, None
+
+        obj.hash_payload = huella.hexdigest(payload)
+        marcar_procesada(obj.planilla_id, obj.hash_payload)
+    return obj, created
@@ -0,0 +1,268 @@
+# pila_api/services/ingestar_planilla.py
+
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import transaction, DataError
+from django.db.models import CharField
+from pila_api.models import PilaPlanillaDetalle, PilaNovedad
+from pila_api.utils.centavos import a_centavos, a_decimal
+
+
+def _to_date(value):
+    if value is None:
+        return None
+    if isinstance(value, date):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    raise TypeError(f"Tipo de fecha no soportado: {type(value)}")
+
+
+def json_safe(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: json_safe(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [json_safe(v) for v in value]
+    return value
+
+
+def _batch_size(batch_size: int | None) -> int:
+    if batch_size:
+        return int(batch_size)
+    return int(getattr(settings, "PILA_INGESTA_BATCH_SIZE", 1000) or 1000)
+
+
+def construir_filas(planilla, empleados, riesgo_arl_default: str):
+    """
+    Construye en memoria los detalles (uno por registro / línea tipo 02) y sus novedades.
+
+    Returns:
+        Lista de tuplas (detalle, novedades) donde detalle es un PilaPlanillaDetalle sin
+        guardar y novedades una lista de PilaNovedad sin guardar (sin detalle asignado).
+    """
+    filas = []
+
+    for emp in empleados:
+        tipo_doc = emp.get("tipo_doc", "")
+        numero_doc = emp.get("numero_doc") or emp.get("num_doc") or ""
+
+        # Clase de riesgo (campo 78, pos 513): por empleado desde payload, según tarifa ARL
+        riesgo_arl = str(emp.get("clase_riesgo") or riesgo_arl_default).strip() or riesgo_arl_default
+        if riesgo_arl not in ("1", "2", "3", "4", "5"):
+            riesgo_arl = riesgo_arl_default
+
+        # Extraer datos comunes del empleado
+        nombre = (emp.get("nombre_completo") or "").strip()
+        partes = [p for p in nombre.split() if p]
+        primer_apellido = partes[0] if len(partes) >= 1 else ""
+        primer_nombre = partes[1] if len(partes) >= 2 else ""
+
+        tipo_cotizante = emp.get("tipo_cotizante", "")
+        subtipo_cotizante = emp.get("subtipo_cotizante", "00")
+        entidades = emp.get("entidades") or {}
+        caja_compensacion = bool(entidades.get("caja"))
+
+        registros = emp.get("registros") or []
+
+        # Si no hay registros (formato antiguo), crear uno con datos del empleado
+        if not registros:
+            registros = [{
+                "tipo_linea": "NORMAL",
+                "dias": emp.get("dias") or {},
+                "ibc": emp.get("ibc") or {},
+                "novedades": emp.get("novedades") or []
+            }]
+
+        # Un detalle por cada registro (línea tipo 02)
+        for registro in registros:
+            dias = registro.get("dias") or {}
+            dias_salud = int(dias.get("salud", 0) or 0)
+            dias_pension = int(dias.get("pension", 0) or 0)
+            dias_arl = int(dias.get("arl", 0) or 0)
+            dias_caja = int(dias.get("caja", 0) or 0)
+
+            ibc = registro.get("ibc") or {}
+            # Montos normalizados a centavos exactos (Decimal con 2 decimales)
+            ibc_salud = a_decimal(a_centavos(ibc.get("salud")))
+            ibc_pension = a_decimal(a_centavos(ibc.get("pension")))
+            ibc_arl = a_decimal(a_centavos(ibc.get("arl")))
+
+            detalle = PilaPlanillaDetalle(
+                planilla=planilla,
+                tipo_doc=tipo_doc,
+                numero_doc=numero_doc,
+                primer_nombre=primer_nombre,
+                primer_apellido=primer_apellido,
+                tipo_cotizante=tipo_cotizante,
+                subtipo_cotizante=subtipo_cotizante,
+
+                # mantenemos dias_cotizados como "principal" usando salud
+                dias_cotizados=dias_salud,
+                dias_salud=dias_salud,
+                dias_pension=dias_pension,
+                dias_arl=dias_arl,
+                dias_caja=dias_caja,
+
+                ibc=ibc_salud,
+                ibc_salud=ibc_salud,
+                ibc_pension=ibc_pension,
+                ibc_arl=ibc_arl,
+                riesgo_arl=riesgo_arl,
+                caja_compensacion=caja_compensacion,
+                estado="OK",
+                errores=[],
+            )
+
+            novedades = []
+            for nov in (registro.get("novedades") or []):
+                if not isinstance(nov, dict):
+                    continue
+                codigo = (nov.get("codigo") or "").upper()
+                if not codigo:
+                    continue
+
+                fi = _to_date(nov.get("fecha_desde"))
+                ff = _to_date(nov.get("fecha_hasta"))
+
+                if not fi:
+                    continue
+
+                novedad = PilaNovedad(
+                    tipo_novedad=codigo,
+                    fecha_inicio=fi,
+                    fecha_fin=ff,
+                    dias=nov.get("dias"),
+                    valor=nov.get("valor"),
+                    metadata=json_safe(nov),
+                )
+                _validar_longitudes(planilla, detalle, novedad)
+                novedades.append(novedad)
+
+            filas.append((detalle, novedades))
+
+    return filas
+
+
+# Columnas de texto de PilaNovedad con su longitud máxima
+_LONGITUDES_NOVEDAD = [
+    (campo.attname, campo.max_length)
+    for campo in PilaNovedad._meta.concrete_fields
+    if isinstance(campo, CharField) and campo.max_length
+]
+
+
+def _validar_longitudes(planilla, detalle, novedad: PilaNovedad) -> None:
+    """
+    Rechaza la novedad si un texto excede la longitud de su columna. Se valida antes del
+    INSERT porque en PostgreSQL bulk_create envía las filas como UNNEST(%s::varchar(n)[]) y
+    ese cast recorta el texto en silencio en vez de fallar con DataError.
+
+    Raises:
+        ValueError: Con la planilla, el empleado y el código de la novedad
+    """
+    for attname, max_length in _LONGITUDES_NOVEDAD:
+        valor = getattr(novedad, attname)
+        if isinstance(valor, str) and len(valor) > max_length:
+            raise _error_novedad(
+                planilla, novedad, f"{attname} excede {max_length} caracteres", detalle=detalle,
+            )
+
+
+def _error_novedad(planilla, novedad: PilaNovedad, error, detalle=None) -> ValueError:
+    # Enriquecer mensaje para ubicar fácilmente el problema de longitud
+    detalle = detalle or novedad.detalle
+    return ValueError(
+        f"Error al guardar novedad PILA "
+        f"(planilla={planilla.numero_interno}, tipo_doc={detalle.tipo_doc}, "
+        f"numero_doc={detalle.numero_doc}, codigo_novedad={novedad.tipo_novedad}): {error}"
+    )
+
+
+def _insertar_novedades(planilla, novedades: list, batch_size: int):
+    for i in range(0, len(novedades), batch_size):
+        lote = novedades[i:i + batch_size]
+        try:
+            with transaction.atomic():
+                PilaNovedad.objects.bulk_create(lote)
+        except DataError:
+            # Segunda línea de defensa (las longitudes ya se validan en construir_filas): el
+            # INSERT por lotes no dice qué fila falló, se reintenta fila a fila (cada una en su
+            # savepoint) para reportar la novedad. Si todas entran una a una, el lote queda
+            # insertado y se sigue con el siguiente.
+            for novedad in lote:
+                try:
+                    with transaction.atomic():
+                        novedad.save(force_insert=True)
+                except DataError as e:
+                    raise _error_novedad(planilla, novedad, e)
+
+
+def _lotes(iterable, tamano: int):
+    lote = []
+    for elemento in iterable:
+        lote.append(elemento)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def ingestar_detalles(
+    planilla,
+    empleados,
+    riesgo_arl_default: str,
+    batch_size: int | None = None,
+    *,
+    generacion: int,
+) -> int:
+    """
+    Inserta los detalles y novedades del payload como la generación generacion de la
+    planilla, usando INSERTs por lotes (bulk_create) en lugar de uno por fila.
+
+    No borra ni modifica los detalles de la generación vigente: las lecturas los siguen
+    viendo hasta que calcular_planilla(generacion=...) active la nueva, y después
+    generaciones_detalles.recolectar_generaciones los borra.
+
+    empleados puede ser cualquier iterable (ej. un generador que los lee del cuerpo de la
+    petición): se consume de a batch_size empleados y cada lote se inserta antes de leer
+    el siguiente, así que en memoria solo quedan las filas de un lote.
+
+    Debe llamarse dentro de una transacción.
+
+    Args:
+        planilla: PilaPlanilla destino
+        empleados: empleados validados (validated_data del payload)
+        riesgo_arl_default: clase de riesgo por defecto de la empresa
+        batch_size: empleados por lote y filas por INSERT. Por defecto settings.PILA_INGESTA_BATCH_SIZE
+        generacion: generación de los detalles creados (generaciones_detalles.nueva_generacion)
+
+    Returns:
+        Número de detalles creados
+    """
+    batch_size = _batch_size(batch_size)
+
+    total = 0
+    for lote in _lotes(empleados, batch_size):
+        filas = construir_filas(planilla, lote, riesgo_arl_default)
+
+        detalles = [detalle for detalle, _ in filas]
+        for detalle in detalles:
+            detalle.generacion = generacion
+        PilaPlanillaDetalle.objects.bulk_create(detalles, batch_size=batch_size)
+
+        novedades = []
+        for detalle, novedades_detalle in filas:
+            for novedad in novedades_detalle:
+                novedad.detalle = detalle
+                novedades.append(novedad)
+
+        _insertar_novedades(planilla, novedades, batch_size)
+        total += len(detalles)
+
+    return total
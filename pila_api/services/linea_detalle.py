@@ -0,0 +1,375 @@
+# pila_api/services/linea_detalle.py
+"""
+Registro 02 (línea de detalle del TXT PILA) de un detalle ya calculado.
+
+calcular_planilla renderiza la línea al calcular cada detalle y la guarda en
+PilaPlanillaDetalle.linea_02 (con secuencia provisional); generar_txt solo le pone la
+secuencia real. Si la línea guardada no está vigente (huella distinta), generar_txt la
+vuelve a renderizar con estas mismas funciones.
+"""
+
+from decimal import Decimal
+
+from pila_api.renderers.fixed_width.registro_02 import Registro02Renderer
+from pila_api.utils.centavos import a_centavos, cotizacion, pesos_enteros
+
+# Secuencia (posiciones 3-7) de las líneas guardadas; generar_txt pone la real
+SECUENCIA_PROVISIONAL = "00000"
+_INICIO_SECUENCIA, _FIN_SECUENCIA = 2, 7
+
+_RENDERER_02 = Registro02Renderer()
+
+
+def _format_tarifa_arl(tarifa):
+    """
+    Formatea la tarifa ARL para el campo 61 (381-389).
+    
+    La tarifa viene del payload desde centrotrabajo.tarifaarl en formato porcentaje.
+    Ejemplos: "0.522" (0.522%), "4.350" (4.350%), "6.960" (6.960%)
+    Debe convertirse a formato decimal PILA dividiendo por 100.
+    
+    Formato PILA: 9 caracteres (decimal con 7 decimales)
+    Ejemplo: 0.522 (porcentaje) -> 0.00522 -> "0.0052200" (9 chars)
+    Ejemplo: 4.350 (porcentaje) -> 0.04350 -> "0.0435000" (9 chars)
+    Ejemplo: 6.960 (porcentaje) -> 0.06960 -> "0.0696000" (9 chars)
+    """
+    if tarifa is None:
+        return ""
+    
+    try:
+        # Convertir a Decimal para precisión
+        if isinstance(tarifa, str):
+            tarifa = Decimal(tarifa)
+        elif not isinstance(tarifa, Decimal):
+            tarifa = Decimal(str(tarifa))
+        
+        # La tarifa siempre viene como porcentaje desde centrotrabajo.tarifaarl
+        # Dividir por 100 para convertir a decimal (0.522% -> 0.00522)
+        tarifa_decimal = tarifa / Decimal("100")
+        
+        # Formatear con 7 decimales (total 9 caracteres incluyendo punto y 1 dígito entero)
+        tarifa_formateada = f"{tarifa_decimal:.7f}"
+        
+        # Asegurar que tenga exactamente 9 caracteres
+        if len(tarifa_formateada) != 9:
+            # Si tiene menos de 9, rellenar con ceros a la derecha
+            tarifa_formateada = tarifa_formateada.ljust(9, '0')
+        elif len(tarifa_formateada) > 9:
+            # Si tiene más de 9, truncar
+            tarifa_formateada = tarifa_formateada[:9]
+        
+        return tarifa_formateada
+    except:
+        return ""
+
+
+def datos_registro_02(detalle, emp, parametros, secuencia: str) -> dict:
+    """
+    Datos del registro 02 de un detalle (claves de Registro02Renderer).
+
+    Args:
+        detalle: PilaPlanillaDetalle calculado, con novedades precargadas
+        emp: EmpleadoContexto del detalle (payload_inicial)
+        parametros: ParametrosLegales del periodo (parafiscales, tarifa ARL por clase)
+        secuencia: número de línea en el archivo, 5 dígitos
+    """
+
+    # Extraer entidades
+    entidades = emp.entidades
+
+    # Extraer códigos DANE (departamento y municipio separados según layout registro 02)
+    cod_departamento = emp.cod_departamento
+    cod_municipio = emp.cod_municipio
+
+    # Extraer nombres completos (4 campos)
+    primer_apellido = emp.primer_apellido if emp.primer_apellido is not None else detalle.primer_apellido
+    segundo_apellido = emp.segundo_apellido
+    primer_nombre = emp.primer_nombre if emp.primer_nombre is not None else detalle.primer_nombre
+    segundo_nombre = emp.segundo_nombre
+
+    # Extraer días por subsistema desde el detalle
+    dias_salud = detalle.dias_salud
+    dias_pension = detalle.dias_pension
+    dias_arl = detalle.dias_arl
+    dias_caja = detalle.dias_caja
+
+    # Extraer IBCs y aportes desde el JSON calculado
+    aportes = detalle.aportes or {}
+
+    salud = aportes.get("salud", {})
+    pension = aportes.get("pension", {})
+    arl = aportes.get("arl", {})
+    caja = aportes.get("caja", {})
+
+    # Salario básico
+    salario_basico = emp.salario_basico
+
+    # Determinar tipo de salario (Campo 41: X=integral, F=fijo, V=variable)
+    if emp.salario_integral:
+        tipo_salario = "X"  # Integral
+    else:
+        tipo_salario = "F"
+
+    # Extraer tarifas (incluyendo tarifa ARL)
+    tarifa_arl = emp.tarifa_arl
+
+    # Centro de trabajo (campo 62, pos 390-398): código según tarifa ARL
+    centro_trabajo = emp.centro_trabajo
+
+    # ============================================
+    # NOVEDADES: Extraer desde PilaNovedad
+    # ============================================
+    novedades_detalle = detalle.novedades.all()
+
+    # Campos de novedades (posiciones 137-149)
+    nov_ing = ""  # Campo 15 (pos 137)
+    nov_ret = ""  # Campo 16 (pos 138)
+    nov_vsp = ""  # Campo 21 (pos 143)
+    nov_vst = ""  # Campo 23 (pos 145)
+    nov_sln = ""  # Campo 24 (pos 146)
+    nov_ige = ""  # Campo 25 (pos 147)
+    nov_lma = ""  # Campo 26 (pos 148)
+    nov_vac = ""  # Campo 27 (pos 149)
+    irl_dias = 0  # Campo 30 (pos 152-153)
+
+    # Fechas de novedades (campos 80-94)
+    fecha_ing = ""  # Campo 80 (pos 515-524)
+    fecha_ret = ""  # Campo 81 (pos 525-534)
+    fecha_vsp_inicio = ""  # Campo 82 (pos 535-544)
+    fecha_sln_inicio = ""  # Campo 83 (pos 545-554)
+    fecha_sln_fin = ""  # Campo 84 (pos 555-564)
+    fecha_ige_inicio = ""  # Campo 85 (pos 565-574)
+    fecha_ige_fin = ""  # Campo 86 (pos 575-584)
+    fecha_lma_inicio = ""  # Campo 87 (pos 585-594)
+    fecha_lma_fin = ""  # Campo 88 (pos 595-604)
+    fecha_vac_inicio = ""  # Campo 89 (pos 605-614)
+    fecha_vac_fin = ""  # Campo 90 (pos 615-624)
+    fecha_irl_inicio = ""  # Campo 93 (pos 645-654)
+    fecha_irl_fin = ""  # Campo 94 (pos 655-664)
+
+    for nov in novedades_detalle:
+        codigo = nov.tipo_novedad.upper()
+
+        if codigo == "ING":
+            nov_ing = "X"
+            fecha_ing = nov.fecha_inicio.isoformat() if nov.fecha_inicio else ""
+        elif codigo == "RET":
+            nov_ret = "X"
+            fecha_ret = nov.fecha_inicio.isoformat() if nov.fecha_inicio else ""
+        elif codigo == "VSP":
+            nov_vsp = "X"
+            fecha_vsp_inicio = nov.fecha_inicio.isoformat() if nov.fecha_inicio else ""
+        elif codigo == "VST":
+            nov_vst = "X"
+        elif codigo == "SLN":
+            nov_sln = "X"
+            fecha_sln_inicio = nov.fecha_inicio.isoformat() if nov.fecha_inicio else ""
+            fecha_sln_fin = nov.fecha_fin.isoformat() if nov.fecha_fin else ""
+        elif codigo == "IGE":
+            nov_ige = "X"
+            fecha_ige_inicio = nov.fecha_inicio.isoformat() if nov.fecha_inicio else ""
+            fecha_ige_fin = nov.fecha_fin.isoformat() if nov.fecha_fin else ""
+        elif codigo == "LMA":
+            nov_lma = "X"
+            fecha_lma_inicio = nov.fecha_inicio.isoformat() if nov.fecha_inicio else ""
+            fecha_lma_fin = nov.fecha_fin.isoformat() if nov.fecha_fin else ""
+        elif codigo == "VAC":
+            nov_vac = "X"
+            fecha_vac_inicio = nov.fecha_inicio.isoformat() if nov.fecha_inicio else ""
+            fecha_vac_fin = nov.fecha_fin.isoformat() if nov.fecha_fin else ""
+        elif codigo == "IRL":
+            irl_dias = nov.dias or 0
+            fecha_irl_inicio = nov.fecha_inicio.isoformat() if nov.fecha_inicio else ""
+            fecha_irl_fin = nov.fecha_fin.isoformat() if nov.fecha_fin else ""
+
+    # Calcular parafiscales con redondeo según Decreto 1990
+    # En centavos enteros: IBC × tarifa al múltiplo de 100 superior, sin float
+    ibc_caja_centavos = a_centavos(caja.get("ibc", 0))
+    if caja.get("aplica", False) and ibc_caja_centavos > 0:
+        tarifa_ccf_val = f"{parametros.tasa_caja:.5f}"
+        valor_ccf_val = cotizacion(ibc_caja_centavos, parametros.tasa_caja)
+        tarifa_sena_val = f"{parametros.tasa_sena:.5f}" if not caja.get("exonerado", False) else ""
+        valor_sena_val = cotizacion(ibc_caja_centavos, parametros.tasa_sena) if not caja.get("exonerado", False) else 0
+        tarifa_icbf_val = f"{parametros.tasa_icbf:.5f}" if not caja.get("exonerado", False) else ""
+        valor_icbf_val = cotizacion(ibc_caja_centavos, parametros.tasa_icbf) if not caja.get("exonerado", False) else 0
+    else:
+        tarifa_ccf_val = ""
+        valor_ccf_val = 0
+        tarifa_sena_val = ""
+        valor_sena_val = 0
+        tarifa_icbf_val = ""
+        valor_icbf_val = 0
+
+    # Error 330: Para novedad SLN la tarifa de aportes CCF debe ser 0 (licencia sin pago)
+    if nov_sln:
+        tarifa_ccf_val = "0.00000"
+        valor_ccf_val = 0
+        tarifa_sena_val = ""
+        valor_sena_val = 0
+        tarifa_icbf_val = ""
+        valor_icbf_val = 0
+
+    # No obligado a pensiones: tipo 23, o subtipo con valor distinto de 12 (si blanco/0/00 o 12 sí obligado)
+    subtipo_norm = str(detalle.subtipo_cotizante or "").strip().zfill(2)
+    no_obligado_pension = detalle.tipo_cotizante == "23" or subtipo_norm not in ("00", "12")
+
+    # Error 835: Si hay novedades de ausentismo (VAC, IGE, LMA, SLN, IRL), tarifa ARL debe ser 0
+    # IRL = incapacidad riesgo laboral: días sin exposición a riesgos, tarifa 0 en esa línea
+    # Pensionados/exonerados de pensión SÍ cotizan ARL: mantienen su tarifa real (no 0)
+    tiene_novedad_ausentismo = bool(nov_vac or nov_ige or nov_lma or nov_sln or irl_dias)
+    if tiene_novedad_ausentismo:
+        tarifa_arl_formateada = "0.0000000"
+    else:
+        # Pensionados: priorizar clase_riesgo (Error 355 exige 0.0435 según clase)
+        # El payload a veces trae tarifa 0/vacía para exonerados; clase_riesgo es fiable
+        clase_riesgo = str(emp.clase_riesgo or detalle.riesgo_arl or "").strip()
+        tarifa_arl_efectiva = parametros.tarifa_arl_clase(clase_riesgo) if no_obligado_pension else None
+        if not tarifa_arl_efectiva:
+            tarifa_arl_efectiva = tarifa_arl
+        if not tarifa_arl_efectiva or (isinstance(tarifa_arl_efectiva, (int, float)) and float(tarifa_arl_efectiva) == 0):
+            tarifa_arl_efectiva = parametros.tarifa_arl_clase(clase_riesgo)
+        tarifa_arl_formateada = _format_tarifa_arl(tarifa_arl_efectiva) if tarifa_arl_efectiva else ""
+
+    # Error 362: En líneas con SLN (licencia sin pago) la tarifa salud debe ser 0. Solo SLN (3 chars; tabla novedades no permite SUSP).
+    tiene_novedad_sln_susp = bool(nov_sln)
+    if tiene_novedad_sln_susp:
+        tarifa_salud_val = "0.00000"
+        cotizacion_salud_val = 0
+    else:
+        tarifa_salud_val = (
+            "0.00000" if detalle.tipo_cotizante == "23"
+            else ("0.12500" if a_centavos(salud.get("empleador", 0) or 0) > 0 else "0.04000")
+        )
+        cotizacion_salud_val = pesos_enteros(salud.get("total", 0))
+
+    # Construir data para Registro02Renderer
+    data_02 = {
+        "secuencia": secuencia,
+        "tipo_doc": detalle.tipo_doc,
+        "num_doc": detalle.numero_doc,
+        "tipo_cotizante": detalle.tipo_cotizante,
+        "subtipo_cotizante": detalle.subtipo_cotizante or "00",
+
+        # DANE (layout campos 9 y 10: departamento 32-33, municipio 34-36)
+        "cod_departamento": cod_departamento,
+        "cod_municipio": cod_municipio,
+
+        # Nombres completos (4 campos)
+        "papellido": primer_apellido,
+        "sapellido": segundo_apellido,
+        "pnombre": primer_nombre,
+        "snombre": segundo_nombre,
+
+        # Novedades (campos 15-30: posiciones 137-153)
+        "nov_ing": nov_ing,  # Campo 15 (pos 137)
+        "nov_ret": nov_ret,  # Campo 16 (pos 138)
+        "nov_vsp": nov_vsp,  # Campo 21 (pos 143)
+        "nov_vst": nov_vst,  # Campo 23 (pos 145)
+        "nov_sln": nov_sln,  # Campo 24 (pos 146)
+        "nov_ige": nov_ige,  # Campo 25 (pos 147)
+        "nov_lma": nov_lma,  # Campo 26 (pos 148)
+        "nov_vac": nov_vac,  # Campo 27 (pos 149)
+        "irl_dias": irl_dias,  # Campo 30 (pos 152-153)
+
+        # Entidades (códigos de 6 caracteres)
+        # Campo 31 (154-159): AFP en blanco si no obligado a pensiones (tipo 23 o subtipo != 12)
+        # Evitar None/str(None) para Aportes en Línea
+        "afp": "" if no_obligado_pension else (entidades.get("afp") or ""),
+        # Errores 242/245: EPS y CCF vacíos para tipo 23 (no aporta salud ni CCF)
+        "eps": "" if detalle.tipo_cotizante == "23" else entidades.get("eps", ""),  # Campo 33 (166-171)
+        "ccf": "" if detalle.tipo_cotizante == "23" else entidades.get("caja", ""),  # Campo 35 (178-183)
+
+        # Días por subsistema (184-191)
+        "dias_salud": int(dias_salud),
+        "dias_pension": int(dias_pension),
+        "dias_arl": int(dias_arl),
+        "dias_caja": int(dias_caja),
+
+        # Campos 192-332 (IBCs y valores calculados)
+        "v_192_200": int(salario_basico),  # Campo 40: Salario básico (192-200)
+        # Error 466: Tipo salario vacío para tipo 23 (no aplica F/X/V)
+        "tipo_salario": "" if detalle.tipo_cotizante == "23" else tipo_salario,  # Campo 41 (201)
+        "ibc_pension": pesos_enteros(pension.get("ibc", 0)),  # Campo 42: IBC pensión (202-210)
+        "v_210_218": pesos_enteros(salud.get("ibc", 0)),  # Campo 43: IBC salud (211-219)
+        "v_219_227": pesos_enteros(arl.get("ibc", 0)),  # Campo 44: IBC ARL (220-228)
+        "v_228_236": pesos_enteros(caja.get("ibc", 0)),  # Campo 45: IBC CCF (229-237)
+
+        # Tarifas y cotizaciones
+        # Tarifa pensión 0 si no obligado a pensiones (tipo 23 o subtipo != 12)
+        "v_237_245": "0.00000" if no_obligado_pension else "0.16000",  # Campo 46 (238-244)
+        "v_246_254": pesos_enteros(pension.get("total", 0)),  # Campo 47: Cotización pensión
+
+        # Campos adicionales
+        "v_255_263": 0,  # Campo 48: Aporte voluntario afiliado
+        "v_264_272": 0,  # Campo 49: Aporte voluntario aportante
+        "v_273_281": 0,  # Campo 50: Total cotización pensión
+        "v_282_290": pesos_enteros(pension.get("fsp_solidaridad", 0)),  # Campo 51: Fondo solidaridad (FSP)
+        "v_291_299": pesos_enteros(pension.get("fsp_subsistencia", 0)),  # Campo 52: Fondo subsistencia (FSP)
+        "v_300_308": 0,  # Campo 53: Valor no retenido
+
+        # Salud
+        # Error 360: Tarifa salud 0 para cotizantes no obligados a EPS (tipo 23)
+        # Error 362: Tarifa salud 0 en líneas SLN (licencia sin pago)
+        # IBC > 10 SMLV: 12.5% (conceptosfijos idfijo 8+18). Exonerado: 4% empleado.
+        "v_309_317": tarifa_salud_val,  # Campo 54 (308-314)
+        "v_318_326": cotizacion_salud_val,  # Campo 55: Cotización salud
+        "v_327_332": 0,  # Campo 56: UPC adicional
+
+        # ARL
+        # Error 194: Cotización obligatoria riesgos debe ser $0 cuando hay ausentismo (IRL, VAC, etc.)
+        "tarifa_arl": tarifa_arl_formateada,
+        "centro_trabajo": centro_trabajo,
+        "cotizacion_arl": 0 if tiene_novedad_ausentismo else arl.get("empleador", 0),
+
+        # Parafiscales (valores ya calculados con redondeo)
+        "tarifa_ccf": tarifa_ccf_val,
+        "valor_ccf": valor_ccf_val,
+        "tarifa_sena": tarifa_sena_val,
+        "valor_sena": valor_sena_val,
+        "tarifa_icbf": tarifa_icbf_val,
+        "valor_icbf": valor_icbf_val,
+
+        # Error 610: Tipo 23 no aplica exoneración; valor esperado N
+        "exonerado": "N" if detalle.tipo_cotizante == "23" else (
+            "S" if (caja.get("exonerado", False) or salud.get("exonerado_empleador", False)) else "N"
+        ),
+        "codigo_arl": entidades.get("arl", ""),
+        "clase_riesgo": str(detalle.riesgo_arl) if detalle.riesgo_arl else "",
+        "horas_laboradas": int(dias_caja) * 8 if dias_caja > 0 else 0,
+        # Campo 95 (pos 665-673): IBC otros parafiscales (SENA/ICBF). Obligatorio cuando hay aporte.
+        # Error 816: no puede ser 0 cuando hay aporte obligatorio y 30 días cotizados
+        "ibc_otros_parafiscales": ibc_caja_centavos // 100 if (valor_sena_val or valor_icbf_val) else 0,
+        "actividad_economica_arl": emp.actividad_economica_arl,
+
+        # Fechas de novedades (campos 80-94)
+        "fecha_ing": fecha_ing,
+        "fecha_ret": fecha_ret,
+        "fecha_vsp_inicio": fecha_vsp_inicio,
+        "fecha_sln_inicio": fecha_sln_inicio,
+        "fecha_sln_fin": fecha_sln_fin,
+        "fecha_ige_inicio": fecha_ige_inicio,
+        "fecha_ige_fin": fecha_ige_fin,
+        "fecha_lma_inicio": fecha_lma_inicio,
+        "fecha_lma_fin": fecha_lma_fin,
+        "fecha_vac_inicio": fecha_vac_inicio,
+        "fecha_vac_fin": fecha_vac_fin,
+        "fecha_irl_inicio": fecha_irl_inicio,
+        "fecha_irl_fin": fecha_irl_fin,
+
+        # Campos 333-693: resto sin mapear aún
+        "raw_333_693": None,
+    }
+    
+    return data_02
+
+
+def renderizar_linea_02(detalle, emp, parametros, secuencia: str = SECUENCIA_PROVISIONAL) -> str:
+    """Línea registro 02 del detalle (693 caracteres)."""
+    return _RENDERER_02.render(datos_registro_02(detalle, emp, parametros, secuencia))
+
+
+def con_secuencia(linea: str | bytes, secuencia: str | bytes) -> str | bytes:
+    """Reemplaza la secuencia (posiciones 3-7) de una línea registro 02 (str, o bytes Latin-1)."""
+    if len(secuencia) != _FIN_SECUENCIA - _INICIO_SECUENCIA:
+        raise ValueError(f"Valor '{secuencia}' excede ancho {_FIN_SECUENCIA - _INICIO_SECUENCIA}")
+    return linea[:_INICIO_SECUENCIA] + secuencia + linea[_FIN_SECUENCIA:]
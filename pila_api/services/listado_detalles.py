@@ -0,0 +1,169 @@
+# pila_api/services/listado_detalles.py
+"""
+Lectura de los detalles de una planilla para listar_detalles, por bloques de id.
+
+- Paginación por cursor (keyset sobre id): cada página es WHERE id > cursor ORDER BY id
+  LIMIT n, con costo constante sin importar la página (a diferencia de OFFSET).
+- Filtros: estado, tipo_cotizante, documento (tipo_doc / numero_doc).
+- Proyección (fields=): la consulta solo lee las columnas de los campos pedidos
+  (.values(), sin instanciar modelos); las novedades solo se leen si se piden.
+
+iter_detalles lee de a _BLOQUE detalles (una consulta de detalles y una de novedades por
+bloque) y entrega cada detalle ya como dict de respuesta: la vista puede armar una página
+JSON o escribir NDJSON a medida que se leen, sin cargar la planilla completa.
+"""
+
+from collections.abc import Iterator
+
+from django.conf import settings
+
+from pila_api.models import PilaNovedad, PilaPlanillaDetalle
+
+# Detalles por consulta al recorrer la planilla
+_BLOQUE = 2000
+
+
+def _texto(valor):
+    return str(valor)
+
+
+# Campo de la respuesta -> (columna, formato). Orden = orden de las claves en la respuesta
+CAMPOS_DETALLE = {
+    "detalle_id": ("id", None),
+    "tipo_doc": ("tipo_doc", None),
+    "numero_doc": ("numero_doc", None),
+    "primer_nombre": ("primer_nombre", None),
+    "primer_apellido": ("primer_apellido", None),
+    "tipo_cotizante": ("tipo_cotizante", None),
+    "subtipo_cotizante": ("subtipo_cotizante", None),
+    "dias_cotizados": ("dias_cotizados", None),
+    "dias_salud": ("dias_salud", None),
+    "dias_pension": ("dias_pension", None),
+    "dias_arl": ("dias_arl", None),
+    "dias_caja": ("dias_caja", None),
+    "ibc": ("ibc", _texto),
+    "ibc_salud": ("ibc_salud", _texto),
+    "ibc_pension": ("ibc_pension", _texto),
+    "ibc_arl": ("ibc_arl", _texto),
+    "riesgo_arl": ("riesgo_arl", None),
+    "caja_compensacion": ("caja_compensacion", None),
+    "estado": ("estado", None),
+    "errores": ("errores", None),
+    "aportes": ("aportes", None),
+    "aportes_empleado": ("aportes_empleado", _texto),
+    "aportes_empleador": ("aportes_empleador", _texto),
+    "novedades": (None, None),
+}
+
+# Filtro de la URL -> columna
+FILTROS_DETALLE = {
+    "estado": "estado",
+    "tipo_cotizante": "tipo_cotizante",
+    "tipo_doc": "tipo_doc",
+    "numero_doc": "numero_doc",
+}
+
+
+def limite_maximo() -> int:
+    return int(getattr(settings, "PILA_DETALLES_LIMITE_MAX", 5000) or 5000)
+
+
+def parsear_campos(fields: str | None) -> tuple[str, ...]:
+    """
+    Campos pedidos en fields= (separados por coma), en el orden de CAMPOS_DETALLE.
+    detalle_id va siempre (es el cursor). Sin fields: todos.
+
+    Raises:
+        ValueError: Si algún campo no existe
+    """
+    if not fields:
+        return tuple(CAMPOS_DETALLE)
+    pedidos = {c.strip() for c in fields.split(",") if c.strip()}
+    desconocidos = pedidos - CAMPOS_DETALLE.keys()
+    if desconocidos:
+        raise ValueError(
+            f"Campos desconocidos: {', '.join(sorted(desconocidos))} "
+            f"(disponibles: {', '.join(CAMPOS_DETALLE)})"
+        )
+    pedidos.add("detalle_id")
+    return tuple(c for c in CAMPOS_DETALLE if c in pedidos)
+
+
+def _novedad(n: dict) -> dict:
+    return {
+        "id": n["id"],
+        "tipo_novedad": n["tipo_novedad"],
+        "fecha_inicio": n["fecha_inicio"].isoformat(),
+        "fecha_fin": n["fecha_fin"].isoformat() if n["fecha_fin"] else None,
+        "dias": n["dias"],
+        "valor": str(n["valor"]) if n["valor"] else None,
+        "metadata": n["metadata"],
+    }
+
+
+def _novedades_por_detalle(ids: list) -> dict:
+    """Novedades de los detalles (una consulta), ordenadas por id."""
+    por_detalle = {}
+    novedades = (
+        PilaNovedad.objects
+        .filter(detalle_id__in=ids)
+        .order_by("id")
+        .values("id", "detalle_id", "tipo_novedad", "fecha_inicio", "fecha_fin", "dias", "valor", "metadata")
+    )
+    for n in novedades:
+        por_detalle.setdefault(n["detalle_id"], []).append(_novedad(n))
+    return por_detalle
+
+
+def iter_detalles(
+    planilla,
+    campos: tuple[str, ...] | None = None,
+    filtros: dict | None = None,
+    cursor: int | None = None,
+    limite: int | None = None,
+) -> Iterator[dict]:
+    """
+    Detalles de la generación vigente de la planilla ordenados por id, como dicts de respuesta.
+
+    Args:
+        planilla: PilaPlanilla
+        campos: campos de CAMPOS_DETALLE a incluir (ver parsear_campos). Por defecto todos
+        filtros: {filtro de FILTROS_DETALLE: valor}
+        cursor: solo detalles con id > cursor
+        limite: máximo de detalles (None = todos)
+    """
+    campos = campos or tuple(CAMPOS_DETALLE)
+    columnas = [CAMPOS_DETALLE[c][0] for c in campos if CAMPOS_DETALLE[c][0]]
+    formatos = [(c, CAMPOS_DETALLE[c][0], CAMPOS_DETALLE[c][1]) for c in campos if c != "novedades"]
+    con_novedades = "novedades" in campos
+
+    qs = PilaPlanillaDetalle.objects.filter(
+        planilla=planilla,
+        generacion=planilla.generacion,
+        **{FILTROS_DETALLE[f]: v for f, v in (filtros or {}).items()},
+    )
+    ultimo = cursor
+    pendientes = limite
+
+    while pendientes is None or pendientes > 0:
+        bloque = _BLOQUE if pendientes is None else min(_BLOQUE, pendientes)
+        pagina = qs.filter(id__gt=ultimo) if ultimo is not None else qs
+        filas = list(pagina.order_by("id").values(*columnas)[:bloque])
+        if not filas:
+            return
+
+        novedades = _novedades_por_detalle([f["id"] for f in filas]) if con_novedades else None
+        for fila in filas:
+            detalle = {}
+            for nombre, columna, formato in formatos:
+                valor = fila[columna]
+                detalle[nombre] = formato(valor) if formato else valor
+            if con_novedades:
+                detalle["novedades"] = novedades.get(fila["id"], [])
+            yield detalle
+
+        ultimo = filas[-1]["id"]
+        if pendientes is not None:
+            pendientes -= len(filas)
+        if len(filas) < bloque:
+            return
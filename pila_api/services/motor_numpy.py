@@ -0,0 +1,271 @@
+# pila_api/services/motor_numpy.py
+"""
+Motor de cálculo vectorizado (NumPy) para calcular_planilla.
+
+Carga los detalles de una planilla en arreglos columnares de centavos (int64) y calcula
+en lote los topes de IBC, salud/pensión/ARL/caja, FSP y el redondeo del Decreto 1990.
+El resultado es idéntico al del motor Decimal de referencia:
+
+- Porcentajes con ROUND_HALF_UP a centavos: (2·c·n + d) // (2·d), con n/d la fracción exacta de la tasa.
+- Redondeo a múltiplo de 100 superior: ceil(c / 10000) · 100 pesos.
+- Reparto empleado/empleador de salud y pensión con la misma fracción exacta.
+
+Son las versiones vectorizadas de utils.centavos (porcentaje, ceil_100, proporcion).
+
+Si los datos no cumplen las condiciones para trabajar en centavos enteros (SMMLV con más
+de 2 decimales, días no enteros, tasas negativas, valores que desbordan int64...) se usa
+el motor Decimal para esa planilla.
+"""
+
+from decimal import Decimal
+
+import numpy as np
+
+from pila_api.services.calcular_planilla import calcular_entradas_decimal
+from pila_api.utils.centavos import a_centavos, a_texto, fraccion
+
+# Límite para los intermediarios (2·c·n + d) en int64
+_LIMITE = 2 ** 62
+
+
+class _NoVectorizable(Exception):
+    """Los datos de la planilla no permiten el cálculo exacto en centavos enteros."""
+
+
+def _entero(valor: Decimal) -> int:
+    if not valor.is_finite() or valor % 1:
+        raise _NoVectorizable(f"{valor} no es entero")
+    return int(valor)
+
+
+def _fraccion(pct) -> tuple[int, int]:
+    """Tasa como fracción exacta n/d (d > 0); solo tasas no negativas."""
+    n, d = fraccion(pct)
+    if n < 0:
+        raise _NoVectorizable(f"tasa {pct} no soportada")
+    return n, d
+
+
+def _acotar(valor: int):
+    if abs(valor) >= _LIMITE:
+        raise _NoVectorizable("valores fuera de rango para int64")
+
+
+def _pct(c, n, d):
+    """ROUND_HALF_UP(c · n / d) para c >= 0 en centavos; n y d escalares o arreglos."""
+    return (2 * c * n + d) // (2 * d)
+
+
+def _redondear_100(c):
+    """Centavos -> pesos al múltiplo de 100 superior (Decreto 1990)."""
+    return -(-c // 10000) * 100
+
+
+def _fraccion_reparto(tasa_emp: Decimal, tasa_empl: Decimal) -> tuple[int, int]:
+    """emp / (emp + empl) como fracción: parte del empleado de un total (ver calcular_planilla._repartir)."""
+    en, ed = _fraccion(tasa_emp)
+    sn, sd = _fraccion(tasa_emp + tasa_empl)
+    if sn == 0:
+        raise _NoVectorizable("tasas de reparto en 0")
+    return en * sd, ed * sn
+
+
+def _validar(entradas: list, parametros):
+    smmlv = parametros.smmlv_centavos
+    if smmlv is None:
+        raise _NoVectorizable("smmlv no es un valor exacto en centavos")
+    dias_base = _entero(parametros.dias_base)
+    if dias_base <= 0:
+        raise _NoVectorizable("dias_base debe ser positivo")
+    ibc_max = parametros.ibc_max_centavos
+    umbral_10 = a_centavos(parametros.umbral_exoneracion, redondeo=None)
+
+    tasas = {
+        "salud_emp": _fraccion(parametros.tasa_salud_emp),
+        "salud_empl_ibc10": _fraccion(parametros.tasa_salud_empl_ibc10),
+        "salud_empl": _fraccion(parametros.tasa_salud_empl),
+        "pension_emp": _fraccion(parametros.tasa_pension_emp),
+        "pension_empl": _fraccion(parametros.tasa_pension_empl),
+        "caja": _fraccion(parametros.tasa_caja),
+        "reparto_salud": _fraccion_reparto(*parametros.reparto_salud),
+        "reparto_pension": _fraccion_reparto(*parametros.reparto_pension),
+    }
+    # Tramos FSP: límites en centavos (para searchsorted) y tasa por tramo
+    tramos_fsp = [_fraccion(tasa) for tasa in parametros.fsp_tasas]
+
+    ibc = [a_centavos(e.ibc_subs, redondeo=None) for e in entradas]
+    dias = [
+        [_entero(e.dias_salud) for e in entradas],
+        [_entero(e.dias_pension) for e in entradas],
+        [_entero(e.dias_arl) for e in entradas],
+    ]
+
+    # Tasas ARL por detalle (pocas distintas: se convierten una vez por valor)
+    fracciones_arl = {}
+    arl = []
+    for e in entradas:
+        if e.arl_pct:
+            if e.arl_pct not in fracciones_arl:
+                fracciones_arl[e.arl_pct] = _fraccion(e.arl_pct)
+            arl.append(fracciones_arl[e.arl_pct])
+        else:
+            arl.append((0, 1))
+
+    # Cotas de los intermediarios antes de pasar a int64
+    dias_max = max(max(max(col, default=0) for col in dias), 0)
+    _acotar(2 * smmlv * dias_max + dias_base)
+    _acotar(max(parametros.fsp_limites_centavos or (0,)))
+    _acotar(umbral_10)
+    tope = max(ibc_max, smmlv * dias_max // dias_base + 1)
+    fracciones = list(tasas.values()) + tramos_fsp + list(fracciones_arl.values())
+    n_max = max(n for n, _ in fracciones)
+    d_max = max(d for _, d in fracciones)
+    _acotar(2 * tope * n_max + d_max)
+    _acotar(2 * d_max)
+
+    return smmlv, dias_base, ibc_max, umbral_10, tasas, tramos_fsp, ibc, dias, arl
+
+
+def calcular_entradas_numpy(entradas: list, parametros):
+    """Calcula en lote las entradas de una planilla (misma salida que calcular_entradas_decimal)."""
+    if not entradas:
+        return
+
+    try:
+        smmlv, dias_base, ibc_max, umbral_10, tasas, tramos_fsp, ibc, dias, arl = _validar(entradas, parametros)
+        ibc = np.array(ibc, dtype=np.int64)
+        dias = np.array(dias, dtype=np.int64)
+        arl_n, arl_d = np.array(arl, dtype=np.int64).T
+    except (_NoVectorizable, OverflowError, ValueError, ArithmeticError):
+        calcular_entradas_decimal(entradas, parametros)
+        return
+
+    def columna(atributo):
+        return np.array([getattr(e, atributo) for e in entradas], dtype=bool)
+
+    ok = np.array([not e.errores for e in entradas], dtype=bool)
+    aplica_salud = columna("aplica_salud")
+    aplica_pension = columna("aplica_pension")
+    aplica_arl = columna("aplica_arl")
+    aplica_caja = columna("aplica_caja")
+    salario_integral = columna("salario_integral")
+    exonerada = columna("aplica_exoneracion")
+    sln = columna("tiene_novedad_sln")
+    salud_cero = columna("ibc_salud_cero")
+    pension_cero = columna("ibc_pension_cero")
+    tiene_caja = np.array([bool(e.detalle.caja_compensacion) for e in entradas], dtype=bool)
+
+    # --- A.2: mínimo proporcional por subsistema + tope ---
+    minimos = np.where(dias > 0, (2 * smmlv * dias + dias_base) // (2 * dias_base), 0)
+    acotados = np.where(ibc < minimos, minimos, np.where(ibc > ibc_max, ibc_max, ibc))
+    ibc_salud = np.where(salud_cero, 0, acotados[0])
+    ibc_pension = np.where(pension_cero, 0, acotados[1])
+    ibc_arl = acotados[2]
+
+    # IBC efectivos según flags
+    ibc_salud_calc = np.where(aplica_salud, ibc_salud, 0)
+    ibc_pension_calc = np.where(aplica_pension, ibc_pension, 0)
+    ibc_arl_calc = np.where(aplica_arl, ibc_arl, 0)
+
+    # Salud
+    cotiza_salud = aplica_salud & ~sln
+    ibc_mayor_10 = (ibc_salud_calc > umbral_10) | salario_integral
+    salud_emp = np.where(cotiza_salud, _pct(ibc_salud_calc, *tasas["salud_emp"]), 0)
+    salud_empl = np.where(
+        ibc_mayor_10,
+        _pct(ibc_salud_calc, *tasas["salud_empl_ibc10"]),
+        np.where(exonerada, 0, _pct(ibc_salud_calc, *tasas["salud_empl"])),
+    )
+    salud_empl = np.where(cotiza_salud, salud_empl, 0)
+
+    # Pensión
+    pension_emp = np.where(aplica_pension, _pct(ibc_pension_calc, *tasas["pension_emp"]), 0)
+    pension_empl = np.where(aplica_pension, _pct(ibc_pension_calc, *tasas["pension_empl"]), 0)
+
+    # ARL y caja
+    arl_empl = _pct(ibc_arl_calc, arl_n, arl_d)
+    caja_empl = np.where(aplica_caja & tiene_caja & ~exonerada, _pct(ibc_salud_calc, *tasas["caja"]), 0)
+
+    # FSP por tramos de SMMLV sobre el IBC de pensión: searchsorted = bisect_left de
+    # ParametrosLegales.tasa_fsp; tramo 0 (IBC <= 4 SMMLV) no aplica
+    fsp = np.zeros(len(entradas), dtype=np.int64)
+    if tramos_fsp:
+        tramo = np.searchsorted(np.array(parametros.fsp_limites_centavos, dtype=np.int64), ibc_pension_calc, side="left")
+        fsp_n = np.array([0] + [n for n, _ in tramos_fsp], dtype=np.int64)[tramo]
+        fsp_d = np.array([1] + [d for _, d in tramos_fsp], dtype=np.int64)[tramo]
+        fsp_total = _pct(ibc_pension_calc, fsp_n, fsp_d)
+        # Cada mitad (solidaridad / subsistencia) se redondea al múltiplo de 100 superior
+        fsp = np.where(aplica_pension & (tramo > 0), -(-fsp_total // 20000) * 100, 0)
+
+    # Redondeo Decreto 1990 (salud y pensión como total)
+    salud_total = salud_emp + salud_empl
+    pension_total = pension_emp + pension_empl
+    salud_total_r = _redondear_100(salud_total)
+    pension_total_r = _redondear_100(pension_total)
+    arl_r = _redondear_100(arl_empl)
+    caja_r = _redondear_100(caja_empl)
+
+    pension_emp_r = np.where(pension_total > 0, _pct(pension_total_r, *tasas["reparto_pension"]), 0)
+    pension_empl_r = np.where(pension_total > 0, pension_total_r - pension_emp_r, 0)
+
+    salud_emp_r = np.where(
+        salud_empl == 0, salud_total_r, _pct(salud_total_r, *tasas["reparto_salud"])
+    )
+    salud_emp_r = np.where(salud_total > 0, salud_emp_r, 0)
+    salud_empl_r = np.where(salud_total > 0, salud_total_r - salud_emp_r, 0)
+
+    aportes_emp = salud_emp_r + pension_emp_r
+    aportes_empl = salud_empl_r + pension_empl_r + arl_r + caja_r
+
+    columnas = zip(
+        entradas, ok.tolist(),
+        ibc_salud.tolist(), ibc_pension.tolist(), ibc_arl.tolist(),
+        ibc_salud_calc.tolist(), ibc_pension_calc.tolist(), ibc_arl_calc.tolist(),
+        salud_emp_r.tolist(), salud_empl_r.tolist(), salud_total_r.tolist(),
+        pension_emp_r.tolist(), pension_empl_r.tolist(), pension_total_r.tolist(), fsp.tolist(),
+        arl_r.tolist(), caja_r.tolist(), aportes_emp.tolist(), aportes_empl.tolist(),
+    )
+    for (
+        e, sin_error, c_salud, c_pension, c_arl, c_salud_calc, c_pension_calc, c_arl_calc,
+        s_emp, s_empl, s_total, p_emp, p_empl, p_total, fsp_mitad, arl, caja, emp, empl,
+    ) in columnas:
+        e.ibc_salud = Decimal(c_salud).scaleb(-2)
+        e.ibc_pension = Decimal(c_pension).scaleb(-2)
+        e.ibc_arl = Decimal(c_arl).scaleb(-2)
+        if not sin_error:
+            continue
+
+        ibc_salud_str = a_texto(c_salud_calc)
+        e.aportes = {
+            "salud": {
+                "aplica": e.aplica_salud,
+                "ibc": ibc_salud_str,
+                "empleado": str(s_emp),
+                "empleador": str(s_empl),
+                "total": str(s_total),
+                "exonerado_empleador": e.aplica_exoneracion,
+            },
+            "pension": {
+                "aplica": e.aplica_pension,
+                "ibc": a_texto(c_pension_calc),
+                "empleado": str(p_emp),
+                "empleador": str(p_empl),
+                "total": str(p_total),
+                "fsp_solidaridad": str(fsp_mitad),
+                "fsp_subsistencia": str(fsp_mitad),
+            },
+            "arl": {
+                "aplica": e.aplica_arl,
+                "ibc": a_texto(c_arl_calc),
+                "riesgo": str(e.detalle.riesgo_arl),
+                "empleador": str(arl),
+            },
+            "caja": {
+                "aplica": e.aplica_caja and bool(e.detalle.caja_compensacion),
+                "ibc": ibc_salud_str,
+                "empleador": str(caja),
+                "exonerado": e.aplica_exoneracion,
+            },
+        }
+        e.aportes_emp = Decimal(emp)
+        e.aportes_empl = Decimal(empl)
@@ -0,0 +1,166 @@
+# pila_api/services/parametros_legales.py
+"""
+Registro de parámetros legales por periodo (tasas, topes y tramos FSP).
+
+Las tasas de ley viven en tablas con vigencia (_VIGENCIAS): cada tabla aplica desde su
+periodo "YYYY-MM" hasta la siguiente. parametros_periodo() combina la tabla vigente con
+los parámetros que envía Nomiweb en el payload (SMMLV, tope, días base, FSP, tasas EPS) y
+devuelve un ParametrosLegales "compilado": umbrales en SMMLV, ibc_max_global y tramos FSP
+listos para bisect ya calculados.
+
+El resultado se cachea en proceso (LRU) por (periodo, parámetros del payload): todas las
+planillas y empleados de un mismo periodo reutilizan el mismo objeto. Es de solo lectura.
+"""
+
+import json
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from functools import lru_cache
+
+from pila_api.utils.centavos import a_centavos, a_decimal
+
+D0 = Decimal("0")
+
+# Tramos del FSP en SMMLV (límite superior inclusivo) con su clave en parametros.fsp_porcentajes
+# y porcentaje por defecto. Por debajo de 4 SMMLV (inclusive) no aplica FSP.
+UMBRAL_FSP_SMMLV = 4
+TRAMOS_FSP = (
+    (16, "4-16", 0.01),
+    (17, "16-17", 0.012),
+    (18, "17-18", 0.014),
+    (19, "18-19", 0.016),
+    (20, "19-20", 0.018),
+    (None, ">20", 0.02),
+)
+
+# Exoneración (Ley 1607/2012) y tasa EPS del empleador para IBC > 10 SMMLV
+UMBRAL_EXONERACION_SMMLV = 10
+
+# Tasas de ley por vigencia (desde periodo "YYYY-MM"), ordenadas por periodo
+_VIGENCIAS = (
+    ("2000-01", {
+        "salud_emp": Decimal("0.04"),
+        "salud_empl": Decimal("0.085"),
+        "pension_emp": Decimal("0.04"),
+        "pension_empl": Decimal("0.12"),
+        "caja": Decimal("0.04"),
+        "sena": Decimal("0.02"),
+        "icbf": Decimal("0.03"),
+        # ARL por clase de riesgo (1..5), Decreto 1772 de 1994
+        "arl": {
+            "1": Decimal("0.00522"),
+            "2": Decimal("0.01044"),
+            "3": Decimal("0.02436"),
+            "4": Decimal("0.04350"),
+            "5": Decimal("0.06960"),
+        },
+    }),
+)
+_VIGENCIAS_DESDE = [desde for desde, _ in _VIGENCIAS]
+
+# Planillas/periodos distintos que se mantienen compilados en memoria
+TAMANO_CACHE = 128
+
+
+def _to_decimal(x) -> Decimal:
+    if x is None:
+        return D0
+    if isinstance(x, Decimal):
+        return x
+    return Decimal(str(x))
+
+
+def tasas_vigentes(periodo: str | None) -> dict:
+    """Tabla de tasas de ley vigente para el periodo "YYYY-MM" (la más antigua si no hay periodo)."""
+    i = bisect_right(_VIGENCIAS_DESDE, str(periodo or "")[:7]) - 1
+    return _VIGENCIAS[max(i, 0)][1]
+
+
+class ParametrosLegales:
+    """
+    Parámetros legales de un periodo ya convertidos y precalculados.
+
+    Atributos en Decimal (pesos); smmlv_centavos y fsp_limites_centavos en centavos enteros
+    cuando el SMMLV es exacto en centavos (None si no lo es).
+    """
+
+    def __init__(self, periodo: str | None, params: dict):
+        tasas = tasas_vigentes(periodo)
+        self.periodo = periodo
+
+        self.smmlv = _to_decimal(params.get("smmlv"))
+        self.tope_smmlv = _to_decimal(params.get("tope_ibc_smmlv", 25))
+        self.dias_base = _to_decimal(params.get("dias_base", 30))
+        self.fsp_porcentajes = params.get("fsp_porcentajes", {}) or {}
+
+        # Tasas de ley del periodo
+        self.tasa_salud_empl = tasas["salud_empl"]
+        self.tasa_pension_emp = tasas["pension_emp"]
+        self.tasa_pension_empl = tasas["pension_empl"]
+        self.tasa_caja = tasas["caja"]
+        self.tasa_sena = tasas["sena"]
+        self.tasa_icbf = tasas["icbf"]
+        self.arl_tasas = tasas["arl"]
+        # EPS desde conceptosfijos: idfijo 8 (empleado), idfijo 18 (empresa cuando IBC > 10 SMLV)
+        self.tasa_salud_emp = _to_decimal(params.get("tasa_salud_emp", tasas["salud_emp"]))
+        self.tasa_salud_empl_ibc10 = _to_decimal(params.get("tasa_salud_empl_ibc_mayor_10", tasas["salud_empl"]))
+        # Reparto empleado/empleador de los totales redondeados (tasas de ley: 4%/8.5% salud, 4%/12% pensión)
+        self.reparto_salud = (tasas["salud_emp"], tasas["salud_empl"])
+        self.reparto_pension = (tasas["pension_emp"], tasas["pension_empl"])
+
+        # Umbrales en pesos
+        self.ibc_max_global = a_decimal(a_centavos(self.smmlv * self.tope_smmlv)) if self.smmlv > 0 else D0
+        self.umbral_exoneracion = self.smmlv * UMBRAL_EXONERACION_SMMLV
+
+        # FSP: límites [4, 16, 17, 18, 19, 20] SMMLV para bisect_left; tasa i-1 si el índice es i >= 1
+        if self.fsp_porcentajes and self.smmlv > 0:
+            self.fsp_limites = tuple(
+                self.smmlv * limite for limite in (UMBRAL_FSP_SMMLV,) + tuple(l for l, _, _ in TRAMOS_FSP if l)
+            )
+            self.fsp_tasas = tuple(
+                _to_decimal(self.fsp_porcentajes.get(clave, defecto)) for _, clave, defecto in TRAMOS_FSP
+            )
+        else:
+            self.fsp_limites = ()
+            self.fsp_tasas = ()
+
+        # Centavos enteros para el motor NumPy
+        try:
+            self.smmlv_centavos = a_centavos(self.smmlv, redondeo=None)
+        except ValueError:
+            self.smmlv_centavos = None
+        self.ibc_max_centavos = a_centavos(self.ibc_max_global)
+        self.fsp_limites_centavos = (
+            tuple(a_centavos(limite) for limite in self.fsp_limites) if self.smmlv_centavos is not None else None
+        )
+
+        # Tarifas ARL en % para el TXT (campo 61): 0.00522 -> "0.52200"
+        self.tarifas_arl_pct = {clase: str(tasa * 100) for clase, tasa in self.arl_tasas.items()}
+
+    def tasa_arl(self, riesgo) -> Decimal | None:
+        return self.arl_tasas.get(str(riesgo))
+
+    def tarifa_arl_clase(self, clase) -> str | None:
+        """Tarifa ARL en % por clase de riesgo, para cuando el payload no la trae."""
+        return self.tarifas_arl_pct.get(str(clase))
+
+    def tasa_fsp(self, ibc_pension: Decimal) -> Decimal | None:
+        """Porcentaje FSP del tramo del IBC de pensión; None si no aplica (FSP desactivado o IBC <= 4 SMMLV)."""
+        if not self.fsp_limites:
+            return None
+        i = bisect_left(self.fsp_limites, ibc_pension)
+        return self.fsp_tasas[i - 1] if i > 0 else None
+
+
+@lru_cache(maxsize=TAMANO_CACHE)
+def _compilar(periodo: str | None, params_json: str) -> ParametrosLegales:
+    return ParametrosLegales(periodo, json.loads(params_json))
+
+
+def parametros_periodo(periodo: str | None, params: dict | None) -> ParametrosLegales:
+    """
+    ParametrosLegales del periodo con los parámetros del payload, desde la caché si ya se
+    compilaron. No modificar el objeto devuelto: es compartido.
+    """
+    params_json = json.dumps(params or {}, sort_keys=True, default=str)
+    return _compilar(periodo, params_json)
@@ -0,0 +1,234 @@
+# pila_api/services/procesar_planilla.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from pila_api.models import PilaPlanilla, PilaPlanillaDetalle, PilaJob
+from pila_api.serializers import PayloadPlanillaSerializer
+from pila_api.services.bloqueo_planilla import PlanillaOcupada, bloqueo_planilla
+from pila_api.services.calcular_planilla import calcular_planilla
+from pila_api.services.generaciones_detalles import activar_payload_pendiente, nueva_generacion
+from pila_api.services.idempotencia import hash_payload, marcar_procesada
+from pila_api.services.ingestar_planilla import ingestar_detalles
+from pila_api.validacion import validar
+
+
+def registrar_planilla(payload: dict, payload_inicial: dict) -> tuple[PilaPlanilla, bool]:
+    """
+    Crea o reutiliza la planilla del payload validado (por numero_interno) con payload_inicial
+    (el cuerpo recibido).
+
+    Una planilla nueva queda EN_PROCESO con ese payload. En una existente el payload queda en
+    payload_pendiente: payload_inicial, estado, totales y detalles siguen siendo los vigentes
+    hasta que el cálculo de la nueva generación (o activar_payload, sin reingesta) lo active
+    (ver generaciones_detalles).
+
+    Returns:
+        (planilla, created)
+    """
+    empresa = payload["empresa"]
+
+    # Sin leer los payloads guardados (pueden ser muy grandes): no se usan aquí
+    obj, created = PilaPlanilla.objects.defer("payload_inicial", "payload_pendiente").get_or_create(
+        numero_interno=payload["planilla"]["numero_interno"],
+        defaults={
+            "periodo": payload["periodo"],
+            "empresa_nit": empresa["nit"],
+            "empresa_sucursal": empresa["sucursal"],
+            "estado": "EN_PROCESO",
+            "payload_inicial": payload_inicial,
+            "totales": None,
+            "resumen": {
+                "empleados_procesados": 0,
+                "empleados_con_error": 0,
+                "warnings": 0,
+            },
+            "errores": [],
+            "tiene_archivo": False,
+        }
+    )
+
+    if not created:
+        obj.payload_pendiente = payload_inicial
+        obj.save(update_fields=["payload_pendiente"])
+    return obj, created
+
+
+def activar_payload(planilla) -> None:
+    """
+    Activa el payload pendiente sin reingerir ni recalcular (detalles sin cambios): pasa a
+    payload_inicial e invalida los archivos generados (el TXT lee encabezado y datos de
+    empleados del payload), en un solo UPDATE. Una planilla PENDIENTE (encolada) vuelve al
+    estado de su último cálculo.
+    """
+    campos = activar_payload_pendiente(planilla)
+    if campos:
+        planilla.version_archivo += 1
+        campos.append("version_archivo")
+    if planilla.estado == "PENDIENTE":
+        con_error = (planilla.resumen or {}).get("empleados_con_error")
+        planilla.estado = "CON_ERRORES" if con_error else "COMPLETADA"
+        campos.append("estado")
+    if campos:
+        planilla.save(update_fields=campos)
+
+
+def requiere_ingesta(planilla, force: bool = False, created: bool = False) -> bool:
+    """Solo se reprocesa si se fuerza, si la planilla es nueva o si aún no tiene detalles."""
+    if force or created:
+        return True
+    return not PilaPlanillaDetalle.objects.filter(planilla=planilla, generacion=planilla.generacion).exists()
+
+
+def procesar_planilla(planilla, payload: dict, force: bool = False, created: bool = False) -> bool:
+    """
+    Ingesta (detalles + novedades) y cálculo de una planilla a partir del payload validado.
+    Es el mismo flujo para crear_planilla síncrono y para el worker asíncrono.
+
+    Solo reprocesa si se fuerza, si la planilla es nueva o si aún no tiene detalles; si no,
+    solo activa el payload pendiente (activar_payload).
+    Los detalles nuevos se escriben como una generación aparte y el cálculo la activa al
+    terminar (ver generaciones_detalles): mientras tanto se siguen leyendo los anteriores.
+
+    Returns:
+        True si se ingirió y calculó la planilla
+    """
+    if not requiere_ingesta(planilla, force, created):
+        activar_payload(planilla)
+        return False
+
+    empresa = payload["empresa"]
+    empleados = payload.get("empleados", [])
+    riesgo_arl_default = str(empresa.get("clase_riesgo_arl", "1"))
+
+    with transaction.atomic():
+        generacion = nueva_generacion(planilla)
+        ingestar_detalles(planilla, empleados, riesgo_arl_default, generacion=generacion)
+
+    # cálculo SOLO una vez
+    calcular_planilla(planilla.planilla_id, generacion=generacion)
+    planilla.refresh_from_db()
+    return True
+
+
+# -------------------------------------------------------------------
+# Cola de jobs (modo asíncrono)
+# -------------------------------------------------------------------
+
+def encolar_planilla(planilla, payload: dict, force: bool = False, created: bool = False) -> PilaJob:
+    """
+    Crea un job PENDIENTE para procesar en un worker el payload recibido (el cuerpo del POST).
+    El job guarda su propio payload y si creó la planilla: otro POST sobre la misma planilla
+    antes de que corra no cambia lo que procesa.
+
+    La planilla queda PENDIENTE (sus datos vigentes no cambian) para que quien la consulte vea
+    que hay trabajo en cola; el worker le deja el estado final.
+    """
+    planilla.estado = "PENDIENTE"
+    planilla.save(update_fields=["estado"])
+    return PilaJob.objects.create(
+        planilla=planilla, payload=payload, force=force, created=created, estado="PENDIENTE",
+    )
+
+
+def _max_intentos() -> int:
+    return int(getattr(settings, "PILA_JOBS_MAX_INTENTOS", 3) or 1)
+
+
+def _fallar_job(job: PilaJob, error: str) -> PilaJob:
+    """Deja el job FALLIDO con el error y la planilla CON_ERRORES."""
+    job.estado = "FALLIDO"
+    job.error = error
+    job.fecha_fin = timezone.now()
+    # update y no save: si la planilla (y con ella el job) se borró, no hay fila que actualizar
+    PilaJob.objects.filter(job_id=job.job_id).update(estado=job.estado, error=job.error, fecha_fin=job.fecha_fin)
+
+    PilaPlanilla.objects.filter(planilla_id=job.planilla_id).update(
+        estado="CON_ERRORES",
+        errores=[f"Error procesando job {job.job_id}: {error}"],
+    )
+    return job
+
+
+def _liberar_job(job: PilaJob) -> PilaJob:
+    """Devuelve a PENDIENTE un job reclamado que no llegó a procesarse."""
+    job.estado = "PENDIENTE"
+    job.intentos = max(job.intentos - 1, 0)
+    job.fecha_inicio = None
+    PilaJob.objects.filter(job_id=job.job_id).update(
+        estado=job.estado, intentos=job.intentos, fecha_inicio=job.fecha_inicio,
+    )
+    return job
+
+
+def reclamar_job() -> PilaJob | None:
+    """
+    Toma el siguiente job pendiente con SELECT ... FOR UPDATE SKIP LOCKED, de modo que
+    varios workers no reclamen el mismo. También re-toma jobs EN_PROCESO cuyo worker
+    murió (sin terminar tras settings.PILA_JOBS_TIMEOUT segundos), hasta
+    settings.PILA_JOBS_MAX_INTENTOS intentos: los que ya los agotaron quedan FALLIDO.
+    """
+    timeout = int(getattr(settings, "PILA_JOBS_TIMEOUT", 1800))
+    limite = timezone.now() - timedelta(seconds=timeout)
+    max_intentos = _max_intentos()
+    huerfanos = Q(estado="EN_PROCESO", fecha_inicio__lt=limite)
+
+    with transaction.atomic():
+        agotados = PilaJob.objects.select_for_update(skip_locked=True).filter(huerfanos, intentos__gte=max_intentos)
+        for agotado in agotados:
+            _fallar_job(agotado, f"Sin terminar tras {agotado.intentos} intento(s)")
+
+        job = (
+            PilaJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(estado="PENDIENTE") | huerfanos)
+            .order_by("job_id")
+            .first()
+        )
+        if job is None:
+            return None
+
+        job.estado = "EN_PROCESO"
+        job.intentos += 1
+        job.fecha_inicio = timezone.now()
+        job.save(update_fields=["estado", "intentos", "fecha_inicio"])
+
+    return job
+
+
+def ejecutar_job(job: PilaJob) -> PilaJob:
+    """
+    Procesa un job reclamado: valida el payload del job, lo deja como payload pendiente de
+    la planilla, ingiere y calcula (o solo lo activa, igual que crear_planilla síncrono).
+    Si falla, el job queda FALLIDO y la planilla CON_ERRORES con el mensaje en errores.
+
+    Corre dentro de bloqueo_planilla, igual que crear_planilla: espera a las peticiones en
+    curso sobre la misma planilla antes de escribirla. Si no obtiene el bloqueo a tiempo el
+    job vuelve a PENDIENTE sin gastar el intento, para que un worker lo retome después.
+    """
+    try:
+        numero_interno = PilaPlanilla.objects.values_list("numero_interno", flat=True).get(planilla_id=job.planilla_id)
+        with bloqueo_planilla(numero_interno):
+            planilla = PilaPlanilla.objects.get(planilla_id=job.planilla_id)
+            if job.payload is not None:
+                planilla.payload_pendiente = job.payload
+                planilla.save(update_fields=["payload_pendiente"])
+            payload = validar(PayloadPlanillaSerializer, planilla.payload_pendiente or planilla.payload_inicial or {})
+            procesar_planilla(planilla, payload, force=job.force, created=job.created)
+            marcar_procesada(planilla.planilla_id, hash_payload(planilla.payload_inicial))
+            # Otro POST encoló más trabajo mientras tanto: sigue PENDIENTE hasta su job
+            if PilaJob.objects.filter(planilla_id=job.planilla_id, estado="PENDIENTE").exists():
+                PilaPlanilla.objects.filter(planilla_id=job.planilla_id).update(estado="PENDIENTE")
+    except PlanillaOcupada:
+        return _liberar_job(job)
+    except Exception as e:
+        return _fallar_job(job, str(e))
+
+    job.estado = "COMPLETADO"
+    job.error = ""
+    job.fecha_fin = timezone.now()
+    job.save(update_fields=["estado", "error", "fecha_fin"])
+    return job
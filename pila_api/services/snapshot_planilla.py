@@ -0,0 +1,110 @@
+# pila_api/services/snapshot_planilla.py
+"""
+Carga de una planilla con sus detalles y novedades en un número fijo de consultas.
+
+- 1 consulta: la planilla (opcionalmente bloqueada con select_for_update)
+- 1 consulta: sus detalles, ordenados por id
+- 1 consulta (por bloque, con .iterator(chunk_size)): las novedades de esos detalles,
+  ordenadas por id
+
+calcular_planilla y generar_txt leen a través de este módulo. Como el
+Prefetch ya trae las novedades ordenadas, se recorren con d.novedades.all(): volver a
+filtrar u ordenar el manager relacionado (d.novedades.order_by(...)) ignora la caché del
+prefetch y hace una consulta por detalle.
+
+Quien escribe la planilla (calcular_planilla) la bloquea con select_for_update; la
+generación de archivos lee dentro de lectura_consistente(), sin locks de fila.
+"""
+
+from contextlib import contextmanager
+
+from django.db import connection, transaction
+from django.db.models import Prefetch
+
+from pila_api.models import PilaNovedad, PilaPlanilla, PilaPlanillaDetalle
+from pila_api.services.contexto_planilla import PlanillaContexto
+
+
+def novedades_ordenadas() -> Prefetch:
+    """Prefetch de las novedades de cada detalle, ordenadas por id."""
+    return Prefetch("novedades", queryset=PilaNovedad.objects.order_by("id"))
+
+
+def detalles_planilla(planilla, **filtros):
+    """
+    QuerySet de los detalles de la generación vigente de la planilla (filtros adicionales
+    opcionales, ej. estado="OK"; generacion=G para otra generación), ordenados por id y con
+    sus novedades precargadas.
+    """
+    filtros.setdefault("generacion", planilla.generacion)
+    return (
+        PilaPlanillaDetalle.objects
+        .filter(planilla=planilla, **filtros)
+        .order_by("id")
+        .prefetch_related(novedades_ordenadas())
+    )
+
+
+def cargar_planilla(planilla_id: int, bloquear: bool = False) -> PilaPlanilla:
+    """
+    La planilla por id; con bloquear=True toma el lock de fila (select_for_update, requiere
+    transacción). Raises PilaPlanilla.DoesNotExist.
+    """
+    planillas = PilaPlanilla.objects.select_for_update() if bloquear else PilaPlanilla.objects
+    return planillas.get(planilla_id=planilla_id)
+
+
+@contextmanager
+def lectura_consistente():
+    """
+    Transacción de solo lectura con una vista fija de la base: todas las consultas dentro
+    ven los datos confirmados al empezar, aunque otra transacción recalcule la planilla
+    mientras tanto, y no toman locks (lecturas concurrentes no se esperan entre sí ni a
+    calcular_planilla).
+
+    En PostgreSQL: REPEATABLE READ READ ONLY. En SQLite la transacción ya lee un snapshot.
+    Dentro de una transacción ya abierta se usa esa (no se puede cambiar su aislamiento).
+    Escribir aquí falla en PostgreSQL: las escrituras van después, en transacciones cortas.
+    """
+    if connection.in_atomic_block:
+        yield
+        return
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        yield
+
+
+class PlanillaSnapshot:
+    """
+    Planilla con sus detalles (lista, ordenada por id) y novedades ya cargados.
+    contexto (índice del payload_inicial) se construye la primera vez que se usa.
+    """
+
+    def __init__(self, planilla: PilaPlanilla, detalles: list):
+        self.planilla = planilla
+        self.detalles = detalles
+        self._contexto = None
+
+    @property
+    def contexto(self) -> PlanillaContexto:
+        if self._contexto is None:
+            self._contexto = PlanillaContexto.desde_planilla(self.planilla)
+        return self._contexto
+
+
+def cargar_snapshot(planilla_id: int, bloquear: bool = False, **filtros) -> PlanillaSnapshot:
+    """
+    Planilla + detalles + novedades en 3 consultas, independiente del número de detalles.
+
+    Args:
+        planilla_id: ID de la planilla
+        bloquear: select_for_update sobre la planilla (requiere transacción)
+        **filtros: filtros adicionales de los detalles (ej. estado="OK")
+
+    Raises:
+        PilaPlanilla.DoesNotExist: Si la planilla no existe
+    """
+    planilla = cargar_planilla(planilla_id, bloquear=bloquear)
+    return PlanillaSnapshot(planilla, list(detalles_planilla(planilla, **filtros)))
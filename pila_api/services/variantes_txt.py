@@ -0,0 +1,213 @@
+# pila_api/services/variantes_txt.py
+"""
+Varios archivos TXT de una planilla (E, K, por sucursal) en una sola lectura.
+
+iter_lineas_txt genera un archivo por llamada: para tener E y K hay que leer y renderizar
+la planilla dos veces. generar_variantes lee la planilla y sus detalles una
+sola vez, renderiza cada registro 02 una vez y lo reparte en la misma pasada entre los
+archivos pedidos. Cada archivo lleva su propio encabezado (tipo de planilla, sucursal,
+total cotizantes, valor nómina) y su propia secuencia 00001, 00002, ...
+
+Variantes:
+- tipos: "E" (no estudiantes), "K" (estudiantes, tipo 23), None (todos los detalles)
+- por_sucursal: un archivo por sucursal del empleado (codigo_sucursal en el payload; por
+  defecto la de la empresa). Por defecto cuando tipo_presentacion_planilla es "S"
+
+Las líneas de todos los archivos quedan en memoria (una por detalle, compartida entre
+archivos) hasta escribirlas; iter_zip las emite como un ZIP en streaming.
+"""
+
+import io
+import zipfile
+from collections.abc import Iterator
+
+from pila_api.renderers.fixed_width.registro_01 import Registro01Renderer
+from pila_api.services.calcular_planilla import version_lineas
+from pila_api.services.contexto_planilla import PlanillaContexto
+from pila_api.services.generar_txt import (
+    LONGITUD_REGISTRO_01,
+    LONGITUD_REGISTRO_02,
+    _ajustar_linea,
+    _chunk_size,
+    _linea_detalle,
+    datos_registro_01,
+    detalles_para_txt,
+    marcar_archivo_generado,
+    valor_nomina_detalle,
+)
+from pila_api.services.linea_detalle import SECUENCIA_PROVISIONAL, con_secuencia
+from pila_api.services.parametros_legales import parametros_periodo
+from pila_api.services.snapshot_planilla import cargar_planilla, lectura_consistente
+
+TIPOS_VARIANTE = ("E", "K")
+
+
+class ArchivoVariante:
+    """
+    Un archivo de generar_variantes: registro 01 ya renderizado y registros 02 con la
+    secuencia provisional (iter_lineas pone la del archivo).
+    """
+
+    __slots__ = ("tipo_planilla", "sucursal", "registro_01", "lineas", "cotizantes", "valor_total_nomina")
+
+    def __init__(self, tipo_planilla: str | None, sucursal: tuple[str, str] | None):
+        self.tipo_planilla = tipo_planilla
+        self.sucursal = sucursal
+        self.registro_01 = b""
+        self.lineas = []
+        self.cotizantes = set()
+        self.valor_total_nomina = 0
+
+    def agregar(self, linea: bytes, cotizante: tuple[str, str], valor_nomina: int):
+        self.lineas.append(linea)
+        self.cotizantes.add(cotizante)
+        self.valor_total_nomina += valor_nomina
+
+    def nombre(self, numero_interno: str) -> str:
+        """Nombre del archivo, con la misma convención de descargar_archivo (+ sucursal)."""
+        sufijo = f"_{self.tipo_planilla}" if self.tipo_planilla else ""
+        if self.sucursal is not None:
+            sufijo += f"_S{self.sucursal[0] or 'SIN'}"
+        return f"PILA_{numero_interno}{sufijo}.txt"
+
+    def iter_lineas(self) -> Iterator[bytes]:
+        """Registro 01 y registros 02 con su secuencia en este archivo (bytes Latin-1)."""
+        yield self.registro_01
+        for i, linea in enumerate(self.lineas, start=1):
+            yield con_secuencia(linea, b"%05d" % i)
+
+
+def _tipo_detalle(detalle) -> str:
+    return "K" if detalle.tipo_cotizante == "23" else "E"
+
+
+def _sucursal(emp, empresa: dict) -> tuple[str, str]:
+    """(código, nombre) de la sucursal del empleado; sin nombre se usa el código (Anexo Técnico)."""
+    codigo_empresa = str(empresa.get("codigo_sucursal", "")).strip()
+    codigo = str(emp.codigo_sucursal or codigo_empresa).strip()
+    nombre = str(emp.nombre_sucursal or "").strip()
+    if not nombre and codigo == codigo_empresa:
+        nombre = str(empresa.get("nombre_sucursal", "")).strip()
+    return codigo, nombre or codigo
+
+
+def generar_variantes(
+    planilla_id: int,
+    tipos: tuple = TIPOS_VARIANTE,
+    por_sucursal: bool | None = None,
+    chunk_size: int | None = None,
+) -> list[ArchivoVariante]:
+    """
+    Genera en una sola lectura los archivos TXT de la planilla por tipo y, si se pide, por
+    sucursal. Los archivos sin detalles no se incluyen.
+
+    Args:
+        planilla_id: ID de la planilla
+        tipos: tipos de planilla ("E", "K"; None = todos los detalles en un archivo)
+        por_sucursal: un archivo por sucursal; None = según tipo_presentacion_planilla ("S")
+        chunk_size: Detalles por bloque leído de la base (por defecto PILA_TXT_CHUNK_SIZE)
+
+    Returns:
+        Archivos en el orden de tipos y, dentro de cada tipo, por código de sucursal
+
+    Raises:
+        PilaPlanilla.DoesNotExist: Si la planilla no existe
+        ValueError: Si faltan datos requeridos en el payload o ningún archivo tiene detalles
+    """
+    chunk_size = chunk_size or _chunk_size()
+    # Lectura sobre un snapshot, sin lock de la planilla (ver iter_lineas_txt)
+    with lectura_consistente():
+        planilla = cargar_planilla(planilla_id)
+        contexto = PlanillaContexto.desde_planilla(planilla)
+        if not contexto.empresa:
+            raise ValueError("Falta 'empresa' en payload_inicial")
+
+        parametros = parametros_periodo(planilla.periodo, contexto.parametros)
+        lineas_vigentes = planilla.version_lineas == version_lineas(planilla)
+        if por_sucursal is None:
+            por_sucursal = str(contexto.empresa.get("tipo_presentacion_planilla", "U")).strip() == "S"
+
+        # Una pasada: cada registro 02 se renderiza una vez y se agrega a sus archivos
+        archivos = {}
+        for detalle in detalles_para_txt(planilla).iterator(chunk_size=chunk_size):
+            emp = contexto.empleado(detalle.tipo_doc, detalle.numero_doc)
+            linea = _ajustar_linea(
+                _linea_detalle(detalle, emp, parametros, lineas_vigentes, SECUENCIA_PROVISIONAL),
+                LONGITUD_REGISTRO_02,
+                f"Detalle {detalle.id}",
+            )
+            tipo_detalle = _tipo_detalle(detalle)
+            sucursal = _sucursal(emp, contexto.empresa) if por_sucursal else None
+            cotizante = (detalle.tipo_doc, detalle.numero_doc)
+            valor_nomina = valor_nomina_detalle(detalle)
+
+            for tipo in tipos:
+                if tipo is not None and tipo != tipo_detalle:
+                    continue
+                clave = (tipo, sucursal[0] if sucursal else None)
+                archivo = archivos.get(clave)
+                if archivo is None:
+                    archivo = archivos[clave] = ArchivoVariante(tipo, sucursal)
+                archivo.agregar(linea, cotizante, valor_nomina)
+
+        if not archivos:
+            raise ValueError(f"La planilla {planilla_id} no tiene detalles válidos")
+
+        # Encabezado de cada archivo con sus propios totales
+        renderer_01 = Registro01Renderer()
+        for archivo in archivos.values():
+            data_01 = datos_registro_01(
+                planilla,
+                contexto,
+                len(archivo.cotizantes),
+                archivo.valor_total_nomina,
+                archivo.tipo_planilla,
+                archivo.sucursal,
+            )
+            archivo.registro_01 = _ajustar_linea(
+                renderer_01.render(data_01), LONGITUD_REGISTRO_01, "Registro 01"
+            )
+
+    marcar_archivo_generado(planilla)
+
+    orden_tipos = {tipo: i for i, tipo in enumerate(tipos)}
+    return sorted(
+        archivos.values(),
+        key=lambda a: (orden_tipos[a.tipo_planilla], a.sucursal[0] if a.sucursal else ""),
+    )
+
+
+class _SalidaZip(io.RawIOBase):
+    """Destino no buscable para zipfile: acumula lo escrito hasta que iter_zip lo entrega."""
+
+    def __init__(self):
+        self.datos = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, datos) -> int:
+        self.datos += datos
+        return len(datos)
+
+    def vaciar(self) -> bytes:
+        datos = bytes(self.datos)
+        self.datos.clear()
+        return datos
+
+
+def iter_zip(archivos: list[ArchivoVariante], numero_interno: str) -> Iterator[bytes]:
+    """
+    ZIP (deflate) con un TXT por archivo, emitido por partes a medida que se comprime: no
+    arma el ZIP completo en memoria.
+    """
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for archivo in archivos:
+            with zf.open(archivo.nombre(numero_interno), "w") as destino:
+                for i, linea in enumerate(archivo.iter_lineas()):
+                    destino.write(b"\n" + linea if i else linea)
+                    if len(salida.datos) >= 64 * 1024:
+                        yield salida.vaciar()
+    # Resto del último archivo y directorio central
+    yield salida.vaciar()
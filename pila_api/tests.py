@@ -1,3 +1,1729 @@
-from django.test import TestCase
+import copy
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import random
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from decimal import Decimal
+from unittest import skipUnless
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import FileResponse
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from pila_api.compresion import codificaciones_disponibles, elegir_codificacion
+from pila_api.models import (
+    PilaArchivo,
+    PilaEmpleadosLote,
+    PilaIdempotencia,
+    PilaJob,
+    PilaNovedad,
+    PilaPlanilla,
+    PilaPlanillaDetalle,
+)
+from pila_api.renderers.fixed_width.layout import ALFA, Campo, compilar_layout
+from pila_api.renderers.fixed_width.referencia import Registro01Referencia, Registro02Referencia
+from pila_api.renderers.fixed_width.registro_01 import Registro01Renderer
+from pila_api.renderers.fixed_width.registro_02 import Registro02Renderer
+from pila_api.scripts.bench_renderers import datos_01, datos_02
+from pila_api.scripts.payload_sintetico import generar_payload
+from pila_api.serializers import EmpleadoSerializer, PayloadPlanillaSerializer
+from pila_api.services.aportes_detalle import CAMPOS_APORTES
+from pila_api.services.archivos_generados import _guardar_archivo, invalidar_archivos
+from pila_api.services.bloqueo_planilla import bloqueo_planilla, llave_bloqueo
+from pila_api.services.calcular_planilla import calcular_planilla, version_lineas
+from pila_api.services.contexto_planilla import PlanillaContexto
+from pila_api.services.generaciones_detalles import nueva_generacion, recolectar_generaciones
+from pila_api.services.generar_txt import datos_registro_01, generar_txt_planilla, iter_lineas_txt
+from pila_api.services.idempotencia import HashPayloadPorPartes, hash_payload
+from pila_api.services.ingestar_planilla import _insertar_novedades, construir_filas, ingestar_detalles
+from pila_api.services.parametros_legales import parametros_periodo
+from pila_api.services.procesar_planilla import (
+    activar_payload, ejecutar_job, encolar_planilla, reclamar_job, registrar_planilla,
+)
+from pila_api.services.variantes_txt import generar_variantes
+from pila_api.utils.centavos import a_centavos, a_texto, ceil_100, cotizacion, pesos_enteros, porcentaje
+from pila_api.utils.json_streaming import leer_objeto
+from pila_api.utils.redondeos import (
+    redondear_cotizacion,
+    redondear_cotizacion_lote,
+    redondear_ibc,
+    redondear_ibc_lote,
+)
+from pila_api.validacion import validar
+
+
+SMMLV = 1423500
+
+
+def crear_planilla(numero_interno="TEST-1", n_empleados=1, salario=SMMLV, salarios=None):
+    salarios = salarios or [salario] * n_empleados
+    empleados = [
+        {
+            "tipo_doc": "CC",
+            "num_doc": str(1000 + i),
+            "tipo_cotizante": "01",
+            "subtipo_cotizante": "00",
+            "salario_basico": salario,
+            "flags": {"salario_integral": salario >= 26 * SMMLV},
+            "entidades": {"eps": "EPS001", "afp": "230301", "arl": "14-23", "caja": "CCF22"},
+        }
+        for i, salario in enumerate(salarios)
+    ]
+    planilla = PilaPlanilla.objects.create(
+        numero_interno=numero_interno,
+        periodo="2025-12",
+        empresa_nit="900123456",
+        empresa_sucursal="001",
+        payload_inicial={
+            "empresa": {"nit": "900123456", "razon_social": "ACME SAS", "flags": {}},
+            "periodo": "2025-12",
+            "planilla": {"tipo_planilla": "E", "numero_interno": numero_interno},
+            "empleados": empleados,
+            "parametros": {
+                "smmlv": SMMLV,
+                "tope_ibc_smmlv": 25,
+                "dias_base": 30,
+                "fsp_porcentajes": {"4-16": 0.01, "16-17": 0.012, "17-18": 0.014, "18-19": 0.016, "19-20": 0.018, ">20": 0.02},
+            },
+        },
+    )
+    PilaPlanillaDetalle.objects.bulk_create([
+        PilaPlanillaDetalle(
+            planilla=planilla,
+            tipo_doc="CC",
+            numero_doc=emp["num_doc"],
+            tipo_cotizante="01",
+            subtipo_cotizante="00",
+            dias_cotizados=30,
+            dias_salud=30,
+            dias_pension=30,
+            dias_arl=30,
+            dias_caja=30,
+            ibc=emp["salario_basico"],
+            ibc_salud=emp["salario_basico"],
+            ibc_pension=emp["salario_basico"],
+            ibc_arl=emp["salario_basico"],
+            riesgo_arl="1",
+        )
+        for emp in empleados
+    ])
+    return planilla
+
+
+class PilaTransactionTestCase(TransactionTestCase):
+    """
+    TransactionTestCase que borra las tablas de la app al terminar cada test: el flush de
+    Django no encuentra las tablas del esquema "pila" (db_table 'pila"."...') en PostgreSQL
+    y las filas pasarían de un test al siguiente.
+    """
+
+    def tearDown(self):
+        PilaIdempotencia.objects.all().delete()
+        PilaPlanilla.objects.all().delete()  # en cascada: jobs, archivos, detalles y novedades
+        super().tearDown()
+
+
+class CalcularPlanillaTests(TestCase):
+
+    def test_aportes_empleado_smmlv(self):
+        planilla = crear_planilla()
+        resultado = calcular_planilla(planilla.planilla_id)
+
+        self.assertEqual(resultado["estado"], "COMPLETADA")
+        d = PilaPlanillaDetalle.objects.get(planilla=planilla)
+        self.assertEqual(d.aportes["salud"]["total"], "178000")
+        self.assertEqual(d.aportes["pension"]["total"], "227800")
+        self.assertEqual(d.aportes["arl"]["empleador"], "7500")
+        self.assertEqual(d.aportes["caja"]["empleador"], "57000")
+        self.assertEqual(d.aportes_empleado, Decimal("113910"))
+
+    def test_escrituras_no_crecen_con_detalles(self):
+        pocos = crear_planilla("TEST-POCOS", n_empleados=2)
+        # Menos detalles que batch_size: las dos planillas se guardan con un solo UPDATE por lotes
+        muchos = crear_planilla("TEST-MUCHOS", n_empleados=30)
+
+        with CaptureQueriesContext(connection) as q_pocos:
+            calcular_planilla(pocos.planilla_id, batch_size=100)
+        with CaptureQueriesContext(connection) as q_muchos:
+            calcular_planilla(muchos.planilla_id, batch_size=100)
+
+        self.assertEqual(len(q_pocos.captured_queries), len(q_muchos.captured_queries))
+
+    def test_batch_size_define_numero_de_updates(self):
+        planilla = crear_planilla(n_empleados=10)
+
+        with CaptureQueriesContext(connection) as ctx:
+            calcular_planilla(planilla.planilla_id, batch_size=3)
+
+        updates_detalle = [
+            q for q in ctx.captured_queries
+            if q["sql"].startswith("UPDATE") and "pila_planilla_detalle" in q["sql"]
+        ]
+        self.assertEqual(len(updates_detalle), 4)
+
+    def test_motor_numpy_igual_a_decimal(self):
+        salarios = [SMMLV, 1800000, 6500000.55, 23000000, 28000000, 40000000]
+        planilla = crear_planilla("TEST-MOTOR", salarios=salarios)
+
+        def resultados():
+            return list(
+                PilaPlanillaDetalle.objects.filter(planilla=planilla).order_by("id").values_list(
+                    "ibc_salud", "ibc_pension", "ibc_arl", "aportes", "aportes_empleado", "aportes_empleador",
+                )
+            )
+
+        decimal = calcular_planilla(planilla.planilla_id, motor="decimal")
+        esperado = resultados()
+        vectorizado = calcular_planilla(planilla.planilla_id, motor="numpy", full=True)
+
+        self.assertEqual(decimal, vectorizado)
+        self.assertEqual(esperado, resultados())
+        self.assertNotEqual(esperado[4][3]["pension"]["fsp_solidaridad"], "0")
+
+    def test_columnas_de_aportes_y_totales_por_sum(self):
+        planilla = crear_planilla("TEST-COLUMNAS", salarios=[SMMLV, 6500000.55, 28000000])
+        PilaPlanillaDetalle.objects.filter(planilla=planilla, numero_doc="1001").update(dias_cotizados=40)
+        resultado = calcular_planilla(planilla.planilla_id)
+        parametros = parametros_periodo(planilla.periodo, planilla.payload_inicial["parametros"])
+
+        detalles = list(PilaPlanillaDetalle.objects.filter(planilla=planilla).order_by("id"))
+        ok = [d for d in detalles if d.estado == "OK"]
+        self.assertEqual(len(ok), 2)
+        for d in ok:
+            self.assertEqual(d.salud_empleado_centavos, a_centavos(d.aportes["salud"]["empleado"]))
+            self.assertEqual(d.pension_ibc_centavos, a_centavos(d.aportes["pension"]["ibc"]))
+            self.assertEqual(d.fsp_solidaridad_centavos, a_centavos(d.aportes["pension"]["fsp_solidaridad"]))
+            self.assertEqual(d.caja_empleador_centavos, a_centavos(d.aportes["caja"]["empleador"]))
+            ibc_caja = a_centavos(d.aportes["caja"]["ibc"])
+            self.assertEqual(d.sena_centavos, cotizacion(ibc_caja, parametros.tasa_sena) * 100)
+            self.assertEqual(d.icbf_centavos, cotizacion(ibc_caja, parametros.tasa_icbf) * 100)
+        self.assertGreater(ok[1].fsp_solidaridad_centavos, 0)
+        self.assertEqual(detalles[1].salud_empleado_centavos, 0)
+
+        self.assertEqual(resultado["totales"]["empleado"], a_texto(sum(a_centavos(d.aportes_empleado) for d in ok)))
+        self.assertEqual(resultado["totales"]["empleador"], a_texto(sum(a_centavos(d.aportes_empleador) for d in ok)))
+
+        lineas = list(iter_lineas_txt(planilla.planilla_id))
+        nomina = sum(pesos_enteros(d.aportes["caja"]["ibc"]) for d in ok)
+        self.assertEqual(Registro01Renderer().render(datos_registro_01(
+            planilla, PlanillaContexto.desde_planilla(planilla), 2, nomina,
+        )).encode("iso-8859-1"), lineas[0])
+
+    def test_migracion_llena_columnas_de_aportes(self):
+        planilla = crear_planilla("TEST-BACKFILL", n_empleados=3)
+        calcular_planilla(planilla.planilla_id)
+        esperado = list(PilaPlanillaDetalle.objects.order_by("id").values(*CAMPOS_APORTES))
+        PilaPlanillaDetalle.objects.update(**dict.fromkeys(CAMPOS_APORTES, 0))
+
+        migracion = importlib.import_module("pila_api.migrations.0016_aportes_centavos")
+        migracion.llenar_aportes_centavos(django_apps, None)
+
+        self.assertEqual(list(PilaPlanillaDetalle.objects.order_by("id").values(*CAMPOS_APORTES)), esperado)
+
+    def test_motor_desconocido(self):
+        planilla = crear_planilla()
+        with self.assertRaises(ValueError):
+            calcular_planilla(planilla.planilla_id, motor="fortran")
+
+    def test_recalculo_incremental_solo_detalles_cambiados(self):
+        planilla = crear_planilla("TEST-INCREMENTAL", n_empleados=5)
+        primero = calcular_planilla(planilla.planilla_id)
+        self.assertEqual(primero["resumen"]["detalles_recalculados"], 5)
+
+        sin_cambios = calcular_planilla(planilla.planilla_id)
+        self.assertEqual(sin_cambios["resumen"]["detalles_recalculados"], 0)
+        self.assertEqual(sin_cambios["totales"], primero["totales"])
+
+        PilaPlanillaDetalle.objects.filter(planilla=planilla, numero_doc="1002").update(ibc=6 * SMMLV)
+        incremental = calcular_planilla(planilla.planilla_id)
+        self.assertEqual(incremental["resumen"]["detalles_recalculados"], 1)
+
+        completo = calcular_planilla(planilla.planilla_id, full=True)
+        self.assertEqual(completo["resumen"]["detalles_recalculados"], 5)
+        self.assertEqual(incremental["totales"], completo["totales"])
+        self.assertNotEqual(incremental["totales"], primero["totales"])
+
+    def test_recalculo_por_cambio_de_parametros(self):
+        planilla = crear_planilla("TEST-PARAMETROS", n_empleados=3)
+        calcular_planilla(planilla.planilla_id)
+
+        planilla.payload_inicial["parametros"]["smmlv"] = 1300000
+        planilla.save(update_fields=["payload_inicial"])
+        resultado = calcular_planilla(planilla.planilla_id)
+
+        self.assertEqual(resultado["resumen"]["detalles_recalculados"], 3)
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test")
+class GenerarTxtTests(TestCase):
+
+    def test_lineas_latin1_de_ancho_fijo(self):
+        planilla = crear_planilla(n_empleados=3)
+        calcular_planilla(planilla.planilla_id)
+
+        lineas = list(iter_lineas_txt(planilla.planilla_id, chunk_size=2))
+
+        self.assertEqual([len(linea) for linea in lineas], [359, 693, 693, 693])
+        self.assertTrue(all(isinstance(linea, bytes) for linea in lineas))
+        self.assertEqual(generar_txt_planilla(planilla.planilla_id), b"\n".join(lineas).decode("iso-8859-1"))
+
+    def test_linea_02_guardada_al_calcular(self):
+        planilla = crear_planilla(n_empleados=2)
+        calcular_planilla(planilla.planilla_id)
+
+        detalles = list(PilaPlanillaDetalle.objects.filter(planilla=planilla).order_by("id"))
+        lineas = generar_txt_planilla(planilla.planilla_id).split("\n")[1:]
+
+        for i, (d, linea) in enumerate(zip(detalles, lineas), start=1):
+            self.assertEqual(len(d.linea_02), 693)
+            self.assertEqual(d.linea_02[2:7], "00000")
+            self.assertEqual(linea, d.linea_02[:2] + f"{i:05d}" + d.linea_02[7:])
+
+    def test_txt_usa_linea_guardada_vigente(self):
+        planilla = crear_planilla()
+        calcular_planilla(planilla.planilla_id)
+        d = PilaPlanillaDetalle.objects.get(planilla=planilla)
+        marcada = d.linea_02[:37] + "GUARDADA".ljust(20) + d.linea_02[57:]
+        PilaPlanillaDetalle.objects.filter(id=d.id).update(linea_02=marcada)
+
+        self.assertIn("GUARDADA", generar_txt_planilla(planilla.planilla_id))
+
+    def test_linea_guardada_no_vigente_se_renderiza(self):
+        planilla = crear_planilla()
+        calcular_planilla(planilla.planilla_id)
+        d = PilaPlanillaDetalle.objects.get(planilla=planilla)
+        PilaPlanillaDetalle.objects.filter(id=d.id).update(linea_02=d.linea_02.replace("CC", "XX", 1))
+
+        # Cambia el nombre en el payload sin recalcular: la línea guardada ya no es vigente
+        planilla.refresh_from_db()
+        planilla.payload_pendiente = copy.deepcopy(planilla.payload_inicial)
+        planilla.payload_pendiente["empleados"][0]["primer_apellido"] = "NUEVO"
+        activar_payload(planilla)
+        txt = generar_txt_planilla(planilla.planilla_id)
+
+        self.assertIn("NUEVO", txt)
+        self.assertNotIn("XX", txt)
+        self.assertEqual(calcular_planilla(planilla.planilla_id)["resumen"]["detalles_recalculados"], 1)
+
+    def test_lineas_vigentes_se_revisan_por_planilla(self):
+        planilla = crear_planilla(n_empleados=3)
+        calcular_planilla(planilla.planilla_id)
+        planilla.refresh_from_db()
+        self.assertEqual(planilla.version_lineas, version_lineas(planilla))
+        for d in PilaPlanillaDetalle.objects.filter(planilla=planilla):
+            marcada = d.linea_02[:37] + "GUARDADA".ljust(20) + d.linea_02[57:]
+            PilaPlanillaDetalle.objects.filter(id=d.id).update(linea_02=marcada)
+
+        self.assertEqual(generar_txt_planilla(planilla.planilla_id).count("GUARDADA"), 3)
+
+        # Otra versión de las líneas (ej. archivos invalidados sin recalcular): se renderizan todas
+        invalidar_archivos(planilla.planilla_id)
+        self.assertNotIn("GUARDADA", generar_txt_planilla(planilla.planilla_id))
+
+    def test_consultas_no_crecen_con_detalles(self):
+        consultas = []
+        for n in (2, 8):
+            planilla = crear_planilla(numero_interno=f"TXT-{n}", n_empleados=n)
+            calcular_planilla(planilla.planilla_id)
+            with CaptureQueriesContext(connection) as ctx:
+                list(iter_lineas_txt(planilla.planilla_id, chunk_size=100))
+            consultas.append(len(ctx.captured_queries))
+
+        self.assertEqual(consultas[0], consultas[1])
+
+    @override_settings(PILA_ARCHIVOS_MAX=0)
+    def test_descarga_streaming(self):
+        planilla = crear_planilla(n_empleados=2)
+        calcular_planilla(planilla.planilla_id)
+
+        response = self.client.get(
+            f"/api/v1/pila/planillas/{planilla.planilla_id}/archivo/",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenido = b"".join(response.streaming_content)
+        self.assertEqual(contenido.decode("iso-8859-1"), generar_txt_planilla(planilla.planilla_id))
+
+    def test_sin_almacen_no_guarda_archivos(self):
+        # Por defecto (sin PILA_ARCHIVOS_DIR ni PILA_ARCHIVOS_EN_TABLA) la descarga es streaming
+        planilla = crear_planilla(n_empleados=2)
+        calcular_planilla(planilla.planilla_id)
+
+        response = self.client.get(
+            f"/api/v1/pila/planillas/{planilla.planilla_id}/archivo/",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+
+        self.assertTrue(response.streaming)
+        self.assertFalse(response.has_header("ETag"))
+        b"".join(response.streaming_content)
+        self.assertFalse(PilaArchivo.objects.exists())
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test")
+class VariantesTxtTests(TestCase):
+
+    def _planilla_mixta(self):
+        """4 empleados: 1000 y 1002 estudiantes (tipo 23); 1000-1001 sucursal 01, 1002-1003 sucursal 02."""
+        planilla = crear_planilla(n_empleados=4)
+        empleados = planilla.payload_inicial["empleados"]
+        for i, emp in enumerate(empleados):
+            emp["codigo_sucursal"] = "01" if i < 2 else "02"
+            if i % 2 == 0:
+                emp["tipo_cotizante"] = "23"
+        empleados[2]["nombre_sucursal"] = "NORTE"
+        planilla.payload_inicial["empresa"].update(codigo_sucursal="01", nombre_sucursal="PRINCIPAL")
+        planilla.save(update_fields=["payload_inicial"])
+        PilaPlanillaDetalle.objects.filter(planilla=planilla, numero_doc__in=["1000", "1002"]).update(tipo_cotizante="23")
+        calcular_planilla(planilla.planilla_id)
+        return planilla
+
+    def test_e_y_k_iguales_a_generar_por_separado(self):
+        planilla = self._planilla_mixta()
+
+        archivos = generar_variantes(planilla.planilla_id, ("E", "K"), por_sucursal=False)
+
+        self.assertEqual([a.tipo_planilla for a in archivos], ["E", "K"])
+        for archivo in archivos:
+            contenido = b"\n".join(archivo.iter_lineas()).decode("iso-8859-1")
+            self.assertEqual(contenido, generar_txt_planilla(planilla.planilla_id, archivo.tipo_planilla))
+
+    def test_archivos_por_sucursal(self):
+        planilla = self._planilla_mixta()
+
+        archivos = generar_variantes(planilla.planilla_id, (None,), por_sucursal=True)
+
+        self.assertEqual([a.sucursal for a in archivos], [("01", "PRINCIPAL"), ("02", "NORTE")])
+        for archivo in archivos:
+            lineas = list(archivo.iter_lineas())
+            registro_01 = lineas[0].decode("iso-8859-1")
+            self.assertEqual(registro_01[248:258].strip(), archivo.sucursal[0])
+            self.assertEqual(registro_01[258:298].strip(), archivo.sucursal[1])
+            self.assertEqual(int(registro_01[338:343]), 2)  # total cotizantes del archivo
+            self.assertEqual([l[2:7] for l in lineas[1:]], [b"00001", b"00002"])
+
+    def test_una_sola_lectura(self):
+        planilla = self._planilla_mixta()
+
+        with CaptureQueriesContext(connection) as ctx:
+            generar_variantes(planilla.planilla_id, ("E", "K", None), por_sucursal=True)
+        sql = [q["sql"] for q in ctx.captured_queries]
+
+        tabla = connection.ops.quote_name(PilaPlanillaDetalle._meta.db_table)
+        self.assertEqual(sum(f"FROM {tabla}" in q for q in sql), 1)
+
+    def test_descarga_zip(self):
+        planilla = self._planilla_mixta()
+
+        response = self.client.get(
+            f"/api/v1/pila/planillas/{planilla.planilla_id}/archivos/?tipos=E,K&por_sucursal=1",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as zf:
+            self.assertEqual(zf.namelist(), [
+                "PILA_TEST-1_E_S01.txt", "PILA_TEST-1_E_S02.txt",
+                "PILA_TEST-1_K_S01.txt", "PILA_TEST-1_K_S02.txt",
+            ])
+            self.assertTrue(all(len(zf.read(n).split(b"\n")) == 2 for n in zf.namelist()))
+
+    def test_tipos_invalidos(self):
+        planilla = self._planilla_mixta()
+
+        response = self.client.get(
+            f"/api/v1/pila/planillas/{planilla.planilla_id}/archivos/?tipos=X",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test", PILA_ARCHIVOS_EN_TABLA=True)
+class ArchivosGeneradosTests(TestCase):
+
+    def _descargar(self, planilla, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(
+                f"/api/v1/pila/planillas/{planilla.planilla_id}/archivo/",
+                HTTP_AUTHORIZATION="Bearer token-test",
+                **headers,
+            )
+            contenido = b"".join(response.streaming_content) if response.streaming else response.content
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        return response, contenido, sql
+
+    def test_segunda_descarga_no_lee_detalles(self):
+        planilla = crear_planilla(n_empleados=2)
+        calcular_planilla(planilla.planilla_id)
+
+        _, primera, _ = self._descargar(planilla)
+        response, segunda, sql = self._descargar(planilla)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(segunda, primera)
+        self.assertEqual(segunda.decode("iso-8859-1"), generar_txt_planilla(planilla.planilla_id))
+        self.assertEqual(response["ETag"], f'"{hashlib.sha256(segunda).hexdigest()}"')
+        self.assertEqual(response["Content-Length"], str(len(segunda)))
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="PILA_{planilla.numero_interno}.txt"')
+        self.assertNotIn("pila_planilla_detalle", sql)
+
+    def test_if_none_match_responde_304(self):
+        planilla = crear_planilla()
+        calcular_planilla(planilla.planilla_id)
+        etag = self._descargar(planilla)[0]["ETag"]
+
+        response, contenido, sql = self._descargar(planilla, HTTP_IF_NONE_MATCH=f'"otro", {etag}')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(contenido, b"")
+        self.assertNotIn("pila_planilla_detalle", sql)
+
+    def test_recalcular_invalida_archivo(self):
+        planilla = crear_planilla()
+        calcular_planilla(planilla.planilla_id)
+        etag = self._descargar(planilla)[0]["ETag"]
+
+        PilaPlanillaDetalle.objects.filter(planilla=planilla).update(ibc=2 * SMMLV)
+        calcular_planilla(planilla.planilla_id)
+        response, contenido, _ = self._descargar(planilla, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(contenido.decode("iso-8859-1"), generar_txt_planilla(planilla.planilla_id))
+        # La versión anterior se borró al guardar la nueva
+        self.assertEqual(PilaArchivo.objects.filter(planilla=planilla).count(), 1)
+
+    def test_recalcular_sin_cambios_conserva_archivo(self):
+        planilla = crear_planilla(n_empleados=2)
+        calcular_planilla(planilla.planilla_id)
+        etag = self._descargar(planilla)[0]["ETag"]
+        planilla.refresh_from_db()
+        version = planilla.version_archivo
+
+        calcular_planilla(planilla.planilla_id)
+        calcular_planilla(planilla.planilla_id, full=True)
+        response, _, _ = self._descargar(planilla, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        planilla.refresh_from_db()
+        self.assertEqual(planilla.version_archivo, version)
+
+    def test_rangos_de_bytes(self):
+        planilla = crear_planilla(n_empleados=3)
+        calcular_planilla(planilla.planilla_id)
+        _, completo, _ = self._descargar(planilla)
+        n = len(completo)
+
+        casos = {
+            "bytes=0-358": (0, 358),
+            "bytes=360-": (360, n - 1),
+            "bytes=-100": (n - 100, n - 1),
+            f"bytes=100-{n + 50}": (100, n - 1),
+        }
+        for rango, (inicio, fin) in casos.items():
+            with self.subTest(rango=rango):
+                response, contenido, _ = self._descargar(planilla, HTTP_RANGE=rango)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response["Content-Range"], f"bytes {inicio}-{fin}/{n}")
+                self.assertEqual(contenido, completo[inicio:fin + 1])
+
+        for rango in (f"bytes={n}-", "bytes=-0"):
+            with self.subTest(rango=rango):
+                response, _, _ = self._descargar(planilla, HTTP_RANGE=rango)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response["Content-Range"], f"bytes */{n}")
+
+        # If-Range con otro ETag (el archivo cambió): archivo completo
+        response, contenido, _ = self._descargar(planilla, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"viejo"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(contenido, completo)
+
+    def test_generacion_simultanea_de_la_misma_version(self):
+        planilla = crear_planilla(n_empleados=2)
+        calcular_planilla(planilla.planilla_id)
+        _, contenido, _ = self._descargar(planilla)
+        guardado = PilaArchivo.objects.get()
+
+        # Otra descarga generó la misma versión sobre su snapshot y llega a guardar después
+        planilla.refresh_from_db()
+        otro = _guardar_archivo(planilla, "", guardado.etag, contenido, guardado.tamano, guardado.ruta)
+
+        self.assertEqual(otro.id, guardado.id)
+        self.assertEqual(PilaArchivo.objects.count(), 1)
+        self.assertTrue(PilaPlanilla.objects.get(pk=planilla.pk).tiene_archivo)
+
+    @override_settings(PILA_ARCHIVOS_MAX=2)
+    def test_desalojo_por_ultima_descarga(self):
+        planillas = [crear_planilla(numero_interno=f"LRU-{i}") for i in range(3)]
+        for planilla in planillas:
+            calcular_planilla(planilla.planilla_id)
+
+        self._descargar(planillas[0])
+        self._descargar(planillas[1])
+        self._descargar(planillas[0])  # más reciente que la 1
+        self._descargar(planillas[2])
+
+        guardadas = set(PilaArchivo.objects.values_list("planilla_id", flat=True))
+        self.assertEqual(guardadas, {planillas[0].planilla_id, planillas[2].planilla_id})
+
+
+class ArchivosEnDiscoTests(ArchivosGeneradosTests):
+    """Las mismas pruebas con los archivos en PILA_ARCHIVOS_DIR (FileResponse)."""
+
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.directorio = directorio.name
+        ajustes = override_settings(PILA_ARCHIVOS_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def _en_disco(self):
+        return sorted(
+            nombre for _, _, nombres in os.walk(self.directorio) for nombre in nombres
+        )
+
+    def test_archivo_en_disco_por_contenido(self):
+        planilla = crear_planilla()
+        calcular_planilla(planilla.planilla_id)
+
+        response, contenido, _ = self._descargar(planilla)
+        archivo = PilaArchivo.objects.get(planilla=planilla)
+
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(bytes(archivo.contenido), b"")
+        self.assertEqual(self._en_disco(), [f"{archivo.etag}.txt"])
+        with open(os.path.join(self.directorio, archivo.ruta), "rb") as f:
+            self.assertEqual(f.read(), contenido)
+
+    def test_archivo_en_disco_comprimido(self):
+        planilla = crear_planilla()
+        calcular_planilla(planilla.planilla_id)
+        _, plano, _ = self._descargar(planilla)
+
+        response, comprimido, _ = self._descargar(planilla, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(comprimido), plano)
+
+    def test_desalojo_borra_archivo_en_disco(self):
+        planilla = crear_planilla()
+        calcular_planilla(planilla.planilla_id)
+        etag = self._descargar(planilla)[0]["ETag"].strip('"')
+
+        PilaPlanillaDetalle.objects.filter(planilla=planilla).update(ibc=2 * SMMLV)
+        calcular_planilla(planilla.planilla_id)
+        nuevo = self._descargar(planilla)[0]["ETag"].strip('"')
+
+        self.assertEqual(self._en_disco(), [f"{nuevo}.txt"])
+        self.assertNotEqual(etag, nuevo)
+
+
+class DescargasConcurrentesTests(PilaTransactionTestCase):
+    """
+    La generación lee sobre un snapshot (lectura_consistente), sin lock de la planilla:
+    una descarga en curso no frena a las demás ni a calcular_planilla.
+    """
+
+    N = 4
+
+    def _en_hilo(self, funcion, *args):
+        try:
+            return funcion(*args)
+        finally:
+            connection.close()
+
+    def _con_descarga_en_curso(self, planilla, n, funcion, *args):
+        """Corre funcion(*args) n veces en paralelo mientras otra descarga tiene su snapshot abierto."""
+        en_curso = iter_lineas_txt(planilla.planilla_id, chunk_size=10)
+        next(en_curso)
+        pool = ThreadPoolExecutor(n)
+        try:
+            futuros = [pool.submit(self._en_hilo, funcion, *args) for _ in range(n)]
+            _, pendientes = wait(futuros, timeout=30)
+        finally:
+            resto = list(en_curso)
+            pool.shutdown(wait=True)
+        self.assertFalse(pendientes, "las descargas esperaron a la que estaba en curso")
+        return [f.result() for f in futuros], resto
+
+    def test_descargas_en_paralelo_no_se_esperan(self):
+        planilla = crear_planilla("CONCURRENTE-1", n_empleados=60)
+        calcular_planilla(planilla.planilla_id)
+        esperado = generar_txt_planilla(planilla.planilla_id)
+
+        resultados, resto = self._con_descarga_en_curso(planilla, self.N, generar_txt_planilla, planilla.planilla_id)
+
+        self.assertEqual(resultados, [esperado] * self.N)
+        self.assertEqual(len(resto), 60)
+
+    @skipUnless(connection.vendor == "postgresql", "snapshot REPEATABLE READ de PostgreSQL")
+    def test_recalculo_no_espera_ni_cambia_descarga_en_curso(self):
+        planilla = crear_planilla("CONCURRENTE-2", n_empleados=60)
+        calcular_planilla(planilla.planilla_id)
+        esperado = generar_txt_planilla(planilla.planilla_id).split("\n")
+
+        PilaPlanillaDetalle.objects.filter(planilla=planilla).update(ibc=2 * SMMLV)
+        _, resto = self._con_descarga_en_curso(planilla, 1, calcular_planilla, planilla.planilla_id)
+
+        # La descarga en curso terminó con los datos de su snapshot, no con los recalculados
+        self.assertEqual([l.decode("iso-8859-1") for l in resto], esperado[1:])
+        self.assertNotEqual(generar_txt_planilla(planilla.planilla_id).split("\n")[1:], esperado[1:])
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test")
+class CompresionTests(TestCase):
+
+    def _crear(self, cuerpo: bytes, **headers):
+        return self.client.post(
+            "/api/v1/pila/planillas/",
+            data=cuerpo,
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer token-test",
+            **headers,
+        )
+
+    def test_cuerpo_gzip(self):
+        payload = generar_payload(5, numero_interno="GZ-1")
+
+        response = self._crear(gzip.compress(json.dumps(payload).encode()), HTTP_CONTENT_ENCODING="gzip")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        planilla = PilaPlanilla.objects.get(numero_interno="GZ-1")
+        self.assertEqual(planilla.payload_inicial["empleados"], json.loads(json.dumps(payload))["empleados"])
+        self.assertTrue(PilaPlanillaDetalle.objects.filter(planilla=planilla).exists())
+
+    def test_cuerpo_gzip_excede_tope(self):
+        cuerpo = json.dumps(generar_payload(5, numero_interno="GZ-2")).encode()
+
+        with override_settings(PILA_MAX_CUERPO_DESCOMPRIMIDO=len(cuerpo) - 1):
+            response = self._crear(gzip.compress(cuerpo), HTTP_CONTENT_ENCODING="gzip")
+
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(PilaPlanilla.objects.filter(numero_interno="GZ-2").exists())
+
+    def test_cuerpo_gzip_invalido(self):
+        response = self._crear(b"no es gzip", HTTP_CONTENT_ENCODING="gzip")
+        self.assertEqual(response.status_code, 400)
+
+        response = self._crear(b"{}", HTTP_CONTENT_ENCODING="br")
+        self.assertEqual(response.status_code, 415)
+
+    def _get(self, ruta, planilla, **headers):
+        response = self.client.get(
+            f"/api/v1/pila/planillas/{planilla.planilla_id}{ruta}",
+            HTTP_AUTHORIZATION="Bearer token-test",
+            **headers,
+        )
+        contenido = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, contenido
+
+    def test_respuestas_gzip(self):
+        planilla = crear_planilla(n_empleados=3)
+        calcular_planilla(planilla.planilla_id)
+
+        for ruta in ("/archivo/", "/payload/", "/detalles/"):
+            with self.subTest(ruta=ruta):
+                plano, esperado = self._get(ruta, planilla)
+                response, comprimido = self._get(ruta, planilla, HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+                self.assertEqual(response["Content-Encoding"], "gzip")
+                self.assertIn("Accept-Encoding", response["Vary"])
+                self.assertEqual(gzip.decompress(comprimido), esperado)
+                self.assertFalse(plano.has_header("Content-Encoding"))
+
+    @override_settings(PILA_ARCHIVOS_EN_TABLA=True)
+    def test_etag_debil_y_304_con_gzip(self):
+        planilla = crear_planilla()
+        calcular_planilla(planilla.planilla_id)
+
+        response, _ = self._get("/archivo/", planilla, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+        response, _ = self._get("/archivo/", planilla, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_payload_compacto(self):
+        planilla = crear_planilla()
+
+        _, contenido = self._get("/payload/", planilla)
+
+        self.assertEqual(json.loads(contenido), planilla.payload_inicial)
+        self.assertNotIn(b"\n", contenido)
+
+    def test_elegir_codificacion(self):
+        self.assertEqual(elegir_codificacion("gzip;q=0.5, identity"), "gzip")
+        self.assertIsNone(elegir_codificacion("gzip;q=0"))
+        self.assertIsNone(elegir_codificacion(""))
+        self.assertEqual(elegir_codificacion("*"), codificaciones_disponibles()[0])
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test")
+class ValidacionCompiladaTests(TestCase):
+    """El validador compilado devuelve lo mismo que los serializers DRF, datos y errores."""
+
+    def _payload(self, n=4):
+        return json.loads(json.dumps(generar_payload(n, numero_interno="VAL-1")))
+
+    def _resultado(self, serializer_class, data, validador):
+        try:
+            return "ok", validar(serializer_class, copy.deepcopy(data), validador)
+        except ValidationError as e:
+            return "error", e.detail
+
+    def _assert_igual(self, serializer_class, data):
+        drf = self._resultado(serializer_class, data, "drf")
+        compilado = self._resultado(serializer_class, data, "compilado")
+        self.assertEqual(compilado, drf)
+        # Mismo tipo y representación (ej. Decimal('1.50') vs Decimal('1.5'), códigos de error)
+        self.assertEqual(repr(compilado), repr(drf))
+        return drf
+
+    def test_payload_valido(self):
+        estado, datos = self._assert_igual(PayloadPlanillaSerializer, self._payload(20))
+        self.assertEqual(estado, "ok")
+        self.assertIsInstance(datos["empleados"][0]["registros"][0]["ibc"]["salud"], Decimal)
+
+    def test_errores_iguales(self):
+        casos = {
+            "sin tipo_cotizante": lambda p: p["empleados"][2].pop("tipo_cotizante"),
+            "periodo": lambda p: p.update(periodo="2025/12"),
+            "ibc texto": lambda p: p["empleados"][1]["registros"][0]["ibc"].update(salud="abc"),
+            "decimales": lambda p: p["empleados"][0].update(salario_basico="1.005"),
+            "fecha": lambda p: p["empleados"][0]["registros"][0]["novedades"].append({"codigo": "VAC", "fecha_desde": "2025-02-30"}),
+            "nit largo": lambda p: p["empresa"].update(nit="9" * 21),
+            "blanco": lambda p: p["empleados"][3].update(tipo_doc="  "),
+            "nulo": lambda p: p["empleados"][3].update(entidades=None),
+            "sin empleados": lambda p: p.update(empleados=[]),
+            "no es lista": lambda p: p.update(empleados={}),
+            # Válidos pero fuera del camino rápido: los resuelve DRF
+            "número como texto": lambda p: p["empleados"][0].update(id_empleado="7"),
+            "texto con espacios": lambda p: p["empleados"][0].update(primer_nombre="  ANA "),
+        }
+        for nombre, mutar in casos.items():
+            with self.subTest(caso=nombre):
+                payload = self._payload()
+                mutar(payload)
+                self._assert_igual(PayloadPlanillaSerializer, payload)
+                self._assert_igual(EmpleadoSerializer, payload["empleados"][0] if payload["empleados"] else {})
+
+    def test_respuesta_400_igual(self):
+        payload = self._payload()
+        payload["empleados"][1]["registros"][0]["dias"]["salud"] = "treinta"
+        respuestas = {}
+        for validador in ("drf", "compilado"):
+            with override_settings(PILA_VALIDADOR=validador):
+                response = self.client.post(
+                    "/api/v1/pila/planillas/",
+                    data=payload,
+                    content_type="application/json",
+                    HTTP_AUTHORIZATION="Bearer token-test",
+                )
+            self.assertEqual(response.status_code, 400)
+            respuestas[validador] = response.json()
+
+        self.assertEqual(respuestas["compilado"], respuestas["drf"])
+        self.assertIn("salud", respuestas["drf"]["empleados"][1]["registros"][0]["dias"])
+
+
+class IngestaDetallesTests(TestCase):
+    """ingestar_detalles: INSERTs por lotes de detalles y novedades."""
+
+    def setUp(self):
+        self.planilla = crear_planilla("INGESTA-1", n_empleados=0)
+
+    def _empleado(self, i, codigo="SLN", valor=None):
+        return {
+            "tipo_doc": "CC",
+            "numero_doc": f"7{i:05d}",
+            "nombre_completo": "PEREZ JUAN",
+            "tipo_cotizante": "01",
+            "registros": [{
+                "tipo_linea": "NORMAL",
+                "dias": {"salud": 30, "pension": 30, "arl": 30, "caja": 30},
+                "ibc": {"salud": SMMLV, "pension": SMMLV, "arl": SMMLV},
+                "novedades": [{
+                    "codigo": codigo, "fecha_desde": "2025-12-01", "fecha_hasta": "2025-12-02", "dias": 2,
+                    "valor": valor,
+                }],
+            }],
+        }
+
+    def _inserts(self, ctx, tabla):
+        return sum(q["sql"].startswith("INSERT") and f'"{tabla}"' in q["sql"] for q in ctx.captured_queries)
+
+    def test_inserta_por_lotes_de_batch_size(self):
+        empleados = (self._empleado(i) for i in range(5))  # iterable: se consume por lotes
+
+        with CaptureQueriesContext(connection) as ctx:
+            creados = ingestar_detalles(self.planilla, empleados, "1", batch_size=2, generacion=1)
+
+        self.assertEqual(creados, 5)
+        # 5 filas de a 2 por INSERT: 3 INSERT de detalles y 3 de novedades
+        self.assertEqual(self._inserts(ctx, "pila_planilla_detalle"), 3)
+        self.assertEqual(self._inserts(ctx, "pila_novedad"), 3)
+        self.assertEqual(PilaPlanillaDetalle.objects.filter(planilla=self.planilla, generacion=1).count(), 5)
+        self.assertEqual(PilaNovedad.objects.filter(detalle__planilla=self.planilla).count(), 5)
+
+    def test_codigo_largo_se_rechaza_antes_del_insert(self):
+        # En PostgreSQL el INSERT por lotes recortaría "XXXX" a "XXX" sin error
+        empleados = [self._empleado(1), self._empleado(2, codigo="XXXX")]
+
+        with CaptureQueriesContext(connection) as ctx:
+            with self.assertRaisesRegex(ValueError, "numero_doc=700002, codigo_novedad=XXXX"):
+                ingestar_detalles(self.planilla, empleados, "1", generacion=1)
+
+        self.assertEqual(self._inserts(ctx, "pila_novedad"), 0)
+        self.assertFalse(PilaNovedad.objects.exists())
+
+    @skipUnless(connection.vendor == "postgresql", "DataError por desborde de numeric de PostgreSQL")
+    def test_novedad_invalida_reintenta_fila_a_fila(self):
+        empleados = [self._empleado(1), self._empleado(2, valor="10000000000000")]
+        filas = construir_filas(self.planilla, empleados, "1")
+        novedades = []
+        for detalle, novedades_detalle in filas:
+            detalle.generacion = 1
+            detalle.save()
+            for novedad in novedades_detalle:
+                novedad.detalle = detalle
+                novedades.append(novedad)
+
+        with CaptureQueriesContext(connection) as ctx:
+            with self.assertRaisesRegex(ValueError, "numero_doc=700002, codigo_novedad=SLN"):
+                _insertar_novedades(self.planilla, novedades, batch_size=10)
+
+        # Un INSERT del lote y, al fallar, uno por fila (cada uno en su savepoint)
+        self.assertEqual(self._inserts(ctx, "pila_novedad"), 3)
+        # El savepoint deja usable la transacción: la fila válida quedó insertada
+        self.assertEqual(list(PilaNovedad.objects.values_list("detalle__numero_doc", flat=True)), ["700001"])
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test")
+class IngestaStreamingTests(TestCase):
+
+    def _crear(self, payload, query="?stream=1", **headers):
+        cuerpo = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        return self.client.post(
+            f"/api/v1/pila/planillas/{query}",
+            data=cuerpo,
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer token-test",
+            **headers,
+        )
+
+    def _payload(self, planilla):
+        response = self.client.get(
+            f"/api/v1/pila/planillas/{planilla.planilla_id}/payload/",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+        return json.loads(b"".join(response.streaming_content))
+
+    def _detalles(self, numero_interno):
+        return list(
+            PilaPlanillaDetalle.objects
+            .filter(planilla__numero_interno=numero_interno)
+            .order_by("id")
+            .values("tipo_doc", "numero_doc", "dias_salud", "ibc_salud", "aportes", "estado", "linea_02")
+        )
+
+    def test_leer_objeto_por_bloques(self):
+        documento = {"a": 12345678901234, "empleados": [{"n": "ñandú", "x": 1.5}, {"n": "é", "x": 10}], "z": [True, None]}
+        cuerpo = json.dumps(documento, ensure_ascii=False, indent=1).encode()
+
+        # Bloques de 1 a 5 bytes: claves, números y caracteres UTF-8 partidos entre bloques
+        for bloque in range(1, 6):
+            with self.subTest(bloque=bloque):
+                eventos = list(leer_objeto(io.BytesIO(cuerpo), "empleados", bloque))
+                self.assertEqual(eventos, [
+                    ("a", 12345678901234),
+                    ("empleados", {"n": "ñandú", "x": 1.5}),
+                    ("empleados", {"n": "é", "x": 10}),
+                    ("z", [True, None]),
+                ])
+
+        for invalido in (b'{"a": 1', b'{"a": 1} x', b'[1]', b'{"empleados": {}}', b'{"a": tru}'):
+            with self.subTest(invalido=invalido), self.assertRaises(ValueError):
+                list(leer_objeto(io.BytesIO(invalido), "empleados", 3))
+
+    @override_settings(PILA_INGESTA_BATCH_SIZE=2)
+    def test_mismo_resultado_que_crear_normal(self):
+        payload = generar_payload(7, numero_interno="ST-N")
+        self.assertEqual(self._crear(payload, query="").status_code, 201)
+
+        payload["planilla"]["numero_interno"] = "ST-S"
+        response = self._crear(payload)
+
+        self.assertEqual(response.status_code, 201, response.content)
+        normal = PilaPlanilla.objects.get(numero_interno="ST-N")
+        streaming = PilaPlanilla.objects.get(numero_interno="ST-S")
+        self.assertEqual(streaming.totales, normal.totales)
+        self.assertEqual(self._detalles("ST-S"), self._detalles("ST-N"))
+        self.assertEqual(
+            PilaNovedad.objects.filter(detalle__planilla=streaming).count(),
+            PilaNovedad.objects.filter(detalle__planilla=normal).count(),
+        )
+        # Registros 02 con los datos de los empleados leídos de los lotes (el 01 lleva el numero_interno)
+        txt = {p.numero_interno: generar_txt_planilla(p.planilla_id).split("\n")[1:] for p in (normal, streaming)}
+        self.assertEqual(txt["ST-S"], txt["ST-N"])
+
+        # Sin la lista de empleados en payload_inicial: van de a 2 por lote
+        self.assertNotIn("empleados", streaming.payload_inicial)
+        lotes = PilaEmpleadosLote.objects.filter(planilla=streaming, generacion=streaming.generacion)
+        self.assertEqual([len(lote.empleados) for lote in lotes.order_by("lote")], [2, 2, 2, 1])
+        self.assertEqual(self._payload(streaming), json.loads(json.dumps(payload)))
+        self.assertEqual(streaming.hash_payload, hash_payload(payload))
+
+        # Reenvío sin force: no reingiere, responde 200 y reemplaza los lotes de la generación
+        payload["empleados"][0]["primer_nombre"] = "REENVIO"
+        self.assertEqual(self._crear(payload).status_code, 200)
+        streaming.refresh_from_db()
+        self.assertEqual(streaming.generacion, 1)
+        self.assertEqual(PilaEmpleadosLote.objects.filter(planilla=streaming).count(), 4)
+        self.assertEqual(self._payload(streaming), json.loads(json.dumps(payload)))
+
+    def test_empleados_antes_del_encabezado_y_gzip(self):
+        payload = generar_payload(3, numero_interno="ST-GZ")
+        invertido = {"empleados": payload["empleados"], **{k: v for k, v in payload.items() if k != "empleados"}}
+
+        response = self._crear(gzip.compress(json.dumps(invertido).encode()), HTTP_CONTENT_ENCODING="gzip")
+
+        self.assertEqual(response.status_code, 201, response.content)
+        planilla = PilaPlanilla.objects.get(numero_interno="ST-GZ")
+        self.assertEqual(self._payload(planilla), invertido)
+        self.assertTrue(PilaPlanillaDetalle.objects.filter(planilla=planilla).exists())
+
+    @override_settings(PILA_INGESTA_BATCH_SIZE=2)
+    def test_empleado_invalido_deshace_la_ingesta(self):
+        payload = generar_payload(6, numero_interno="ST-ERR")
+        del payload["empleados"][4]["tipo_cotizante"]
+
+        response = self._crear(payload)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("tipo_cotizante", response.json()["empleados"]["4"])
+        self.assertFalse(PilaPlanilla.objects.filter(numero_interno="ST-ERR").exists())
+        self.assertFalse(PilaPlanillaDetalle.objects.exists())
+
+    def test_cuerpo_invalido(self):
+        payload = generar_payload(2, numero_interno="ST-X")
+
+        self.assertEqual(self._crear(json.dumps(payload).encode()[:-20]).status_code, 400)
+        self.assertEqual(self._crear({**payload, "empleados": []}).status_code, 400)
+        self.assertEqual(self._crear(payload, query="?stream=1&async=1").status_code, 400)
+        self.assertFalse(PilaPlanilla.objects.filter(numero_interno="ST-X").exists())
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test")
+class IdempotenciaTests(TestCase):
+
+    def _crear(self, payload, query="", **headers):
+        cuerpo = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        return self.client.post(
+            f"/api/v1/pila/planillas/{query}",
+            data=cuerpo,
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer token-test",
+            **headers,
+        )
+
+    def _ids_detalles(self, numero_interno):
+        return list(
+            PilaPlanillaDetalle.objects
+            .filter(planilla__numero_interno=numero_interno)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+    def test_mismo_payload_no_reprocesa(self):
+        payload = generar_payload(3, numero_interno="IDEM-1")
+        primera = self._crear(payload)
+        self.assertEqual(primera.status_code, 201)
+        ids = self._ids_detalles("IDEM-1")
+
+        # Mismo contenido con otro orden de claves y formato, incluso con force=1
+        reordenado = json.dumps(dict(reversed(list(payload.items()))), indent=2).encode()
+        with CaptureQueriesContext(connection) as ctx:
+            segunda = self._crear(reordenado, query="?force=1")
+
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(segunda["Idempotent-Replayed"], "true")
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(self._ids_detalles("IDEM-1"), ids)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_hash_canonico_por_partes(self):
+        payloads = [
+            generar_payload(5, numero_interno="IDEM-H"),
+            {"z": [1, {"b": "ñ", "a": None}], "a": {"y": Decimal("1.50"), "x": [[], {}]}},
+            [], {}, "texto", 7,
+        ]
+        for payload in payloads:
+            canonico = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+            self.assertEqual(hash_payload(payload), hashlib.sha256(canonico.encode("utf-8")).hexdigest())
+
+    def test_hash_con_empleados_recibidos_de_a_uno(self):
+        # "aa" y "zz" quedan antes y después de "empleados" en el JSON canónico
+        payload = {**generar_payload(4, numero_interno="IDEM-P"), "aa": {"b": 1, "a": "ñ"}, "zz": None}
+        for empleados in (payload["empleados"], [{}]):
+            with self.subTest(n=len(empleados)):
+                huella = HashPayloadPorPartes()
+                for emp in empleados:
+                    huella.agregar_empleado(emp)
+                resto = {k: v for k, v in payload.items() if k != "empleados"}
+                self.assertEqual(huella.hexdigest(resto), hash_payload({**resto, "empleados": empleados}))
+
+    def test_payload_distinto_reprocesa(self):
+        payload = generar_payload(3, numero_interno="IDEM-2")
+        self._crear(payload)
+        ids = self._ids_detalles("IDEM-2")
+
+        payload["empleados"][0]["primer_nombre"] = "OTRO"
+        response = self._crear(payload, query="?force=1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertNotEqual(self._ids_detalles("IDEM-2"), ids)
+        planilla = PilaPlanilla.objects.get(numero_interno="IDEM-2")
+        self.assertEqual(planilla.payload_inicial["empleados"][0]["primer_nombre"], "OTRO")
+
+    def test_idempotency_key(self):
+        payload = generar_payload(2, numero_interno="IDEM-3")
+        primera = self._crear(payload, HTTP_IDEMPOTENCY_KEY="clave-1")
+        self.assertEqual(primera.status_code, 201)
+
+        repetida = self._crear(payload, HTTP_IDEMPOTENCY_KEY="clave-1")
+        self.assertEqual(repetida.status_code, 201)
+        self.assertEqual(repetida["Idempotent-Replayed"], "true")
+        self.assertEqual(repetida.json(), primera.json())
+
+        payload["empleados"][0]["primer_nombre"] = "OTRO"
+        self.assertEqual(self._crear(payload, HTTP_IDEMPOTENCY_KEY="clave-1").status_code, 422)
+
+    def test_idempotency_key_vencida(self):
+        payload = generar_payload(2, numero_interno="IDEM-4")
+        self._crear(payload, HTTP_IDEMPOTENCY_KEY="clave-2")
+        PilaIdempotencia.objects.update(fecha_creacion=timezone.now() - timedelta(days=2))
+
+        payload["empleados"][0]["primer_nombre"] = "OTRO"
+        response = self._crear(payload, HTTP_IDEMPOTENCY_KEY="clave-2")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(PilaIdempotencia.objects.count(), 1)
+
+    def test_idempotency_key_streaming(self):
+        payload = generar_payload(2, numero_interno="IDEM-5")
+        primera = self._crear(payload, query="?stream=1", HTTP_IDEMPOTENCY_KEY="clave-3")
+        self.assertEqual(primera.status_code, 201)
+
+        repetida = self._crear(payload, query="?stream=1", HTTP_IDEMPOTENCY_KEY="clave-3")
+        self.assertEqual(repetida.json(), primera.json())
+        self.assertEqual(repetida["Idempotent-Replayed"], "true")
+
+        # El hash guardado por la ingesta streaming también sirve al POST normal
+        self.assertEqual(self._crear(payload)["Idempotent-Replayed"], "true")
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test")
+class GeneracionesDetallesTests(TestCase):
+    """
+    Reingesta por generaciones: la nueva se escribe al lado de la vigente, calcular_planilla
+    la activa junto con los totales y recolectar_generaciones borra las anteriores.
+    """
+
+    def setUp(self):
+        self.payload = generar_payload(6, numero_interno="GEN-1")
+        response = self.client.post(
+            "/api/v1/pila/planillas/",
+            data=json.dumps(self.payload),
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.planilla = PilaPlanilla.objects.get(numero_interno="GEN-1")
+
+    def _ids_listados(self):
+        response = self.client.get(
+            f"/api/v1/pila/planillas/{self.planilla.planilla_id}/detalles/?fields=detalle_id",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+        return [d["detalle_id"] for d in response.json()["detalles"]]
+
+    def _ids_generacion(self, generacion):
+        return list(
+            PilaPlanillaDetalle.objects
+            .filter(planilla=self.planilla, generacion=generacion)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+    def _ingerir(self):
+        """Ingiere el payload como una generación nueva, sin activarla."""
+        payload = validar(PayloadPlanillaSerializer, self.payload)
+        generacion = nueva_generacion(self.planilla)
+        ingestar_detalles(self.planilla, payload["empleados"], "1", generacion=generacion)
+        return generacion
+
+    def test_lecturas_ven_la_generacion_vigente_hasta_el_cambio(self):
+        vigente = self.planilla.generacion
+        viejos = self._ids_generacion(vigente)
+        txt = generar_txt_planilla(self.planilla.planilla_id)
+        self.assertEqual(self._ids_listados(), viejos)
+
+        nueva = self._ingerir()
+        self.assertEqual(nueva, vigente + 1)
+        # Generación nueva escrita, todavía sin activar: las lecturas no cambian
+        self.assertEqual(self._ids_listados(), viejos)
+        self.assertEqual(generar_txt_planilla(self.planilla.planilla_id), txt)
+
+        calcular_planilla(self.planilla.planilla_id, generacion=nueva)
+        self.planilla.refresh_from_db()
+        self.assertEqual(self.planilla.generacion, nueva)
+        self.assertEqual(self._ids_listados(), self._ids_generacion(nueva))
+        self.assertTrue(set(viejos).isdisjoint(self._ids_generacion(nueva)))
+        # Mismo payload: mismos totales y mismo TXT con los detalles nuevos
+        self.assertEqual(generar_txt_planilla(self.planilla.planilla_id), txt)
+
+        # La generación anterior queda hasta la recolección
+        self.assertEqual(self._ids_generacion(vigente), viejos)
+        self.assertEqual(recolectar_generaciones(), len(viejos))
+        self.assertEqual(self._ids_generacion(vigente), [])
+        self.assertFalse(PilaNovedad.objects.filter(detalle_id__in=viejos).exists())
+        self.assertEqual(recolectar_generaciones(), 0)
+
+    def test_force_reingiere_como_generacion_nueva(self):
+        vigente = self.planilla.generacion
+        self.payload["empleados"][0]["nombre_completo"] = "OTRO APELLIDO"
+        response = self.client.post(
+            "/api/v1/pila/planillas/?force=1",
+            data=json.dumps(self.payload),
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.planilla.refresh_from_db()
+
+        self.assertEqual(self.planilla.generacion, vigente + 1)
+        self.assertEqual(self._ids_listados(), self._ids_generacion(vigente + 1))
+        self.assertNotEqual(self._ids_generacion(vigente), [])
+
+    def test_payload_nuevo_se_activa_con_la_generacion(self):
+        txt = generar_txt_planilla(self.planilla.planilla_id)
+        anterior = self.planilla.payload_inicial
+        nuevo = copy.deepcopy(self.payload)
+        nuevo["empresa"]["razon_social"] = "EMPRESA REINGESTA SAS"  # encabezado (registro 01) del payload
+
+        # Reingesta a medio camino: payload registrado y generación nueva escrita
+        planilla, created = registrar_planilla(validar(PayloadPlanillaSerializer, nuevo), nuevo)
+        self.assertFalse(created)
+        generacion = nueva_generacion(planilla)
+        ingestar_detalles(planilla, validar(PayloadPlanillaSerializer, nuevo)["empleados"], "1", generacion=generacion)
+
+        # Las lecturas siguen con payload, estado, detalles y TXT anteriores
+        self.planilla.refresh_from_db()
+        self.assertEqual(self.planilla.payload_inicial, anterior)
+        self.assertEqual(self.planilla.payload_pendiente, nuevo)
+        self.assertEqual(self.planilla.estado, "COMPLETADA")
+        self.assertEqual(generar_txt_planilla(self.planilla.planilla_id), txt)
+
+        calcular_planilla(self.planilla.planilla_id, generacion=generacion)
+        self.planilla.refresh_from_db()
+        self.assertEqual(self.planilla.payload_inicial, nuevo)
+        self.assertIsNone(self.planilla.payload_pendiente)
+        self.assertIn("EMPRESA REINGESTA SAS", generar_txt_planilla(self.planilla.planilla_id))
+
+    def test_payload_sin_reingesta_se_activa_sin_quedar_en_proceso(self):
+        version = self.planilla.version_archivo
+        self.payload["meta"] = {"origen": "reintento"}
+        response = self.client.post(
+            "/api/v1/pila/planillas/",
+            data=json.dumps(self.payload),
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.planilla.refresh_from_db()
+
+        self.assertEqual(self.planilla.payload_inicial, self.payload)
+        self.assertIsNone(self.planilla.payload_pendiente)
+        self.assertEqual(self.planilla.estado, "COMPLETADA")
+        self.assertEqual(self.planilla.version_archivo, version + 1)
+
+    def test_recoleccion_por_lotes_no_toca_generaciones_sin_activar(self):
+        viejos = self._ids_generacion(self.planilla.generacion)
+        calcular_planilla(self.planilla.planilla_id, generacion=self._ingerir())
+        pendiente = self._ingerir()  # ingesta en curso (mayor que la vigente)
+        self.planilla.refresh_from_db()
+
+        self.assertEqual(recolectar_generaciones(batch_size=2, max_lotes=1), 2)
+        self.assertEqual(recolectar_generaciones(batch_size=2), len(viejos) - 2)
+        self.assertNotEqual(self._ids_generacion(pendiente), [])
+        self.assertNotEqual(self._ids_generacion(self.planilla.generacion), [])
+
+        # Una ingesta que quedó sin activar no se reutiliza: la siguiente va después
+        self.assertEqual(nueva_generacion(self.planilla), pendiente + 1)
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test")
+class CrearPlanillaConcurrenteTests(PilaTransactionTestCase):
+    """
+    crear_planilla concurrente sobre el mismo numero_interno (bloqueo_planilla): de a una
+    petición por planilla; las idénticas a la que está en curso reutilizan su resultado.
+    """
+
+    def _crear(self, payload, query=""):
+        try:
+            response = Client().post(
+                f"/api/v1/pila/planillas/{query}",
+                data=json.dumps(payload),
+                content_type="application/json",
+                HTTP_AUTHORIZATION="Bearer token-test",
+            )
+            return response.status_code, response.has_header("Idempotent-Replayed"), response.json()
+        finally:
+            connection.close()
+
+    def test_peticiones_identicas_reutilizan_el_primer_resultado(self):
+        payload = generar_payload(20, numero_interno="SINGLE-1")
+        with ThreadPoolExecutor(4) as pool:
+            resultados = list(pool.map(lambda _: self._crear(payload, "?force=1"), range(4)))
+
+        procesadas = [r for r in resultados if not r[1]]
+        self.assertEqual([r[0] for r in procesadas], [201])
+        self.assertTrue(all(r[0] == 200 and r[2] == procesadas[0][2] for r in resultados if r[1]))
+        self.assertEqual(PilaPlanilla.objects.filter(numero_interno="SINGLE-1").count(), 1)
+        # Detalles de una sola ingesta (mismo payload procesado una vez, sin concurrencia)
+        self._crear(generar_payload(20, numero_interno="SINGLE-0"))
+        self.assertEqual(
+            PilaPlanillaDetalle.objects.filter(planilla__numero_interno="SINGLE-1").count(),
+            PilaPlanillaDetalle.objects.filter(planilla__numero_interno="SINGLE-0").count(),
+        )
+
+    def test_peticion_espera_a_la_que_tiene_el_bloqueo(self):
+        payload = generar_payload(3, numero_interno="SINGLE-2")
+        with ThreadPoolExecutor(1) as pool:
+            with bloqueo_planilla("SINGLE-2"):
+                futuro = pool.submit(self._crear, payload)
+                _, pendientes = wait([futuro], timeout=0.5)
+                self.assertTrue(pendientes, "la petición no esperó el bloqueo de la planilla")
+                self.assertFalse(PilaPlanilla.objects.filter(numero_interno="SINGLE-2").exists())
+            self.assertEqual(futuro.result(timeout=30)[0], 201)
+
+        # Otra planilla no espera
+        with bloqueo_planilla("SINGLE-2"):
+            self.assertEqual(self._crear(generar_payload(3, numero_interno="SINGLE-3"))[0], 201)
+
+    @override_settings(PILA_BLOQUEO_TIMEOUT=0.3)
+    def test_peticion_que_no_obtiene_el_bloqueo_responde_409(self):
+        payload = generar_payload(3, numero_interno="SINGLE-4")
+        with ThreadPoolExecutor(1) as pool:
+            with bloqueo_planilla("SINGLE-4"):
+                codigo, _, cuerpo = pool.submit(self._crear, payload).result(timeout=30)
+
+        self.assertEqual(codigo, 409)
+        self.assertIn("SINGLE-4", cuerpo["detail"])
+        self.assertFalse(PilaPlanilla.objects.filter(numero_interno="SINGLE-4").exists())
+        # Sin el bloqueo se procesa normalmente
+        self.assertEqual(self._crear(payload)[0], 201)
+
+    def test_llave_de_bloqueo_estable(self):
+        self.assertEqual(llave_bloqueo("PLAN-1"), llave_bloqueo("PLAN-1"))
+        self.assertNotEqual(llave_bloqueo("PLAN-1"), llave_bloqueo("PLAN-2"))
+        self.assertTrue(-(2 ** 63) <= llave_bloqueo("PLAN-1") < 2 ** 63)
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test", PILA_JOBS_TIMEOUT=60, PILA_JOBS_MAX_INTENTOS=3)
+class ColaJobsTests(PilaTransactionTestCase):
+    """
+    Modo asíncrono: ?async=1 encola, el worker (procesar_planillas) reclama y procesa.
+    TransactionTestCase: el worker cierra las conexiones viejas en cada vuelta.
+    """
+
+    def _encolar(self, payload):
+        return self.client.post(
+            "/api/v1/pila/planillas/?async=1",
+            data=json.dumps(payload),
+            content_type="application/json",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+
+    def _worker(self):
+        salida = io.StringIO()
+        call_command("procesar_planillas", "--once", "--lotes-recoleccion", "0", stdout=salida)
+        return salida.getvalue()
+
+    def _job_huerfano(self, intentos):
+        planilla = crear_planilla(f"COLA-HUERFANO-{intentos}")
+        job = encolar_planilla(planilla, None)
+        PilaJob.objects.filter(job_id=job.job_id).update(
+            estado="EN_PROCESO", intentos=intentos, fecha_inicio=timezone.now() - timedelta(seconds=120),
+        )
+        return planilla, job
+
+    def test_async_responde_202_con_location(self):
+        payload = generar_payload(3, numero_interno="COLA-1")
+        response = self._encolar(payload)
+
+        self.assertEqual(response.status_code, 202)
+        planilla = PilaPlanilla.objects.get(numero_interno="COLA-1")
+        self.assertEqual(response["Location"], f"/api/v1/pila/planillas/{planilla.planilla_id}/")
+        self.assertEqual(response.json()["job"]["estado"], "PENDIENTE")
+        self.assertEqual(response.json()["estado"], "PENDIENTE")
+        self.assertEqual(planilla.estado, "PENDIENTE")
+        self.assertFalse(PilaPlanillaDetalle.objects.filter(planilla=planilla).exists())
+
+        job = PilaJob.objects.get(planilla=planilla)
+        self.assertEqual(job.payload, payload)
+        self.assertTrue(job.created)
+
+    def test_worker_procesa_cada_job_con_su_payload(self):
+        primero = generar_payload(3, numero_interno="COLA-2")
+        segundo = copy.deepcopy(primero)
+        segundo["empresa"]["razon_social"] = "EMPRESA SEGUNDO POST SAS"
+        self.assertEqual(self._encolar(primero).status_code, 202)
+        self.assertEqual(self._encolar(segundo).status_code, 202)
+        primer_job, segundo_job = PilaJob.objects.order_by("job_id")
+
+        ejecutar_job(reclamar_job())
+        planilla = PilaPlanilla.objects.get(numero_interno="COLA-2")
+        self.assertEqual(planilla.estado, "PENDIENTE")  # queda el job del segundo POST
+        self.assertEqual(planilla.payload_inicial, primero)
+        self.assertTrue(PilaPlanillaDetalle.objects.filter(planilla=planilla, generacion=planilla.generacion).exists())
+
+        salida = self._worker()
+        planilla.refresh_from_db()
+        self.assertIn("1 job(s) procesados", salida)
+        self.assertEqual(planilla.estado, "COMPLETADA")
+        self.assertEqual(planilla.payload_inicial, segundo)
+        self.assertEqual(
+            list(PilaJob.objects.order_by("job_id").values_list("estado", "intentos")),
+            [("COMPLETADO", 1), ("COMPLETADO", 1)],
+        )
+
+    def test_worker_fallido_deja_error(self):
+        planilla = crear_planilla("COLA-3")
+        job = encolar_planilla(planilla, {"empresa": {}})
+
+        salida = self._worker()
+
+        job.refresh_from_db()
+        planilla.refresh_from_db()
+        self.assertIn(f"Job {job.job_id} fallido", salida)
+        self.assertEqual(job.estado, "FALLIDO")
+        self.assertTrue(job.error)
+        self.assertIsNotNone(job.fecha_fin)
+        self.assertEqual(planilla.estado, "CON_ERRORES")
+        self.assertIn(f"Error procesando job {job.job_id}", planilla.errores[0])
+
+    def test_job_de_planilla_borrada_no_detiene_el_worker(self):
+        planilla = crear_planilla("COLA-4")
+        encolar_planilla(planilla, None)
+        job = reclamar_job()
+        planilla.delete()
+
+        job = ejecutar_job(job)
+
+        self.assertEqual(job.estado, "FALLIDO")
+        self.assertFalse(PilaJob.objects.exists())
+
+    @override_settings(PILA_BLOQUEO_TIMEOUT=0.3)
+    def test_job_de_planilla_ocupada_vuelve_a_la_cola(self):
+        planilla = crear_planilla("COLA-OCUPADA")
+        encolar_planilla(planilla, None)
+
+        def ejecutar():
+            try:
+                return ejecutar_job(reclamar_job())
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(1) as pool:
+            with bloqueo_planilla("COLA-OCUPADA"):
+                job = pool.submit(ejecutar).result(timeout=30)
+
+        job.refresh_from_db()
+        self.assertEqual((job.estado, job.intentos, job.fecha_inicio), ("PENDIENTE", 0, None))
+        # Otro worker lo retoma con el intento sin gastar
+        retomado = reclamar_job()
+        self.assertEqual((retomado.job_id, retomado.intentos), (job.job_id, 1))
+
+    def test_reclamar_no_repite_jobs(self):
+        for numero_interno in ("COLA-5", "COLA-6"):
+            encolar_planilla(crear_planilla(numero_interno), None)
+
+        primero, segundo = reclamar_job(), reclamar_job()
+
+        self.assertNotEqual(primero.job_id, segundo.job_id)
+        self.assertIsNone(reclamar_job())
+        self.assertEqual(set(PilaJob.objects.values_list("estado", flat=True)), {"EN_PROCESO"})
+
+    def test_reclamar_retoma_job_huerfano(self):
+        _, huerfano = self._job_huerfano(intentos=1)
+        reciente = encolar_planilla(crear_planilla("COLA-7"), None)
+        PilaJob.objects.filter(job_id=reciente.job_id).update(estado="EN_PROCESO", fecha_inicio=timezone.now())
+
+        job = reclamar_job()
+
+        self.assertEqual(job.job_id, huerfano.job_id)
+        self.assertEqual(job.intentos, 2)
+        self.assertIsNone(reclamar_job())  # el EN_PROCESO reciente sigue en su worker
+
+    def test_job_huerfano_sin_intentos_queda_fallido(self):
+        planilla, huerfano = self._job_huerfano(intentos=3)
+
+        self.assertIsNone(reclamar_job())
+
+        huerfano.refresh_from_db()
+        planilla.refresh_from_db()
+        self.assertEqual(huerfano.estado, "FALLIDO")
+        self.assertIn("3 intento(s)", huerfano.error)
+        self.assertEqual(planilla.estado, "CON_ERRORES")
+
+    @skipUnless(connection.vendor == "postgresql", "SELECT ... FOR UPDATE SKIP LOCKED de PostgreSQL")
+    def test_reclamar_salta_jobs_bloqueados(self):
+        primero = encolar_planilla(crear_planilla("COLA-SKIP-1"), None)
+        segundo = encolar_planilla(crear_planilla("COLA-SKIP-2"), None)
+
+        def reclamar():
+            try:
+                return reclamar_job()
+            finally:
+                connection.close()
+
+        # Otro worker tiene tomado el primero (fila bloqueada): este reclama el siguiente
+        with transaction.atomic():
+            PilaJob.objects.select_for_update().get(job_id=primero.job_id)
+            with ThreadPoolExecutor(1) as pool:
+                job = pool.submit(reclamar).result(timeout=10)
+
+        self.assertEqual(job.job_id, segundo.job_id)
+        self.assertEqual(PilaJob.objects.get(job_id=primero.job_id).estado, "PENDIENTE")
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test", PILA_ARCHIVOS_EN_TABLA=True)
+class ConsultasPorEndpointTests(TestCase):
+    """
+    Número de consultas por endpoint: fijo, sin importar cuántos detalles/novedades haya.
+    Los conteos incluyen los SAVEPOINT/RELEASE de transaction.atomic dentro del TestCase.
+    """
+
+    CONSULTAS = {
+        ("get", "/"): 2,            # planilla + último job
+        ("get", "/detalles/"): 3,   # planilla + detalles + novedades
+        ("get", "/detalles/?fields=numero_doc,estado"): 2,  # sin novedades
+        ("get", "/detalles/?formato=ndjson"): 3,
+        ("post", "/calcular/?full=1"): 9,  # planilla + detalles + novedades + bulk_update + SUM + totales
+        # Primera descarga (genera y guarda): planilla + archivo vigente + existe OK + de nuevo en
+        # obtener_archivo + snapshot (planilla + TXT, 5) + guardar/borrar anteriores + tiene_archivo + desalojo
+        ("get", "/archivo/"): 16,
+    }
+
+    def _planilla_con_novedades(self, numero_interno, n):
+        planilla = crear_planilla(numero_interno=numero_interno, n_empleados=n)
+        PilaNovedad.objects.bulk_create([
+            PilaNovedad(detalle=d, tipo_novedad=tipo, fecha_inicio="2025-12-01", fecha_fin="2025-12-01", dias=1)
+            for d in PilaPlanillaDetalle.objects.filter(planilla=planilla)
+            for tipo in ("VAR", "ING")
+        ])
+        calcular_planilla(planilla.planilla_id)
+        return planilla
+
+    def _consultas(self, metodo, ruta, planilla):
+        url = f"/api/v1/pila/planillas/{planilla.planilla_id}{ruta}"
+        with CaptureQueriesContext(connection) as ctx:
+            response = getattr(self.client, metodo)(url, HTTP_AUTHORIZATION="Bearer token-test")
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, ruta)
+        return len(ctx.captured_queries)
+
+    def test_consultas_fijas_por_endpoint(self):
+        pequena = self._planilla_con_novedades("Q-2", 2)
+        grande = self._planilla_con_novedades("Q-20", 20)
+
+        for (metodo, ruta), esperado in self.CONSULTAS.items():
+            with self.subTest(ruta=ruta):
+                self.assertEqual(self._consultas(metodo, ruta, pequena), esperado)
+                self.assertEqual(self._consultas(metodo, ruta, grande), esperado)
+
+    def test_novedades_ordenadas_por_id(self):
+        planilla = self._planilla_con_novedades("Q-ORD", 1)
+
+        response = self.client.get(
+            f"/api/v1/pila/planillas/{planilla.planilla_id}/detalles/",
+            HTTP_AUTHORIZATION="Bearer token-test",
+        )
+
+        ids = [n["id"] for n in response.json()["detalles"][0]["novedades"]]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(ids), 2)
+
+
+@override_settings(PILA_SERVICE_TOKEN="token-test", PILA_DETALLES_LIMITE_MAX=50)
+class ListadoDetallesTests(TestCase):
+
+    def setUp(self):
+        self.planilla = crear_planilla(numero_interno="LIST-1", n_empleados=7)
+        self.ids = list(
+            PilaPlanillaDetalle.objects.filter(planilla=self.planilla).order_by("id").values_list("id", flat=True)
+        )
+        PilaPlanillaDetalle.objects.filter(id__in=self.ids[1::3]).update(estado="CON_ERROR", tipo_cotizante="12")
+
+    def _get(self, query="", **headers):
+        return self.client.get(
+            f"/api/v1/pila/planillas/{self.planilla.planilla_id}/detalles/{query}",
+            HTTP_AUTHORIZATION="Bearer token-test",
+            **headers,
+        )
+
+    def test_paginacion_por_cursor(self):
+        vistos = []
+        cursor = ""
+        while True:
+            data = self._get(f"?limit=3{cursor}").json()
+            vistos += [d["detalle_id"] for d in data["detalles"]]
+            siguiente = data["paginacion"]["cursor_siguiente"]
+            if siguiente is None:
+                break
+            cursor = f"&cursor={siguiente}"
+
+        self.assertEqual(vistos, self.ids)
+        self.assertEqual(len(self._get("?limit=3").json()["detalles"]), 3)
+        self.assertNotIn("paginacion", self._get().json())
+
+    def test_filtros(self):
+        con_error = self._get("?estado=CON_ERROR").json()["detalles"]
+        self.assertEqual([d["detalle_id"] for d in con_error], self.ids[1::3])
+        self.assertEqual(len(self._get("?tipo_cotizante=12").json()["detalles"]), len(self.ids[1::3]))
+
+        por_doc = self._get("?tipo_doc=CC&numero_doc=1004").json()["detalles"]
+        self.assertEqual([d["numero_doc"] for d in por_doc], ["1004"])
+
+    def test_proyeccion_de_campos(self):
+        detalle = self._get("?fields=estado,ibc").json()["detalles"][0]
+        self.assertEqual(list(detalle), ["detalle_id", "ibc", "estado"])
+        self.assertEqual(detalle["ibc"], f"{SMMLV}.00")
+
+        completo = self._get().json()["detalles"][0]
+        self.assertEqual(list(self._get("?fields=novedades").json()["detalles"][0]), ["detalle_id", "novedades"])
+        self.assertIn("aportes", completo)
+
+    def test_ndjson(self):
+        for query, headers in (("?formato=ndjson", {}), ("", {"HTTP_ACCEPT": "application/x-ndjson"})):
+            response = self._get(query, **headers)
+            self.assertTrue(response.streaming)
+            self.assertTrue(response["Content-Type"].startswith("application/x-ndjson"))
+            lineas = b"".join(response.streaming_content).decode().splitlines()
+            self.assertEqual(
+                [json.loads(linea) for linea in lineas],
+                self._get().json()["detalles"],
+            )
+
+        pagina = b"".join(self._get(f"?formato=ndjson&limit=2&cursor={self.ids[0]}").streaming_content)
+        self.assertEqual([json.loads(l)["detalle_id"] for l in pagina.splitlines()], self.ids[1:3])
+
+    def test_parametros_invalidos(self):
+        for query in ("?fields=ibc,inexistente", "?limit=0", "?limit=51", "?limit=x", "?cursor=-1", "?estado=MAL"):
+            with self.subTest(query=query):
+                self.assertEqual(self._get(query).status_code, 400)
+
+
+class LayoutAnchoFijoTests(TestCase):
+    """Los layouts compilados producen exactamente las mismas líneas que FixedWidthLine."""
+
+    def test_registro_01_igual_a_referencia(self):
+        rnd = random.Random(359)
+        for _ in range(300):
+            data = datos_01(rnd)
+            self.assertEqual(Registro01Renderer().render(data), Registro01Referencia().render(data))
+        self.assertEqual(Registro01Renderer().render({}), Registro01Referencia().render({}))
+
+    def test_registro_02_igual_a_referencia(self):
+        rnd = random.Random(693)
+        for i in range(300):
+            data = datos_02(rnd, i + 1)
+            self.assertEqual(Registro02Renderer().render(data), Registro02Referencia().render(data))
+        self.assertEqual(Registro02Renderer().render({}), Registro02Referencia().render({}))
+
+    def test_registro_02_con_cola_clonada(self):
+        data = datos_02(random.Random(1), 1)
+        data["raw_333_693"] = "".join(chr(65 + i % 26) for i in range(361))
+        data["v_348_356"] = "123"
+        data["tarifa_sena"] = ""
+
+        self.assertEqual(Registro02Renderer().render(data), Registro02Referencia().render(data))
+
+    def test_valor_mas_ancho_que_el_campo(self):
+        data = datos_02(random.Random(2), 1)
+        data["eps"] = "EPS0011"
+
+        with self.assertRaisesMessage(ValueError, "Valor 'EPS0011' excede ancho 6"):
+            Registro02Renderer().render(data)
+        with self.assertRaisesMessage(ValueError, "Valor 'EPS0011' excede ancho 6"):
+            Registro02Referencia().render(data)
+
+    def test_layout_invalido_falla_al_compilar(self):
+        with self.assertRaises(ValueError):
+            compilar_layout("solape", 10, [Campo(1, 5, ALFA, dict.get), Campo(5, 6, ALFA, dict.get)])
+        with self.assertRaises(ValueError):
+            compilar_layout("rango", 10, [Campo(8, 11, ALFA, dict.get)])
+
+
+class ParametrosLegalesTests(TestCase):
+
+    def test_cache_por_periodo_y_parametros(self):
+        params = {"smmlv": 1423500, "fsp_porcentajes": {"4-16": 0.01}}
+        self.assertIs(parametros_periodo("2025-01", params), parametros_periodo("2025-01", dict(params)))
+        self.assertIsNot(parametros_periodo("2025-01", params), parametros_periodo("2025-01", {"smmlv": 1300000}))
+
+    def test_tramos_fsp(self):
+        p = parametros_periodo("2025-01", {"smmlv": 1000000, "fsp_porcentajes": {"4-16": 0.01}})
+        self.assertIsNone(p.tasa_fsp(Decimal("4000000")))
+        self.assertEqual(p.tasa_fsp(Decimal("4000000.01")), Decimal("0.01"))
+        self.assertEqual(p.tasa_fsp(Decimal("17000000")), Decimal("0.012"))
+        self.assertEqual(p.tasa_fsp(Decimal("25000000")), Decimal("0.02"))
+        self.assertEqual(p.tarifa_arl_clase(4), "4.35000")
+
+
+class CentavosTests(TestCase):
+
+    def test_redondeos_decreto_1990(self):
+        self.assertEqual([redondear_ibc(v) for v in ("1234.50", "1234.01", "1234.00", 1234.99)], [1235, 1235, 1234, 1235])
+        self.assertEqual(
+            [redondear_cotizacion(v) for v in (899470, 580065, 224867, 100000, 100001, Decimal("100.001"))],
+            [899500, 580100, 224900, 100000, 100100, 200],
+        )
+
+    def test_exacto_con_ibc_grande(self):
+        # Con float: 9007199254740993.01 -> 9007199254740992.0 y el redondeo se pierde
+        self.assertEqual(redondear_ibc(Decimal("9007199254740993.01")), 9007199254740994)
+        self.assertEqual(redondear_cotizacion("90071992547409000.01"), 90071992547409100)
+
+    def test_porcentaje_y_cotizacion(self):
+        ibc = a_centavos("1423500.00")
+        self.assertEqual(porcentaje(ibc, Decimal("0.00522")), 743067)  # 7430.67
+        self.assertEqual(porcentaje(ibc, "0.085"), 12099750)
+        self.assertEqual(a_texto(porcentaje(a_centavos("0.50"), "0.01")), "0.01")  # 0.005 -> 0.01 (ROUND_HALF_UP)
+        self.assertEqual(cotizacion(ibc, "0.04"), 57000)
+        self.assertEqual(ceil_100(5, divisor=2), 100)
+
+    def test_redondeo_por_lote_igual_a_escalar(self):
+        valores = [None, 0, 99, 100, 101, -150, Decimal("100.001"), "1234.01", 1234.99, Decimal("9007199254740993.01")]
+        self.assertEqual(redondear_ibc_lote(valores), [redondear_ibc(v) for v in valores])
+        self.assertEqual(redondear_cotizacion_lote(valores), [redondear_cotizacion(v) for v in valores])
@@ -6,6 +6,7 @@ urlpatterns = [
     path('pila/planillas/', views.crear_planilla, name='crear_planilla'),
     path('pila/planillas/<int:planilla_id>/', views.consultar_planilla, name='consultar_planilla'),
     path('pila/planillas/<int:planilla_id>/archivo/', views.descargar_archivo, name='descargar_archivo'),
+    path('pila/planillas/<int:planilla_id>/archivos/', views.descargar_archivos_zip, name='descargar_archivos_zip'),
     path('pila/planillas/<int:planilla_id>/payload/', views.descargar_payload_json, name='descargar_payload_json'),
     #path('pila/planillas/by-ref/<str:numero_interno>/', views.consultar_por_referencia, name='consultar_por_referencia'),
     path("pila/planillas/<int:planilla_id>/detalles/", views.listar_detalles, name="pila_listar_detalles"),
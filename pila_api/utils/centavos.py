@@ -0,0 +1,129 @@
+# pila_api/utils/centavos.py
+"""
+Núcleo de aritmética monetaria en centavos enteros.
+
+Los valores de la planilla (IBC, cotizaciones) se manejan como int en centavos: sin
+float ni pérdida de precisión con IBCs grandes. Las tasas (Decimal, str, int o float)
+se convierten a fracción exacta n/d, de modo que porcentajes y redondeos del Decreto
+1990 de 2016 son exactos:
+
+- IBC: peso superior más cercano -> ceil_peso
+- Cotizaciones: múltiplo de 100 superior -> ceil_100 / cotizacion
+
+redondeos.redondear_ibc, redondeos.redondear_cotizacion y calcular_planilla._calc_pct
+son envoltorios de estas funciones.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+
+
+def _a_decimal(valor) -> Decimal:
+    if isinstance(valor, Decimal):
+        return valor
+    if isinstance(valor, int):
+        return Decimal(valor)
+    # float vía str: 0.1 -> Decimal("0.1"), no su representación binaria
+    return Decimal(str(valor).strip())
+
+
+def fraccion(valor) -> tuple[int, int]:
+    """Valor exacto como fracción (numerador, denominador > 0)."""
+    if isinstance(valor, int):
+        return valor, 1
+    valor = _a_decimal(valor)
+    if not valor.is_finite():
+        raise ValueError(f"Valor no finito: {valor}")
+    return valor.as_integer_ratio()
+
+
+def a_centavos(valor, redondeo: str | None = ROUND_HALF_UP) -> int:
+    """
+    Convierte pesos (Decimal, str, int o float) a centavos enteros.
+
+    Args:
+        valor: pesos; None o "" cuentan como 0
+        redondeo: modo de redondeo de decimal para fracciones de centavo.
+            None exige un valor exacto en centavos (ValueError si no lo es)
+    """
+    if valor is None or valor == "":
+        return 0
+    if isinstance(valor, int):
+        return valor * 100
+    d = _a_decimal(valor)
+    if not d.is_finite():
+        raise ValueError(f"Valor no finito: {valor}")
+    c = d.scaleb(2)
+    entero = c.to_integral_value(rounding=redondeo or ROUND_HALF_UP)
+    if redondeo is None and entero != c:
+        raise ValueError(f"{valor} no es un valor exacto en centavos")
+    return int(entero)
+
+
+def a_decimal(centavos: int) -> Decimal:
+    """Centavos -> Decimal en pesos con 2 decimales (12345 -> Decimal("123.45"))."""
+    return Decimal(centavos).scaleb(-2)
+
+
+def a_texto(centavos: int) -> str:
+    """Centavos -> texto en pesos con 2 decimales, igual a str(a_decimal(centavos))."""
+    signo = "-" if centavos < 0 else ""
+    pesos, cent = divmod(abs(centavos), 100)
+    return f"{signo}{pesos}.{cent:02d}"
+
+
+def pesos_enteros(valor) -> int:
+    """Parte entera en pesos (trunca hacia cero, como int()) sin pasar por float."""
+    if valor is None or valor == "":
+        return 0
+    if isinstance(valor, int):
+        return valor
+    return int(_a_decimal(valor))
+
+
+def _div_half_up(num: int, den: int) -> int:
+    """num / den (den > 0) redondeado ROUND_HALF_UP (mitades lejos de cero)."""
+    if num >= 0:
+        return (2 * num + den) // (2 * den)
+    return -((-2 * num + den) // (2 * den))
+
+
+def proporcion(centavos: int, numerador, denominador=1) -> int:
+    """centavos × numerador / denominador, exacto y redondeado a centavos (ROUND_HALF_UP)."""
+    nn, nd = fraccion(numerador)
+    dn, dd = fraccion(denominador)
+    if dn == 0:
+        raise ZeroDivisionError("denominador 0")
+    num = centavos * nn * dd
+    den = nd * dn
+    if den < 0:
+        num, den = -num, -den
+    return _div_half_up(num, den)
+
+
+def porcentaje(centavos: int, tasa) -> int:
+    """centavos × tasa redondeado a centavos (ROUND_HALF_UP). Ej: porcentaje(142350000, "0.04") -> 5694000."""
+    return proporcion(centavos, tasa)
+
+
+def _ceil_div(num: int, den: int) -> int:
+    return -(-num // den)
+
+
+def ceil_peso(centavos: int) -> int:
+    """Centavos -> pesos al peso superior (IBC, Decreto 1990). 123401 -> 1235."""
+    return _ceil_div(centavos, 100)
+
+
+def ceil_100(centavos: int, divisor: int = 1) -> int:
+    """
+    (centavos / divisor) -> pesos al múltiplo de 100 superior (cotizaciones, Decreto 1990).
+    divisor permite redondear fracciones exactas de centavo (ej. la mitad del FSP) sin
+    pasar por decimales: ceil_100(8994701) -> 90000; ceil_100(5, 2) -> 100.
+    """
+    return _ceil_div(centavos, 10000 * divisor) * 100
+
+
+def cotizacion(centavos: int, tasa) -> int:
+    """Cotización en pesos: centavos × tasa al múltiplo de 100 superior, sin redondeo intermedio."""
+    n, d = fraccion(tasa)
+    return ceil_100(centavos * n, d)
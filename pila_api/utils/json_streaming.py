@@ -0,0 +1,129 @@
+# pila_api/utils/json_streaming.py
+"""
+Lectura incremental de un objeto JSON grande desde un flujo de bytes.
+
+leer_objeto() recorre el objeto de primer nivel leyendo el flujo por bloques: cada clave
+se entrega con su valor ya decodificado, salvo la clave de la lista grande (ej.
+"empleados"), cuyos elementos se entregan uno a uno. En memoria solo queda el bloque
+leído y el elemento en curso, nunca el documento completo.
+
+Cada valor se decodifica con json.JSONDecoder.raw_decode sobre el buffer; si el valor aún
+no está completo se lee otro bloque y se reintenta (hasta _MAX_VALOR caracteres por valor).
+"""
+
+import codecs
+import json
+from collections.abc import Iterator
+
+_BLOQUE = 64 * 1024
+# Tamaño máximo (caracteres) de un valor individual: acota el buffer ante JSON inválido
+_MAX_VALOR = 16 * 1024 * 1024
+_ESPACIOS = " \t\n\r"
+
+
+class LectorJSON:
+    """Buffer de texto sobre un flujo de bytes UTF-8, con lectura de valores JSON completos."""
+
+    def __init__(self, flujo, bloque: int = _BLOQUE):
+        self._flujo = flujo
+        self._bloque = bloque
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._texto = ""
+        self._pos = 0
+        self._fin = False
+
+    def _leer_bloque(self) -> bool:
+        if self._fin:
+            return False
+        datos = self._flujo.read(self._bloque)
+        if not datos:
+            self._fin = True
+            self._texto = self._texto[self._pos:] + self._utf8.decode(b"", final=True)
+        else:
+            # Descarta lo ya consumido antes de agregar el bloque nuevo
+            self._texto = self._texto[self._pos:] + self._utf8.decode(datos)
+        self._pos = 0
+        return True
+
+    def siguiente(self) -> str:
+        """Primer carácter no blanco (sin consumirlo); "" al final del flujo."""
+        while True:
+            while self._pos < len(self._texto) and self._texto[self._pos] in _ESPACIOS:
+                self._pos += 1
+            if self._pos < len(self._texto):
+                return self._texto[self._pos]
+            if not self._leer_bloque():
+                return ""
+
+    def esperar(self, caracter: str):
+        encontrado = self.siguiente()
+        if encontrado != caracter:
+            raise ValueError(f"JSON inválido: se esperaba '{caracter}' y se encontró '{encontrado or 'fin'}'")
+        self._pos += 1
+
+    def valor(self):
+        """
+        Decodifica el siguiente valor JSON completo. Un valor que termina justo al final del
+        buffer (ej. un número) se reintenta con más datos: podría continuar en el bloque
+        siguiente.
+        """
+        self.siguiente()
+        while True:
+            try:
+                valor, fin = self._decoder.raw_decode(self._texto, self._pos)
+                if fin < len(self._texto) or self._fin:
+                    self._pos = fin
+                    return valor
+            except json.JSONDecodeError as e:
+                if self._fin:
+                    raise ValueError(f"JSON inválido: {e}") from e
+            if len(self._texto) - self._pos > _MAX_VALOR:
+                raise ValueError(f"JSON inválido: valor de más de {_MAX_VALOR} caracteres")
+            self._leer_bloque()
+
+
+def leer_objeto(flujo, clave_lista: str, bloque: int = _BLOQUE) -> Iterator[tuple[str, object]]:
+    """
+    Recorre el objeto JSON de primer nivel de flujo.
+
+    Yields:
+        (clave, valor) por cada clave del objeto, en orden; para clave_lista (que debe ser
+        una lista) un (clave_lista, elemento) por cada elemento
+
+    Raises:
+        ValueError: Si el JSON es inválido o clave_lista no es una lista
+    """
+    lector = LectorJSON(flujo, bloque)
+    lector.esperar("{")
+    if lector.siguiente() == "}":
+        lector.esperar("}")
+        return
+
+    while True:
+        clave = lector.valor()
+        if not isinstance(clave, str):
+            raise ValueError("JSON inválido: se esperaba una clave")
+        lector.esperar(":")
+
+        if clave == clave_lista:
+            lector.esperar("[")
+            if lector.siguiente() == "]":
+                lector.esperar("]")
+            else:
+                while True:
+                    yield clave, lector.valor()
+                    if lector.siguiente() == "]":
+                        lector.esperar("]")
+                        break
+                    lector.esperar(",")
+        else:
+            yield clave, lector.valor()
+
+        if lector.siguiente() == "}":
+            lector.esperar("}")
+            break
+        lector.esperar(",")
+
+    if lector.siguiente():
+        raise ValueError("JSON inválido: datos después del objeto")
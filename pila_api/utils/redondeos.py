@@ -5,10 +5,19 @@ Utilidades de redondeo según Decreto 1990 de 2016 (Colombia).
 Reglas:
 - IBC: se aproxima al peso superior más cercano (redondeo hacia arriba)
 - Cotizaciones: se ajustan al múltiplo de 100 superior (redondeo hacia arriba a centenas)
+
+redondear_ibc_lote / redondear_cotizacion_lote aplican la misma regla a una secuencia,
+buffer (array.array, memoryview) o arreglo NumPy de valores en una sola pasada.
 """
 
 from decimal import Decimal, ROUND_CEILING
-from math import ceil
+
+from pila_api.utils.centavos import a_centavos, ceil_100, ceil_peso
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él los lotes se procesan como listas
+    np = None
 
 
 def redondear_ibc(valor: Decimal | float | int | str) -> int:
@@ -27,23 +36,11 @@ def redondear_ibc(valor: Decimal | float | int | str) -> int:
     Returns:
         IBC redondeado hacia arriba al entero más cercano
     """
-    if valor is None:
+    if valor is None or not isinstance(valor, (str, int, float, Decimal)):
         return 0
-    
-    # Convertir a Decimal para precisión
-    if isinstance(valor, str):
-        valor_decimal = Decimal(valor)
-    elif isinstance(valor, (int, float)):
-        valor_decimal = Decimal(str(valor))
-    elif isinstance(valor, Decimal):
-        valor_decimal = valor
-    else:
-        return 0
-    
-    # Redondear hacia arriba usando math.ceil (más preciso que Decimal con ROUND_CEILING)
-    # Convertir a float para usar ceil, luego a int
-    valor_float = float(valor_decimal)
-    return int(ceil(valor_float))
+
+    # Centavos enteros redondeados hacia arriba: ceil(ceil_centavo(x)) == ceil(x), exacto sin float
+    return ceil_peso(a_centavos(valor, redondeo=ROUND_CEILING))
 
 
 def redondear_cotizacion(valor: Decimal | float | int | str) -> int:
@@ -63,24 +60,86 @@ def redondear_cotizacion(valor: Decimal | float | int | str) -> int:
     Returns:
         Cotización redondeada hacia arriba al múltiplo de 100 superior
     """
-    if valor is None:
-        return 0
-    
-    # Convertir a Decimal para precisión
-    if isinstance(valor, str):
-        valor_decimal = Decimal(valor)
-    elif isinstance(valor, (int, float)):
-        valor_decimal = Decimal(str(valor))
-    elif isinstance(valor, Decimal):
-        valor_decimal = valor
-    else:
+    if valor is None or not isinstance(valor, (str, int, float, Decimal)):
         return 0
-    
-    # Convertir a float para usar ceil
-    valor_float = float(valor_decimal)
-    
-    # Redondear hacia arriba al múltiplo de 100 superior
-    # Dividir por 100, redondear hacia arriba, multiplicar por 100
-    valor_redondeado = ceil(valor_float / 100) * 100
-    
-    return int(valor_redondeado)
+
+    # Redondear hacia arriba al múltiplo de 100 superior, en centavos enteros (sin float)
+    return ceil_100(a_centavos(valor, redondeo=ROUND_CEILING))
+
+
+# -------------------------------------------------------------------
+# Redondeo por lotes
+# -------------------------------------------------------------------
+
+# Por debajo de este valor absoluto el redondeo vectorizado en int64 no desborda
+_LIMITE_INT64 = 2 ** 62
+
+
+def _ceil_peso_decimal(valor: Decimal) -> int:
+    return int(valor.to_integral_value(rounding=ROUND_CEILING))
+
+
+def _ceil_100_int(valor: int) -> int:
+    return -(-valor // 100) * 100
+
+
+def _ceil_100_decimal(valor: Decimal) -> int:
+    return int(valor.scaleb(-2).to_integral_value(rounding=ROUND_CEILING)) * 100
+
+
+# Conversión directa por tipo exacto (sin la escalera de isinstance); el resto usa la función escalar
+_IBC_POR_TIPO = {int: int, Decimal: _ceil_peso_decimal}
+_COTIZACION_POR_TIPO = {int: _ceil_100_int, Decimal: _ceil_100_decimal}
+
+
+def _es_buffer(valores) -> bool:
+    if isinstance(valores, (str, bytes)):
+        return False
+    try:
+        memoryview(valores)
+    except TypeError:
+        return False
+    return True
+
+
+def _redondear_lote(valores, por_tipo: dict, escalar, vectorizado):
+    if np is not None and (isinstance(valores, np.ndarray) or _es_buffer(valores)):
+        arreglo = np.asarray(valores)
+        if arreglo.dtype.kind in "iu" and (arreglo.size == 0 or int(np.abs(arreglo).max()) < _LIMITE_INT64):
+            return vectorizado(arreglo.astype(np.int64))
+        # float/object o enteros enormes: valor a valor con semántica exacta
+        resultado = [por_tipo.get(type(v), escalar)(v) for v in arreglo.tolist()]
+        try:
+            return np.array(resultado, dtype=np.int64)
+        except OverflowError:
+            return np.array(resultado, dtype=object)
+
+    return [por_tipo.get(type(v), escalar)(v) for v in valores]
+
+
+def redondear_ibc_lote(valores) -> list[int]:
+    """
+    redondear_ibc sobre muchos valores en una pasada, con la misma semántica exacta.
+
+    Args:
+        valores: iterable de int/Decimal/str/float, buffer (array.array, memoryview)
+            o arreglo NumPy
+
+    Returns:
+        Lista de int; arreglo NumPy int64 si la entrada es un arreglo/buffer y NumPy está disponible
+    """
+    return _redondear_lote(valores, _IBC_POR_TIPO, redondear_ibc, lambda a: a)
+
+
+def redondear_cotizacion_lote(valores) -> list[int]:
+    """
+    redondear_cotizacion sobre muchos valores en una pasada, con la misma semántica exacta.
+
+    Args:
+        valores: iterable de int/Decimal/str/float, buffer (array.array, memoryview)
+            o arreglo NumPy
+
+    Returns:
+        Lista de int; arreglo NumPy int64 si la entrada es un arreglo/buffer y NumPy está disponible
+    """
+    return _redondear_lote(valores, _COTIZACION_POR_TIPO, redondear_cotizacion, lambda a: -(-a // 100) * 100)
@@ -0,0 +1,343 @@
+# pila_api/validacion.py
+"""
+Validación del payload con el backend elegido en PILA_VALIDADOR.
+
+- "drf": los serializers de serializers.py tal cual (referencia)
+- "compilado": el mismo esquema compilado una vez a funciones simples. Cada serializer se
+  recorre desde sus propios campos DRF (tipo, required, allow_null, allow_blank, default,
+  max_length, max_digits, ...) y se genera una función por objeto con una rama por campo,
+  como los layouts de ancho fijo: sin instanciar campos ni pasar por
+  run_validation/get_value/validate_empty_values en cada valor.
+
+El compilado solo acepta lo que puede resolver igual que DRF (mismos tipos y mismo valor
+validado: str recortado, Decimal cuantizado, date, ...). Ante cualquier otra cosa (un
+error, un número enviado como texto, un tipo de campo no soportado) valida el payload
+completo con DRF: los errores (mensajes, códigos y rutas) son siempre los de DRF, y el
+camino lento solo se recorre con datos inválidos o inusuales.
+"""
+
+import datetime
+import decimal
+import re
+from functools import cache
+
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from rest_framework import fields, serializers
+from rest_framework.fields import empty
+from rest_framework.settings import api_settings
+
+VALIDADORES = ("drf", "compilado")
+
+# Caracteres sustitutos (U+D800 a U+DFFF): CharField los rechaza
+_SUSTITUTOS = re.compile("[\ud800-\udfff]")
+
+_VALIDADORES_CHAR = (
+    fields.MaxLengthValidator,
+    fields.MinLengthValidator,
+    fields.ProhibitNullCharactersValidator,
+    fields.ProhibitSurrogateCharactersValidator,
+)
+
+
+class _NoCompilado(Exception):
+    """El compilado no resuelve este valor: se valida con DRF."""
+
+
+def _validador() -> str:
+    validador = (getattr(settings, "PILA_VALIDADOR", "drf") or "drf").lower()
+    if validador not in VALIDADORES:
+        raise ValueError(f"Validador desconocido: {validador} (use {', '.join(VALIDADORES)})")
+    return validador
+
+
+def validar(serializer_class, data, validador: str | None = None) -> dict:
+    """
+    validated_data de serializer_class para data.
+
+    Args:
+        validador: "drf" o "compilado". Por defecto settings.PILA_VALIDADOR
+
+    Raises:
+        ValidationError: con los mismos errores que serializer.is_valid(raise_exception=True)
+    """
+    if (validador or _validador()) == "compilado":
+        try:
+            return compilar_serializer(serializer_class)(data)
+        except _NoCompilado:
+            pass
+
+    serializer = serializer_class(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+@cache
+def compilar_serializer(serializer_class):
+    """
+    Compila serializer_class (una vez por clase) a una función data -> validated_data que
+    lanza _NoCompilado ante lo que no resuelve igual que DRF.
+    """
+    return _compilar_objeto(serializer_class())
+
+
+# -------------------------------------------------------------------
+# Objetos y listas
+# -------------------------------------------------------------------
+
+def _compilar_objeto(serializer):
+    """
+    Serializer (raíz o anidado): genera una función con una rama por campo escribible, en
+    el orden de DRF. Un campo ausente se omite, toma su default o (requerido) va a DRF.
+    """
+    if serializer.validators:
+        return _generico(serializer)
+
+    espacio = {"empty": empty, "_NoCompilado": _NoCompilado, "_sin_error": _sin_error}
+    lineas = [
+        "def objeto(data):",
+        "    if data.__class__ is not dict:",
+        "        raise _NoCompilado",
+        "    ret = {}",
+    ]
+    for i, (nombre, campo) in enumerate(serializer.fields.items()):
+        if campo.read_only:
+            continue
+        if campo.source_attrs != [nombre]:
+            return _generico(serializer)
+
+        espacio[f"convertir_{i}"] = _compilar_campo(campo)
+        valor = f"convertir_{i}(v)"
+        if campo.allow_null:
+            valor = f"None if v is None else {valor}"
+        lineas += [f"    v = data.get({nombre!r}, empty)", "    if v is not empty:", f"        v = {valor}"]
+
+        if campo.required:
+            lineas += ["    else:", "        raise _NoCompilado"]
+        elif campo.default is not empty:
+            espacio[f"default_{i}"] = campo.default
+            default = f"default_{i}()" if callable(campo.default) else f"default_{i}"
+            lineas += ["    else:", f"        v = {default}"]
+        else:
+            lineas += ["    else:", "        v = empty"]
+
+        validar_campo = getattr(serializer, f"validate_{nombre}", None)
+        if validar_campo is not None:
+            espacio[f"validar_{i}"] = validar_campo
+            lineas += ["    if v is not empty:", f"        v = _sin_error(validar_{i}, v)"]
+        if campo.required or campo.default is not empty:
+            lineas.append(f"    ret[{nombre!r}] = v")
+        else:
+            lineas += ["    if v is not empty:", f"        ret[{nombre!r}] = v"]
+
+    if type(serializer).validate is not serializers.Serializer.validate:
+        espacio["validate"] = serializer.validate
+        lineas.append("    ret = _sin_error(validate, ret)")
+    lineas.append("    return ret")
+
+    fuente = "\n".join(lineas)
+    exec(compile(fuente, f"<validador {type(serializer).__name__}>", "exec"), espacio)
+    return espacio["objeto"]
+
+
+def _compilar_lista(lista: serializers.ListSerializer):
+    if lista.validators or type(lista).validate is not serializers.ListSerializer.validate:
+        return _generico(lista)
+
+    hijo = _compilar_campo(lista.child)
+    permitir_vacia = lista.allow_empty
+    maximo, minimo = lista.max_length, lista.min_length
+
+    def elementos(data):
+        if data.__class__ is not list:
+            raise _NoCompilado
+        n = len(data)
+        if (not n and not permitir_vacia) or (maximo is not None and n > maximo) or (minimo is not None and n < minimo):
+            raise _NoCompilado
+        return [hijo(item) for item in data]
+
+    return elementos
+
+
+# -------------------------------------------------------------------
+# Campos (el valor nunca es empty; None solo llega si el campo no admite nulos)
+# -------------------------------------------------------------------
+
+def _compilar_campo(campo):
+    """Conversor valor -> valor validado del campo."""
+    if getattr(campo.default, "requires_context", False):
+        return _generico(campo)
+    if isinstance(campo, serializers.ListSerializer):
+        return _compilar_lista(campo)
+    if isinstance(campo, serializers.Serializer):
+        return _compilar_objeto(campo)
+    if type(campo) in (fields.CharField, fields.RegexField):
+        return _compilar_char(campo)
+    if type(campo) is fields.IntegerField:
+        return _compilar_entero(campo)
+    if type(campo) is fields.DecimalField:
+        return _compilar_decimal(campo)
+    if type(campo) is fields.DateField:
+        return _compilar_fecha(campo)
+    if type(campo) is fields.DictField and type(campo.child) is fields._UnvalidatedField:
+        return _compilar_dict(campo)
+    return _generico(campo)
+
+
+def _compilar_char(campo):
+    permitir_blanco = campo.allow_blank
+    recortar = campo.trim_whitespace
+    maximo, minimo = campo.max_length, campo.min_length
+    regex, invertir = None, False
+    for validador in campo.validators:
+        if type(validador) is fields.RegexValidator and regex is None:
+            regex, invertir = validador.regex, validador.inverse_match
+        elif type(validador) not in _VALIDADORES_CHAR:
+            return _generico(campo)
+
+    def char(valor):
+        if valor.__class__ is not str:
+            raise _NoCompilado
+        texto = valor.strip() if recortar else valor
+        if not texto and (recortar or not valor):
+            if permitir_blanco:
+                return ""
+            raise _NoCompilado
+        if (
+            (maximo is not None and len(texto) > maximo)
+            or (minimo is not None and len(texto) < minimo)
+            or "\x00" in texto
+            or (not texto.isascii() and _SUSTITUTOS.search(texto))
+            or (regex is not None and (regex.search(texto) is None) != invertir)
+        ):
+            raise _NoCompilado
+        return texto
+
+    return char
+
+
+def _compilar_entero(campo):
+    maximo, minimo = campo.max_value, campo.min_value
+    if len(campo.validators) != (maximo is not None) + (minimo is not None):
+        return _generico(campo)
+
+    def entero(valor):
+        if valor.__class__ is not int:
+            raise _NoCompilado
+        if (maximo is not None and valor > maximo) or (minimo is not None and valor < minimo):
+            raise _NoCompilado
+        return valor
+
+    return entero
+
+
+def _compilar_decimal(campo):
+    if campo.localize or campo.validators:
+        return _generico(campo)
+    max_digits, max_decimales, max_enteros = campo.max_digits, campo.decimal_places, campo.max_whole_digits
+    exponente = decimal.Decimal(".1") ** max_decimales if max_decimales is not None else None
+    redondeo = campo.rounding
+    max_texto = campo.MAX_STRING_LENGTH
+
+    def a_decimal(valor):
+        tipo = valor.__class__
+        if tipo is int:
+            numero = decimal.Decimal(valor)
+        elif tipo is str or tipo is float:
+            # Mismo texto que DRF (str(float) / str recortado); vacío o no numérico -> DRF
+            texto = str(valor).strip()
+            if not texto or len(texto) > max_texto:
+                raise _NoCompilado
+            try:
+                numero = decimal.Decimal(texto)
+            except decimal.DecimalException:
+                raise _NoCompilado
+            if not numero.is_finite():
+                raise _NoCompilado
+        else:
+            raise _NoCompilado
+
+        # Precisión: misma cuenta que DecimalField.validate_precision
+        _, digitos, exp = numero.as_tuple()
+        if exp >= 0:
+            total = enteros = len(digitos) + exp
+            decimales = 0
+        elif len(digitos) > -exp:
+            total, decimales = len(digitos), -exp
+            enteros = total - decimales
+        else:
+            total = decimales = -exp
+            enteros = 0
+        if (
+            (max_digits is not None and total > max_digits)
+            or (max_decimales is not None and decimales > max_decimales)
+            or (max_enteros is not None and enteros > max_enteros)
+        ):
+            raise _NoCompilado
+
+        # Cuantización: misma que DecimalField.quantize
+        if exponente is None:
+            return numero
+        contexto = decimal.getcontext().copy()
+        if max_digits is not None:
+            contexto.prec = max_digits
+        return numero.quantize(exponente, rounding=redondeo, context=contexto)
+
+    return a_decimal
+
+
+def _compilar_fecha(campo):
+    formatos = getattr(campo, "input_formats", api_settings.DATE_INPUT_FORMATS)
+    if [f.lower() for f in formatos] != [fields.ISO_8601] or campo.validators:
+        return _generico(campo)
+
+    def fecha(valor):
+        if valor.__class__ is datetime.date:
+            return valor
+        if valor.__class__ is not str:
+            raise _NoCompilado
+        try:
+            resultado = parse_date(valor)
+        except ValueError:
+            raise _NoCompilado
+        if resultado is None:
+            raise _NoCompilado
+        return resultado
+
+    return fecha
+
+
+def _compilar_dict(campo):
+    if campo.validators:
+        return _generico(campo)
+    permitir_vacio = campo.allow_empty
+
+    def diccionario(valor):
+        if valor.__class__ is not dict or (not valor and not permitir_vacio):
+            raise _NoCompilado
+        return {str(k): v for k, v in valor.items()}
+
+    return diccionario
+
+
+# -------------------------------------------------------------------
+# Resto: DRF campo a campo
+# -------------------------------------------------------------------
+
+def _generico(campo):
+    """Campo o serializer sin versión compilada: su propio run_validation (errores -> DRF)."""
+
+    def generico(valor):
+        try:
+            return campo.run_validation(valor)
+        except (serializers.ValidationError, fields.DjangoValidationError, fields.SkipField):
+            raise _NoCompilado
+
+    return generico
+
+
+def _sin_error(funcion, valor):
+    try:
+        return funcion(valor)
+    except (serializers.ValidationError, fields.DjangoValidationError):
+        raise _NoCompilado
@@ -2,21 +2,52 @@
 
 import json
 import traceback
-from datetime import date, datetime
+from math import ceil
 
 from django.conf import settings
-from django.db import transaction, DataError
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import parse_etags
 
 from rest_framework import status
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.exceptions import APIException
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
 
-from .models import PilaPlanilla, PilaPlanillaDetalle, PilaNovedad
+from .compresion import comprimir_respuesta
+from .models import PilaPlanilla, PilaPlanillaDetalle
 from .serializers import PayloadPlanillaSerializer
-from .services.calcular_planilla import calcular_planilla
-from .services.generar_txt import generar_txt_planilla
-from .dto import planilla_to_response
+from .validacion import validar
+from .services.archivos_generados import (
+    abrir_archivo,
+    archivo_vigente,
+    cache_activa,
+    etag_http,
+    obtener_archivo,
+    registrar_acceso,
+)
+from .services.bloqueo_planilla import PlanillaOcupada, bloqueo_planilla
+from .services.empleados_lotes import empleados_guardados
+from .services.calcular_planilla import calcular_planilla, MOTORES_CALCULO
+from .services.idempotencia import (
+    MAX_CLAVE,
+    guardar_respuesta,
+    hash_payload,
+    marcar_procesada,
+    numero_interno_payload,
+    planilla_procesada,
+    respuesta_guardada,
+)
+from .services.generar_txt import (
+    LONGITUD_REGISTRO_01,
+    LONGITUD_REGISTRO_02,
+    iter_lineas_txt,
+)
+from .services.listado_detalles import FILTROS_DETALLE, iter_detalles, limite_maximo, parsear_campos
+from .services.variantes_txt import TIPOS_VARIANTE, generar_variantes, iter_zip
+from .services.ingesta_streaming import procesar_payload_streaming
+from .services.procesar_planilla import procesar_planilla, encolar_planilla, registrar_planilla
+from .dto import planilla_to_response, job_to_response
 
 
 # -------------------------------------------------------------------
@@ -46,26 +77,74 @@ def _require_service_token(request):
     return None
 
 
-def _to_date(value):
-    if value is None:
-        return None
-    if isinstance(value, date):
-        return value
-    if isinstance(value, datetime):
-        return value.date()
-    if isinstance(value, str):
-        return date.fromisoformat(value)
-    raise TypeError(f"Tipo de fecha no soportado: {type(value)}")
+def _responder_planilla(clave: str, huella: str, planilla, data: dict, status_code: int):
+    """Respuesta de crear_planilla; con Idempotency-Key queda guardada para los reintentos."""
+    if clave:
+        guardar_respuesta(clave, huella, planilla, status_code, data)
+    return JsonResponse(data, status=status_code)
+
+
+def _respuesta_repetida(guardada):
+    response = JsonResponse(guardada.respuesta, status=guardada.status)
+    response["Idempotent-Replayed"] = "true"
+    if guardada.status == status.HTTP_202_ACCEPTED:
+        response["Location"] = f"/api/v1/pila/planillas/{guardada.planilla_id}/"
+    return response
+
+
+def _respuesta_previa(data, clave: str, huella: str):
+    """
+    Respuesta de crear_planilla que ya existe para este reintento, o None: la guardada para
+    la Idempotency-Key (422 si se usó con otro payload) o la planilla ya procesada con el
+    mismo payload.
+    """
+    if clave:
+        guardada = respuesta_guardada(clave)
+        if guardada is not None:
+            if guardada.hash_payload != huella:
+                return JsonResponse(
+                    {"detail": "Idempotency-Key ya usada con otro payload"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            return _respuesta_repetida(guardada)
+
+    # Reintento de un payload ya procesado: no se reescribe ni se reingiere nada
+    procesada = planilla_procesada(data, huella)
+    if procesada is not None:
+        response = _responder_planilla(clave, huella, procesada, planilla_to_response(procesada), status.HTTP_200_OK)
+        response["Idempotent-Replayed"] = "true"
+        return response
+    return None
+
+
+def _procesar_crear_planilla(request, clave: str, huella: str):
+    """Valida, registra e ingiere/calcula (o encola) el payload de crear_planilla."""
+    payload = validar(PayloadPlanillaSerializer, request.data)
+    empleados = payload.get("empleados", [])
+
+    if not empleados:
+        return JsonResponse({"detail": "Payload sin empleados"}, status=400)
+
+    obj, created = registrar_planilla(payload, request.data)
 
+    force = request.GET.get("force") == "1"
 
-def json_safe(value):
-    if isinstance(value, (date, datetime)):
-        return value.isoformat()
-    if isinstance(value, dict):
-        return {k: json_safe(v) for k, v in value.items()}
-    if isinstance(value, list):
-        return [json_safe(v) for v in value]
-    return value
+    # Modo asíncrono (opt-in): encolar y responder 202; un worker ingiere y calcula
+    if request.GET.get("async") == "1":
+        job = encolar_planilla(obj, request.data, force=force, created=created)
+        data = planilla_to_response(obj)
+        data["job"] = job_to_response(job)
+        response = _responder_planilla(clave, huella, obj, data, status.HTTP_202_ACCEPTED)
+        response["Location"] = f"/api/v1/pila/planillas/{obj.planilla_id}/"
+        return response
+
+    procesar_planilla(obj, payload, force=force, created=created)
+    marcar_procesada(obj.planilla_id, huella)
+
+    return _responder_planilla(
+        clave, huella, obj, planilla_to_response(obj),
+        status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+    )
 
 
 # -------------------------------------------------------------------
@@ -77,182 +156,63 @@ def crear_planilla(request):
     """
     POST /api/v1/pila/planillas/
     Crea o reutiliza una planilla y genera sus detalles + novedades
+
+    ?force=1  reingesta detalles/novedades aunque ya existan
+    ?async=1  encola el procesamiento y responde 202 con job_id;
+              el progreso se consulta en GET /pila/planillas/<id>/ (estado)
+    ?stream=1 lee el cuerpo por partes y valida e inserta los empleados por lotes
+              a medida que llegan (payloads muy grandes; ver ingesta_streaming)
+
+    Reintentos (ver services/idempotencia.py): el mismo payload ya procesado responde la
+    planilla guardada sin reprocesar; con header Idempotency-Key se repite la respuesta
+    guardada para esa clave (422 si la clave se usó con otro payload).
+
+    Concurrencia (ver services/bloqueo_planilla.py): las peticiones del mismo numero_interno
+    se procesan de a una, en orden de llegada; una idéntica a la que está en curso espera y
+    responde su resultado. Si la anterior no termina en PILA_BLOQUEO_TIMEOUT segundos
+    responde 409 con Retry-After.
     """
     auth_error = _require_service_token(request)
     if auth_error:
         return auth_error
 
-    try:
-        serializer = PayloadPlanillaSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        payload = serializer.validated_data
-
-        empresa = payload["empresa"]
-        planilla_data = payload["planilla"]
-        empleados = payload.get("empleados", [])
-
-        if not empleados:
-            return JsonResponse({"detail": "Payload sin empleados"}, status=400)
-
-        numero_interno = planilla_data["numero_interno"]
-
-        obj, created = PilaPlanilla.objects.get_or_create(
-        numero_interno=numero_interno,
-        defaults={
-            "periodo": payload["periodo"],
-            "empresa_nit": empresa["nit"],
-            "empresa_sucursal": empresa["sucursal"],
-            "estado": "EN_PROCESO",
-            "payload_inicial": request.data,
-            "totales": None,
-            "resumen": {
-                "empleados_procesados": 0,
-                "empleados_con_error": 0,
-                "warnings": 0,
-            },
-            "errores": [],
-            "tiene_archivo": False,
-        }
-)
-
-        # 🔑 Forzar actualización del payload SIEMPRE
-        obj.payload_inicial = request.data
-        obj.errores = []
-        obj.estado = "EN_PROCESO"
-        obj.save(update_fields=["payload_inicial", "errores", "estado"])
-        
-        force = request.GET.get("force") == "1"
-
-        ya_tiene_detalles = PilaPlanillaDetalle.objects.filter(planilla=obj).exists()
-
-        if force or created or not ya_tiene_detalles:
-            riesgo_arl_default = str(empresa.get("clase_riesgo_arl", "1"))
-
-            with transaction.atomic():
-                # limpieza segura
-                PilaNovedad.objects.filter(detalle__planilla=obj).delete()
-                PilaPlanillaDetalle.objects.filter(planilla=obj).delete()
-
-                for emp in empleados:
-                    tipo_doc = emp.get("tipo_doc", "")
-                    numero_doc = emp.get("numero_doc") or emp.get("num_doc") or ""
-
-                    # Clase de riesgo (campo 78, pos 513): por empleado desde payload, según tarifa ARL
-                    riesgo_arl = str(emp.get("clase_riesgo") or riesgo_arl_default).strip() or riesgo_arl_default
-                    if riesgo_arl not in ("1", "2", "3", "4", "5"):
-                        riesgo_arl = riesgo_arl_default
-
-                    # Extraer datos comunes del empleado
-                    nombre = (emp.get("nombre_completo") or "").strip()
-                    partes = [p for p in nombre.split() if p]
-                    primer_apellido = partes[0] if len(partes) >= 1 else ""
-                    primer_nombre = partes[1] if len(partes) >= 2 else ""
-
-                    tipo_cotizante = emp.get("tipo_cotizante", "")
-                    subtipo_cotizante = emp.get("subtipo_cotizante", "00")
-                    entidades = emp.get("entidades") or {}
-                    caja_compensacion = bool(entidades.get("caja"))
-
-                    # ============================================
-                    # NUEVO: Procesar múltiples registros por empleado
-                    # ============================================
-                    registros = emp.get("registros") or []
-                    
-                    # Si no hay registros (formato antiguo), crear uno con datos del empleado
-                    if not registros:
-                        dias = emp.get("dias") or {}
-                        ibc = emp.get("ibc") or {}
-                        registros = [{
-                            "tipo_linea": "NORMAL",
-                            "dias": dias,
-                            "ibc": ibc,
-                            "novedades": emp.get("novedades") or []
-                        }]
-                    
-                    # Crear un detalle por cada registro (línea tipo 02)
-                    for registro in registros:
-                        dias = registro.get("dias") or {}
-                        dias_salud = int(dias.get("salud", 0) or 0)
-                        dias_pension = int(dias.get("pension", 0) or 0)
-                        dias_arl = int(dias.get("arl", 0) or 0)
-                        dias_caja = int(dias.get("caja", 0) or 0)
-
-                        # mantenemos dias_cotizados como "principal" usando salud
-                        dias_cotizados = dias_salud
-
-                        ibc = registro.get("ibc") or {}
-                        ibc_salud = ibc.get("salud") or 0
-                        ibc_pension = ibc.get("pension") or 0
-                        ibc_arl = ibc.get("arl") or 0
-
-                        detalle = PilaPlanillaDetalle.objects.create(
-                            planilla=obj,
-                            tipo_doc=tipo_doc,
-                            numero_doc=numero_doc,
-                            primer_nombre=primer_nombre,
-                            primer_apellido=primer_apellido,
-                            tipo_cotizante=tipo_cotizante,
-                            subtipo_cotizante=subtipo_cotizante,
-
-                            dias_cotizados=dias_cotizados,
-                            dias_salud=dias_salud,
-                            dias_pension=dias_pension,
-                            dias_arl=dias_arl,
-                            dias_caja=dias_caja,
-
-                            ibc=ibc_salud,
-                            ibc_salud=ibc_salud,
-                            ibc_pension=ibc_pension,
-                            ibc_arl=ibc_arl,
-                            riesgo_arl=riesgo_arl,
-                            caja_compensacion=caja_compensacion,
-                            estado="OK",
-                            errores=[],
-                        )
-
-                        # Crear novedades para este registro específico
-                        for nov in (registro.get("novedades") or []):
-                            if not isinstance(nov, dict):
-                                continue
-                            codigo = (nov.get("codigo") or "").upper()
-                            if not codigo:
-                                continue
-
-                            fi = _to_date(nov.get("fecha_desde"))
-                            ff = _to_date(nov.get("fecha_hasta"))
-
-                            if not fi:
-                                continue
-
-                            try:
-                                PilaNovedad.objects.create(
-                                    detalle=detalle,
-                                    tipo_novedad=codigo,
-                                    fecha_inicio=fi,
-                                    fecha_fin=ff,
-                                    dias=nov.get("dias"),
-                                    valor=nov.get("valor"),
-                                    metadata=json_safe(nov),
-                                )
-                            except DataError as e:
-                                # Enriquecer mensaje para ubicar fácilmente el problema de longitud
-                                raise ValueError(
-                                    f"Error al guardar novedad PILA "
-                                    f"(planilla={obj.numero_interno}, tipo_doc={tipo_doc}, "
-                                    f"numero_doc={numero_doc}, codigo_novedad={codigo}): {e}"
-                                )
-
-            # cálculo SOLO una vez
-            calcular_planilla(obj.planilla_id)
-            obj.refresh_from_db()
+    clave = request.headers.get("Idempotency-Key", "").strip()
+    if len(clave) > MAX_CLAVE:
+        return JsonResponse({"detail": f"Idempotency-Key excede {MAX_CLAVE} caracteres"}, status=400)
 
-        return JsonResponse(
-            planilla_to_response(obj),
-            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
-        )
+    try:
+        if request.GET.get("stream") == "1":
+            if request.GET.get("async") == "1":
+                return JsonResponse({"detail": "stream=1 no se puede combinar con async=1"}, status=400)
+            # El cuerpo no se lee antes de procesar: solo se repite por Idempotency-Key
+            guardada = respuesta_guardada(clave) if clave else None
+            if guardada is not None:
+                return _respuesta_repetida(guardada)
+            obj, created = procesar_payload_streaming(request.stream, force=request.GET.get("force") == "1")
+            return _responder_planilla(
+                clave, obj.hash_payload, obj, planilla_to_response(obj),
+                status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+            )
+
+        huella = hash_payload(request.data)
+        previa = _respuesta_previa(request.data, clave, huella)
+        if previa is not None:
+            return previa
+
+        # Una petición a la vez por numero_interno (ver services/bloqueo_planilla.py). Quien
+        # esperaba a otra con el mismo payload o la misma clave reutiliza su resultado
+        with bloqueo_planilla(numero_interno_payload(request.data)):
+            previa = _respuesta_previa(request.data, clave, huella)
+            if previa is not None:
+                return previa
+            return _procesar_crear_planilla(request, clave, huella)
 
     except APIException:
         raise  # 400 validación, etc.: que DRF responda
+    except PlanillaOcupada as e:
+        response = JsonResponse({"detail": str(e)}, status=status.HTTP_409_CONFLICT)
+        response["Retry-After"] = str(max(ceil(e.espera), 1))
+        return response
     except Exception as e:
         tb = traceback.format_exc()
         detail = str(e)
@@ -275,70 +235,102 @@ def consultar_planilla(request, planilla_id: int):
     except PilaPlanilla.DoesNotExist:
         return JsonResponse({"detail": "No existe"}, status=404)
 
-    return JsonResponse(planilla_to_response(obj), status=200)
+    data = planilla_to_response(obj)
+
+    # Progreso del último job asíncrono (si la planilla se creó con ?async=1)
+    job = obj.jobs.order_by("-job_id").first()
+    if job is not None:
+        data["job"] = job_to_response(job)
+
+    return JsonResponse(data, status=200)
+
+
+def _entero_param(request, nombre: str, minimo: int, maximo: int | None = None) -> int | None:
+    """Parámetro entero opcional de la URL. Raises ValueError si no es válido."""
+    valor = request.query_params.get(nombre)
+    if valor is None or valor == "":
+        return None
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ValueError(f"{nombre} debe ser un entero")
+    if numero < minimo or (maximo is not None and numero > maximo):
+        rango = f"entre {minimo} y {maximo}" if maximo is not None else f">= {minimo}"
+        raise ValueError(f"{nombre} debe estar {rango}")
+    return numero
+
+
+class _RendererNDJSON(BaseRenderer):
+    """Solo para la negociación de contenido (Accept: application/x-ndjson): la vista arma el cuerpo."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+
+def _ndjson(detalles):
+    """Un detalle por línea (JSON compacto, UTF-8), a medida que se leen de la base."""
+    for detalle in detalles:
+        yield (json.dumps(detalle, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
 
 
 @api_view(["GET"])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, _RendererNDJSON])
+@comprimir_respuesta
 def listar_detalles(request, planilla_id: int):
+    """
+    GET /api/v1/pila/planillas/{planilla_id}/detalles/
+    Detalles de la planilla ordenados por id.
+
+    Query params (todos opcionales):
+        fields: campos a incluir, separados por coma (detalle_id siempre va)
+        estado, tipo_cotizante, tipo_doc, numero_doc: filtros por igualdad
+        limit / cursor: paginación por cursor (detalles con id > cursor, máx. limit)
+        formato=ndjson (o Accept: application/x-ndjson): un detalle por línea, en streaming
+    """
     auth_error = _require_service_token(request)
     if auth_error:
         return auth_error
 
+    try:
+        campos = parsear_campos(request.query_params.get("fields"))
+        limite = _entero_param(request, "limit", 1, limite_maximo())
+        cursor = _entero_param(request, "cursor", 0)
+    except ValueError as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+
+    filtros = {f: request.query_params[f] for f in FILTROS_DETALLE if f in request.query_params}
+    estado = filtros.get("estado")
+    if estado is not None and estado not in dict(PilaPlanillaDetalle.ESTADOS):
+        return JsonResponse(
+            {"detail": f"estado inválido (use {', '.join(dict(PilaPlanillaDetalle.ESTADOS))})"},
+            status=400,
+        )
+
     try:
         planilla = PilaPlanilla.objects.get(planilla_id=planilla_id)
     except PilaPlanilla.DoesNotExist:
         return JsonResponse({"detail": "No existe"}, status=404)
 
-    detalles = (
-        PilaPlanillaDetalle.objects
-        .filter(planilla=planilla)
-        .prefetch_related("novedades")
-        .order_by("id")
-    )
+    formato = request.query_params.get("formato", "").lower()
+    if formato == "ndjson" or request.accepted_renderer.format == "ndjson":
+        # Página (o planilla completa) en streaming; el cursor de la siguiente página es el
+        # detalle_id de la última línea
+        detalles = iter_detalles(planilla, campos, filtros, cursor, limite)
+        return StreamingHttpResponse(_ndjson(detalles), content_type="application/x-ndjson; charset=utf-8")
 
+    # Un detalle de más para saber si hay página siguiente
+    detalles = list(iter_detalles(planilla, campos, filtros, cursor, limite + 1 if limite else None))
     data = {
         "planilla": planilla_to_response(planilla),
-        "detalles": [],
+        "detalles": detalles[:limite] if limite else detalles,
     }
-
-    for d in detalles:
-        data["detalles"].append({
-            "detalle_id": d.id,
-            "tipo_doc": d.tipo_doc,
-            "numero_doc": d.numero_doc,
-            "primer_nombre": d.primer_nombre,
-            "primer_apellido": d.primer_apellido,
-            "tipo_cotizante": d.tipo_cotizante,
-            "subtipo_cotizante": d.subtipo_cotizante,
-            "dias_cotizados": d.dias_cotizados,
-            "dias_salud": d.dias_salud,
-            "dias_pension": d.dias_pension,
-            "dias_arl": d.dias_arl,
-            "dias_caja": d.dias_caja,
-            "ibc": str(d.ibc),
-            "ibc_salud": str(d.ibc_salud),
-            "ibc_pension": str(d.ibc_pension),
-            "ibc_arl": str(d.ibc_arl),
-            "riesgo_arl": d.riesgo_arl,
-            "caja_compensacion": d.caja_compensacion,
-            "estado": d.estado,
-            "errores": d.errores,
-            "aportes": d.aportes,
-            "aportes_empleado": str(d.aportes_empleado),
-            "aportes_empleador": str(d.aportes_empleador),
-            "novedades": [
-                {
-                    "id": n.id,
-                    "tipo_novedad": n.tipo_novedad,
-                    "fecha_inicio": n.fecha_inicio.isoformat(),
-                    "fecha_fin": n.fecha_fin.isoformat() if n.fecha_fin else None,
-                    "dias": n.dias,
-                    "valor": str(n.valor) if n.valor else None,
-                    "metadata": n.metadata,
-                }
-                for n in d.novedades.all().order_by("id")
-            ],
-        })
+    if limite is not None or cursor is not None:
+        hay_mas = limite is not None and len(detalles) > limite
+        data["paginacion"] = {
+            "limit": limite,
+            "cursor_siguiente": detalles[limite - 1]["detalle_id"] if hay_mas else None,
+        }
 
     return JsonResponse(data, status=200)
 
@@ -347,6 +339,9 @@ def listar_detalles(request, planilla_id: int):
 def calcular_planilla_view(request, planilla_id: int):
     """
     POST /api/v1/pila/planillas/{planilla_id}/calcular/
+    Query params opcionales:
+      ?motor=decimal|numpy  (por defecto settings.PILA_MOTOR_CALCULO)
+      ?full=1               recalcula todos los detalles (por defecto solo los que cambiaron)
     """
     auth_error = _require_service_token(request)
     if auth_error:
@@ -357,7 +352,12 @@ def calcular_planilla_view(request, planilla_id: int):
     except PilaPlanilla.DoesNotExist:
         return JsonResponse({"detail": "Planilla no existe"}, status=404)
 
-    resumen = calcular_planilla(planilla_id)
+    motor = (request.query_params.get("motor") or "").strip().lower() or None
+    if motor and motor not in MOTORES_CALCULO:
+        return JsonResponse({"detail": f"motor inválido (use {', '.join(MOTORES_CALCULO)})"}, status=400)
+
+    full = request.GET.get("full") == "1"
+    resumen = calcular_planilla(planilla_id, motor=motor, full=full)
 
     return JsonResponse(
         {"planilla_id": planilla_id, "resultado": resumen},
@@ -365,11 +365,133 @@ def calcular_planilla_view(request, planilla_id: int):
     )
 
 
+def _stream_txt(registro_01: bytes, lineas):
+    """
+    Emite el TXT (registro 01 + registros 02 separados por \\n) validando la longitud de
+    cada línea a medida que sale. Un error a mitad de la descarga corta la respuesta: el
+    cliente recibe un archivo incompleto en lugar de uno inválido.
+    """
+    try:
+        yield registro_01
+        for i, linea in enumerate(lineas, start=1):
+            if len(linea) != LONGITUD_REGISTRO_02:
+                raise ValueError(
+                    f"Registro 02 línea {i} tiene {len(linea)} caracteres, esperado {LONGITUD_REGISTRO_02}"
+                )
+            yield b"\n" + linea
+    finally:
+        # Cierra la transacción de iter_lineas_txt si el cliente se desconecta
+        lineas.close()
+
+
+def _etag_coincide(request, archivo) -> bool:
+    """If-None-Match incluye el ETag del archivo (o es *): el cliente ya tiene esta versión."""
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if "*" in etags:
+        return True
+    etag = etag_http(archivo)
+    return any(e.removeprefix("W/") == etag for e in etags)
+
+
+def _rango_bytes(request, archivo) -> tuple[int, int] | None:
+    """
+    Rango pedido en el header Range como (inicio, fin inclusivo). Se atiende un solo rango
+    ("bytes=inicio-fin", "bytes=inicio-" o "bytes=-últimos"); None = archivo completo (sin
+    Range, varios rangos, mal formado o If-Range con otro ETag).
+
+    Raises:
+        ValueError: Si el rango empieza después del final del archivo o es un sufijo de 0
+            bytes (416)
+    """
+    rango = request.headers.get("Range", "").replace(" ", "")
+    if not rango.startswith("bytes=") or "," in rango:
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != etag_http(archivo):
+        return None
+
+    inicio, _, fin = rango[len("bytes="):].partition("-")
+    if not (inicio + fin).isdigit():
+        return None
+    ultimo = archivo.tamano - 1
+    if not inicio:
+        # Sufijo: los últimos N bytes ("bytes=-0" no pide ninguno)
+        if not int(fin) or not archivo.tamano:
+            raise ValueError("Rango no satisfacible")
+        return max(archivo.tamano - int(fin), 0), ultimo
+    inicio, fin = int(inicio), min(int(fin), ultimo) if fin else ultimo
+    if inicio > ultimo:
+        raise ValueError("Rango no satisfacible")
+    if inicio > fin:
+        return None
+    return inicio, fin
+
+
+def _leer_rango(contenido, n: int, bloque: int = 64 * 1024):
+    """Emite n bytes de contenido (ya posicionado) por bloques y lo cierra."""
+    try:
+        while n > 0:
+            datos = contenido.read(min(bloque, n))
+            if not datos:
+                break
+            n -= len(datos)
+            yield datos
+    finally:
+        contenido.close()
+
+
+def _respuesta_archivo(request, archivo, nombre_archivo: str):
+    """
+    Archivo guardado: 304 si el cliente ya lo tiene; 206 con el rango pedido (Range, para
+    reanudar descargas); si no, el archivo completo con FileResponse (sendfile si está en
+    disco).
+    """
+    if _etag_coincide(request, archivo):
+        response = HttpResponse(status=304)
+        response["ETag"] = etag_http(archivo)
+        return response
+
+    try:
+        rango = _rango_bytes(request, archivo)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{archivo.tamano}"
+        return response
+
+    contenido = abrir_archivo(archivo)
+    if rango is None:
+        response = FileResponse(contenido, content_type="text/plain; charset=iso-8859-1")
+    else:
+        inicio, fin = rango
+        contenido.seek(inicio)
+        response = StreamingHttpResponse(
+            _leer_rango(contenido, fin - inicio + 1),
+            status=206,
+            content_type="text/plain; charset=iso-8859-1",
+        )
+        response["Content-Range"] = f"bytes {inicio}-{fin}/{archivo.tamano}"
+        response["Content-Length"] = str(fin - inicio + 1)
+
+    response["Content-Disposition"] = f'attachment; filename="{nombre_archivo}"'
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag_http(archivo)
+    return response
+
+
 @api_view(["GET"])
+@comprimir_respuesta
 def descargar_archivo(request, planilla_id: int):
     """
     GET /api/v1/pila/planillas/{planilla_id}/archivo/
     Genera y descarga el archivo TXT PILA completo para la planilla.
+
+    Con la caché de archivos activa (PILA_ARCHIVOS_MAX > 0) el archivo se genera una vez por
+    versión de los datos de la planilla y luego se sirve guardado, con ETag fuerte (SHA-256
+    del contenido). If-None-Match con el ETag vigente responde 304 sin leer los detalles, y
+    Range: bytes=... responde 206 con ese tramo (descargas reanudables).
+
+    Sin caché la respuesta es streaming: las líneas se envían a medida que se renderizan y
+    la memoria no crece con el número de empleados (sin Content-Length ni ETag).
     """
     auth_error = _require_service_token(request)
     if auth_error:
@@ -380,44 +502,48 @@ def descargar_archivo(request, planilla_id: int):
     except PilaPlanilla.DoesNotExist:
         return JsonResponse({"detail": "Planilla no existe"}, status=404)
 
+    # Parámetro opcional: tipo_planilla=K (solo estudiantes) o E (solo no estudiantes)
+    tipo_planilla = request.GET.get("tipo_planilla", "").strip().upper()
+    filtro = tipo_planilla if tipo_planilla in ("K", "E") else None
+
+    # Preparar nombre de archivo (incluir sufijo tipo cuando se filtra)
+    sufijo = f"_{filtro}" if filtro else ""
+    nombre_archivo = f"PILA_{planilla.numero_interno}{sufijo}.txt"
+
+    # Archivo ya generado para esta versión de los datos: sin tocar detalles
+    if cache_activa():
+        archivo = archivo_vigente(planilla, filtro)
+        if archivo is not None:
+            registrar_acceso(archivo)
+            return _respuesta_archivo(request, archivo, nombre_archivo)
+
     # Validar que la planilla tenga detalles válidos
-    detalles_ok = PilaPlanillaDetalle.objects.filter(
-        planilla=planilla, 
-        estado="OK"
-    ).count()
-    
-    if detalles_ok == 0:
+    if not PilaPlanillaDetalle.objects.filter(planilla=planilla, generacion=planilla.generacion, estado="OK").exists():
         return JsonResponse(
             {"detail": "La planilla no tiene detalles válidos para generar el archivo"},
             status=400
         )
 
-    # Parámetro opcional: tipo_planilla=K (solo estudiantes) o E (solo no estudiantes)
-    tipo_planilla = request.GET.get("tipo_planilla", "").strip().upper()
-    filtro = tipo_planilla if tipo_planilla in ("K", "E") else None
-
     try:
-        # Generar el archivo TXT (filtrado por tipo si se especifica)
-        contenido_txt = generar_txt_planilla(planilla_id, filtro_tipo_planilla=filtro)
-        
-        # Validar longitudes de cada línea antes de enviar
-        lineas = contenido_txt.split('\n')
-        if len(lineas[0]) != 359:
-            raise ValueError(f"Registro 01 tiene {len(lineas[0])} caracteres, esperado 359")
-        
-        for i in range(1, len(lineas)):
-            if len(lineas[i]) != 693:
-                raise ValueError(f"Registro 02 línea {i} tiene {len(lineas[i])} caracteres, esperado 693")
-        
-        # Preparar nombre de archivo (incluir sufijo tipo cuando se filtra)
-        sufijo = f"_{filtro}" if filtro else ""
-        nombre_archivo = f"PILA_{planilla.numero_interno}{sufijo}.txt"
+        if cache_activa():
+            # Generar y guardar (iter_lineas_txt ya valida la longitud de cada línea)
+            return _respuesta_archivo(request, obtener_archivo(planilla_id, filtro), nombre_archivo)
+
+        # Generar el archivo TXT (filtrado por tipo si se especifica). El registro 01 se
+        # genera aquí: los errores de payload/encabezado aún pueden responder 400/500.
+        lineas = iter_lineas_txt(planilla_id, filtro_tipo_planilla=filtro)
+        registro_01 = next(lineas)
+        if len(registro_01) != LONGITUD_REGISTRO_01:
+            lineas.close()
+            raise ValueError(f"Registro 01 tiene {len(registro_01)} caracteres, esperado {LONGITUD_REGISTRO_01}")
         
         # Crear respuesta HTTP con el archivo
         # IMPORTANTE: Usar ISO-8859-1 (Latin-1) para que caracteres especiales ocupen 1 byte
-        response = HttpResponse(contenido_txt, content_type='text/plain; charset=iso-8859-1')
+        response = StreamingHttpResponse(
+            _stream_txt(registro_01, lineas),
+            content_type='text/plain; charset=iso-8859-1',
+        )
         response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
-        response['Content-Length'] = len(contenido_txt.encode('iso-8859-1'))
         
         return response
         
@@ -434,10 +560,96 @@ def descargar_archivo(request, planilla_id: int):
 
 
 @api_view(["GET"])
+def descargar_archivos_zip(request, planilla_id: int):
+    """
+    GET /api/v1/pila/planillas/{planilla_id}/archivos/
+    ZIP con varios TXT de la planilla (E, K, por sucursal) generados en una sola lectura,
+    cada uno con su encabezado, secuencia y totales.
+
+    Query params opcionales:
+      ?tipos=E,K          tipos de planilla (por defecto E,K; TODOS = un archivo sin filtro)
+      ?por_sucursal=1|0   un archivo por sucursal (por defecto si tipo_presentacion_planilla=S)
+    """
+    auth_error = _require_service_token(request)
+    if auth_error:
+        return auth_error
+
+    try:
+        planilla = PilaPlanilla.objects.get(planilla_id=planilla_id)
+    except PilaPlanilla.DoesNotExist:
+        return JsonResponse({"detail": "Planilla no existe"}, status=404)
+
+    tipos = []
+    for tipo in (request.GET.get("tipos") or ",".join(TIPOS_VARIANTE)).upper().split(","):
+        tipo = tipo.strip()
+        if tipo not in TIPOS_VARIANTE + ("TODOS",):
+            return JsonResponse({"detail": "tipos inválido (use E, K o TODOS)"}, status=400)
+        tipo = None if tipo == "TODOS" else tipo
+        if tipo not in tipos:
+            tipos.append(tipo)
+
+    por_sucursal = request.GET.get("por_sucursal")
+    por_sucursal = None if por_sucursal in (None, "") else por_sucursal == "1"
+
+    try:
+        # Se genera todo antes de responder: los errores de payload aún pueden responder 400/500
+        archivos = generar_variantes(planilla_id, tuple(tipos), por_sucursal=por_sucursal)
+    except ValueError as e:
+        return JsonResponse({"detail": f"Error al generar archivo: {str(e)}"}, status=400)
+    except Exception as e:
+        return JsonResponse({"detail": f"Error interno: {str(e)}"}, status=500)
+
+    response = StreamingHttpResponse(iter_zip(archivos, planilla.numero_interno), content_type="application/zip")
+    response["Content-Disposition"] = f'attachment; filename="PILA_{planilla.numero_interno}.zip"'
+    return response
+
+
+def _json_por_partes(datos, tamano: int = 64 * 1024):
+    """Serializa datos a JSON compacto (UTF-8) en bloques de ~tamano bytes."""
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    return _en_bloques(encoder.iterencode(datos), tamano)
+
+
+def _payload_con_lotes(planilla, payload: dict):
+    """
+    JSON compacto del payload de una ingesta por partes: payload_inicial (sin "empleados")
+    más los empleados guardados por lotes, leídos de a un lote.
+    """
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    yield "{"
+    for clave, valor in payload.items():
+        yield f"{encoder.encode(clave)}:"
+        yield from encoder.iterencode(valor)
+        yield ","
+    yield '"empleados":['
+    for i, emp in enumerate(empleados_guardados(planilla.planilla_id, planilla.generacion)):
+        if i:
+            yield ","
+        yield encoder.encode(emp)
+    yield "]}"
+
+
+def _en_bloques(partes, tamano: int = 64 * 1024):
+    """Agrupa partes de texto en bloques UTF-8 de ~tamano bytes."""
+    bloque = []
+    largo = 0
+    for parte in partes:
+        bloque.append(parte)
+        largo += len(parte)
+        if largo >= tamano:
+            yield "".join(bloque).encode("utf-8")
+            bloque, largo = [], 0
+    if bloque:
+        yield "".join(bloque).encode("utf-8")
+
+
+@api_view(["GET"])
+@comprimir_respuesta
 def descargar_payload_json(request, planilla_id: int):
     """
     GET /api/v1/pila/planillas/{planilla_id}/payload/
-    Devuelve el payload JSON (payload_inicial) usado en la liquidación.
+    Devuelve el payload JSON (payload_inicial) usado en la liquidación, compacto y en
+    streaming (gzip/zstd según Accept-Encoding).
     """
     auth_error = _require_service_token(request)
     if auth_error:
@@ -452,7 +664,11 @@ def descargar_payload_json(request, planilla_id: int):
     if payload is None:
         return JsonResponse({"detail": "No hay payload guardado para esta planilla"}, status=404)
 
-    contenido = json.dumps(payload, ensure_ascii=False, indent=2)
-    response = HttpResponse(contenido, content_type="application/json; charset=utf-8")
+    # JSON compacto (sin indent) y por partes: se comprime a medida que se serializa
+    if "empleados" in payload:
+        partes = _json_por_partes(payload)
+    else:
+        partes = _en_bloques(_payload_con_lotes(planilla, payload))
+    response = StreamingHttpResponse(partes, content_type="application/json; charset=utf-8")
     response["Content-Disposition"] = f'attachment; filename="PILA_payload_{planilla.numero_interno}.json"'
     return response
\ No newline at end of file
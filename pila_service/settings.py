@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'pila_api.compresion.GzipCuerpoMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -133,4 +134,55 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-PILA_SERVICE_TOKEN = os.getenv("PILA_SERVICE_TOKEN", "").strip()
\ No newline at end of file
+PILA_SERVICE_TOKEN = os.getenv("PILA_SERVICE_TOKEN", "").strip()
+
+# Empleados por lote y filas por INSERT al ingerir detalles/novedades (bulk_create)
+PILA_INGESTA_BATCH_SIZE = int(os.getenv("PILA_INGESTA_BATCH_SIZE", "1000"))
+
+# Jobs EN_PROCESO sin terminar tras este tiempo (segundos) se consideran huérfanos y se re-toman
+PILA_JOBS_TIMEOUT = int(os.getenv("PILA_JOBS_TIMEOUT", "1800"))
+
+# Intentos máximos de un job: uno huérfano que ya los agotó queda FALLIDO en vez de re-tomarse
+PILA_JOBS_MAX_INTENTOS = int(os.getenv("PILA_JOBS_MAX_INTENTOS", "3"))
+
+# Segundos que una petición espera el bloqueo de su planilla (otra la está escribiendo) antes de responder 409 (0 = sin límite)
+PILA_BLOQUEO_TIMEOUT = float(os.getenv("PILA_BLOQUEO_TIMEOUT", "30"))
+
+# Detalles por UPDATE al persistir resultados de calcular_planilla (bulk_update)
+PILA_CALCULO_BATCH_SIZE = int(os.getenv("PILA_CALCULO_BATCH_SIZE", "500"))
+
+# Motor de cálculo por defecto de calcular_planilla: "decimal" (referencia) o "numpy" (vectorizado)
+PILA_MOTOR_CALCULO = os.getenv("PILA_MOTOR_CALCULO", "decimal").strip().lower()
+
+# Validación del payload: "drf" (serializers, referencia) o "compilado" (mismo esquema y errores, más rápido)
+PILA_VALIDADOR = os.getenv("PILA_VALIDADOR", "drf").strip().lower()
+
+# Detalles por bloque leído de la base al generar el TXT (streaming con .iterator())
+PILA_TXT_CHUNK_SIZE = int(os.getenv("PILA_TXT_CHUNK_SIZE", "2000"))
+
+# Caché de archivos TXT generados (tabla pila_archivo): máximo de archivos guardados (0 = sin caché, descarga streaming)
+PILA_ARCHIVOS_MAX = int(os.getenv("PILA_ARCHIVOS_MAX", "200"))
+
+# Tamaño total máximo de la caché de archivos en bytes (0 = sin límite); se desaloja por última descarga
+PILA_ARCHIVOS_MAX_BYTES = int(os.getenv("PILA_ARCHIVOS_MAX_BYTES", "0"))
+
+# Segundos sin descargas tras los que un archivo guardado se borra (0 = sin vencimiento)
+PILA_ARCHIVOS_TTL = int(os.getenv("PILA_ARCHIVOS_TTL", "0"))
+
+# Directorio (volumen local) donde guardar los TXT generados y servirlos con FileResponse; vacío = en la tabla con PILA_ARCHIVOS_EN_TABLA, si no sin caché
+PILA_ARCHIVOS_DIR = os.getenv("PILA_ARCHIVOS_DIR", "").strip()
+
+# Sin PILA_ARCHIVOS_DIR: guardar los TXT en la tabla (lee cada archivo completo en memoria)
+PILA_ARCHIVOS_EN_TABLA = os.getenv("PILA_ARCHIVOS_EN_TABLA", "False").lower() in ("true", "1", "yes")
+
+# Tamaño máximo (bytes) de un cuerpo de petición gzip ya descomprimido; más grande responde 413
+PILA_MAX_CUERPO_DESCOMPRIMIDO = int(os.getenv("PILA_MAX_CUERPO_DESCOMPRIMIDO", str(200 * 1024 * 1024)))
+
+# Segundos que se guarda la respuesta de crear_planilla por Idempotency-Key (0 = sin vencimiento)
+PILA_IDEMPOTENCIA_TTL = int(os.getenv("PILA_IDEMPOTENCIA_TTL", "86400"))
+
+# Máximo de detalles por página en listar_detalles (?limit=)
+PILA_DETALLES_LIMITE_MAX = int(os.getenv("PILA_DETALLES_LIMITE_MAX", "5000"))
+
+# Detalles de generaciones viejas borrados por transacción (recolectar_generaciones)
+PILA_RECOLECCION_BATCH_SIZE = int(os.getenv("PILA_RECOLECCION_BATCH_SIZE", "1000"))